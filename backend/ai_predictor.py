@@ -7,6 +7,12 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Tuple
 import os
 
+from config import get_settings
+from services import solar_geometry
+from services.forecast_grid import ForecastGrid
+
+settings = get_settings()
+
 
 class EnergyPredictor:
     """
@@ -125,18 +131,12 @@ class EnergyPredictor:
     
     def _estimate_solar_radiation(self, timestamp: datetime, 
                                    cloud_cover: float, humidity: float) -> float:
-        """Estimar radiación solar basada en hora y nubosidad"""
-        
-        # Radiación solar máxima teórica al mediodía (W/m²)
-        max_radiation = 1000.0
-        
-        # Factor de hora (máximo al mediodía)
-        hour = timestamp.hour
-        if hour < 6 or hour > 20:
-            return 0.0
+        """
+        Estimar radiación solar (W/m²): GHI de cielo despejado para la
+        posición real del sol en el sitio, atenuada por nubosidad y humedad
+        """
         
-        # Curva sinusoidal para simular el día
-        hour_factor = np.sin(np.pi * (hour - 6) / 14)
+        clear_sky = float(solar_geometry.clear_sky_ghi(settings.latitude, settings.longitude, timestamp)[0])
         
         # Factor de nubosidad (0-100% nubosidad reduce la radiación)
         cloud_factor = 1.0 - (cloud_cover / 100.0) * 0.75
@@ -144,9 +144,76 @@ class EnergyPredictor:
         # Factor de humedad (alta humedad reduce ligeramente)
         humidity_factor = 1.0 - (humidity / 100.0) * 0.1
         
-        radiation = max_radiation * hour_factor * cloud_factor * humidity_factor
+        return max(0.0, clear_sky * cloud_factor * humidity_factor)
+    
+    # ===== FEATURES VECTORIZADAS (grilla de pronóstico) =====
+    
+    def _time_feature_columns(self, timestamps: List[datetime]) -> Dict[str, np.ndarray]:
+        """Características temporales de muchos timestamps a la vez"""
+        hour = np.array([ts.hour for ts in timestamps], dtype=np.float64)
+        day = np.array([ts.day for ts in timestamps], dtype=np.float64)
+        month = np.array([ts.month for ts in timestamps], dtype=np.float64)
+        day_of_week = np.array([ts.weekday() for ts in timestamps], dtype=np.float64)
         
-        return max(0.0, radiation)
+        return {
+            'hour': hour,
+            'day': day,
+            'month': month,
+            'day_of_week': day_of_week,
+            'is_weekend': (day_of_week >= 5).astype(np.float64),
+            'hour_sin': np.sin(2 * np.pi * hour / 24),
+            'hour_cos': np.cos(2 * np.pi * hour / 24),
+            'month_sin': np.sin(2 * np.pi * month / 12),
+            'month_cos': np.cos(2 * np.pi * month / 12),
+        }
+    
+    def _estimate_solar_radiation_batch(self, times: np.ndarray,
+                                        cloud_cover: np.ndarray, humidity: np.ndarray) -> np.ndarray:
+        """Versión vectorizada de _estimate_solar_radiation (times: epoch en segundos)"""
+        clear_sky = solar_geometry.clear_sky_ghi(settings.latitude, settings.longitude, times)
+        cloud_factor = 1.0 - (cloud_cover / 100.0) * 0.75
+        humidity_factor = 1.0 - (humidity / 100.0) * 0.1
+        
+        return np.maximum(0.0, clear_sky * cloud_factor * humidity_factor)
+    
+    def prepare_features_grid(self, grid: ForecastGrid,
+                              recent_consumption: float = 0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Matrices de características (solar, eólica, consumo) para toda la
+        grilla, con las mismas columnas que prepare_features_*
+        """
+        timestamps = grid.timestamps()
+        tf = self._time_feature_columns(timestamps)
+        
+        temperature = grid.column('temperature_c')
+        cloud_cover = grid.column('cloud_cover_percent')
+        humidity = grid.column('humidity_percent')
+        
+        if 'solar_radiation_wm2' in grid:
+            solar_radiation = grid.column('solar_radiation_wm2')
+        else:
+            solar_radiation = self._estimate_solar_radiation_batch(grid.times, cloud_cover, humidity)
+        
+        X_solar = np.column_stack([
+            tf['hour'], tf['day'], tf['month'],
+            tf['hour_sin'], tf['hour_cos'], tf['month_sin'], tf['month_cos'],
+            temperature, cloud_cover / 100.0, humidity / 100.0, solar_radiation,
+        ])
+        
+        X_wind = np.column_stack([
+            tf['hour'], tf['day'], tf['month'],
+            tf['hour_sin'], tf['hour_cos'],
+            grid.column('wind_speed_ms'), grid.column('wind_direction_deg'),
+            temperature, grid.column('pressure_hpa'),
+        ])
+        
+        X_consumption = np.column_stack([
+            tf['hour'], tf['day_of_week'], tf['is_weekend'],
+            tf['hour_sin'], tf['hour_cos'],
+            temperature, np.full(len(grid), float(recent_consumption)),
+        ])
+        
+        return X_solar, X_wind, X_consumption
     
     def train_with_history(self, historical_data: pd.DataFrame):
         """Entrenar modelos con datos históricos"""
@@ -238,14 +305,20 @@ class EnergyPredictor:
             freq='H'
         )
         
+        # Cielo despejado en el sitio para todas las horas (una sola pasada)
+        clear_sky = solar_geometry.clear_sky_ghi(
+            settings.latitude, settings.longitude, [dt.to_pydatetime() for dt in dates]
+        )
+        
         synthetic_data = []
-        for dt in dates:
+        for i, dt in enumerate(dates):
             # Simular datos realistas
             hour = dt.hour
+            cloud_cover = np.random.uniform(0, 100)
             
-            # Solar: máximo al mediodía, cero de noche
-            solar_base = max(0, 3000 * np.sin(np.pi * (hour - 6) / 14) if 6 <= hour <= 20 else 0)
-            solar_power = solar_base + np.random.normal(0, 200)
+            # Solar: sigue la posición real del sol (3 kW pico), atenuada por nubes
+            solar_base = 3.0 * clear_sky[i] * (1.0 - cloud_cover / 100.0 * 0.75)
+            solar_power = solar_base + (np.random.normal(0, 200) if solar_base > 0 else 0)
             
             # Viento: más variable, picos en tarde/noche
             wind_power = 500 + 1000 * (1 + np.sin(2 * np.pi * hour / 24)) + np.random.normal(0, 300)
@@ -262,7 +335,7 @@ class EnergyPredictor:
                 'wind_power_w': max(0, wind_power),
                 'load_power_w': max(0, load),
                 'temperature_c': 20 + 10 * np.sin(2 * np.pi * hour / 24),
-                'cloud_cover_percent': np.random.uniform(0, 100),
+                'cloud_cover_percent': cloud_cover,
                 'humidity_percent': np.random.uniform(40, 80),
                 'wind_speed_ms': np.random.uniform(0, 15),
                 'wind_direction_deg': np.random.uniform(0, 360),
@@ -326,31 +399,62 @@ class EnergyPredictor:
         
         return max(0.0, prediction)
     
-    def predict_24h(self, weather_forecast: List[Dict], 
-                    current_consumption: float = 0) -> List[Dict]:
-        """Predecir 24 horas adelante"""
+    def predict_grid(self, grid: ForecastGrid,
+                     current_consumption: float = 0) -> Dict[str, np.ndarray]:
+        """
+        Predecir sobre toda la grilla de pronóstico (una llamada por modelo)
         
-        predictions = []
+        Returns:
+            {'predicted_solar_w', 'predicted_wind_w', 'predicted_consumption_w'}:
+            arrays de potencia (W) alineados con grid.times
+        """
         
-        for i, weather in enumerate(weather_forecast):
-            timestamp = weather['timestamp']
-            
-            solar_pred = self.predict_solar(timestamp, weather)
-            wind_pred = self.predict_wind(timestamp, weather)
-            consumption_pred = self.predict_consumption(
-                timestamp, 
-                weather.get('temperature_c', 25),
-                current_consumption
-            )
-            
-            predictions.append({
-                'timestamp': timestamp,
-                'predicted_solar_w': solar_pred,
-                'predicted_wind_w': wind_pred,
-                'predicted_consumption_w': consumption_pred,
-            })
+        if not self.is_trained:
+            self._train_with_synthetic_data()
         
-        return predictions
+        X_solar, X_wind, X_consumption = self.prepare_features_grid(grid, current_consumption)
+        
+        return {
+            'predicted_solar_w': np.maximum(
+                0.0, self.solar_model.predict(self.scaler_solar.transform(X_solar))
+            ),
+            'predicted_wind_w': np.maximum(
+                0.0, self.wind_model.predict(self.scaler_wind.transform(X_wind))
+            ),
+            'predicted_consumption_w': np.maximum(
+                0.0, self.consumption_model.predict(self.scaler_consumption.transform(X_consumption))
+            ),
+        }
+    
+    def predict_24h(self, weather_forecast, 
+                    current_consumption: float = 0) -> List[Dict]:
+        """
+        Predecir 24 horas adelante
+        
+        Args:
+            weather_forecast: ForecastGrid o lista de dicts de pronóstico
+        """
+        
+        grid = weather_forecast
+        if not isinstance(grid, ForecastGrid):
+            grid = ForecastGrid.from_records(weather_forecast)
+        if not len(grid):
+            return []
+        
+        columns = self.predict_grid(grid, current_consumption)
+        solar = columns['predicted_solar_w'].tolist()
+        wind = columns['predicted_wind_w'].tolist()
+        consumption = columns['predicted_consumption_w'].tolist()
+        
+        return [
+            {
+                'timestamp': timestamp,
+                'predicted_solar_w': solar[i],
+                'predicted_wind_w': wind[i],
+                'predicted_consumption_w': consumption[i],
+            }
+            for i, timestamp in enumerate(grid.timestamps())
+        ]
     
     def _save_models(self):
         """Guardar modelos entrenados"""
@@ -3,7 +3,7 @@ Sistema de Protección y Optimización de Batería
 Mantiene la batería en zona óptima (25-80%) para maximizar vida útil
 Prioriza uso directo de renovables sobre batería
 """
-from typing import Dict
+from typing import Dict, Optional
 from datetime import datetime
 
 class BatteryProtectionSystem:
@@ -35,7 +35,8 @@ class BatteryProtectionSystem:
         solar_power_w: float,
         wind_power_w: float,
         load_power_w: float,
-        battery_power_w: float
+        battery_power_w: float,
+        plan_action: Optional[Dict] = None
     ) -> Dict:
         """
         Analiza la estrategia óptima de uso de batería
@@ -45,6 +46,9 @@ class BatteryProtectionSystem:
         2. Excedente → Batería (solo si está en zona óptima)
         3. Batería → Casa (solo si renovables no alcanzan)
         
+        Con plan_action (DispatchPlan.action del despacho predictivo) cargar
+        o descargar lo decide el plan; los límites críticos se aplican igual.
+        
         Returns:
             Dict con estrategia y recomendaciones
         """
@@ -79,6 +83,25 @@ class BatteryProtectionSystem:
             should_charge = False
             should_discharge = False
         
+        # Plan de despacho: misma decisión que el controlador
+        if plan_action is not None:
+            threshold = max(plan_action['granularity_w'], 10.0)
+            should_charge = plan_action['battery_w'] > threshold
+            should_discharge = plan_action['battery_w'] < -threshold
+            if plan_action['grid_charge_w'] > threshold:
+                mode = "charging_from_grid"
+                recommendation = (
+                    f"🔌 Cargando desde la red según el plan "
+                    f"(objetivo {plan_action['target_soc_percent']:.0f}%)"
+                )
+            elif should_charge and renewable_surplus <= 50:
+                recommendation = (
+                    f"🔋 El plan prevé cargar hacia {plan_action['target_soc_percent']:.0f}% "
+                    f"({plan_action['battery_w']:.0f} W previstos en este paso)"
+                )
+            elif renewable_surplus > 50 and not should_charge:
+                recommendation = "🌱 Excedente sin cargar: el plan mantiene la batería en su objetivo"
+        
         # Validaciones de seguridad
         if is_critical_low:
             recommendation = "🚨 BATERÍA CRÍTICA - Reducir consumo o activar red backup"
@@ -121,6 +144,14 @@ class BatteryProtectionSystem:
             'recommendation': recommendation,
             'should_charge': should_charge,
             'should_discharge': should_discharge,
+            'decided_by': 'plan' if plan_action is not None else 'rules',
+            'plan': {
+                'target_soc_percent': round(plan_action['target_soc_percent'], 1),
+                'next_soc_percent': round(plan_action['next_soc_percent'], 1),
+                'battery_w': round(plan_action['battery_w'], 0),
+                'grid_w': round(plan_action['grid_w'], 0),
+                'shed_w': round(plan_action['shed_w'], 0)
+            } if plan_action is not None else None,
             'sources': {
                 'solar_w': solar_power_w,
                 'wind_w': wind_power_w,
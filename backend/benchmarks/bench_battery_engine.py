@@ -0,0 +1,73 @@
+"""
+Benchmark: motor de trayectoria de batería
+
+Compara battery_engine.simulate contra el recorrido paso a paso (el
+bucle que tenía predict_energy_balance_24h) para los casos de uso:
+24 h horario, 5 días cada 15 min, año de 8760 h y lotes de escenarios.
+Verifica además que ambos dan la misma trayectoria.
+
+Uso (desde backend/):
+    python benchmarks/bench_battery_engine.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from services import battery_engine
+from services.battery_engine import BatterySpec
+
+BATERIA = BatterySpec(capacity_wh=10000, soc_min=0.2, soc_max=1.0)
+
+CASOS = [
+    ("24 h, paso 1 h", 24, 1, 1.0),
+    ("5 días, paso 15 min", 480, 1, 0.25),
+    ("Año, 8760 h", 8760, 1, 1.0),
+    ("Monte Carlo 10000 × 24 h", 24, 10000, 1.0),
+    ("Monte Carlo 128 × 8760 h", 8760, 128, 1.0),
+]
+
+
+def paso_a_paso(net_w: np.ndarray, step_h: float, soc_inicial: float) -> np.ndarray:
+    """Referencia: un paso de Python por intervalo y por escenario"""
+    p_max = BATERIA.capacity_wh * BATERIA.max_c_rate
+    low = BATERIA.capacity_wh * BATERIA.soc_min
+    high = BATERIA.capacity_wh * BATERIA.soc_max
+    energia = np.empty_like(net_w)
+    for b in range(net_w.shape[1]):
+        e = BATERIA.capacity_wh * soc_inicial
+        for t, p in enumerate(net_w[:, b].tolist()):
+            p = max(-p_max, min(p_max, p))
+            e += (p * BATERIA.charge_efficiency if p > 0 else p / BATERIA.discharge_efficiency) * step_h
+            e = max(low, min(high, e))
+            energia[t, b] = e
+    return energia
+
+
+def medir(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    rng = np.random.default_rng(0)
+    for nombre, pasos, escenarios, step_h in CASOS:
+        net = rng.normal(0, 1500, (pasos, escenarios))
+        repeat = max(1, int(20000 / (pasos * escenarios) ** 0.5))
+
+        motor_ms = medir(lambda: battery_engine.simulate(net, BATERIA, step_h=step_h, initial_soc=0.6), repeat)
+        bucle_ms = medir(lambda: paso_a_paso(net, step_h, 0.6), max(1, repeat // 10))
+
+        motor = battery_engine.simulate(net, BATERIA, step_h=step_h, initial_soc=0.6)["energy_wh"]
+        error = np.abs(motor - paso_a_paso(net, step_h, 0.6)).max()
+        print(f"{nombre:28s} motor {motor_ms:9.3f} ms | paso a paso {bucle_ms:9.2f} ms "
+              f"| x{bucle_ms / motor_ms:6.1f} | error máx {error:.1e} Wh")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark: despacho predictivo (programación dinámica sobre el SoC)
+
+Mide el tiempo de resolución según horizonte y niveles de SoC, la
+re-planificación con el mismo pronóstico (reutiliza la política) y el
+comportamiento con un presupuesto de tiempo que no alcanza para la
+grilla fina.
+
+Uso (desde backend/):
+    python benchmarks/bench_dispatch_planner.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from services.battery_engine import BatterySpec
+from services.dispatch_planner import DispatchCosts, DispatchPlanner, solve
+
+BATERIA = BatterySpec(capacity_wh=5000, soc_min=0.2, soc_max=1.0)
+COSTOS = DispatchCosts()
+
+
+def balance_sintetico(horas: int) -> np.ndarray:
+    hora = np.arange(horas) % 24
+    solar = np.maximum(0.0, np.sin((hora - 6) / 12 * np.pi)) * 2500
+    solar[24:48] *= 0.2  # Segundo día nublado
+    carga = np.full(horas, 600.0)
+    carga[(hora >= 18) & (hora < 23)] = 1500
+    return solar - carga
+
+
+def medir(fn, repeat: int = 5) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    for horas in (24, 48, 72):
+        net = balance_sintetico(horas)
+        sin_red = np.zeros(horas)
+        precio = np.full(horas, COSTOS.grid_usd_kwh)
+        tiempos = "  ".join(
+            f"{niveles:3d} niveles {medir(lambda: solve(net, sin_red, precio, BATERIA, COSTOS, 1.0, niveles)):7.2f} ms"
+            for niveles in (26, 101, 201)
+        )
+        print(f"Horizonte {horas:2d} h: {tiempos}")
+
+    net = balance_sintetico(48)
+    inicio = time.time() + np.arange(48) * 3600.0
+    planner = DispatchPlanner()
+    planner.replan(inicio, net, 1.0, BATERIA, COSTOS)
+    reutilizar_ms = medir(lambda: planner.replan(inicio, net, 1.0, BATERIA, COSTOS), repeat=100)
+    accion_ms = medir(lambda: planner.plan.action(47.0), repeat=100)
+    print(f"Re-planificar sin cambios:   {reutilizar_ms:7.3f} ms (política reutilizada)")
+    print(f"Acción para el SoC medido:   {accion_ms:7.3f} ms")
+
+    ajustado = DispatchPlanner()
+    plan = ajustado.replan(inicio, net, 1.0, BATERIA, COSTOS, n_levels=401, time_budget_s=0.02)
+    print(f"Presupuesto de 20 ms, 401 niveles: grilla fina={plan.refined}, "
+          f"{len(plan.levels_wh)} niveles usados, {plan.solve_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark: simulador cronológico de 8760 horas
+
+Mide, sobre una tabla de recurso sintética de 10 años:
+- Bajada de la serie diaria a un año horario (primera vez por sitio)
+- Simulación de una configuración (objetivo: < 50 ms)
+- Lote de configuraciones (simulate_batch), costo por configuración
+
+Uso (desde backend/):
+    python benchmarks/bench_energy_simulator.py
+"""
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from services import energy_simulator
+from services.resource_table import SiteResourceTable
+
+YEARS = 10
+REPEAT = 20
+
+
+def tabla_sintetica() -> SiteResourceTable:
+    rng = np.random.default_rng(42)
+    start = date(2015, 1, 1)
+    days = [start + timedelta(days=i) for i in range(YEARS * 365)]
+    month = np.array([d.month for d in days], dtype=np.int8)
+    year = np.array([d.year for d in days], dtype=np.int16)
+    seasonal = np.cos(2 * np.pi * (month - 1) / 12)
+    n = len(days)
+    return SiteResourceTable(
+        -38.7, -62.3, f"{days[0]:%Y%m%d}-{days[-1]:%Y%m%d}", month,
+        np.clip(4 + 2.5 * seasonal + rng.normal(0, 1, n), 0.3, None).astype(np.float32),
+        (rng.weibull(2.0, n) * 5.0).astype(np.float32),
+        (rng.weibull(2.0, n) * 6.5).astype(np.float32),
+        (15 + 8 * seasonal + rng.normal(0, 3, n)).astype(np.float32),
+        year=year
+    )
+
+
+def medir(fn, repeat: int = REPEAT) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    tabla = tabla_sintetica()
+
+    started = time.perf_counter()
+    recurso = energy_simulator.build_hourly_resource(tabla)
+    construccion_ms = (time.perf_counter() - started) * 1000
+
+    carga = energy_simulator.residential_load_profile(8.0)
+    config = energy_simulator.SystemConfig(
+        pv_w=2400, turbine_count=1, turbine_diameter_m=1.8, turbine_rated_w=1000, battery_wh=9600
+    )
+    una_ms = medir(lambda: energy_simulator.simulate(recurso, config, carga))
+
+    lote = [
+        energy_simulator.SystemConfig(
+            pv_w=pv, turbine_count=turbinas, turbine_diameter_m=1.8, turbine_rated_w=1000, battery_wh=bateria
+        )
+        for pv in (1200, 2400, 3600, 4800, 6000)
+        for turbinas in (0, 1, 2, 3)
+        for bateria in (4800, 9600, 14400, 19200, 28800)
+    ]
+    lote_ms = medir(lambda: energy_simulator.simulate_batch(recurso, lote, carga), repeat=3)
+
+    resultado = energy_simulator.simulate(recurso, config, carga).metrics
+    print(f"Recurso horario (8760 h):    {construccion_ms:8.2f} ms (una vez por sitio)")
+    print(f"Una configuración:           {una_ms:8.2f} ms")
+    print(f"Lote de {len(lote)} configuraciones: {lote_ms:8.2f} ms ({lote_ms / len(lote):.2f} ms c/u)")
+    print(f"Ejemplo: {resultado['lolh']} h sin suministro, "
+          f"{resultado['curtailment_fraction'] * 100:.1f}% vertido, "
+          f"{resultado['equivalent_cycles']:.0f} ciclos")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark: Monte Carlo de incertidumbre meteorológica
+
+Mide el throughput de escenarios de:
+- Pronóstico operativo (24 h con errores AR(1) log-normales)
+- Dimensionamiento (años sintéticos de 8760 h por bootstrap por bloques)
+
+y que la misma semilla da el mismo resultado.
+
+Uso (desde backend/):
+    python benchmarks/bench_monte_carlo.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.bench_energy_simulator import tabla_sintetica
+from services import energy_simulator, monte_carlo
+from services.battery_engine import BatterySpec
+
+ESCENARIOS_PRONOSTICO = 10000
+ESCENARIOS_DIMENSIONAMIENTO = 500
+
+
+def pronostico_sintetico(horas: int = 24):
+    hora = np.arange(horas) % 24
+    solar = np.maximum(0.0, np.sin((hora - 6) / 12 * np.pi)) * 1800
+    viento = np.full(horas, 250.0)
+    carga = energy_simulator.residential_load_profile(8.0)[hora]
+    return solar, viento, carga
+
+
+def main():
+    solar, viento, carga = pronostico_sintetico()
+    started = time.perf_counter()
+    pronostico = monte_carlo.simulate_forecast(
+        solar, viento, carga, soc_percent=60,
+        battery=BatterySpec(capacity_wh=10000, soc_min=0.2),
+        n_scenarios=ESCENARIOS_PRONOSTICO, seed=1
+    )
+    pronostico_ms = (time.perf_counter() - started) * 1000
+
+    tabla = tabla_sintetica()
+    config = energy_simulator.SystemConfig(
+        pv_w=2400, turbine_count=1, turbine_diameter_m=1.8, turbine_rated_w=1000, battery_wh=9600
+    )
+    perfil = energy_simulator.residential_load_profile(8.0)
+    started = time.perf_counter()
+    dimensionamiento = monte_carlo.simulate_sizing(
+        tabla, config, perfil, n_scenarios=ESCENARIOS_DIMENSIONAMIENTO, seed=1
+    )
+    dimensionamiento_s = time.perf_counter() - started
+
+    repetido = monte_carlo.simulate_sizing(tabla, config, perfil, n_scenarios=50, seed=7)
+    reproducible = repetido["autonomia"] == monte_carlo.simulate_sizing(
+        tabla, config, perfil, n_scenarios=50, seed=7
+    )["autonomia"]
+
+    print(f"Pronóstico {ESCENARIOS_PRONOSTICO} × 24 h:     {pronostico_ms:8.2f} ms "
+          f"({ESCENARIOS_PRONOSTICO / pronostico_ms * 1000:,.0f} escenarios/s)")
+    print(f"Dimensionamiento {ESCENARIOS_DIMENSIONAMIENTO} × 8760 h: {dimensionamiento_s * 1000:8.2f} ms "
+          f"({ESCENARIOS_DIMENSIONAMIENTO / dimensionamiento_s:,.0f} años/s)")
+    print(f"Probabilidad de déficit 24 h: {pronostico['probabilidad_deficit'] * 100:.1f}%")
+    print(f"Días de autonomía requeridos (p50 / p90 / p95): "
+          f"{dimensionamiento['autonomia']['dias_autonomia_requeridos']['p50']} / "
+          f"{dimensionamiento['autonomia']['dias_autonomia_requeridos']['p90']} / "
+          f"{dimensionamiento['autonomia']['dias_autonomia_requeridos']['p95']}")
+    print(f"Balance anual p50: {dimensionamiento['autonomia']['balance_anual_kwh']['p50']} kWh | "
+          f"generación insuficiente: {'sí' if dimensionamiento['autonomia']['generacion_insuficiente'] else 'no'}")
+    print(f"Misma semilla, mismo resultado: {'sí' if reproducible else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
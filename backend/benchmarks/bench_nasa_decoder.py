@@ -0,0 +1,93 @@
+"""
+Benchmark: procesamiento de respuestas NASA POWER
+
+Compara el recorrido clave por clave (strptime + statistics.mean, como lo
+hacía nasa_power_service._process_monthly_averages) contra el decodificador
+vectorizado services/nasa_response.py, sobre una respuesta diaria sintética
+de 10 años.
+
+Uso (desde backend/):
+    python benchmarks/bench_nasa_decoder.py
+"""
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from services import nasa_response
+
+YEARS = 10
+PARAMS = ["ALLSKY_SFC_SW_DWN", "CLRSKY_SFC_SW_DWN", "T2M", "T2M_MAX", "T2M_MIN", "WS10M", "WS50M", "WD50M"]
+REPEAT = 5
+
+
+def respuesta_sintetica() -> dict:
+    rng = random.Random(42)
+    start = date(2014, 1, 1)
+    keys = [(start + timedelta(days=i)).strftime("%Y%m%d") for i in range(YEARS * 365)]
+    parameter = {
+        p: {k: (-999 if rng.random() < 0.01 else round(rng.uniform(0, 10), 2)) for k in keys}
+        for p in PARAMS
+    }
+    return {"header": {"fill_value": -999}, "properties": {"parameter": parameter}}
+
+
+def antes(data: dict) -> dict:
+    """Recorrido original: una clave a la vez"""
+    result = {}
+    for p, series in data["properties"]["parameter"].items():
+        monthly = {i: [] for i in range(1, 13)}
+        for date_str, value in series.items():
+            if value == -999:
+                continue
+            monthly[datetime.strptime(date_str, "%Y%m%d").month].append(value)
+        result[p] = {
+            "mean": statistics.mean([v for v in series.values() if v != -999]),
+            "monthly": [round(statistics.mean(v), 2) if v else 0 for v in monthly.values()],
+        }
+    return result
+
+
+def despues(data: dict) -> dict:
+    """Decodificador vectorizado"""
+    frame = nasa_response.decode(data)
+    return {
+        p: {
+            "mean": frame.mean(p),
+            "monthly": nasa_response.nan_to_zero(frame.monthly_mean(p), decimals=2),
+        }
+        for p in frame.columns
+    }
+
+
+def medir(fn, data) -> tuple:
+    best = float("inf")
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        result = fn(data)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+if __name__ == "__main__":
+    data = respuesta_sintetica()
+    n_values = YEARS * 365 * len(PARAMS)
+
+    print("=" * 60)
+    print(f"BENCHMARK NASA POWER ({YEARS} años diarios × {len(PARAMS)} parámetros = {n_values:,} valores)")
+    print("=" * 60)
+
+    t_antes, r_antes = medir(antes, data)
+    t_despues, r_despues = medir(despues, data)
+
+    for p in PARAMS:
+        assert abs(r_antes[p]["mean"] - r_despues[p]["mean"]) < 1e-9
+        assert r_antes[p]["monthly"] == r_despues[p]["monthly"]
+
+    print(f"Clave por clave : {t_antes * 1000:8.1f} ms")
+    print(f"Vectorizado     : {t_despues * 1000:8.1f} ms")
+    print(f"Aceleración     : {t_antes / t_despues:8.1f}x  (resultados idénticos)")
@@ -0,0 +1,83 @@
+"""
+Benchmark: supervisor multi-proceso (dispositivos repartidos entre workers)
+
+Mide, con 1, 2 y 4 workers contra el runtime en el proceso principal:
+telemetría evaluada por segundo (pedidos concurrentes de muchos
+dispositivos) y el tiempo de un ciclo de decisiones de todos los
+dispositivos. Además, cuántos dispositivos se mueven al agregar un
+worker y la pausa de enrutamiento durante la migración.
+
+Con el supervisor la telemetría se mide hasta que los workers
+respondieron todos los lotes (drain). En un host de 1 núcleo los workers
+no escalan: la telemetría no supera al proceso principal y las
+decisiones no mejoran. Comparar con la línea "en proceso" antes de activar
+SUPERVISOR_WORKERS.
+
+Uso (desde backend/):
+    python benchmarks/bench_shard_supervisor.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from config import get_settings
+from services.device_runtime import LocalRuntime
+from services.shard_supervisor import HashRing, ShardSupervisor
+from services.telemetry_ingest import ESP32Telemetry
+
+DISPOSITIVOS = 400
+RONDAS = 5
+WORKERS = (1, 2, 4)
+
+
+def muestra(device_id: str, ronda: int) -> ESP32Telemetry:
+    return ESP32Telemetry(device_id=device_id, ts=float(ronda), turbine_rpm=300, soc=55,
+                          potencia_solar=800, potencia_consumo=400)
+
+
+async def medir(runtime, nombre: str) -> None:
+    ids = [f"ESP32_{index:04d}" for index in range(DISPOSITIVOS)]
+    started = time.perf_counter()
+    for ronda in range(RONDAS):
+        await asyncio.gather(*(runtime.evaluate_telemetry(device_id, [muestra(device_id, ronda)])
+                               for device_id in ids))
+    if hasattr(runtime, "drain"):  # Supervisor: no espera la respuesta de los workers
+        await runtime.drain()
+    telemetria_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    decisiones = await runtime.decide_all()
+    decision_ms = (time.perf_counter() - started) * 1000
+    print(f"{nombre:12s}: telemetría {DISPOSITIVOS * RONDAS / telemetria_s:8.0f} muestras/s | "
+          f"decisiones ({len(decisiones)}) {decision_ms:8.1f} ms")
+
+
+async def main():
+    settings = get_settings()
+    await medir(LocalRuntime.from_settings(settings), "en proceso")
+
+    for workers in WORKERS:
+        supervisor = ShardSupervisor(workers=workers, vnodes=settings.supervisor_vnodes)
+        await supervisor.start()
+        while not all(worker.ready for worker in supervisor.workers.values()):
+            await asyncio.sleep(0.1)
+        await medir(supervisor, f"{workers} worker(s)")
+        if workers == WORKERS[-1]:
+            rebalanceo = await supervisor.add_worker()
+            print(f"Agregar worker {rebalanceo['worker']}: {len(rebalanceo['migrados'])}/{DISPOSITIVOS} "
+                  f"dispositivos migrados, pausa {rebalanceo['pausa_ms']} ms")
+        await supervisor.stop()
+
+    ids = [f"ESP32_{index:04d}" for index in range(10000)]
+    anillo = HashRing([f"w{index}" for index in range(4)], settings.supervisor_vnodes)
+    antes = {device_id: anillo.owner(device_id) for device_id in ids}
+    anillo.add("w4")
+    movidos = sum(anillo.owner(device_id) != antes[device_id] for device_id in ids)
+    print(f"Anillo 4 → 5 workers: {movidos / len(ids):.1%} de 10000 dispositivos cambian de dueño (ideal 20%)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
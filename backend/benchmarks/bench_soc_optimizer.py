@@ -0,0 +1,59 @@
+"""
+Benchmark: optimizador de SoC por programación dinámica (objetivo de carga)
+
+Compara, para 1 % y 0.1 % de resolución de SoC y horizontes de 24 h y
+7 días, la DP por pendientes (tablas de costo por hora precalculadas)
+contra la recursión densa N × N, verifica que dan el mismo costo y mide
+la decisión en tiempo de ejecución (lectura de la tabla de política).
+
+Uso (desde backend/):
+    python benchmarks/bench_soc_optimizer.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.bench_dispatch_planner import BATERIA, COSTOS, balance_sintetico, medir
+from services.dispatch_planner import _levels, _solve_dense, solve
+from smart_strategy import smart_strategy
+
+RESOLUCIONES = (1.0, 0.1)  # % de SoC por bucket
+HORIZONTES = (24, 168)
+
+
+def main():
+    rango = (BATERIA.soc_max - BATERIA.soc_min) * 100
+    for horas in HORIZONTES:
+        net = balance_sintetico(horas)
+        sin_red = np.zeros(horas)
+        precio = np.full(horas, COSTOS.grid_usd_kwh)
+        for resolucion in RESOLUCIONES:
+            niveles = int(round(rango / resolucion)) + 1
+            rapido_ms = medir(lambda: solve(net, sin_red, precio, BATERIA, COSTOS, 1.0, niveles))
+            grilla = _levels(BATERIA, 1.0, niveles)
+            started = time.perf_counter()
+            denso = _solve_dense(net, sin_red, precio, BATERIA, COSTOS, 1.0, grilla, None)
+            denso_ms = (time.perf_counter() - started) * 1000
+            error = np.abs(solve(net, sin_red, precio, BATERIA, COSTOS, 1.0, niveles)[2] - denso[2]).max()
+            print(f"{horas:3d} h, {resolucion:4.1f} % ({niveles:4d} buckets): DP {rapido_ms:8.2f} ms "
+                  f"| densa {denso_ms:9.1f} ms | x{denso_ms / rapido_ms:6.1f} | error costo {error:.1e} USD")
+
+    tiempos = time.time() + np.arange(168) * 3600.0
+    net = balance_sintetico(168)
+    objetivo = smart_strategy.calcular_carga_objetivo(
+        bateria_actual_percent=45.0, dias_sin_sol=1, consumo_diario_kwh=15.0,
+        capacidad_bateria_kwh=BATERIA.capacity_wh / 1000, tiempos=tiempos, balance_w=net,
+        resolucion_soc_percent=0.1, costos=COSTOS
+    )
+    consulta_us = medir(lambda: smart_strategy.soc_objetivo_inmediato(45.0), repeat=10000) * 1000
+    print(f"Objetivo de carga (7 días, 0.1 %): {objetivo['carga_objetivo_percent']}% "
+          f"en {objetivo['politica']['tiempo_resolucion_ms']} ms")
+    print(f"Decisión por lectura de la política: {consulta_us:6.2f} µs")
+
+
+if __name__ == "__main__":
+    main()
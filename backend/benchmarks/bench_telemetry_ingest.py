@@ -0,0 +1,78 @@
+"""
+Benchmark: ingesta de telemetría ESP32 (paquetes/segundo por núcleo)
+
+Mide parse (bytes → ESP32Telemetry) + actualización en sitio del store,
+para paquetes Stage 1 y extendidos, en JSON y en el formato binario compacto
+(services/telemetry_binary.py). Sin red ni FastAPI: es el costo de CPU
+del handler.
+
+Uso (desde backend/):
+    python benchmarks/bench_telemetry_ingest.py
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from services import telemetry_binary
+from services.telemetry_ingest import ESP32Telemetry, TelemetryIngest
+
+N = 50_000
+
+STAGE1 = {
+    "device_id": "ESP32_BENCH", "ts": 1234,
+    "v_bat_v": 2.514, "v_wind_v_dc": 0.812, "v_solar_v": 1.203, "v_load_v": 1.890,
+    "raw_adc": {
+        "adc1_bat1": 2.514, "adc1_bat1_raw": 3120,
+        "adc2_eolica": 0.812, "adc2_eolica_raw": 1008,
+        "adc5_solar": 1.203, "adc5_solar_raw": 1493,
+        "adc6_load": 1.890, "adc6_load_raw": 2345
+    }
+}
+
+EXTENDED = {
+    **STAGE1,
+    "voltaje_promedio": 48.2, "soc": 76.5, "potencia_solar": 850.0,
+    "potencia_eolica": 420.0, "potencia_consumo": 610.0, "temperatura": 24.5,
+    "turbine_rpm": 312.0, "rpm": 312.0, "frequency_hz": 52.0,
+    "uptime": 3600, "free_heap": 150000, "rssi": -61,
+    "relays": {"solar": True, "eolica": True, "red": False, "carga": True, "freno": False}
+}
+
+
+def bench(nombre: str, packet: dict, schema_id: int) -> None:
+    json_bodies = []
+    bin_bodies = []
+    for seq in range(N):
+        packet["seq"] = seq
+        json_bodies.append(json.dumps(packet).encode())
+        bin_bodies.append(telemetry_binary.encode(ESP32Telemetry(**packet), schema_id))
+
+    ingest = TelemetryIngest({}, log_every=10**9)
+    t0 = time.perf_counter()
+    for body in json_bodies:
+        ingest.ingest(ingest.parse(body))
+    t_json = time.perf_counter() - t0
+
+    ingest = TelemetryIngest({}, log_every=10**9)
+    t0 = time.perf_counter()
+    for body in bin_bodies:
+        ingest.ingest(telemetry_binary.decode(body))
+    t_bin = time.perf_counter() - t0
+
+    for formato, elapsed, size in (
+        ("JSON", t_json, len(json_bodies[-1])),
+        ("binario", t_bin, len(bin_bodies[-1])),
+    ):
+        print(f"{nombre:<10} {formato:<8} {N / elapsed:>10,.0f} paquetes/s  "
+              f"{elapsed / N * 1e6:6.2f} µs/paquete  {size:4d} bytes")
+
+
+if __name__ == "__main__":
+    print("=" * 72)
+    print(f"BENCHMARK INGESTA TELEMETRÍA ({N:,} paquetes, 1 núcleo)")
+    print("=" * 72)
+    bench("Stage 1", STAGE1, telemetry_binary.SCHEMA_STAGE1)
+    bench("Extendido", EXTENDED, telemetry_binary.SCHEMA_EXTENDED)
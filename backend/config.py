@@ -24,6 +24,9 @@ class Settings(BaseSettings):
     max_wind_power_w: float = 2000.0
     min_battery_soc: float = 20.0
     max_battery_soc: float = 100.0
+    battery_charge_efficiency: float = 0.95
+    battery_discharge_efficiency: float = 0.95
+    battery_max_c_rate: float = 0.5  # Potencia máx. de carga/descarga = C-rate × capacidad
     
     # House Consumption
     average_house_consumption_w: float = 650.0
@@ -39,6 +42,87 @@ class Settings(BaseSettings):
     # Simulation
     simulation_mode: bool = False
     
+    # Telemetría ESP32
+    telemetry_log_level: str = "INFO"  # DEBUG muestra dumps de ADC
+    telemetry_log_every: int = 50  # Loguear 1 de cada N paquetes
+    telemetry_save_interval_s: float = 2.0  # Throttle de devices_store.json
+    telemetry_historian_flush_size: int = 500  # Muestras por INSERT masivo
+    telemetry_historian_flush_interval_s: float = 5.0
+    
+    # Caché de climatología NASA POWER
+    climate_cache_path: str = "./cache/climate_cache.sqlite"
+    climate_offline: bool = False  # True: sólo caché local, nunca red
+    nasa_max_concurrency: int = 4  # Requests simultáneas a NASA POWER
+    nasa_min_request_interval_s: float = 0.25  # Espaciado entre inicios de request
+    resource_table_dir: str = "./cache/resources"  # Tablas de recurso por sitio (.npz)
+    resource_table_years: int = 10  # Años de serie diaria para construirlas
+    
+    # Optimizador de diseño (/api/dimensionamiento/optimizar)
+    optimizer_workers: int = 0  # Procesos del pool (0 = uno por CPU)
+    optimizer_chunk_size: int = 128  # Configuraciones por lote enviado al pool
+    optimizer_max_seconds: float = 20.0  # Tope de tiempo por búsqueda
+    
+    # Despacho predictivo (services/dispatch_planner.py)
+    dispatch_horizon_h: float = 48.0  # Horizonte del plan (24-72 h)
+    dispatch_step_minutes: int = 60
+    dispatch_soc_levels: int = 101  # Niveles de SoC de la grilla fina
+    dispatch_time_budget_s: float = 0.2  # Tope por re-planificación
+    dispatch_replan_s: float = 900.0  # Edad máxima del plan con el mismo pronóstico
+    dispatch_grid_price_usd_kwh: float = 0.15
+    dispatch_grid_max_w: float = 3000.0
+    dispatch_shed_cost_usd_kwh: float = 2.0  # Valor de la energía no abastecida
+    dispatch_degradation_usd_kwh: float = 0.05  # Por kWh de throughput de batería
+    dispatch_zone_penalty_usd_kwh: float = 0.02  # Por kWh·h fuera de la zona óptima
+    dispatch_reserve_usd_kwh_h: float = 0.005  # Por kWh·h de reserva faltante (tope de la zona)
+    dispatch_terminal_usd_kwh: float = 0.10  # Valor de la energía al final del horizonte
+    
+    # Lazos de control (services/control_scheduler.py)
+    control_protection_hz: float = 2.0  # Lazo rápido de protección (1-10 Hz)
+    control_dispatch_s: float = 60.0  # Re-planificación y decisión
+    control_forecast_s: float = 900.0  # Descarga de clima y pronóstico
+    control_workers: int = 2  # Hilos para los pasos pesados en CPU
+    
+    # Protección en tiempo real sobre la telemetría (services/protection_engine.py)
+    protection_trip_debounce_s: float = 0.2  # Condición sostenida antes de disparar
+    protection_release_debounce_s: float = 5.0  # Condición normal sostenida antes de liberar
+    protection_hysteresis: float = 0.1  # Liberar 10% por dentro del umbral
+    protection_latency_budget_ms: float = 2.0  # Tope de evaluación por paquete
+    protection_stale_s: float = 10.0  # Sin muestras por más de esto: sin telemetría
+    protection_resend_s: float = 5.0  # Reenvío si el relé informado no coincide (se duplica en cada uno)
+    protection_max_resends: int = 5  # Reenvíos sin que el relé cambie antes de desistir
+    protection_battery_min_v: float = 0.0  # Tensión de corte de carga (0 = deshabilitado; ej. 44 en 48 V)
+    protection_battery_max_v: float = 0.0  # Tensión de sobrecarga (0 = deshabilitado; ej. 58.4 en 48 V)
+    protection_v_bat_scale: float = 0.0  # v_bat_v (ADC) → V de batería (0 = usar voltaje_promedio; 11 con divisor 100k/10k)
+    protection_v_wind_scale: float = 0.0  # v_wind_v_dc (ADC) → V DC de la turbina (0 = límite deshabilitado; 11 con divisor 100k/10k)
+    
+    # Runtime por dispositivo (services/device_runtime.py)
+    device_runtime_max_devices: int = 500  # Contextos en memoria (se desaloja el menos usado)
+    device_runtime_idle_s: float = 3600.0  # Sin telemetría por más de esto: desalojar
+    device_runtime_sweep_s: float = 60.0  # Barrido de inactivos
+    device_runtime_concurrency: int = 8  # Contextos evaluados a la vez
+    device_learner_interval_s: float = 300.0  # Un registro de consumo por dispositivo cada tanto
+    device_learner_max_records: int = 2016  # Tope del PatternLearner por dispositivo (7 días cada 5 min)
+    
+    # Supervisor multi-proceso (services/shard_supervisor.py)
+    # Procesos worker; 0 = dispositivos en el proceso principal. La telemetría no
+    # escala con workers (IPC por paquete): sólo para decisiones pesadas en varios núcleos
+    supervisor_workers: int = 0
+    supervisor_vnodes: int = 64  # Nodos virtuales por worker en el anillo de hash
+    supervisor_request_timeout_s: float = 2.0  # Espera de la respuesta de un worker
+    supervisor_startup_timeout_s: float = 120.0  # Arranque de un worker (importa los servicios)
+    
+    # Chequeo de salud (/api/status/health)
+    health_check_interval_s: float = 60.0  # Probes externos en segundo plano
+    health_probe_timeout_s: float = 5.0
+    
+    # Circuit breakers de proveedores externos (OpenWeather, NASA POWER...)
+    circuit_failure_threshold: int = 3  # Fallos seguidos que abren el circuito
+    circuit_failure_rate: float = 0.5  # ...o tasa de fallos en la ventana
+    circuit_window_size: int = 20  # Últimas N llamadas
+    circuit_min_calls: int = 10  # Llamadas mínimas para evaluar la tasa
+    circuit_reset_timeout_s: float = 30.0  # Tiempo abierto antes de probar (half-open)
+    circuit_last_good_max_age_s: float = 21600.0  # Vigencia del último dato bueno (6 h)
+    
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
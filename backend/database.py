@@ -47,6 +47,28 @@ class EnergyRecord(Base):
     grid_connected = Column(Boolean, default=False)
 
 
+class ESP32TelemetrySample(Base):
+    """Historial de muestras de telemetría ESP32 (una fila por muestra)"""
+    __tablename__ = "esp32_telemetry_samples"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    device_id = Column(String(64), index=True)
+    seq = Column(Integer, nullable=True)
+    ts_device = Column(Float, default=0.0)  # Segundos según reloj del ESP32
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
+    
+    v_bat_v = Column(Float, default=0.0)
+    v_wind_v_dc = Column(Float, default=0.0)
+    v_solar_v = Column(Float, default=0.0)
+    v_load_v = Column(Float, default=0.0)
+    
+    battery_soc_percent = Column(Float, default=0.0)
+    solar_power_w = Column(Float, default=0.0)
+    wind_power_w = Column(Float, default=0.0)
+    load_power_w = Column(Float, default=0.0)
+    turbine_rpm = Column(Float, default=0.0)
+
+
 class WeatherData(Base):
     """Datos meteorológicos"""
     __tablename__ = "weather_data"
@@ -6,6 +6,11 @@ from typing import Dict, List, Optional
 from datetime import datetime
 import math
 
+from config import get_settings
+from services import solar_geometry
+
+settings = get_settings()
+
 class EfficiencyMonitor:
     """
     Monitorea la eficiencia real de los componentes y detecta problemas
@@ -29,7 +34,8 @@ class EfficiencyMonitor:
         irradiancia_w_m2: float,
         area_paneles_m2: float,
         potencia_generada_w: float,
-        temperatura_ambiente_c: float = 25.0
+        temperatura_ambiente_c: float = 25.0,
+        timestamp: Optional[datetime] = None
     ) -> Dict:
         """
         Calcula eficiencia real de paneles solares
@@ -39,11 +45,18 @@ class EfficiencyMonitor:
             area_paneles_m2: Área total de paneles en m²
             potencia_generada_w: Potencia real generada (W) - del sensor de corriente
             temperatura_ambiente_c: Temperatura ambiente
+            timestamp: Momento de la medición (default: ahora)
         
         Returns:
             Dict con eficiencia y diagnóstico
         """
         
+        # Referencia física: irradiancia de cielo despejado en el sitio
+        cielo_despejado_w_m2 = float(solar_geometry.clear_sky_ghi(
+            settings.latitude, settings.longitude, timestamp or datetime.now()
+        )[0])
+        indice_claridad = irradiancia_w_m2 / cielo_despejado_w_m2 if cielo_despejado_w_m2 > 10 else None
+        
         # Potencia solar disponible
         potencia_disponible_w = irradiancia_w_m2 * area_paneles_m2
         
@@ -113,11 +126,27 @@ class EfficiencyMonitor:
                 'potencia_real_w': round(potencia_generada_w, 1),
                 'perdida_w': round(perdida_w, 1),
                 'temperatura_c': temperatura_ambiente_c,
-                'factor_temperatura': round(factor_temperatura, 3)
+                'factor_temperatura': round(factor_temperatura, 3),
+                'irradiancia_cielo_despejado_w_m2': round(cielo_despejado_w_m2, 1),
+                'indice_claridad': round(indice_claridad, 2) if indice_claridad is not None else None
             },
+            'sensor_sospechoso': self._verificar_sensor_irradiancia(indice_claridad),
             'recomendaciones': self._generar_recomendaciones_solar(eficiencia_real, temperatura_ambiente_c)
         }
     
+    def _verificar_sensor_irradiancia(self, indice_claridad: Optional[float]) -> Optional[str]:
+        """
+        La irradiancia medida no puede superar mucho la de cielo despejado
+        (el realce por bordes de nubes llega a ~30%): si lo hace, el sensor
+        LDR está mal calibrado o la medición es de noche
+        """
+        if indice_claridad is None or indice_claridad <= 1.3:
+            return None
+        return (
+            f"Irradiancia medida {indice_claridad:.1f}x la de cielo despejado: "
+            "revisar calibración del sensor LDR"
+        )
+    
     def calcular_eficiencia_eolica(
         self,
         velocidad_viento_ms: float,
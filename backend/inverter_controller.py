@@ -3,6 +3,11 @@ from datetime import datetime, timedelta
 from config import get_settings
 from ai_predictor import energy_predictor
 from weather_service import weather_service
+from battery_protection import battery_protection
+from services import battery_engine, monte_carlo
+from services.battery_engine import BatterySpec
+from services.dispatch_planner import DispatchCosts, dispatch_planner
+import numpy as np
 import math
 
 settings = get_settings()
@@ -101,11 +106,17 @@ class InverterController:
     def make_decision(self) -> Dict:
         """
         Tomar decisión inteligente sobre qué fuente utilizar
+        
+        Con plan de despacho vigente la decisión sale del plan (la misma
+        que leen la estrategia de carga y la protección de batería); sin
+        plan, reglas instantáneas.
+        
         Retorna: {
             'selected_source': str,
             'reason': str,
             'actions': List[str],
-            'priority_level': int
+            'priority_level': int,
+            'origin': 'plan' | 'rules'
         }
         """
         
@@ -117,6 +128,94 @@ class InverterController:
                 'priority_level': 0
             }
         
+        # Plan de despacho vigente (services/dispatch_planner.py); reglas si no hay
+        plan = dispatch_planner.current(max_age_s=settings.dispatch_replan_s * 2)
+        if plan is not None:
+            decision = self._plan_decision(plan)
+            if decision is not None:
+                return decision
+        
+        return self._rule_decision()
+    
+    def _plan_decision(self, plan) -> Optional[Dict]:
+        """Decisión a partir de la acción del plan para el SoC medido"""
+        
+        solar = self.current_state['solar_power_w']
+        wind = self.current_state['wind_power_w']
+        battery_soc = self.current_state['battery_soc_percent']
+        
+        action = plan.action(battery_soc)
+        if action is None:
+            return None
+        
+        renewable = 'solar' if solar > wind else 'wind'
+        threshold = max(action['granularity_w'], 10.0)
+        target = action['target_soc_percent']
+        
+        decision = {
+            'selected_source': renewable,
+            'reason': '',
+            'actions': [],
+            'priority_level': 0,
+            'origin': 'plan',
+            'plan': {
+                'next_soc_percent': round(action['next_soc_percent'], 1),
+                'target_soc_percent': round(target, 1),
+                'battery_w': round(action['battery_w'], 0),
+                'grid_w': round(action['grid_w'], 0),
+                'shed_w': round(action['shed_w'], 0),
+                'remaining_hours': round(plan.remaining_steps() * plan.step_h, 1),
+            }
+        }
+        
+        if action['shed_w'] > threshold or battery_soc < settings.min_battery_soc:
+            decision['priority_level'] = 3  # Crítico
+            decision['selected_source'] = 'grid' if action['grid_w'] > threshold else 'battery'
+            decision['reason'] = f'Déficit inevitable según el plan ({action["shed_w"]:.0f} W sin cubrir)'
+            decision['actions'].append(f'Reducir consumo {action["shed_w"]:.0f} W inmediatamente')
+        
+        elif action['grid_charge_w'] > threshold:
+            decision['priority_level'] = 2  # Alta
+            decision['selected_source'] = 'grid'
+            decision['reason'] = f'Cargar desde la red antes del déficit previsto (objetivo {target:.0f}%)'
+            decision['actions'].append(f'Usar red eléctrica y cargar batería ({action["grid_charge_w"]:.0f} W)')
+        
+        elif action['grid_w'] > threshold:
+            decision['priority_level'] = 2  # Alta
+            decision['selected_source'] = 'grid'
+            decision['reason'] = f'Renovables y batería no alcanzan según el plan (SoC: {battery_soc:.1f}%)'
+            decision['actions'].append(f'Usar red eléctrica ({action["grid_w"]:.0f} W)')
+        
+        elif action['battery_w'] < -threshold:
+            decision['priority_level'] = 1  # Normal
+            decision['selected_source'] = 'battery'
+            decision['reason'] = (
+                f'Renovables insuficientes, usar batería '
+                f'(SoC: {battery_soc:.1f}% → {action["next_soc_percent"]:.1f}%)'
+            )
+            decision['actions'].append(f'Autonomía estimada: {self.calculate_autonomy():.1f} horas')
+        
+        elif action['battery_w'] > threshold:
+            decision['reason'] = f'Cargar batería con excedente (objetivo {target:.0f}%)'
+            decision['actions'].append('Cargar batería con excedente')
+        
+        else:
+            decision['reason'] = 'Renovables cubren el consumo, batería en reposo'
+            decision['actions'].append('Usar energía renovable')
+        
+        # Déficit más adelante en el plan
+        if decision['priority_level'] < 3 and action['shed_ahead_wh'] > threshold * plan.step_h:
+            decision['priority_level'] = max(decision['priority_level'], 2)
+            decision['actions'].append(
+                f'⚠️ Déficit previsto en las próximas {action["lookahead_h"]:.0f} h: '
+                f'{action["shed_ahead_wh"] / 1000:.1f} kWh sin cubrir, reducir consumo no esencial'
+            )
+        
+        return decision
+    
+    def _rule_decision(self) -> Dict:
+        """Reglas instantáneas (sin plan de despacho: sin pronóstico todavía)"""
+        
         solar = self.current_state['solar_power_w']
         wind = self.current_state['wind_power_w']
         battery_soc = self.current_state['battery_soc_percent']
@@ -128,7 +227,8 @@ class InverterController:
             'selected_source': 'battery',
             'reason': '',
             'actions': [],
-            'priority_level': 0
+            'priority_level': 0,
+            'origin': 'rules'
         }
         
         # Nivel crítico de batería
@@ -187,78 +287,187 @@ class InverterController:
         
         return decision
     
-    def predict_energy_balance_24h(self) -> Dict:
-        """
-        Predecir balance energético para las próximas 24 horas
+    def dispatch_costs(self) -> DispatchCosts:
+        """Precios y penalizaciones del despacho (config.py + zona óptima de battery_protection)"""
+        return DispatchCosts(
+            grid_usd_kwh=settings.dispatch_grid_price_usd_kwh,
+            grid_max_w=settings.dispatch_grid_max_w,
+            shed_usd_kwh=settings.dispatch_shed_cost_usd_kwh,
+            degradation_usd_kwh=settings.dispatch_degradation_usd_kwh,
+            zone_min_soc=battery_protection.min_soc_optimal / 100,
+            zone_max_soc=battery_protection.max_soc_optimal / 100,
+            zone_penalty_usd_kwh=settings.dispatch_zone_penalty_usd_kwh,
+            reserve_usd_kwh_h=settings.dispatch_reserve_usd_kwh_h,
+            terminal_usd_kwh=settings.dispatch_terminal_usd_kwh
+        )
+    
+    def forecast_net_power(self, hours: float = 24, step_minutes: float = 60,
+                           daily_consumption_kwh: Optional[float] = None):
         """
+        Generación − consumo previsto por paso (W) y sus instantes (epoch s)
         
-        # Obtener pronóstico meteorológico
-        weather_forecast = weather_service.get_hourly_forecast_24h()
+        Con daily_consumption_kwh el consumo previsto por la IA se escala
+        para que su promedio diario sea ese (conserva la forma horaria).
+        """
         
-        # Obtener predicciones de IA
+        weather_forecast = weather_service.get_forecast_grid(hours=hours, step_minutes=step_minutes)
         current_consumption = self.get_average_consumption(hours=1)
-        predictions = energy_predictor.predict_24h(weather_forecast, current_consumption)
-        
-        # Calcular totales
-        total_solar = sum(p['predicted_solar_w'] for p in predictions)
-        total_wind = sum(p['predicted_wind_w'] for p in predictions)
-        total_consumption = sum(p['predicted_consumption_w'] for p in predictions)
+        columns = energy_predictor.predict_grid(weather_forecast, current_consumption)
+        consumption = columns['predicted_consumption_w']
+        if daily_consumption_kwh is not None and consumption.mean() > 0:
+            consumption = consumption * (daily_consumption_kwh * 1000 / 24) / consumption.mean()
+        net_w = columns['predicted_solar_w'] + columns['predicted_wind_w'] - consumption
+        return weather_forecast.times, net_w
+    
+    def plan_dispatch(self, force: bool = False):
+        """
+        Re-planificar el despacho de las próximas horas (una vez por ciclo)
         
-        total_generation = total_solar + total_wind
+        Si el pronóstico no cambió, el plan vigente se reutiliza y sólo se
+        busca la acción del paso actual; si cambió, se resuelve de nuevo
+        dentro de settings.dispatch_time_budget_s.
+        """
         
-        # Balance
-        balance_wh = total_generation - total_consumption
+        times, net_w = self.forecast_net_power(settings.dispatch_horizon_h, settings.dispatch_step_minutes)
+        
+        return dispatch_planner.replan(
+            times,
+            net_w,
+            step_h=settings.dispatch_step_minutes / 60.0,
+            battery=BatterySpec.from_settings(settings),
+            costs=self.dispatch_costs(),
+            grid_available=self.current_state['grid_available'],
+            n_levels=settings.dispatch_soc_levels,
+            time_budget_s=settings.dispatch_time_budget_s,
+            max_age_s=settings.dispatch_replan_s,
+            force=force
+        )
+    
+    def predict_energy_balance(self, hours: float = 24, step_minutes: float = 60) -> Dict:
+        """
+        Predecir balance energético y evolución de la batería
         
-        # Simular evolución de batería
-        battery_soc = self.current_state['battery_soc_percent']
-        battery_capacity_wh = settings.battery_capacity_wh
+        Cualquier horizonte (hasta los 5 días del pronóstico) y resolución.
+        La trayectoria del SoC sale de battery_engine: eficiencias de carga
+        y descarga, límite de C-rate y SoC mínimo / máximo de config.py.
+        """
         
-        hourly_soc = [battery_soc]
-        deficit_hours = []
+        # Pronóstico meteorológico en grilla regular y predicciones de IA
+        weather_forecast = weather_service.get_forecast_grid(hours=hours, step_minutes=step_minutes)
+        current_consumption = self.get_average_consumption(hours=1)
+        columns = energy_predictor.predict_grid(weather_forecast, current_consumption)
+        solar = columns['predicted_solar_w']
+        wind = columns['predicted_wind_w']
+        consumption = columns['predicted_consumption_w']
+        step_h = step_minutes / 60.0
+        
+        predictions = [
+            {
+                'timestamp': timestamp,
+                'predicted_solar_w': s,
+                'predicted_wind_w': w,
+                'predicted_consumption_w': c,
+            }
+            for timestamp, s, w, c in zip(
+                weather_forecast.timestamps(), solar.tolist(), wind.tolist(), consumption.tolist()
+            )
+        ]
         
-        for i, pred in enumerate(predictions):
-            generation = pred['predicted_solar_w'] + pred['predicted_wind_w']
-            consumption = pred['predicted_consumption_w']
-            
-            net_power = generation - consumption
-            
-            # Cambio en Wh (1 hora)
-            energy_change_wh = net_power
-            
-            # Cambio en SoC
-            soc_change = (energy_change_wh / battery_capacity_wh) * 100
-            
-            new_soc = battery_soc + soc_change
-            new_soc = max(settings.min_battery_soc, min(settings.max_battery_soc, new_soc))
-            
-            battery_soc = new_soc
-            hourly_soc.append(battery_soc)
-            
-            # Detectar déficit (batería cerca del mínimo)
-            if battery_soc < settings.min_battery_soc + 10:
-                deficit_hours.append(i)
+        # Totales (Wh)
+        total_solar = float(solar.sum()) * step_h
+        total_wind = float(wind.sum()) * step_h
+        total_consumption = float(consumption.sum()) * step_h
+        total_generation = total_solar + total_wind
         
-        # Calcular autonomía al final del período
-        final_soc = hourly_soc[-1]
+        # Evolución de la batería
+        initial_soc = self.current_state['battery_soc_percent']
+        trajectory = battery_engine.simulate(
+            solar + wind - consumption,
+            BatterySpec.from_settings(settings),
+            step_h=step_h,
+            initial_soc=initial_soc / 100.0
+        )
+        soc = trajectory['soc'] * 100
+        soc_evolution = [initial_soc] + soc.tolist()
+        
+        # Déficit: batería cerca del mínimo
+        deficit_steps = np.flatnonzero(soc < settings.min_battery_soc + 10).tolist()
+        
+        # Autonomía al final del período
+        final_soc = soc_evolution[-1]
         usable_soc = max(0, final_soc - settings.min_battery_soc)
-        available_energy_wh = (usable_soc / 100.0) * battery_capacity_wh
+        available_energy_wh = (usable_soc / 100.0) * settings.battery_capacity_wh
         
-        avg_consumption = total_consumption / 24
+        horizon_hours = len(predictions) * step_h
+        avg_consumption = total_consumption / horizon_hours if horizon_hours > 0 else 0
         autonomy_hours = available_energy_wh / avg_consumption if avg_consumption > 0 else float('inf')
         
         return {
             'predictions': predictions,
-            'total_solar_24h_wh': total_solar,
-            'total_wind_24h_wh': total_wind,
-            'total_generation_24h_wh': total_generation,
-            'total_consumption_24h_wh': total_consumption,
-            'balance_24h_wh': balance_wh,
+            'horizon_hours': horizon_hours,
+            'step_minutes': step_minutes,
+            'total_solar_wh': total_solar,
+            'total_wind_wh': total_wind,
+            'total_generation_wh': total_generation,
+            'total_consumption_wh': total_consumption,
+            'balance_wh': total_generation - total_consumption,
+            'unmet_wh': float(trajectory['unmet_w'].sum()) * step_h,
+            'curtailed_wh': float(trajectory['curtailed_w'].sum()) * step_h,
             'final_battery_soc': final_soc,
             'autonomy_hours': autonomy_hours,
-            'deficit_hours': deficit_hours,
-            'hourly_soc_evolution': hourly_soc,
+            'deficit_steps': deficit_steps,
+            'deficit_hours': [round(i * step_h, 2) for i in deficit_steps],
+            'soc_evolution': soc_evolution,
+        }
+    
+    def predict_energy_balance_24h(self) -> Dict:
+        """
+        Predecir balance energético para las próximas 24 horas
+        """
+        
+        balance = self.predict_energy_balance(hours=24, step_minutes=60)
+        
+        return {
+            'predictions': balance['predictions'],
+            'total_solar_24h_wh': balance['total_solar_wh'],
+            'total_wind_24h_wh': balance['total_wind_wh'],
+            'total_generation_24h_wh': balance['total_generation_wh'],
+            'total_consumption_24h_wh': balance['total_consumption_wh'],
+            'balance_24h_wh': balance['balance_wh'],
+            'final_battery_soc': balance['final_battery_soc'],
+            'autonomy_hours': balance['autonomy_hours'],
+            'deficit_hours': balance['deficit_steps'],
+            'hourly_soc_evolution': balance['soc_evolution'],
         }
     
+    def predict_energy_balance_montecarlo(self, hours: float = 24, n_scenarios: int = 1000,
+                                          seed: Optional[int] = None, step_minutes: float = 60) -> Dict:
+        """
+        Balance de las próximas horas con incertidumbre de pronóstico
+        
+        La predicción horaria de la IA se perturba con errores log-normales
+        (correlacionados hora a hora, crecientes con el horizonte) y se
+        simula la batería en todos los escenarios a la vez: bandas de SoC,
+        probabilidad de déficit y autonomía en lugar de una sola trayectoria.
+        """
+        
+        weather_forecast = weather_service.get_forecast_grid(hours=hours, step_minutes=step_minutes)
+        current_consumption = self.get_average_consumption(hours=1)
+        predictions = energy_predictor.predict_grid(weather_forecast, current_consumption)
+        
+        result = monte_carlo.simulate_forecast(
+            predictions['predicted_solar_w'],
+            predictions['predicted_wind_w'],
+            predictions['predicted_consumption_w'],
+            soc_percent=self.current_state['battery_soc_percent'],
+            battery=BatterySpec.from_settings(settings),
+            step_h=step_minutes / 60.0,
+            n_scenarios=n_scenarios,
+            seed=seed
+        )
+        result['timestamps'] = [t.isoformat() for t in weather_forecast.timestamps()]
+        return result
+    
     def check_alerts(self) -> List[Dict]:
         """Verificar y generar alertas"""
         
@@ -3,10 +3,11 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from datetime import datetime, timedelta
 import asyncio
 import json
+import time
 from pathlib import Path
 
 from database import get_db, init_db, EnergyRecord, WeatherData, Prediction, AIDecision, Alert
@@ -25,6 +26,22 @@ from wind_protection import wind_protection
 from battery_protection import battery_protection
 from efficiency_monitor import efficiency_monitor
 from smart_strategy import smart_strategy
+from services.esp32_command_dispatcher import ESP32CommandDispatcher, command_dispatcher
+from services.telemetry_ingest import (
+    ESP32Telemetry, ESP32TelemetryBatch,
+    TelemetryIngest, bind_device, setup_telemetry_logging, stop_telemetry_logging,
+    logger as telemetry_logger
+)
+from services import telemetry_binary
+from services.telemetry_historian import TelemetryHistorian
+from services.resource_table import get_resource_or_none
+from services.nasa_power_service import nasa_service, nasa_sync
+from services.health_monitor import health_monitor
+from services.dispatch_planner import dispatch_planner
+from services.control_scheduler import BACKGROUND, CONTROL, PROTECTION, control_scheduler
+from services.device_runtime import LocalRuntime
+from services.shard_supervisor import ShardSupervisor
+from services import http_clients, design_optimizer
 
 # Importar nuevos routers
 from routers import esp32_router, dimensionamiento_router, ml_router, status_router
@@ -76,136 +93,61 @@ class ConnectionManager:
 manager = ConnectionManager()
 
 # ===== WEBSOCKET MANAGER PARA ESP32 CON COLA PERSISTENTE Y ACK =====
+# La cola y el estado ACK viven en el despachador único (services/esp32_command_dispatcher.py),
+# compartido por WebSocket y HTTP polling.
 class ESP32WebSocketManager:
-    def __init__(self):
-        # {device_id: websocket}
-        self.connections: dict = {}
-        
-        # Cola persistente de comandos con estado ACK
-        # {device_id: [{"id": uuid, "command": str, "parameter": str, "status": "pending/sent/acked", "timestamp": str, "sent_at": str, "acked_at": str}]}
-        self.command_queue: dict = {}
-        
-        # Último comando ACK recibido por device
-        # {device_id: {"command_id": uuid, "timestamp": str}}
-        self.last_ack: dict = {}
+    def __init__(self, dispatcher: ESP32CommandDispatcher):
+        self.dispatcher = dispatcher
+    
+    @property
+    def connections(self) -> dict:
+        """{device_id: websocket}"""
+        return self.dispatcher.websockets
+    
+    @property
+    def command_queue(self) -> dict:
+        return self.dispatcher.command_queue
+    
+    @property
+    def last_ack(self) -> dict:
+        return self.dispatcher.last_ack
         
     async def connect(self, device_id: str, websocket: WebSocket):
         """Conectar un ESP32"""
         await websocket.accept()
-        self.connections[device_id] = websocket
+        self.dispatcher.attach_websocket(device_id, websocket)
         print(f"🔌 ESP32 WebSocket conectado: {device_id}")
         
-        # Enviar comandos pendientes inmediatamente
-        await self.send_pending_commands(device_id)
+        # Enviar comandos pendientes inmediatamente (incluye los encolados para HTTP)
+        await self.dispatcher.send_pending_websocket(device_id)
     
     def disconnect(self, device_id: str):
         """Desconectar un ESP32"""
         if device_id in self.connections:
-            del self.connections[device_id]
+            self.dispatcher.detach_websocket(device_id)
             print(f"🔌 ESP32 WebSocket desconectado: {device_id}")
     
     def enqueue_command(self, device_id: str, command: str, parameter: str = None) -> str:
         """Encolar comando con ID único"""
-        import uuid
-        
-        if device_id not in self.command_queue:
-            self.command_queue[device_id] = []
-        
-        command_id = str(uuid.uuid4())
-        cmd_entry = {
-            "id": command_id,
-            "command": command,
-            "parameter": parameter,
-            "status": "pending",
-            "timestamp": datetime.now().isoformat(),
-            "sent_at": None,
-            "acked_at": None
-        }
-        
-        self.command_queue[device_id].append(cmd_entry)
-        print(f"📤 Comando encolado [{command_id[:8]}]: {command}({parameter})")
-        
-        return command_id
+        return self.dispatcher.enqueue(device_id, command, parameter)["id"]
     
     async def send_pending_commands(self, device_id: str):
         """Enviar comandos pendientes por WebSocket"""
-        if device_id not in self.connections:
-            return
-        
-        if device_id not in self.command_queue:
-            return
-        
-        websocket = self.connections[device_id]
-        pending_commands = [cmd for cmd in self.command_queue[device_id] if cmd["status"] == "pending"]
-        
-        for cmd in pending_commands:
-            try:
-                # Enviar comando con ID para tracking
-                message = {
-                    "type": "command",
-                    "id": cmd["id"],
-                    "command": cmd["command"],
-                    "parameter": cmd["parameter"],
-                    "timestamp": cmd["timestamp"]
-                }
-                
-                await websocket.send_json(message)
-                
-                # Marcar como enviado
-                cmd["status"] = "sent"
-                cmd["sent_at"] = datetime.now().isoformat()
-                
-                print(f"✅ Comando enviado [{cmd['id'][:8]}]: {cmd['command']}({cmd['parameter']})")
-                
-            except Exception as e:
-                print(f"❌ Error enviando comando [{cmd['id'][:8]}]: {e}")
+        await self.dispatcher.send_pending_websocket(device_id)
     
     def mark_ack(self, device_id: str, command_id: str):
         """Marcar comando como confirmado (ACK)"""
-        if device_id not in self.command_queue:
-            return False
-        
-        for cmd in self.command_queue[device_id]:
-            if cmd["id"] == command_id:
-                cmd["status"] = "acked"
-                cmd["acked_at"] = datetime.now().isoformat()
-                
-                self.last_ack[device_id] = {
-                    "command_id": command_id,
-                    "timestamp": datetime.now().isoformat()
-                }
-                
-                print(f"✅ ACK recibido [{command_id[:8]}]: {cmd['command']}({cmd['parameter']})")
-                return True
-        
-        return False
+        return self.dispatcher.mark_ack(device_id, command_id)
     
     def get_command_status(self, device_id: str, command_id: str) -> dict:
         """Obtener estado de un comando"""
-        if device_id not in self.command_queue:
-            return None
-        
-        for cmd in self.command_queue[device_id]:
-            if cmd["id"] == command_id:
-                return cmd
-        
-        return None
+        return self.dispatcher.get_command_status(device_id, command_id)
     
     def cleanup_old_commands(self, device_id: str, max_age_minutes: int = 5):
         """Limpiar comandos viejos ya confirmados"""
-        if device_id not in self.command_queue:
-            return
-        
-        from datetime import timedelta
-        cutoff = datetime.now() - timedelta(minutes=max_age_minutes)
-        
-        # Mantener solo comandos recientes o no confirmados
-        self.command_queue[device_id] = [
-            cmd for cmd in self.command_queue[device_id]
-            if cmd["status"] != "acked" or datetime.fromisoformat(cmd["acked_at"]) > cutoff
-        ]
+        self.dispatcher.cleanup_old_commands(device_id, max_age_minutes)
 
-esp32_ws_manager = ESP32WebSocketManager()
+esp32_ws_manager = ESP32WebSocketManager(command_dispatcher)
 
 
 # ===== ENDPOINT BASICO DE PRUEBA =====
@@ -231,6 +173,9 @@ app.include_router(status_router.router)
 async def startup_event():
     """Inicializar aplicación"""
     init_db()
+    setup_telemetry_logging(settings.telemetry_log_level)
+    # Código sincrónico (recommendation_service) consulta NASA en este loop
+    nasa_sync.bind_loop(asyncio.get_running_loop())
     # Cargar store desde disco al iniciar
     load_store_from_disk()
     print("")
@@ -247,40 +192,100 @@ async def startup_event():
     print("=" * 60)
     print("")
     
-    # Iniciar tarea de actualización periódica
-    asyncio.create_task(periodic_update())
+    # Workers del supervisor multi-proceso (si está habilitado)
+    if shard_supervisor is not None:
+        await shard_supervisor.start()
+    
+    # Lazos de control a tasa fija (protección, despacho, pronóstico)
+    control_scheduler.start()
+    
+    # Chequeos de salud de APIs externas en segundo plano
+    health_monitor.start()
 
 
-# ===== TAREAS PERIÓDICAS =====
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Persistir store, historial, cerrar clientes HTTP y vaciar cola de logs"""
+    await control_scheduler.stop()
+    if shard_supervisor is not None:
+        await shard_supervisor.stop()
+    save_store_to_disk()
+    telemetry_historian.write(telemetry_historian.drain())
+    await health_monitor.stop()
+    await http_clients.close_all()
+    design_optimizer.shutdown_executor()
+    stop_telemetry_logging()
 
-async def periodic_update():
-    """Actualización periódica del sistema (cada 30 segundos)"""
-    while True:
-        try:
-            # Obtener datos actuales (en producción vendrían del ESP32)
-            # En modo simulación, usar datos simulados
-            
-            # Actualizar clima
-            weather = weather_service.get_current_weather()
-            
-            # Tomar decisión de IA
-            decision = inverter_controller.make_decision()
-            
-            # Broadcast a clientes WebSocket
-            await manager.broadcast({
-                'type': 'update',
-                'data': {
-                    'energy': inverter_controller.current_state,
-                    'weather': weather,
-                    'decision': decision,
-                    'timestamp': datetime.now().isoformat()
-                }
-            })
-            
-        except Exception as e:
-            print(f"Error en actualización periódica: {e}")
-        
-        await asyncio.sleep(30)
+
+# ===== LAZOS DE CONTROL =====
+
+# Un contexto de control y protección por dispositivo (sitios con varios
+# inversores); la protección evalúa cada muestra de telemetría al llegar
+local_runtime = LocalRuntime.from_settings(settings, command_dispatcher, run=control_scheduler.run_heavy)
+protection_engine = local_runtime.engine  # Emite los comandos (también los de los workers)
+
+# Con supervisor_workers > 0 los dispositivos se reparten entre procesos worker
+shard_supervisor = ShardSupervisor(
+    workers=settings.supervisor_workers,
+    vnodes=settings.supervisor_vnodes,
+    request_timeout_s=settings.supervisor_request_timeout_s,
+    startup_timeout_s=settings.supervisor_startup_timeout_s,
+    emitter=protection_engine
+) if settings.supervisor_workers > 0 else None
+device_runtime = shard_supervisor or local_runtime
+
+
+async def protection_step():
+    """
+    Lazo rápido: viento de corte (último clima) sobre los dispositivos con
+    telemetría reciente; las muestras se evalúan en procesar_telemetria
+    
+    Sólo lee memoria: nunca espera I/O de clima.
+    """
+    weather = control_scheduler.result('pronostico') or {}
+    result = await device_runtime.sweep(weather.get('wind_speed_ms'))
+    if result['comandos']:
+        await protection_engine.emit(result['comandos'], time.perf_counter())
+    return result['limites_activos']
+
+
+def forecast_step():
+    """Clima actual y pronóstico (I/O bloqueante: corre en el pool del planificador)"""
+    weather = weather_service.get_current_weather()
+    weather_service.refresh_forecast()
+    return weather
+
+
+async def dispatch_step():
+    """Re-planificar (fuera del loop de eventos), decidir y publicar"""
+    
+    # Re-planificar despacho (reutiliza el plan si el pronóstico no cambió)
+    try:
+        await control_scheduler.run_heavy(inverter_controller.plan_dispatch)
+    except Exception as e:
+        print(f"⚠️ Plan de despacho no disponible: {e}")
+    
+    # Tomar decisión de IA (sitio y cada dispositivo, en paralelo)
+    decision = inverter_controller.make_decision()
+    await device_runtime.decide_all()
+    
+    # Broadcast a clientes WebSocket
+    await manager.broadcast({
+        'type': 'update',
+        'data': {
+            'energy': inverter_controller.current_state,
+            'weather': control_scheduler.result('pronostico'),
+            'decision': decision,
+            'timestamp': datetime.now().isoformat()
+        }
+    })
+    return decision
+
+
+control_scheduler.add_loop('proteccion', 1 / settings.control_protection_hz, protection_step, PROTECTION)
+control_scheduler.add_loop('despacho', settings.control_dispatch_s, dispatch_step, CONTROL)
+control_scheduler.add_loop('pronostico', settings.control_forecast_s, forecast_step, BACKGROUND, offload=True)
+control_scheduler.add_loop('dispositivos', settings.device_runtime_sweep_s, device_runtime.evict_idle, BACKGROUND)
 
 
 # ===== ENDPOINTS DE ENERGÍA =====
@@ -404,22 +409,31 @@ async def get_weather_forecast():
 
 
 @app.get("/api/weather/forecast/hours")
-async def get_weather_forecast_hours(hours: int = 24):
-    """Obtener pronóstico meteorológico"""
+async def get_weather_forecast_hours(hours: int = 24, step_minutes: int = 60):
+    """
+    Obtener pronóstico meteorológico en grilla regular
     
-    if hours <= 24:
-        forecast = weather_service.get_hourly_forecast_24h()
-    else:
-        forecast = weather_service.get_forecast_5days()
+    Args:
+        hours: Horizonte (hasta 120 h, lo que cubre OpenWeather)
+        step_minutes: Resolución de la grilla (15, 30, 60...)
+    """
+    
+    if hours < 1 or hours > 120:
+        raise HTTPException(status_code=400, detail="hours debe estar entre 1 y 120")
+    if step_minutes < 5 or step_minutes > 180:
+        raise HTTPException(status_code=400, detail="step_minutes debe estar entre 5 y 180")
+    
+    grid = weather_service.get_forecast_grid(hours=hours, step_minutes=step_minutes)
     
     return {
-        'count': len(forecast),
+        'count': len(grid),
+        'step_minutes': step_minutes,
         'forecast': [
             {
                 'timestamp': f['timestamp'].isoformat(),
                 **{k: v for k, v in f.items() if k != 'timestamp'}
             }
-            for f in forecast[:hours]
+            for f in grid.to_records()
         ]
     }
 
@@ -455,6 +469,43 @@ async def get_predictions_24h():
     )
 
 
+@app.get("/api/predictions/5d")
+async def get_predictions_5d(step_minutes: int = 60):
+    """
+    Balance energético y evolución de la batería para los 5 días del
+    pronóstico (misma simulación que /api/predictions/24h)
+    
+    Args:
+        step_minutes: Resolución (15, 30, 60...)
+    """
+    
+    if step_minutes < 5 or step_minutes > 180:
+        raise HTTPException(status_code=400, detail="step_minutes debe estar entre 5 y 180")
+    
+    return await asyncio.to_thread(inverter_controller.predict_energy_balance, 120, step_minutes)
+
+
+@app.get("/api/predictions/24h/montecarlo")
+async def get_predictions_montecarlo(escenarios: int = 1000, semilla: Optional[int] = None, horas: int = 24,
+                                     step_minutes: int = 60):
+    """
+    Predicción con incertidumbre: bandas de SoC (p5…p95) paso a paso,
+    probabilidad de déficit y autonomía sobre `escenarios` pronósticos
+    perturbados. Misma semilla → mismo resultado.
+    """
+    
+    if not 1 <= escenarios <= 100000:
+        raise HTTPException(status_code=400, detail="escenarios debe estar entre 1 y 100000")
+    if not 1 <= horas <= 120:
+        raise HTTPException(status_code=400, detail="horas debe estar entre 1 y 120")
+    if step_minutes < 5 or step_minutes > 180:
+        raise HTTPException(status_code=400, detail="step_minutes debe estar entre 5 y 180")
+    
+    return await asyncio.to_thread(
+        inverter_controller.predict_energy_balance_montecarlo, horas, escenarios, semilla, step_minutes
+    )
+
+
 @app.get("/api/predictions/autonomy")
 async def get_autonomy():
     """Calcular autonomía actual"""
@@ -494,13 +545,56 @@ async def auto_mode_control(config: AutoModeConfig):
 
 @app.get("/api/control/decision")
 async def get_ai_decision():
-    """Obtener última decisión de IA"""
+    """Obtener última decisión de IA (la del lazo de despacho si es reciente)"""
     
-    decision = inverter_controller.make_decision()
+    decision = control_scheduler.result('despacho', max_age_s=2 * settings.control_dispatch_s)
+    if decision is None:
+        decision = inverter_controller.make_decision()
     
     return decision
 
 
+@app.get("/api/protection/realtime")
+async def get_realtime_protection():
+    """
+    Protección en tiempo real: límites activos y actuadores por dispositivo,
+    disparos, comandos e histogramas de latencia de evaluación y emisión
+    """
+    
+    return await device_runtime.protection_stats()
+
+
+@app.get("/api/control/scheduler")
+async def get_control_scheduler():
+    """Lazos de control: ticks, deadlines incumplidos e histogramas de atraso y duración"""
+    
+    return control_scheduler.get_stats()
+
+
+@app.get("/api/control/plan")
+async def get_dispatch_plan(force: bool = False, programa: bool = True):
+    """
+    Plan de despacho predictivo (batería, red y recorte de carga) desde
+    el estado actual
+    
+    Args:
+        force: Resolver de nuevo aunque el pronóstico no haya cambiado
+        programa: Incluir el programa paso a paso
+    """
+    
+    try:
+        plan = await asyncio.to_thread(inverter_controller.plan_dispatch, force)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Plan de despacho no disponible: {e}")
+    if plan is None:
+        raise HTTPException(status_code=503, detail="El plan no entró en el presupuesto de tiempo")
+    
+    return {
+        **plan.summary(inverter_controller.current_state['battery_soc_percent'], include_schedule=programa),
+        'estadisticas': dispatch_planner.get_stats()
+    }
+
+
 # ===== ENDPOINTS DE ALERTAS =====
 
 @app.get("/api/alerts/current")
@@ -592,13 +686,39 @@ async def esp32_websocket_endpoint(websocket: WebSocket, device_id: str):
     
     El ESP32 se conecta aquí y recibe comandos en tiempo real.
     También envía ACK cuando ejecuta comandos.
+    Los frames binarios son telemetría compacta (services/telemetry_binary.py).
+    La telemetría se atribuye siempre al device_id de la conexión.
     """
     await esp32_ws_manager.connect(device_id, websocket)
     
     try:
         while True:
-            # Recibir mensajes del ESP32 (ACK, heartbeat, etc)
-            data = await websocket.receive_json()
+            # Recibir mensajes del ESP32 (ACK, heartbeat, telemetría binaria)
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            
+            if message.get("bytes") is not None:
+                try:
+                    packet = telemetry_binary.decode_many(message["bytes"], device_id=device_id)
+                    await procesar_telemetria(bind_device(packet, device_id))
+                except Exception as e:
+                    telemetry_logger.warning("Telemetría binaria inválida [%s]: %s", device_id, e)
+                continue
+            
+            data = json.loads(message.get("text") or "{}")
+            
+            # Telemetría por WebSocket (muestra o lote), mismo formato que el POST
+            if data.get("type") in ("telemetry", "telemetry_batch"):
+                try:
+                    data.setdefault("device_id", device_id)
+                    if "samples" in data:
+                        packet = ESP32TelemetryBatch.model_validate(data)
+                    else:
+                        packet = ESP32Telemetry.model_validate(data)
+                    await procesar_telemetria(bind_device(packet, device_id))
+                except Exception as e:
+                    telemetry_logger.warning("Telemetría inválida [%s]: %s", device_id, e)
             
             # Procesar ACK de comandos ejecutados
             if data.get("type") == "ack":
@@ -664,21 +784,16 @@ async def calculate_system_requirements():
     """
     calculator = get_system_calculator(settings.latitude, settings.longitude)
     
-    # Obtener datos meteorológicos promedio
-    try:
-        weather_data = weather_service.get_current_weather()
-        solar_radiation = 5.0  # Default
-        wind_speed = 6.0  # Default
-    except:
-        solar_radiation = 5.0
-        wind_speed = 6.0
+    # Recurso del sitio (tabla precalculada desde NASA POWER; None → promedios por defecto)
+    resource = await get_resource_or_none(settings.latitude, settings.longitude)
     
     requirements = calculator.calculate_system_requirements(
         average_consumption_w=settings.average_house_consumption_w,
         battery_capacity_wh=settings.battery_capacity_wh,
-        avg_solar_radiation_kwh_m2=solar_radiation,
-        avg_wind_speed_ms=wind_speed,
-        autonomy_days=2.0
+        avg_solar_radiation_kwh_m2=5.0,
+        avg_wind_speed_ms=6.0,
+        autonomy_days=2.0,
+        resource=resource
     )
     
     return requirements
@@ -826,12 +941,14 @@ async def get_battery_protection_status(
     """
     Analiza la estrategia de uso de batería y protección
     """
+    plan = dispatch_planner.current()
     strategy = battery_protection.analyze_battery_strategy(
         battery_soc=battery_soc,
         solar_power_w=solar_power,
         wind_power_w=wind_power,
         load_power_w=load_power,
-        battery_power_w=battery_power
+        battery_power_w=battery_power,
+        plan_action=plan.action(battery_soc) if plan is not None else None
     )
     return strategy
 
@@ -997,8 +1114,10 @@ async def obtener_estrategia_inteligente():
                 'mensaje': 'No se pudo obtener pronóstico'
             }
         
-        # Analizar y generar estrategia
-        estrategia = smart_strategy.analizar_pronostico(forecast['forecast'])
+        # Analizar y generar estrategia (con el plan de despacho vigente)
+        plan = dispatch_planner.current()
+        plan_action = plan.action(inverter_controller.current_state['battery_soc_percent']) if plan else None
+        estrategia = smart_strategy.analizar_pronostico(forecast['forecast'], plan_action)
         
         return estrategia
     except Exception as e:
@@ -1012,22 +1131,41 @@ async def obtener_estrategia_inteligente():
 async def calcular_objetivo_carga(
     bateria_actual: float = 50.0,
     consumo_diario_kwh: float = 15.0,
-    capacidad_bateria_kwh: float = 5.0
+    capacidad_bateria_kwh: float = 5.0,
+    horizonte_h: int = 72,
+    resolucion_soc: float = 1.0
 ):
     """
     Calcula nivel de carga objetivo basándose en pronóstico
+    
+    Política de programación dinámica sobre el balance horario previsto
+    (horizonte_h hasta 120 h, SoC en buckets de resolucion_soc %); si el
+    pronóstico horario no está disponible, regla por días sin sol.
     """
     try:
         # Obtener pronóstico
         forecast = weather_service.get_forecast_5days()
         estrategia = smart_strategy.analizar_pronostico(forecast['forecast'])
         
+        try:
+            tiempos, balance_w = await asyncio.to_thread(
+                inverter_controller.forecast_net_power, min(max(horizonte_h, 1), 120), 60, consumo_diario_kwh
+            )
+        except Exception as e:
+            print(f"⚠️ Balance horario no disponible, objetivo por regla: {e}")
+            tiempos, balance_w = None, None
+        
         # Calcular objetivo
-        objetivo = smart_strategy.calcular_carga_objetivo(
+        objetivo = await asyncio.to_thread(
+            smart_strategy.calcular_carga_objetivo,
             bateria_actual_percent=bateria_actual,
             dias_sin_sol=estrategia['analisis']['dias_sin_sol'],
             consumo_diario_kwh=consumo_diario_kwh,
-            capacidad_bateria_kwh=capacidad_bateria_kwh
+            capacidad_bateria_kwh=capacidad_bateria_kwh,
+            tiempos=tiempos,
+            balance_w=balance_w,
+            resolucion_soc_percent=min(max(resolucion_soc, 0.1), 10.0),
+            costos=inverter_controller.dispatch_costs()
         )
         
         return {
@@ -1083,9 +1221,9 @@ async def obtener_dashboard_eficiencia(
 
 # ===== ESTADO GLOBAL (compartido entre POST y GET) =====
 # Evita inconsistencias con atributos en funciones cuando el reloader crea procesos/hilos.
+# DEVICES_STORE se actualiza siempre EN SITIO (nunca se reasigna) para que
+# telemetry_ingest y los routers compartan el mismo dict.
 DEVICES_STORE = {}
-LAST_SEQ = {}
-UPLINK_LOST = {}
 
 # Persistencia simple en disco para evitar pérdida de estado entre procesos/reloads
 from pathlib import Path
@@ -1093,13 +1231,15 @@ import json as _json
 STORE_PATH = Path(__file__).parent / "devices_store.json"
 
 def load_store_from_disk():
-    global DEVICES_STORE
+    """Cargar store desde disco sólo si este proceso todavía no tiene estado"""
+    if DEVICES_STORE:
+        return
     try:
         if STORE_PATH.exists():
             with STORE_PATH.open('r', encoding='utf-8') as f:
                 data = _json.load(f)
                 if isinstance(data, dict):
-                    DEVICES_STORE = data
+                    DEVICES_STORE.update(data)
                     print(f"🗂️  [STORE] Cargado desde disco: {len(DEVICES_STORE)} dispositivos")
     except Exception as e:
         print(f"⚠️  [STORE] Error cargando store: {e}")
@@ -1112,198 +1252,176 @@ def save_store_to_disk():
     except Exception as e:
         print(f"⚠️  [STORE] Error guardando store: {e}")
 
-# ===== CONTADOR GLOBAL PARA DEBUG =====
-contador_paquetes_esp32 = 0
+# ===== INGESTA DE TELEMETRÍA (fast path) =====
+telemetry_historian = TelemetryHistorian(
+    flush_size=settings.telemetry_historian_flush_size,
+    flush_interval_s=settings.telemetry_historian_flush_interval_s
+)
+telemetry_ingest = TelemetryIngest(
+    DEVICES_STORE,
+    log_every=settings.telemetry_log_every,
+    save_interval_s=settings.telemetry_save_interval_s,
+    historian=telemetry_historian
+)
+LAST_SEQ = telemetry_ingest.last_seq
+UPLINK_LOST = telemetry_ingest.uplink_lost
+
+
+async def historian_step():
+    """Volcar el historial aunque no llegue más telemetría (un dispositivo que dejó de reportar)"""
+    if telemetry_historian.should_flush():
+        await asyncio.to_thread(telemetry_historian.write, telemetry_historian.drain())
+    return telemetry_historian.get_stats()
+
+
+control_scheduler.add_loop('historial', settings.telemetry_historian_flush_interval_s, historian_step, BACKGROUND)
+
+
+async def persistir_telemetria(force_historian: bool = False):
+    """Guardar store (con throttle) y volcar el historial en un solo INSERT"""
+    if telemetry_ingest.should_save():
+        save_store_to_disk()
+    if force_historian or telemetry_historian.should_flush():
+        rows = telemetry_historian.drain()
+        if rows:
+            await asyncio.to_thread(telemetry_historian.write, rows)
+
+
+async def procesar_telemetria(packet) -> dict:
+    """
+    Aplicar muestra o lote; un lote se escribe al historial de una vez
+    
+    La protección evalúa cada muestra y emite sus comandos antes de
+    actualizar el store y persistir; con el supervisor multi-proceso las
+    muestras sólo se enrutan al worker y sus comandos se emiten cuando
+    responde. Un error de protección (o de un worker del supervisor) se
+    cuenta y se registra, pero el paquete se guarda igual.
+    """
+    received_at = time.perf_counter()
+    samples = packet.samples if isinstance(packet, ESP32TelemetryBatch) else [packet]
+    if samples:
+        try:
+            commands = await device_runtime.evaluate_telemetry(packet.device_id, samples)
+        except Exception as e:
+            protection_engine.stats["errores_evaluacion"] += 1
+            telemetry_logger.warning("Error evaluando protección de %s: %s", packet.device_id, e)
+            commands = []
+        if commands:
+            await protection_engine.emit(commands, received_at)
+    result = telemetry_ingest.ingest_any(packet)
+    await persistir_telemetria(force_historian='samples' in result)
+    return result
+
 
 @app.post("/api/esp32/telemetry")
-async def recibir_telemetria_esp32(telemetria: dict):
+async def recibir_telemetria_esp32(request: Request):
     """
     Recibir telemetría del ESP32
-    Incluye ACK de comandos ejecutados
-        "v_load_v": 1.890
+    
+    Stage 1:
+    {
+        "device_id": "ESP32_INVERSOR_001", "seq": 123, "ts": 456,
+        "v_bat_v": 2.514, "v_wind_v_dc": 0.812, "v_solar_v": 1.203,
+        "v_load_v": 1.890, "raw_adc": {...}
+    }
+    
+    Legacy/extendido (voltaje_promedio, soc, potencias, relays...) también soportado.
+    
+    Lote (varias muestras por request):
+    {
+        "device_id": "ESP32_INVERSOR_001", "seq_start": 100, "seq_end": 109,
+        "samples": [{"ts": 12.0, "v_bat_v": 2.51, ...}, ...]
     }
     
-    Legacy format also supported for compatibility.
+    El body se valida con ESP32Telemetry / ESP32TelemetryBatch
+    (services/telemetry_ingest.py; lote si trae una lista "samples") y se
+    actualiza el registro en sitio. Un null o valor no numérico en un campo
+    toma su default, como antes.
     """
     try:
-        print(f"🔵 [DEBUG] Recibiendo telemetría...")
-        data = telemetria  # Fix: rename parameter
-        device_id = data.get('device_id', 'UNKNOWN')
-        print(f"🔵 [DEBUG] Device ID: {device_id}, tiene seq: {'seq' in data}, tiene raw_adc: {'raw_adc' in data}")
-        
-        # ===== STAGE 1: Packet loss tracking =====
-        if 'seq' in data:
-            seq = data.get('seq', 0)
-            
-            # Track packet loss usando estado global
-            if device_id in LAST_SEQ:
-                expected_seq = LAST_SEQ[device_id] + 1
-                if seq > expected_seq:
-                    lost = seq - expected_seq
-                    UPLINK_LOST[device_id] = UPLINK_LOST.get(device_id, 0) + lost
-                elif seq < expected_seq:
-                    # Duplicate/out of order - don't count as lost
-                    pass
-            else:
-                UPLINK_LOST[device_id] = 0
-            
-            LAST_SEQ[device_id] = seq
-            
-            # Console log Stage 1 format
-            v_bat = data.get('v_bat_v', 0.0)
-            v_wind = data.get('v_wind_v_dc', 0.0)
-            v_solar = data.get('v_solar_v', 0.0)
-            v_load = data.get('v_load_v', 0.0)
-            ts = data.get('ts', 0)
-            turbine_rpm = data.get('turbine_rpm', 0.0)
-            lost_total = UPLINK_LOST.get(device_id, 0)
-            
-            print(f"[TELEM] {device_id} seq={seq} ts={ts} Vbat={v_bat:.3f}V Vwind_DC={v_wind:.3f}V Vsolar={v_solar:.3f}V Vload={v_load:.3f}V RPM={turbine_rpm:.1f} Lost={lost_total} | OK")
-
-            # Si el firmware envía telemetría extendida con raw_adc (cada ~5s),
-            # mostrar los voltajes por GPIO (0–3.3V) - SOLO 4 ADC REALES
-            raw_adc = data.get('raw_adc')
-            if isinstance(raw_adc, dict):
-                # Mapeo correcto según firmware (CORREGIDO):
-                # GPIO34: Batería (adc1_bat1)
-                # GPIO35: Eólica DC (adc2_eolica) ← NOMBRE CORRECTO
-                # GPIO36: Solar (adc5_solar) ← NOMBRE CORRECTO
-                # GPIO39: Carga (adc6_load)
-                gpio34_bat = raw_adc.get('adc1_bat1', None)
-                gpio35_eolica = raw_adc.get('adc2_eolica', None)
-                gpio36_solar = raw_adc.get('adc5_solar', None)
-                gpio39_carga = raw_adc.get('adc6_load', None)
-                
-                # Imprimir solo si al menos uno está presente
-                if any(v is not None for v in [gpio34_bat, gpio35_eolica, gpio36_solar, gpio39_carga]):
-                    def f(val):
-                        try:
-                            return f"{float(val):.3f}V"
-                        except Exception:
-                            return "--"
-                    print("📊 ADC RAW (0-3.3V):")
-                    print("  GPIO34 → Batería:", f(gpio34_bat))
-                    print("  GPIO35 → Eólica DC:", f(gpio35_eolica))
-                    print("  GPIO36 → Solar:", f(gpio36_solar))
-                    print("  GPIO39 → Carga:", f(gpio39_carga))
-        
-        device_id = data.get('device_id', 'UNKNOWN')
-        
-        # Incrementar contador global
-        global contador_paquetes_esp32
-        contador_paquetes_esp32 += 1
-        contador = contador_paquetes_esp32
-        
-        # Registrar dispositivo en almacén global
-        # (no dependemos de atributos en la función para evitar estados separados)
-        
-        # Mantener registered_at si ya existe
-        registered_at = DEVICES_STORE.get(device_id, {}).get('registered_at', datetime.now().isoformat())
-        
-        # Extraer raw_adc del ESP32
-        raw_adc_from_esp = data.get('raw_adc', {})
-        
-        # Si no viene raw_adc en este paquete, mantener el anterior
-        old_device_data = DEVICES_STORE.get(device_id, {})
-        old_raw_adc = old_device_data.get('raw_adc', {})
-        old_relays = old_device_data.get('relays', {})
-        
-        # Usar el nuevo si existe, sino mantener el viejo
-        final_raw_adc = raw_adc_from_esp if raw_adc_from_esp else old_raw_adc
-        
-        # Relays: siempre usar los nuevos si vienen
-        relays_from_esp = data.get('relays', {})
-        final_relays = {
-            'solar': relays_from_esp.get('solar', old_relays.get('solar', False)),
-            'wind': relays_from_esp.get('eolica', old_relays.get('wind', False)),
-            'grid': relays_from_esp.get('red', old_relays.get('grid', False)),
-            'load': relays_from_esp.get('carga', old_relays.get('load', False))
-        }
-        
-        DEVICES_STORE[device_id] = {
-            'last_seen': datetime.now().isoformat(),
-            'registered_at': registered_at,
-            'contador': contador,  # ← CONTADOR PARA DEBUG
-            'heartbeat': {
-                'device_id': device_id,
-                'uptime': data.get('uptime', 0),
-                'free_heap': data.get('free_heap', 0),
-                'rssi': data.get('rssi', 0),
-                'timestamp': datetime.now().isoformat()
-            },
-            'telemetry': {
-                'battery_voltage': data.get('voltaje_promedio', 0),
-                'battery_soc': data.get('soc', 0),
-                'solar_power': data.get('potencia_solar', 0),
-                'wind_power': data.get('potencia_eolica', 0),
-                'load_power': data.get('potencia_consumo', 0),
-                'temperature': data.get('temperatura', 0),
-                'v_bat_v': data.get('v_bat_v', 0),
-                'v_wind_v_dc': data.get('v_wind_v_dc', 0),
-                'v_solar_v': data.get('v_solar_v', 0),
-                'v_load_v': data.get('v_load_v', 0),
-                'rpm': data.get('rpm', 0),
-                'frequency_hz': data.get('frequency_hz', 0),
-                'turbine_rpm': float(data.get('turbine_rpm', 0.0)) if data.get('turbine_rpm', 0.0) >= 0 else 0.0
-            },
-            'relays': final_relays,
-            'raw_adc': {
-                # 4 ADC reales del hardware (NOMBRES CORREGIDOS):
-                # GPIO34: Batería (adc1_bat1)
-                # GPIO35: Eólica DC (adc2_eolica) ← CORREGIDO
-                # GPIO36: Solar (adc5_solar) ← CORREGIDO
-                # GPIO39: Carga (adc6_load)
-                'adc1_bat1': final_raw_adc.get('adc1_bat1', 0),        # GPIO34 - Batería
-                'adc1_bat1_raw': final_raw_adc.get('adc1_bat1_raw', 0),
-                'adc2_eolica': final_raw_adc.get('adc2_eolica', 0),    # GPIO35 - Eólica DC
-                'adc2_eolica_raw': final_raw_adc.get('adc2_eolica_raw', 0),
-                'adc5_solar': final_raw_adc.get('adc5_solar', 0),      # GPIO36 - Solar
-                'adc5_solar_raw': final_raw_adc.get('adc5_solar_raw', 0),
-                'adc6_load': final_raw_adc.get('adc6_load', 0),        # GPIO39 - Carga
-                'adc6_load_raw': final_raw_adc.get('adc6_load_raw', 0)
-            }
-        }
-        
-        # Debug: imprimir lo que se guardó
-        if raw_adc_from_esp:
-            print(f"💾 [GUARDAR NUEVO #{contador}] raw_adc para {device_id}:", DEVICES_STORE[device_id]['raw_adc'])
-        else:
-            print(f"♻️ [MANTENER #{contador}] raw_adc para {device_id} (paquete sin ADC)")
-        
-        print(f"✅ [{contador}] {device_id} actualizado - Voltaje: {data.get('voltaje_promedio', 0)}V")
-        # Guardar en disco para compartir estado entre procesos
-        save_store_to_disk()
+        packet = telemetry_ingest.parse(await request.body())
+        return await procesar_telemetria(packet)
         
+    except Exception as e:
+        telemetry_logger.warning("Error procesando telemetría: %s", e)
         return {
-            'status': 'success',
-            'message': 'Telemetría recibida',
-            'device_id': device_id,
-            'timestamp': datetime.now().isoformat(),
-            'turbine_rpm': float(data.get('turbine_rpm', 0.0)) if data.get('turbine_rpm', 0.0) >= 0 else 0.0
+            'status': 'error',
+            'message': str(e)
         }
+
+
+@app.post("/api/esp32/telemetry/bin")
+async def recibir_telemetria_esp32_binaria(request: Request):
+    """
+    Recibir telemetría ESP32 en formato binario compacto
+    
+    Body application/octet-stream con uno o más registros de layout fijo
+    (schema 1 = Stage 1, 50 bytes; schema 2 = extendido, 97 bytes).
+    Ver services/telemetry_binary.py para el layout.
+    """
+    try:
+        packet = telemetry_binary.decode_many(await request.body())
+        return await procesar_telemetria(packet)
         
     except Exception as e:
-        print(f"❌ Error procesando telemetría: {e}")
+        telemetry_logger.warning("Error procesando telemetría binaria: %s", e)
         return {
             'status': 'error',
             'message': str(e)
         }
 
 
+@app.get("/api/esp32/runtime")
+async def obtener_runtime_dispositivos():
+    """Contextos por dispositivo en memoria: creados, desalojados e inactividad"""
+    return await device_runtime.runtime_stats()
+
+
+@app.get("/api/esp32/runtime/{device_id}")
+async def obtener_runtime_dispositivo(device_id: str, decidir: bool = False):
+    """
+    Estado de control y protección de un dispositivo
+    
+    Args:
+        decidir: Tomar una decisión ahora (si no, la del último ciclo de despacho)
+    """
+    view = await device_runtime.device_view(device_id, decidir)
+    if view is None:
+        raise HTTPException(status_code=404, detail=f"Sin contexto para {device_id} (no envió telemetría o fue desalojado)")
+    return view
+
+
+@app.get("/api/esp32/supervisor")
+async def obtener_supervisor():
+    """Supervisor multi-proceso: workers, fracción del anillo, IPC y migraciones"""
+    if shard_supervisor is None:
+        return {'activo': False, 'modo': 'proceso_unico', 'workers': {}}
+    return shard_supervisor.get_stats()
+
+
+@app.post("/api/esp32/supervisor/workers")
+async def agregar_worker_supervisor():
+    """Agregar un worker y migrarle los dispositivos que le corresponden en el anillo"""
+    if shard_supervisor is None:
+        raise HTTPException(status_code=400, detail="Supervisor deshabilitado (SUPERVISOR_WORKERS=0)")
+    return await shard_supervisor.add_worker()
+
+
 @app.get("/api/esp32/diagnostico")
 async def diagnostico_esp32():
     """
     Diagnóstico del sistema ESP32
     """
-    global contador_paquetes_esp32
-    
     diagnostico = {
         'backend_funcionando': True,
         'timestamp': datetime.now().isoformat(),
-        'contador_total_paquetes': contador_paquetes_esp32,
+        'contador_total_paquetes': telemetry_ingest.packet_count,
+        'paquetes_perdidos': dict(UPLINK_LOST),
+        'historial_telemetria': telemetry_historian.get_stats(),
         'dispositivos_registrados': len(DEVICES_STORE),
         'device_ids': list(DEVICES_STORE.keys()),
-        'ultimo_paquete': None
+        'ultimo_paquete': None,
+        'comandos': command_dispatcher.get_stats()
     }
     
     if DEVICES_STORE:
@@ -1354,10 +1472,7 @@ async def obtener_estado_dispositivo(device_id: str):
     Obtener estado actual del dispositivo ESP32 (GPIO + relés)
     Frontend lo consulta para actualizar UI
     """
-    if not hasattr(recibir_telemetria_esp32, 'devices'):
-        return {"status": "error", "message": "Dispositivo no encontrado"}
-    
-    device = recibir_telemetria_esp32.devices.get(device_id)
+    device = DEVICES_STORE.get(device_id)
     if not device:
         return {"status": "error", "message": "Dispositivo no encontrado"}
     
@@ -1387,84 +1502,119 @@ async def enviar_comando_esp32(device_id: str, command: dict):
     cmd = command.get('command')
     param = command.get('parameter') or command.get('params')
     
-    # Encolar en el nuevo sistema con ACK
-    command_id = esp32_ws_manager.enqueue_command(device_id, cmd, param)
-    
-    # Si el ESP32 está conectado por WebSocket, enviar inmediatamente
-    if device_id in esp32_ws_manager.connections:
-        await esp32_ws_manager.send_pending_commands(device_id)
-    else:
-        # Si no está conectado, queda en cola para HTTP polling (fallback)
-        # Mantener compatibilidad con HTTP polling
-        if not hasattr(enviar_comando_esp32, 'command_queue'):
-            enviar_comando_esp32.command_queue = {}
-        
-        if device_id not in enviar_comando_esp32.command_queue:
-            enviar_comando_esp32.command_queue[device_id] = []
-        
-        cmd_entry = {
-            'command': cmd,
-            'timestamp': datetime.now().isoformat()
-        }
-        if param:
-            cmd_entry['parameter'] = param
-        
-        enviar_comando_esp32.command_queue[device_id].append(cmd_entry)
-        print(f"📤 Comando encolado para HTTP polling (ESP32 no conectado): {cmd}({param})")
+    # Cola única: el despachador elige WebSocket, long-poll o polling
+    cmd_entry = await command_dispatcher.dispatch(device_id, cmd, param)
     
     return {
         'status': 'success',
         'device_id': device_id,
-        'command_id': command_id,
+        'command_id': cmd_entry['id'],
         'command': cmd,
         'parameter': param,
         'timestamp': datetime.now().isoformat(),
-        'delivery_method': 'websocket' if device_id in esp32_ws_manager.connections else 'http_polling'
+        'delivery_method': cmd_entry['transport'],
+        'command_status': cmd_entry['status']
     }
 
 
+def _formato_comandos_http(commands: list) -> list:
+    """Formato Stage 1 para el ESP32 (incluye id para ACK)"""
+    result = []
+    for c in commands:
+        entry = {
+            'id': c['id'],
+            'command': c['command'],
+            'timestamp': c['timestamp']
+        }
+        if c.get('parameter') is not None:
+            entry['parameter'] = c['parameter']
+        result.append(entry)
+    return result
+
+
 @app.get("/api/esp32/commands/{device_id}")
-async def obtener_comandos_esp32(device_id: str):
+async def obtener_comandos_esp32(device_id: str, request: Request, wait: float = 0):
     """
     ESP32 pregunta si hay comandos pendientes (HTTP Polling - FALLBACK)
     
     STAGE 1: Retorna {"status":"OK"} si no hay comandos,
              {"status":"CMD", "commands":[...]} si hay comandos
     
+    LONG-POLL: con ?wait=N (segundos, máx 30) la request queda estacionada
+    hasta que llegue un comando o venza el timeout. Si se alcanzó el tope de
+    conexiones estacionadas responde al instante con "retry_after".
+    
+    Si el ESP32 cortó la conexión mientras esperaba, los comandos siguen
+    pendientes para el próximo GET.
+    
+    Los comandos entregados quedan en estado "sent" en la cola única;
+    el ESP32 puede confirmarlos con POST /api/esp32/commands/{device_id}/ack.
+    
     NOTA: Este endpoint es fallback. Si ESP32 usa WebSocket, los comandos
     se envían automáticamente por ahí.
     """
-    # Obtener comandos de la cola
-    if hasattr(enviar_comando_esp32, 'command_queue'):
-        commands = enviar_comando_esp32.command_queue.get(device_id, [])
-        
-        # Limpiar cola después de entregar
-        if device_id in enviar_comando_esp32.command_queue:
-            enviar_comando_esp32.command_queue[device_id] = []
+    retry_after = None
+    
+    if wait > 0:
+        commands = await command_dispatcher.wait_for_commands(device_id, wait, request.is_disconnected)
+        if commands is None:
+            # Tope de long-poll alcanzado: degradar a polling simple
+            commands = command_dispatcher.take_pending(device_id)
+            retry_after = 5
+    else:
+        commands = command_dispatcher.take_pending(device_id)
+    
+    if commands:
+        # Log command sent (Stage 1)
+        def fmt(c):
+            cmd = c.get("command", "unknown")
+            par = c.get("parameter")
+            return f"{cmd}({par})" if par is not None else cmd
+        cmd_str = ", ".join([fmt(c) for c in commands])
+        print(f"[CMD] {device_id} → Sent: {cmd_str}")
         
-        if commands:
-            # Log command sent (Stage 1)
-            def fmt(c):
-                cmd = c.get("command", "unknown")
-                par = c.get("parameter")
-                return f"{cmd}({par})" if par is not None else cmd
-            cmd_str = ", ".join([fmt(c) for c in commands])
-            print(f"[CMD] {device_id} → Sent: {cmd_str}")
-            
-            return {
-                'status': 'CMD',
-                'device_id': device_id,
-                'commands': commands,
-                'count': len(commands)
-            }
+        return {
+            'status': 'CMD',
+            'device_id': device_id,
+            'commands': _formato_comandos_http(commands),
+            'count': len(commands)
+        }
     
     # No commands - return OK status (Stage 1)
-    return {
+    response = {
         'status': 'OK',
         'device_id': device_id,
         'commands': [],
         'count': 0
     }
+    if retry_after is not None:
+        response['retry_after'] = retry_after
+    return response
+
+
+@app.post("/api/esp32/commands/{device_id}/ack")
+async def confirmar_comando_esp32(device_id: str, ack: dict):
+    """
+    ACK por HTTP para ESP32 sin WebSocket
+    
+    Body: {"command_id": "..."} o {"command_ids": ["...", "..."]}
+    """
+    command_ids = ack.get('command_ids') or [ack.get('command_id')]
+    acked = [cid for cid in command_ids if cid and command_dispatcher.mark_ack(device_id, cid)]
+    
+    for command_id in acked:
+        await manager.broadcast({
+            "type": "esp32_command_ack",
+            "device_id": device_id,
+            "command_id": command_id,
+            "timestamp": datetime.now().isoformat()
+        })
+    
+    return {
+        'status': 'success' if acked else 'not_found',
+        'device_id': device_id,
+        'acked': acked
+    }
 
 
 @app.get("/api/esp32/command/{device_id}/status/{command_id}")
@@ -1689,8 +1839,7 @@ async def obtener_datos_climaticos(latitude: float, longitude: float, years: int
     Obtener datos climáticos históricos de NASA POWER
     """
     try:
-        from nasa_power_service import nasa_power_service
-        data = nasa_power_service.get_prediction_model_data(latitude, longitude)
+        data = await nasa_service.get_prediction_model_data(latitude, longitude, years=years)
         return data
     except Exception as e:
         print(f"❌ Error obteniendo datos climáticos: {e}")
@@ -1705,7 +1854,9 @@ async def recomendar_por_demanda(request: dict):
     Recomendar equipamiento según demanda de potencia
     """
     try:
-        result = recommendation_service.calculate_by_demand(
+        # Síncrono (consulta NASA vía fachada): fuera del event loop
+        result = await asyncio.to_thread(
+            recommendation_service.calculate_by_demand,
             target_power_w=request.get('target_power_w', 3000),
             latitude=request.get('latitude', -38.7183),
             longitude=request.get('longitude', -62.2663)
@@ -1722,7 +1873,8 @@ async def recomendar_por_recursos(request: dict):
     Calcular potencial según recursos existentes
     """
     try:
-        result = recommendation_service.calculate_by_resources(
+        result = await asyncio.to_thread(
+            recommendation_service.calculate_by_resources,
             solar_panel_w=request.get('solar_panel_w', 0),
             solar_panel_area_m2=request.get('solar_panel_area_m2', 0),
             wind_turbine_w=request.get('wind_turbine_w', 0),
@@ -38,8 +38,9 @@ class PatternLearner:
     """
     Aprende patrones de consumo de la casa
     """
-    def __init__(self, learning_days: int = 30):
+    def __init__(self, learning_days: int = 30, max_records: Optional[int] = None):
         self.learning_days = learning_days
+        self.max_records = max_records  # Tope de memoria (None = sólo por antigüedad)
         self.consumption_history: List[Dict] = []
         self.patterns: Dict[int, ConsumptionPattern] = {}
         self.peak_hours: List[int] = []
@@ -55,12 +56,15 @@ class PatternLearner:
             'is_weekend': timestamp.weekday() >= 5
         })
         
-        # Mantener solo los últimos N días
+        # Mantener solo los últimos N días (registros en orden: vencidos al principio)
         cutoff_date = datetime.now() - timedelta(days=self.learning_days)
-        self.consumption_history = [
-            r for r in self.consumption_history 
-            if r['timestamp'] > cutoff_date
-        ]
+        expired = 0
+        while expired < len(self.consumption_history) and self.consumption_history[expired]['timestamp'] <= cutoff_date:
+            expired += 1
+        if self.max_records is not None:
+            expired = max(expired, len(self.consumption_history) - self.max_records)
+        if expired:
+            del self.consumption_history[:expired]
     
     def analyze_patterns(self) -> Dict:
         """
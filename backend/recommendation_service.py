@@ -25,13 +25,35 @@ class RecommendationService:
         self.WIND_EFFICIENCY = 0.35   # 35% eficiencia (Betz limit ~59%)
         self.BATTERY_DOD = 0.80       # 80% depth of discharge
         self.AUTONOMY_DAYS = 2        # 2 días de autonomía
+        self.WIND_HEIGHT_M = 10       # Turbinas residenciales
         
-    def get_climate_data(self, latitude: float, longitude: float) -> Dict:
+    def get_site_resource(self, latitude: float, longitude: float):
+        """
+        Tabla de recurso precalculada del sitio (services/resource_table.py)
+        o None si NASA POWER no está disponible
+        
+        Bloqueante: llamar desde un hilo de trabajo (asyncio.to_thread)
+        """
+        from services.nasa_power_service import nasa_sync
+        return nasa_sync.get_resource_table(latitude, longitude)
+    
+    def get_climate_data(self, latitude: float, longitude: float, resource=None) -> Dict:
         """
         Obtener datos climáticos promedio para una ubicación
         Integrado con NASA POWER API
+        
+        Bloqueante: llamar desde un hilo de trabajo (asyncio.to_thread)
         """
-        from nasa_power_service import nasa_power_service
+        from services.nasa_power_service import nasa_sync as nasa_power_service
+        
+        if resource is not None:
+            hsp = resource.peak_sun_hours()
+            return {
+                'avg_solar_irradiance_wm2': round(hsp * 1000 / 24, 2),
+                'avg_wind_speed_ms': round(resource.mean_wind_speed(self.WIND_HEIGHT_M), 2),
+                'sun_hours_day': round(hsp / 0.85, 1),
+                'source': 'NASA POWER (tabla de recurso del sitio)'
+            }
         
         # Obtener datos reales de NASA POWER
         nasa_data = nasa_power_service.get_historical_data(latitude, longitude, years=5)
@@ -62,7 +84,8 @@ class RecommendationService:
         Calcular equipamiento necesario según demanda
         """
         # Obtener datos climáticos REALES de la ubicación
-        climate = self.get_climate_data(latitude, longitude)
+        resource = self.get_site_resource(latitude, longitude)
+        climate = self.get_climate_data(latitude, longitude, resource)
         
         # Energía diaria necesaria (Wh)
         daily_energy_wh = target_power_w * 24
@@ -81,9 +104,12 @@ class RecommendationService:
         v_wind = climate['avg_wind_speed_ms']
         
         # Calcular área necesaria
-        wind_area_m2 = (wind_contribution) / (
-            0.5 * rho_air * (v_wind ** 3) * self.WIND_EFFICIENCY
-        )
+        # Con tabla de recurso: densidad de potencia media 0.5·ρ·E[v³] (Weibull)
+        if resource is not None:
+            power_density_w_m2 = resource.power_density_w_m2(self.WIND_HEIGHT_M)
+        else:
+            power_density_w_m2 = 0.5 * rho_air * (v_wind ** 3)
+        wind_area_m2 = (wind_contribution) / (power_density_w_m2 * self.WIND_EFFICIENCY)
         wind_diameter_m = math.sqrt(4 * wind_area_m2 / math.pi)
         wind_power_w = wind_contribution
         
@@ -162,7 +188,8 @@ class RecommendationService:
         Calcular potencial de generación según recursos existentes
         """
         # Obtener datos climáticos REALES de la ubicación
-        climate = self.get_climate_data(latitude, longitude)
+        resource = self.get_site_resource(latitude, longitude)
+        climate = self.get_climate_data(latitude, longitude, resource)
         
         # === GENERACIÓN SOLAR (CON ML SI ESTÁ DISPONIBLE) ===
         if ML_ENABLED and ml_predictor and ml_predictor.ml_available:
@@ -180,7 +207,15 @@ class RecommendationService:
             solar_daily_kwh = (solar_panel_w * climate['sun_hours_day'] * 0.85) / 1000
             
             # === GENERACIÓN EÓLICA ===
-            if wind_turbine_diameter_m > 0:
+            if wind_turbine_diameter_m > 0 and resource is not None:
+                # Curva de potencia (tope = nominal) sobre Weibull del sitio
+                wind_actual_w = min(resource.expected_turbine_power_w(
+                    diameter_m=wind_turbine_diameter_m,
+                    efficiency=self.WIND_EFFICIENCY,
+                    rated_w=wind_turbine_w,
+                    height_m=self.WIND_HEIGHT_M
+                ), wind_turbine_w)
+            elif wind_turbine_diameter_m > 0:
                 rho_air = 1.225
                 wind_area_m2 = math.pi * (wind_turbine_diameter_m / 2) ** 2
                 wind_theoretical_w = 0.5 * rho_air * wind_area_m2 * (climate['avg_wind_speed_ms'] ** 3) * self.WIND_EFFICIENCY
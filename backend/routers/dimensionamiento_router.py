@@ -3,10 +3,21 @@ Router para cálculos de dimensionamiento
 """
 
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+import asyncio
+import json
+from typing import Dict, List, Optional
 from services.dimensionamiento_service import dimensionamiento_service
-from services.nasa_power_service import get_location_climate_data
+from services.energy_simulator import (
+    SystemConfig, hourly_resource, load_profile_from_cargas, load_profile_from_patterns,
+    residential_load_profile
+)
+from services import design_optimizer, monte_carlo
+from services.nasa_power_service import get_location_climate_data, iter_sites_climate, nasa_service
+from services.circuit_breaker import CircuitOpenError
+from services.climate_cache import climate_cache, ClimateCacheMiss
+from services.resource_table import get_resource_or_none, resource_tables
 from services.ml_predictor_service import ml_predictor
 
 router = APIRouter(prefix="/api/dimensionamiento", tags=["Dimensionamiento"])
@@ -21,6 +32,30 @@ class DimensionamientoOpcion1(BaseModel):
     consumo_diario_kwh: float
     dias_autonomia: int = 2
     voltaje_sistema: int = 48
+    escenarios_montecarlo: int = 0  # > 0: días de autonomía desde el clima del sitio
+    percentil_autonomia: int = 90
+    lolp_objetivo: float = 0.01  # Energía no servida admitida al dimensionar por Monte Carlo
+
+
+class Sitio(BaseModel):
+    latitude: float
+    longitude: float
+
+
+class PrefetchClima(BaseModel):
+    """
+    Lista de sitios para precargar la caché climática
+    """
+    sitios: List[Sitio]
+    years_back: int = 10
+
+
+class ClimaLote(BaseModel):
+    """
+    Climatología para muchos sitios candidatos
+    """
+    sitios: List[Sitio]
+    years_back: int = 10
 
 
 class DimensionamientoOpcion2(BaseModel):
@@ -35,6 +70,120 @@ class DimensionamientoOpcion2(BaseModel):
     diametro_turbina_m: float
 
 
+class SimulacionHoraria(BaseModel):
+    """
+    Simulación de un año hora por hora de un sistema dado
+    
+    Carga (en orden de prioridad): perfil_carga_w (24 valores en W),
+    cargas ([{"tipo", "cantidad", "horas_dia"}]), patrones aprendidos
+    (usar_patrones) o consumo_diario_kwh con perfil residencial
+    """
+    latitude: float
+    longitude: float
+    consumo_diario_kwh: Optional[float] = None
+    perfil_carga_w: Optional[List[float]] = None
+    cargas: Optional[List[Dict]] = None
+    usar_patrones: bool = False
+    potencia_solar_w: float = 0
+    turbinas: int = 0
+    diametro_turbina_m: float = 0
+    potencia_turbina_w: float = 0
+    arranque_turbina_ms: float = 3.0
+    altura_buje_m: float = 10
+    bateria_kwh: float = 0
+    profundidad_descarga: float = 0.8
+    anio: Optional[int] = None
+    incluir_series: bool = False
+
+
+class MonteCarloDimensionamiento(SimulacionHoraria):
+    """
+    Incertidumbre meteorológica: el sistema de SimulacionHoraria simulado
+    sobre muchos años sintéticos (bootstrap por bloques de la serie NASA)
+    """
+    escenarios: int = 500
+    semilla: Optional[int] = None
+    bloque_dias: int = 7
+    percentil_autonomia: int = 90
+    lolp_objetivo: float = 0.01
+
+
+class DimensionamientoOptimizar(BaseModel):
+    """
+    Búsqueda del frente de Pareto costo ↔ confiabilidad sobre los
+    componentes disponibles (paneles × turbinas × baterías)
+    """
+    latitude: float
+    longitude: float
+    consumo_diario_kwh: Optional[float] = None
+    perfil_carga_w: Optional[List[float]] = None
+    lolp_objetivo: float = 0.01  # Energía no servida aceptable (recomendación)
+    lolp_suficiente: float = 0.0  # Alcanzado esto, lo más caro ya no se evalúa
+    max_paneles: Optional[int] = None
+    max_turbinas: int = 3
+    max_baterias_paralelo: int = 6
+    voltaje_sistema: int = 48
+    tiempo_max_s: Optional[float] = None
+
+
+def _mensaje_confiabilidad(simulacion: Optional[Dict]) -> Optional[str]:
+    """Resumen de una línea de la simulación horaria"""
+    if simulacion is None:
+        return None
+    confiabilidad = simulacion["confiabilidad"]
+    return (
+        f"Simulación hora por hora: {confiabilidad['cobertura_horaria_porcentaje']:.1f}% de la energía cubierta, "
+        f"{confiabilidad['horas_sin_suministro']} h/año sin suministro "
+        f"(corte más largo: {confiabilidad['corte_mas_largo_h']} h)"
+    )
+
+
+def _perfil_carga(request: SimulacionHoraria):
+    """Perfil de 24 valores (W) y su origen, según lo que traiga el request"""
+    if request.perfil_carga_w is not None:
+        if len(request.perfil_carga_w) != 24:
+            raise HTTPException(status_code=400, detail="perfil_carga_w debe tener 24 valores (W por hora)")
+        return request.perfil_carga_w, "perfil"
+    if request.cargas:
+        return load_profile_from_cargas(request.cargas), "cargas"
+    if request.usar_patrones:
+        from pattern_learner import pattern_learner
+        perfil = load_profile_from_patterns(pattern_learner.patterns)
+        if perfil is None:
+            raise HTTPException(status_code=400, detail="No hay patrones de consumo aprendidos todavía")
+        return perfil, "patrones"
+    if request.consumo_diario_kwh is not None:
+        return residential_load_profile(request.consumo_diario_kwh), "residencial"
+    raise HTTPException(status_code=400, detail="Indicar consumo_diario_kwh, perfil_carga_w, cargas o usar_patrones")
+
+
+def _configuracion(request: SimulacionHoraria) -> SystemConfig:
+    """Componentes del sistema a simular"""
+    return SystemConfig(
+        pv_w=request.potencia_solar_w,
+        turbine_count=request.turbinas,
+        turbine_diameter_m=request.diametro_turbina_m,
+        turbine_rated_w=request.potencia_turbina_w,
+        turbine_cut_in_ms=request.arranque_turbina_ms,
+        hub_height_m=request.altura_buje_m,
+        battery_wh=request.bateria_kwh * 1000,
+        battery_dod=request.profundidad_descarga
+    )
+
+
+def _mensaje_generacion_insuficiente(incertidumbre: Optional[Dict], dias_autonomia: int) -> Optional[str]:
+    """Aviso cuando el Monte Carlo pide más generación en lugar de más batería"""
+    if not incertidumbre or not incertidumbre["generacion_insuficiente"]:
+        return None
+    autonomia = incertidumbre["montecarlo"]["autonomia"]
+    return (
+        f"Generación insuficiente: en el año de diseño (p{autonomia['percentil_diseno']}) el balance "
+        f"anual es negativo o cumplir el objetivo de energía no servida exigiría más de "
+        f"{autonomia['dias_autonomia_maximos']:g} días de almacenamiento. Aumentar la generación; "
+        f"la batería se dimensionó con {dias_autonomia} día(s) de autonomía"
+    )
+
+
 @router.post("/opcion1")
 async def calcular_opcion1(request: DimensionamientoOpcion1):
     """
@@ -51,6 +200,7 @@ async def calcular_opcion1(request: DimensionamientoOpcion1):
         # 1. Obtener datos climáticos históricos
         print(f"📡 Obteniendo datos climáticos para: {request.latitude}, {request.longitude}")
         clima_data = await get_location_climate_data(request.latitude, request.longitude)
+        recurso = await get_resource_or_none(request.latitude, request.longitude)
         
         irradiancia_kwh_m2_dia = clima_data["solar"]["annual_avg_kwh_m2_day"]
         velocidad_viento_ms = clima_data["wind"]["annual_avg_ms"]
@@ -60,25 +210,51 @@ async def calcular_opcion1(request: DimensionamientoOpcion1):
         solar_result = dimensionamiento_service.dimensionar_solar_opcion1(
             consumo_diario_kwh=request.consumo_diario_kwh,
             irradiancia_kwh_m2_dia=irradiancia_kwh_m2_dia,
-            dias_autonomia=request.dias_autonomia
+            dias_autonomia=request.dias_autonomia,
+            recurso=recurso
         )
         
         # 3. Dimensionamiento eólico
         print(f"💨 Calculando sistema eólico...")
         eolico_result = dimensionamiento_service.dimensionar_eolico_opcion1(
             consumo_diario_kwh=request.consumo_diario_kwh,
-            velocidad_viento_promedio_ms=velocidad_viento_ms
+            velocidad_viento_promedio_ms=velocidad_viento_ms,
+            recurso=recurso
         )
         
-        # 4. Dimensionamiento batería
+        # 4. Dimensionamiento batería (días de autonomía fijos o por Monte Carlo)
+        perfil = residential_load_profile(request.consumo_diario_kwh)
+        dias_autonomia = request.dias_autonomia
+        incertidumbre = None
+        if request.escenarios_montecarlo > 0:
+            print(f"🎲 Monte Carlo de autonomía ({request.escenarios_montecarlo} años sintéticos)...")
+            incertidumbre = await asyncio.to_thread(
+                dimensionamiento_service.autonomia_montecarlo,
+                recurso,
+                dimensionamiento_service.configuracion_sistema(solar_result, eolico_result),
+                perfil,
+                request.escenarios_montecarlo,
+                request.percentil_autonomia,
+                lolp_objetivo=request.lolp_objetivo
+            )
+            if incertidumbre is not None and not incertidumbre["generacion_insuficiente"]:
+                dias_autonomia = incertidumbre["dias_autonomia"]
+        
         print(f"🔋 Calculando batería...")
         bateria_result = dimensionamiento_service.dimensionar_bateria(
             consumo_diario_kwh=request.consumo_diario_kwh,
-            dias_autonomia=request.dias_autonomia,
+            dias_autonomia=dias_autonomia,
             voltaje_sistema=request.voltaje_sistema
         )
         
-        # 5. Resumen total
+        # 5. Simulación horaria del sistema propuesto (año de 8760 h)
+        simulacion = dimensionamiento_service.simular_anio(
+            recurso,
+            dimensionamiento_service.configuracion_sistema(solar_result, eolico_result, bateria_result),
+            perfil
+        )
+        
+        # 6. Resumen total
         generacion_total_kwh = (
             solar_result["resultado"]["generacion"]["diaria_kwh"] +
             eolico_result["resultado"]["generacion"]["diaria_kwh"]
@@ -104,21 +280,24 @@ async def calcular_opcion1(request: DimensionamientoOpcion1):
                 "zona": "Argentina"  # TODO: geocoding
             },
             "clima_historico": clima_data,
+            "recurso_sitio": recurso.summary() if recurso is not None else None,
             "entrada": {
                 "consumo_diario_kwh": request.consumo_diario_kwh,
                 "consumo_mensual_kwh": request.consumo_diario_kwh * 30,
                 "consumo_anual_kwh": request.consumo_diario_kwh * 365,
-                "dias_autonomia": request.dias_autonomia,
+                "dias_autonomia": dias_autonomia,
                 "voltaje_sistema": request.voltaje_sistema
             },
             "sistema_solar": solar_result,
             "sistema_eolico": eolico_result,
             "sistema_bateria": bateria_result,
+            "simulacion_horaria": simulacion,
+            "incertidumbre": incertidumbre["montecarlo"] if incertidumbre else None,
             "resumen": {
                 "generacion_total_diaria_kwh": generacion_total_kwh,
                 "cobertura_porcentaje": cobertura_porcentaje,
                 "balance_diario_kwh": balance_kwh,
-                "autonomia_dias": request.dias_autonomia,
+                "autonomia_dias": dias_autonomia,
                 "costo_total_usd": costo_total_usd,
                 "ahorro_anual_usd": request.consumo_diario_kwh * 365 * 0.15,
                 "payback_years": round(payback_years, 1),
@@ -127,6 +306,8 @@ async def calcular_opcion1(request: DimensionamientoOpcion1):
             "recomendacion": {
                 "viabilidad": "EXCELENTE" if cobertura_porcentaje >= 100 else "BUENA" if cobertura_porcentaje >= 80 else "REGULAR",
                 "mensaje": f"El sistema cubre el {cobertura_porcentaje:.0f}% del consumo",
+                "confiabilidad_horaria": _mensaje_confiabilidad(simulacion),
+                "generacion_insuficiente": _mensaje_generacion_insuficiente(incertidumbre, dias_autonomia),
                 "siguiente_paso": "Configurar ESP32 con esta ubicación y comenzar monitoreo"
             }
         }
@@ -152,12 +333,13 @@ async def calcular_opcion2(request: DimensionamientoOpcion2):
         # 1. Obtener datos climáticos
         print(f"📡 Obteniendo datos climáticos para: {request.latitude}, {request.longitude}")
         clima_data = await get_location_climate_data(request.latitude, request.longitude)
+        recurso = await get_resource_or_none(request.latitude, request.longitude)
         
         irradiancia_kwh_m2_dia = clima_data["solar"]["annual_avg_kwh_m2_day"]
         velocidad_viento_ms = clima_data["wind"]["annual_avg_ms"]
         
         # 2. Calcular generación solar máxima
-        hsp = irradiancia_kwh_m2_dia
+        hsp = recurso.peak_sun_hours() if recurso is not None else irradiancia_kwh_m2_dia
         eficiencia_sistema = 0.85
         generacion_solar_kwh = (request.potencia_solar_w / 1000) * hsp * eficiencia_sistema
         
@@ -167,8 +349,26 @@ async def calcular_opcion2(request: DimensionamientoOpcion2):
         densidad_aire = 1.225
         eficiencia_turbina = 0.35
         
-        potencia_viento = 0.5 * densidad_aire * area_barrido * (velocidad_viento_ms ** 3)
-        potencia_eolica_real = potencia_viento * eficiencia_turbina
+        if recurso is not None:
+            # Curva de potencia (tope = potencia nominal) sobre Weibull del sitio
+            k, c = recurso.weibull_params(dimensionamiento_service.ALTURA_VIENTO_M)
+            potencia_eolica_real = recurso.expected_turbine_power_w(
+                diameter_m=request.diametro_turbina_m,
+                efficiency=eficiencia_turbina,
+                rated_w=request.potencia_eolica_w or None,
+                height_m=dimensionamiento_service.ALTURA_VIENTO_M
+            )
+            calculo_eolico = {
+                "ecuacion": "P_eolica = ∫ min(0.5 × ρ × A × v³ × η_turbina, P_nominal) × f_Weibull(v) dv",
+                "valores": f"A = {area_barrido:.2f} m², k = {k:.2f}, c = {c:.2f} m/s, η = {eficiencia_turbina}",
+            }
+        else:
+            potencia_viento = 0.5 * densidad_aire * area_barrido * (velocidad_viento_ms ** 3)
+            potencia_eolica_real = potencia_viento * eficiencia_turbina
+            calculo_eolico = {
+                "ecuacion": "P_eolica = 0.5 × ρ × A × v³ × η_turbina",
+                "valores": f"P = 0.5 × {densidad_aire} × {area_barrido:.2f} × {velocidad_viento_ms}³ × {eficiencia_turbina}",
+            }
         generacion_eolica_kwh = (potencia_eolica_real * 24) / 1000
         
         # 4. Generación total
@@ -184,6 +384,23 @@ async def calcular_opcion2(request: DimensionamientoOpcion2):
             voltaje_sistema=48
         )
         
+        # 7. Simulación horaria con la carga máxima recomendada
+        simulacion = dimensionamiento_service.simular_anio(
+            recurso,
+            SystemConfig(
+                pv_w=request.potencia_solar_w,
+                turbine_count=1 if request.diametro_turbina_m > 0 else 0,
+                turbine_diameter_m=request.diametro_turbina_m,
+                turbine_rated_w=request.potencia_eolica_w,
+                hub_height_m=dimensionamiento_service.ALTURA_VIENTO_M,
+                battery_wh=bateria_result["resultado"]["baterias"]["capacidad_total_kwh"] * 1000,
+                battery_dod=dimensionamiento_service.PROFUNDIDAD_DESCARGA_BATERIA,
+                pv_system_efficiency=eficiencia_sistema,
+                turbine_efficiency=eficiencia_turbina
+            ),
+            residential_load_profile(consumo_maximo_kwh)
+        )
+        
         return {
             "tipo": "opcion2_desde_recursos",
             "ubicacion": {
@@ -191,6 +408,7 @@ async def calcular_opcion2(request: DimensionamientoOpcion2):
                 "longitude": request.longitude
             },
             "clima_historico": clima_data,
+            "recurso_sitio": recurso.summary() if recurso is not None else None,
             "entrada": {
                 "potencia_solar_w": request.potencia_solar_w,
                 "area_solar_m2": request.area_solar_m2,
@@ -204,8 +422,7 @@ async def calcular_opcion2(request: DimensionamientoOpcion2):
                     "resultado": f"{generacion_solar_kwh:.2f} kWh/día"
                 },
                 "eolico": {
-                    "ecuacion": "P_eolica = 0.5 × ρ × A × v³ × η_turbina",
-                    "valores": f"P = 0.5 × {densidad_aire} × {area_barrido:.2f} × {velocidad_viento_ms}³ × {eficiencia_turbina}",
+                    **calculo_eolico,
                     "resultado": f"{generacion_eolica_kwh:.2f} kWh/día"
                 }
             },
@@ -219,9 +436,11 @@ async def calcular_opcion2(request: DimensionamientoOpcion2):
                 "potencia_promedio_w": (consumo_maximo_kwh * 1000) / 24
             },
             "sistema_bateria_recomendado": bateria_result,
+            "simulacion_horaria": simulacion,
             "recomendacion": {
                 "mensaje": f"Tu sistema puede generar hasta {generacion_total_kwh:.1f} kWh/día",
                 "consumo_max": f"Consumo máximo recomendado: {consumo_maximo_kwh:.1f} kWh/día",
+                "confiabilidad_horaria": _mensaje_confiabilidad(simulacion),
                 "suficiencia": "EXCELENTE" if generacion_total_kwh > 15 else "BUENA" if generacion_total_kwh > 10 else "MODERADA"
             }
         }
@@ -241,5 +460,227 @@ async def get_clima_ubicacion(latitude: float, longitude: float):
     try:
         clima_data = await get_location_climate_data(latitude, longitude)
         return clima_data
+    except (ClimateCacheMiss, CircuitOpenError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo datos: {str(e)}")
+
+
+@router.post("/clima/prefetch")
+async def prefetch_clima(request: PrefetchClima):
+    """
+    Precargar la caché climática local para una lista de sitios
+    
+    Útil antes de trabajar sin conexión (CLIMATE_OFFLINE=true)
+    """
+    resultados = await nasa_service.prefetch_sites(
+        [sitio.model_dump() for sitio in request.sitios],
+        years_back=request.years_back
+    )
+    return {
+        "sitios": resultados,
+        "cache": await asyncio.to_thread(climate_cache.get_stats)
+    }
+
+
+@router.post("/clima/lote")
+async def get_clima_lote(request: ClimaLote):
+    """
+    Climatología de varios sitios en una sola llamada
+    
+    Responde NDJSON (una línea JSON por sitio) a medida que cada sitio
+    se completa. Sitios en la misma celda de grilla NASA comparten una
+    sola request; el resto sale de la caché local.
+    """
+    sitios = [sitio.model_dump() for sitio in request.sitios]
+    
+    async def stream():
+        async for item in iter_sites_climate(sitios, years_back=request.years_back):
+            yield json.dumps(item, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@router.get("/clima/cache")
+async def get_clima_cache():
+    """Estado de la caché climática local"""
+    return await asyncio.to_thread(climate_cache.get_stats)
+
+
+@router.get("/recurso/{latitude}/{longitude}")
+async def get_recurso_sitio(latitude: float, longitude: float):
+    """
+    Tabla de recurso precalculada del sitio: HSP mensual, claridad,
+    Weibull del viento a 10/50 m (se construye una vez y queda en disco)
+    """
+    try:
+        recurso = await resource_tables.get(latitude, longitude)
+    except (ClimateCacheMiss, CircuitOpenError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error construyendo tabla de recurso: {str(e)}")
+    return {
+        **recurso.summary(),
+        "store": resource_tables.get_stats()
+    }
+
+
+@router.post("/simular")
+async def simular_sistema(request: SimulacionHoraria):
+    """
+    Simular un año completo (8760 h) de un sistema en un sitio
+    
+    Recurso horario desde la tabla del sitio (NASA POWER diario bajado a
+    horas), batería con eficiencias y límite de potencia. Devuelve horas
+    sin suministro, energía no servida y vertida, ciclos de batería,
+    peor semana y desglose mensual.
+    """
+    perfil, origen_carga = _perfil_carga(request)
+    
+    try:
+        recurso = await resource_tables.get(request.latitude, request.longitude)
+    except (ClimateCacheMiss, CircuitOpenError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error construyendo tabla de recurso: {str(e)}")
+    
+    config = _configuracion(request)
+    simulacion = dimensionamiento_service.simular_anio(
+        recurso, config, perfil, anio=request.anio, incluir_series=request.incluir_series
+    )
+    if simulacion is None:
+        raise HTTPException(status_code=400, detail="La serie del sitio no tiene un año completo para simular")
+    
+    return {
+        "ubicacion": {
+            "latitude": request.latitude,
+            "longitude": request.longitude
+        },
+        "carga": {
+            "origen": origen_carga,
+            "perfil_w": [round(float(p), 1) for p in perfil],
+            "consumo_diario_kwh": round(float(sum(perfil)) / 1000, 2)
+        },
+        **simulacion
+    }
+
+
+@router.post("/montecarlo")
+async def montecarlo_sistema(request: MonteCarloDimensionamiento):
+    """
+    Monte Carlo de incertidumbre meteorológica para un sistema
+    
+    Cientos de años sintéticos (bloques de `bloque_dias` tomados de años
+    NASA distintos en la misma época) simulados hora por hora. Devuelve
+    bandas de percentiles de energía no servida, horas sin suministro y
+    SoC mínimo, probabilidad de cumplir lolp_objetivo y el almacenamiento
+    / días de autonomía mínimos que cumplen lolp_objetivo en cada año
+    (autonomia.generacion_insuficiente si el año de diseño tiene balance
+    negativo o pide más de una semana). Con la misma semilla, mismo resultado.
+    """
+    perfil, origen_carga = _perfil_carga(request)
+    if not 1 <= request.escenarios <= 20000:
+        raise HTTPException(status_code=400, detail="escenarios debe estar entre 1 y 20000")
+    if not 1 <= request.percentil_autonomia <= 100:
+        raise HTTPException(status_code=400, detail="percentil_autonomia debe estar entre 1 y 100")
+    
+    try:
+        recurso = await resource_tables.get(request.latitude, request.longitude)
+    except (ClimateCacheMiss, CircuitOpenError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error construyendo tabla de recurso: {str(e)}")
+    
+    try:
+        resultado = await asyncio.to_thread(
+            monte_carlo.simulate_sizing,
+            recurso, _configuracion(request), perfil,
+            n_scenarios=request.escenarios,
+            seed=request.semilla,
+            block_days=max(1, request.bloque_dias),
+            objective_lolp=request.lolp_objetivo,
+            autonomy_percentile=request.percentil_autonomia
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        "ubicacion": {
+            "latitude": request.latitude,
+            "longitude": request.longitude
+        },
+        "carga": {
+            "origen": origen_carga,
+            "perfil_w": [round(float(p), 1) for p in perfil],
+            "consumo_diario_kwh": round(float(sum(perfil)) / 1000, 2)
+        },
+        **resultado
+    }
+
+
+@router.post("/optimizar")
+async def optimizar_sistema(request: DimensionamientoOptimizar):
+    """
+    Optimizador de diseño: frente de Pareto costo ↔ energía no servida
+    
+    Enumera modelos y cantidades de PANELES_DISPONIBLES, TURBINAS_DISPONIBLES
+    y BATERIAS_DISPONIBLES, simula cada combinación un año hora por hora
+    (pool de procesos, de la más barata a la más cara) y corta la búsqueda
+    en cuanto se alcanza lolp_suficiente (lo más caro ya no se evalúa, así
+    que el frente llega hasta ese costo) o se agota el tiempo.
+    """
+    if request.perfil_carga_w is not None:
+        if len(request.perfil_carga_w) != 24:
+            raise HTTPException(status_code=400, detail="perfil_carga_w debe tener 24 valores (W por hora)")
+        perfil = request.perfil_carga_w
+    elif request.consumo_diario_kwh is not None:
+        perfil = residential_load_profile(request.consumo_diario_kwh)
+    else:
+        raise HTTPException(status_code=400, detail="Indicar consumo_diario_kwh o perfil_carga_w")
+    consumo_diario_kwh = float(sum(perfil)) / 1000
+    
+    try:
+        recurso = await resource_tables.get(request.latitude, request.longitude)
+    except (ClimateCacheMiss, CircuitOpenError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error construyendo tabla de recurso: {str(e)}")
+    
+    try:
+        recurso_horario = await asyncio.to_thread(hourly_resource, recurso)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    candidatos = design_optimizer.enumerate_candidates(
+        consumo_diario_kwh,
+        recurso.worst_month_solar()[1],
+        max_paneles=request.max_paneles,
+        max_turbinas=request.max_turbinas,
+        max_baterias_paralelo=request.max_baterias_paralelo,
+        voltaje_sistema=request.voltaje_sistema
+    )
+    print(f"🧮 Optimizando {len(candidatos)} combinaciones para ({request.latitude}, {request.longitude})")
+    
+    busqueda = await design_optimizer.optimize(
+        recurso_horario, perfil, candidatos,
+        lolp_suficiente=request.lolp_suficiente,
+        max_seconds=request.tiempo_max_s
+    )
+    resumen = design_optimizer.summarize(busqueda["evaluados"], request.lolp_objetivo)
+    
+    return {
+        "ubicacion": {
+            "latitude": request.latitude,
+            "longitude": request.longitude
+        },
+        "carga": {
+            "consumo_diario_kwh": round(consumo_diario_kwh, 2),
+            "perfil_w": [round(float(p), 1) for p in perfil]
+        },
+        "objetivo": {
+            "lolp_objetivo": request.lolp_objetivo,
+            "lolp_suficiente": request.lolp_suficiente
+        },
+        **resumen,
+        "busqueda": busqueda["estadisticas"]
+    }
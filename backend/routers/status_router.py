@@ -4,24 +4,20 @@ Router para verificar estado de servicios
 
 from fastapi import APIRouter
 from datetime import datetime
-import httpx
 from config import get_settings
+from services.circuit_breaker import get_all_stats
+from services.health_monitor import health_monitor
+from services.http_clients import get_client
 
 router = APIRouter(prefix="/api/status", tags=["Status"])
 
 settings = get_settings()
 
 
-@router.get("/health")
-async def health_check():
+def _build_status(external: dict) -> dict:
     """
-    Verificar estado de TODOS los servicios
-    
-    Chequea:
-    - Servidor backend (este)
-    - OpenWeather API
-    - NASA POWER API
-    - ESP32 conectados
+    Armar respuesta de salud: servicios locales (en el momento) +
+    servicios externos (resultado del monitor)
     """
     
     status = {
@@ -37,79 +33,8 @@ async def health_check():
         "version": "1.0.0"
     }
     
-    # 2. OpenWeather API
-    try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            # Test API key
-            url = f"https://api.openweathermap.org/data/2.5/weather?lat={settings.latitude}&lon={settings.longitude}&appid={settings.openweather_api_key}"
-            response = await client.get(url)
-            
-            if response.status_code == 200:
-                data = response.json()
-                status["services"]["openweather"] = {
-                    "status": "online",
-                    "name": "OpenWeather API",
-                    "response_time_ms": int(response.elapsed.total_seconds() * 1000),
-                    "api_key_valid": True,
-                    "location": data.get("name", "Unknown"),
-                    "last_update": datetime.fromtimestamp(data.get("dt", 0)).isoformat()
-                }
-            elif response.status_code == 401:
-                status["services"]["openweather"] = {
-                    "status": "error",
-                    "name": "OpenWeather API",
-                    "error": "API key inválida",
-                    "api_key_valid": False
-                }
-            else:
-                status["services"]["openweather"] = {
-                    "status": "error",
-                    "name": "OpenWeather API",
-                    "error": f"HTTP {response.status_code}"
-                }
-    except Exception as e:
-        status["services"]["openweather"] = {
-            "status": "offline",
-            "name": "OpenWeather API",
-            "error": str(e)
-        }
-    
-    # 3. NASA POWER API
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            url = "https://power.larc.nasa.gov/api/temporal/daily/point"
-            params = {
-                "parameters": "ALLSKY_SFC_SW_DWN",
-                "community": "RE",
-                "longitude": settings.longitude,
-                "latitude": settings.latitude,
-                "start": "20240101",
-                "end": "20240107",
-                "format": "JSON"
-            }
-            response = await client.get(url, params=params)
-            
-            if response.status_code == 200:
-                data = response.json()
-                status["services"]["nasa_power"] = {
-                    "status": "online",
-                    "name": "NASA POWER API",
-                    "response_time_ms": int(response.elapsed.total_seconds() * 1000),
-                    "data_available": True,
-                    "source": data.get("header", {}).get("title", "NASA POWER")
-                }
-            else:
-                status["services"]["nasa_power"] = {
-                    "status": "error",
-                    "name": "NASA POWER API",
-                    "error": f"HTTP {response.status_code}"
-                }
-    except Exception as e:
-        status["services"]["nasa_power"] = {
-            "status": "offline",
-            "name": "NASA POWER API",
-            "error": str(e)
-        }
+    # 2-3. OpenWeather / NASA POWER (chequeados por health_monitor)
+    status["services"].update(external)
     
     # 4. ESP32 dispositivos
     from routers.esp32_router import dispositivos_db
@@ -179,6 +104,42 @@ async def health_check():
     return status
 
 
+@router.get("/health")
+async def health_check():
+    """
+    Verificar estado de TODOS los servicios (respuesta inmediata)
+    
+    Chequea:
+    - Servidor backend (este)
+    - OpenWeather API y NASA POWER API: último resultado del chequeo en
+      segundo plano, con su antigüedad (age_s)
+    - ESP32 conectados
+    - Machine Learning
+    """
+    return _build_status(health_monitor.snapshot())
+
+
+@router.get("/health/deep")
+async def health_check_deep():
+    """
+    Igual que /health, pero chequeando las APIs externas en vivo
+    (en paralelo, con timeout por servicio)
+    """
+    return _build_status(await health_monitor.run_probes())
+
+
+@router.get("/circuits")
+async def circuits_status():
+    """
+    Estado de los circuit breakers de proveedores externos
+    (closed / open / half_open, tasa de fallos, fallbacks servidos)
+    """
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "circuits": get_all_stats()
+    }
+
+
 @router.get("/forecast")
 async def forecast_summary():
     """
@@ -186,74 +147,74 @@ async def forecast_summary():
     Usado por ML para mejorar predicciones
     """
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            url = f"https://api.openweathermap.org/data/2.5/forecast?lat={settings.latitude}&lon={settings.longitude}&appid={settings.openweather_api_key}&units=metric"
-            response = await client.get(url)
-            
-            if response.status_code != 200:
-                return {"error": "No se pudo obtener pronóstico"}
-            
-            data = response.json()
-            forecast_list = data.get("list", [])
+        client = get_client("openweather")
+        url = f"https://api.openweathermap.org/data/2.5/forecast?lat={settings.latitude}&lon={settings.longitude}&appid={settings.openweather_api_key}&units=metric"
+        response = await client.get(url, timeout=5.0)
+        
+        if response.status_code != 200:
+            return {"error": "No se pudo obtener pronóstico"}
+        
+        data = response.json()
+        forecast_list = data.get("list", [])
+        
+        # Agrupar por día
+        daily_summary = {}
+        
+        for item in forecast_list[:40]:  # 5 días × 8 (cada 3 horas)
+            date = item["dt_txt"].split(" ")[0]
             
-            # Agrupar por día
-            daily_summary = {}
+            if date not in daily_summary:
+                daily_summary[date] = {
+                    "date": date,
+                    "temps": [],
+                    "wind_speeds": [],
+                    "clouds": [],
+                    "rain": 0,
+                    "conditions": []
+                }
             
-            for item in forecast_list[:40]:  # 5 días × 8 (cada 3 horas)
-                date = item["dt_txt"].split(" ")[0]
-                
-                if date not in daily_summary:
-                    daily_summary[date] = {
-                        "date": date,
-                        "temps": [],
-                        "wind_speeds": [],
-                        "clouds": [],
-                        "rain": 0,
-                        "conditions": []
-                    }
-                
-                daily_summary[date]["temps"].append(item["main"]["temp"])
-                daily_summary[date]["wind_speeds"].append(item["wind"]["speed"])
-                daily_summary[date]["clouds"].append(item["clouds"]["all"])
-                
-                if "rain" in item and "3h" in item["rain"]:
-                    daily_summary[date]["rain"] += item["rain"]["3h"]
-                
-                daily_summary[date]["conditions"].append(item["weather"][0]["main"])
+            daily_summary[date]["temps"].append(item["main"]["temp"])
+            daily_summary[date]["wind_speeds"].append(item["wind"]["speed"])
+            daily_summary[date]["clouds"].append(item["clouds"]["all"])
             
-            # Calcular promedios
-            forecast_days = []
-            for date, data in daily_summary.items():
-                forecast_days.append({
-                    "date": date,
-                    "temp_avg": sum(data["temps"]) / len(data["temps"]),
-                    "temp_max": max(data["temps"]),
-                    "temp_min": min(data["temps"]),
-                    "wind_avg_ms": sum(data["wind_speeds"]) / len(data["wind_speeds"]),
-                    "wind_max_ms": max(data["wind_speeds"]),
-                    "clouds_avg": sum(data["clouds"]) / len(data["clouds"]),
-                    "rain_total_mm": data["rain"],
-                    "condition": max(set(data["conditions"]), key=data["conditions"].count),
-                    "solar_factor": 1.0 - (sum(data["clouds"]) / len(data["clouds"]) / 100) * 0.7,  # Reducción por nubes
-                    "wind_factor": sum(data["wind_speeds"]) / len(data["wind_speeds"]) / 10.0  # Normalizado
-                })
+            if "rain" in item and "3h" in item["rain"]:
+                daily_summary[date]["rain"] += item["rain"]["3h"]
             
-            return {
-                "location": {
-                    "city": data["city"]["name"],
-                    "lat": data["city"]["coord"]["lat"],
-                    "lon": data["city"]["coord"]["lon"]
-                },
-                "forecast_days": forecast_days,
-                "summary": {
-                    "avg_temp": sum(d["temp_avg"] for d in forecast_days) / len(forecast_days),
-                    "avg_wind": sum(d["wind_avg_ms"] for d in forecast_days) / len(forecast_days),
-                    "total_rain": sum(d["rain_total_mm"] for d in forecast_days),
-                    "avg_solar_factor": sum(d["solar_factor"] for d in forecast_days) / len(forecast_days),
-                    "good_solar_days": sum(1 for d in forecast_days if d["solar_factor"] > 0.7),
-                    "good_wind_days": sum(1 for d in forecast_days if d["wind_avg_ms"] > 4.0)
-                }
+            daily_summary[date]["conditions"].append(item["weather"][0]["main"])
+        
+        # Calcular promedios
+        forecast_days = []
+        for date, data in daily_summary.items():
+            forecast_days.append({
+                "date": date,
+                "temp_avg": sum(data["temps"]) / len(data["temps"]),
+                "temp_max": max(data["temps"]),
+                "temp_min": min(data["temps"]),
+                "wind_avg_ms": sum(data["wind_speeds"]) / len(data["wind_speeds"]),
+                "wind_max_ms": max(data["wind_speeds"]),
+                "clouds_avg": sum(data["clouds"]) / len(data["clouds"]),
+                "rain_total_mm": data["rain"],
+                "condition": max(set(data["conditions"]), key=data["conditions"].count),
+                "solar_factor": 1.0 - (sum(data["clouds"]) / len(data["clouds"]) / 100) * 0.7,  # Reducción por nubes
+                "wind_factor": sum(data["wind_speeds"]) / len(data["wind_speeds"]) / 10.0  # Normalizado
+            })
+        
+        return {
+            "location": {
+                "city": data["city"]["name"],
+                "lat": data["city"]["coord"]["lat"],
+                "lon": data["city"]["coord"]["lon"]
+            },
+            "forecast_days": forecast_days,
+            "summary": {
+                "avg_temp": sum(d["temp_avg"] for d in forecast_days) / len(forecast_days),
+                "avg_wind": sum(d["wind_avg_ms"] for d in forecast_days) / len(forecast_days),
+                "total_rain": sum(d["rain_total_mm"] for d in forecast_days),
+                "avg_solar_factor": sum(d["solar_factor"] for d in forecast_days) / len(forecast_days),
+                "good_solar_days": sum(1 for d in forecast_days if d["solar_factor"] > 0.7),
+                "good_wind_days": sum(1 for d in forecast_days if d["wind_avg_ms"] > 4.0)
             }
-            
+        }
+        
     except Exception as e:
         return {"error": str(e)}
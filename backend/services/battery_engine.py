@@ -0,0 +1,164 @@
+"""
+Motor de trayectoria de batería (estado de carga) vectorizado
+
+Una sola implementación para todo lo que simula la batería en el tiempo:
+la predicción de 24 h y de 5 días del InverterController, el año de
+8760 h del simulador de dimensionamiento y los miles de escenarios del
+Monte Carlo.
+
+- Series de cualquier largo y paso (step_h: 1 h, 15 min...)
+- Eficiencias de carga / descarga, límite de potencia por C-rate y
+  SoC mínimo / máximo
+- Lotes: net_w (T, B) con una batería por columna (B configuraciones o
+  B escenarios de la misma batería)
+
+El acotado e[t] = clip(e[t-1] + flujo[t], mínimo, máximo) no se puede
+resolver con un cumsum seguido de un clip (un tope alcanzado cambia todo
+lo que sigue). Pero las funciones x → clip(x + a, l, h) son cerradas por
+composición, así que la trayectoria sale de un scan asociativo en
+log2(T) pasos de NumPy (bounded_cumsum): un año de 8760 h en < 1 ms
+contra ~50 ms paso a paso. Con lotes anchos (más de SCAN_MAX_BATCH
+columnas) el bucle en el tiempo ya opera sobre B valores por paso y el
+scan, con su log2(T) de trabajo extra, deja de convenir.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Union
+
+import numpy as np
+
+
+# Desde este ancho de lote conviene recorrer el tiempo (B operaciones por paso)
+SCAN_MAX_BATCH = 8
+
+
+@dataclass(frozen=True)
+class BatterySpec:
+    """Batería para la simulación (SoC como fracción 0-1)"""
+    capacity_wh: float
+    soc_min: float = 0.0
+    soc_max: float = 1.0
+    charge_efficiency: float = 0.95
+    discharge_efficiency: float = 0.95
+    max_c_rate: float = 0.5  # Potencia máxima = C-rate × capacidad
+
+    @classmethod
+    def from_settings(cls, settings) -> "BatterySpec":
+        """Batería del sistema instalado (config.py: SoC en %)"""
+        return cls(
+            capacity_wh=settings.battery_capacity_wh,
+            soc_min=settings.min_battery_soc / 100,
+            soc_max=settings.max_battery_soc / 100,
+            charge_efficiency=settings.battery_charge_efficiency,
+            discharge_efficiency=settings.battery_discharge_efficiency,
+            max_c_rate=settings.battery_max_c_rate
+        )
+
+
+def bounded_cumsum(flow: np.ndarray, start: np.ndarray, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+    """
+    e[t] = clip(e[t-1] + flow[t], low, high) para flow (T, B), e[-1] = start
+
+    Scan de Hillis-Steele sobre f(x) = clip(x + a, l, h): componer
+    f1 y luego f2 da a = a1 + a2, l = clip(l1 + a2, l2, h2),
+    h = clip(h1 + a2, l2, h2). Los desplazamientos acumulados son un
+    cumsum; sólo los topes (l, h) se propagan en log2(T) pasos.
+    """
+    T, B = flow.shape
+    if T == 0:
+        return np.empty_like(flow)
+    if B > SCAN_MAX_BATCH:
+        return _bounded_cumsum_loop(flow, start, low, high)
+
+    shift = np.cumsum(flow, axis=0)
+    lo = np.repeat(low[None, :].astype(np.float64), T, axis=0)
+    hi = np.repeat(high[None, :].astype(np.float64), T, axis=0)
+    k = 1
+    while k < T:
+        seg = shift[k:] - shift[:-k]
+        new_lo = np.minimum(np.maximum(lo[:-k] + seg, lo[k:]), hi[k:])
+        new_hi = np.minimum(np.maximum(hi[:-k] + seg, lo[k:]), hi[k:])
+        lo[k:] = new_lo
+        hi[k:] = new_hi
+        k *= 2
+    return np.minimum(np.maximum(start[None, :] + shift, lo), hi)
+
+
+def _bounded_cumsum_loop(flow: np.ndarray, start: np.ndarray, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+    """Mismo resultado recorriendo el tiempo (lotes anchos)"""
+    energy = np.empty_like(flow)
+    e = start.astype(np.float64).copy()
+    for t in range(flow.shape[0]):
+        np.add(e, flow[t], out=e)
+        np.minimum(e, high, out=e)
+        np.maximum(e, low, out=e)
+        energy[t] = e
+    return energy
+
+
+def simulate(
+    net_w: np.ndarray,
+    batteries: Union[BatterySpec, Sequence[BatterySpec]],
+    step_h: float = 1.0,
+    initial_soc: Optional[Union[float, np.ndarray]] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Trayectoria de la batería para un balance neto (generación − consumo)
+
+    Args:
+        net_w: (T,) o (T, B) W medios por paso (positivo: sobra energía)
+        batteries: Una batería (para todas las columnas) o una por columna
+        step_h: Duración del paso en horas
+        initial_soc: SoC inicial (0-1, escalar o uno por columna;
+            default: batería en su SoC máximo)
+
+    Returns:
+        Arrays con la forma de net_w:
+        energy_wh: energía almacenada al final de cada paso
+        soc: energy_wh / capacidad (0-1)
+        charged_w: entrada a la batería desde la barra
+        discharged_w: salida de la batería hacia la carga
+        unmet_w: consumo no abastecido
+        curtailed_w: excedente que no entró a la batería
+    """
+    net_w = np.asarray(net_w, dtype=np.float64)
+    single = net_w.ndim == 1
+    net = net_w[:, None] if single else net_w
+    n_columns = net.shape[1]
+    if isinstance(batteries, BatterySpec):
+        batteries = [batteries] * n_columns
+    if len(batteries) != n_columns:
+        raise ValueError(f"{len(batteries)} baterías para {n_columns} columnas de balance")
+
+    capacity = np.array([b.capacity_wh for b in batteries], dtype=np.float64)
+    eta_c = np.array([b.charge_efficiency for b in batteries], dtype=np.float64)
+    eta_d = np.array([b.discharge_efficiency for b in batteries], dtype=np.float64)
+    p_max = capacity * np.array([b.max_c_rate for b in batteries], dtype=np.float64)
+    low = capacity * np.array([b.soc_min for b in batteries], dtype=np.float64)
+    high = capacity * np.array([b.soc_max for b in batteries], dtype=np.float64)
+    if initial_soc is None:
+        start = high
+    else:
+        start = np.clip(capacity * np.asarray(initial_soc, dtype=np.float64), low, high)
+
+    # Flujo deseado (Wh por paso, lado batería) antes de acotar el SoC
+    limited = np.clip(net, -p_max, p_max)
+    flow = np.where(limited > 0, limited * eta_c, limited / eta_d) * step_h
+    energy = bounded_cumsum(flow, start, low, high)
+
+    stored_w = np.diff(energy, axis=0, prepend=start[None, :]) / step_h
+    with np.errstate(invalid="ignore", divide="ignore"):
+        charged = np.where(stored_w > 0, stored_w / eta_c, 0.0)
+        discharged = np.where(stored_w < 0, -stored_w * eta_d, 0.0)
+        soc = np.where(capacity > 0, energy / capacity, 0.0)
+    result = {
+        "energy_wh": energy,
+        "soc": soc,
+        "charged_w": charged,
+        "discharged_w": discharged,
+        "unmet_w": np.maximum(-net - discharged, 0.0),
+        "curtailed_w": np.maximum(net - charged, 0.0),
+    }
+    if single:
+        return {name: values[:, 0] for name, values in result.items()}
+    return result
@@ -0,0 +1,290 @@
+"""
+Capa de resiliencia para proveedores externos (OpenWeather, Open-Meteo, NASA POWER)
+
+Circuit breaker por proveedor:
+
+closed    → requests normales; se abre con N fallos seguidos o cuando la
+            tasa de fallos de la ventana (últimas `window_size` llamadas)
+            supera `failure_rate_threshold`
+open      → no se llama al proveedor (fallback inmediato) durante reset_timeout_s
+half_open → se deja pasar UNA request de prueba: éxito cierra, fallo reabre
+
+Mientras el circuito está abierto (o la llamada falla) se responde con el
+último dato bueno (last-known-good) si no es demasiado viejo, y si no con
+el fallback del caller. Un proveedor caído cuesta microsegundos por
+request en lugar de esperar el timeout completo.
+
+Los breakers son compartidos por nombre (get_breaker): si un servicio
+detecta que OpenWeather está caído, los demás dejan de llamarlo también.
+Su estado se expone en /api/status/circuits.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from config import get_settings
+
+
+settings = get_settings()
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """El circuito del proveedor está abierto: no se intentó la llamada"""
+
+
+class CircuitBreaker:
+    """
+    Estado de salud de un proveedor + último dato bueno por clave
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 3,
+        reset_timeout_s: float = 30.0,
+        window_size: int = 20,
+        failure_rate_threshold: float = 0.5,
+        min_calls: int = 10,
+        last_good_max_age_s: float = 6 * 3600
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.failure_rate_threshold = failure_rate_threshold
+        self.min_calls = min_calls
+        self.last_good_max_age_s = last_good_max_age_s
+
+        self.state = STATE_CLOSED
+        self.state_since = time.monotonic()
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._window = deque(maxlen=window_size)  # True = fallo
+        self._lock = threading.Lock()  # WeatherService se usa desde hilos de trabajo
+
+        # {clave: (guardado_monotonic, valor)}
+        self._last_good: Dict[Hashable, tuple] = {}
+
+        # Métricas
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.short_circuited = 0
+        self.fallbacks = 0
+        self.last_good_served = 0
+        self.times_opened = 0
+        self.last_error: Optional[str] = None
+
+    # ===== ESTADO =====
+
+    def allow(self) -> bool:
+        """¿Se puede llamar al proveedor ahora?"""
+        if self.state == STATE_CLOSED:
+            return True
+
+        with self._lock:
+            if self.state == STATE_OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout_s:
+                    self.short_circuited += 1
+                    return False
+                self._set_state(STATE_HALF_OPEN)
+                self._trial_in_flight = False
+
+            # half_open: una sola request de prueba a la vez
+            if self._trial_in_flight:
+                self.short_circuited += 1
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.calls += 1
+            self.successes += 1
+            self._window.append(False)
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+            if self.state != STATE_CLOSED:
+                print(f"🔌 Circuito CERRADO: {self.name} (proveedor recuperado)")
+                self._set_state(STATE_CLOSED)
+
+    def record_failure(self, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self.calls += 1
+            self.failures += 1
+            self._window.append(True)
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if error is not None:
+                self.last_error = f"{type(error).__name__}: {error}"[:200]
+                print(f"❌ Error en proveedor {self.name}: {self.last_error}")
+
+            if self.state == STATE_HALF_OPEN or self._should_open():
+                if self.state != STATE_OPEN:
+                    print(
+                        f"🔌 Circuito ABIERTO: {self.name} "
+                        f"({self.consecutive_failures} fallos seguidos, "
+                        f"{self.failure_rate() * 100:.0f}% en ventana)"
+                    )
+                    self.times_opened += 1
+                    self._set_state(STATE_OPEN)
+                self.opened_at = time.monotonic()
+
+    def release_trial(self) -> None:
+        """
+        La llamada no llegó a un resultado (cancelada): liberar la prueba de
+        half_open sin contarla como éxito ni como fallo
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def failure_rate(self) -> float:
+        """Tasa de fallos en la ventana de últimas llamadas"""
+        if not self._window:
+            return 0.0
+        return sum(self._window) / len(self._window)
+
+    def _should_open(self) -> bool:
+        if self.consecutive_failures >= self.failure_threshold:
+            return True
+        return len(self._window) >= self.min_calls and self.failure_rate() >= self.failure_rate_threshold
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        self.state_since = time.monotonic()
+
+    # ===== LAST-KNOWN-GOOD =====
+
+    def remember(self, key: Hashable, value: Any) -> None:
+        """Guardar el último dato bueno para `key`"""
+        self._last_good[key] = (time.monotonic(), value)
+
+    def last_good(self, key: Hashable) -> Optional[Any]:
+        """Último dato bueno para `key` (None si no hay o es demasiado viejo)"""
+        entry = self._last_good.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.last_good_max_age_s:
+            return None
+        return entry[1]
+
+    def _fallback(self, key: Optional[Hashable], fallback: Optional[Callable[[], Any]]) -> Any:
+        if key is not None:
+            value = self.last_good(key)
+            if value is not None:
+                self.last_good_served += 1
+                return value
+        if fallback is None:
+            raise CircuitOpenError(f"Proveedor {self.name} no disponible (circuito {self.state})")
+        self.fallbacks += 1
+        return fallback()
+
+    # ===== LLAMADAS PROTEGIDAS =====
+
+    def call(
+        self,
+        fn: Callable[[], Any],
+        fallback: Optional[Callable[[], Any]] = None,
+        key: Optional[Hashable] = None
+    ) -> Any:
+        """
+        Ejecutar fn() protegida (sincrónico)
+
+        Circuito abierto o error → último dato bueno de `key` → fallback().
+        Sin fallback levanta CircuitOpenError / el error original.
+        """
+        if not self.allow():
+            return self._fallback(key, fallback)
+
+        try:
+            value = fn()
+        except Exception as e:
+            self.record_failure(e)
+            if fallback is None and (key is None or self.last_good(key) is None):
+                raise
+            return self._fallback(key, fallback)
+
+        self.record_success()
+        if key is not None:
+            self.remember(key, value)
+        return value
+
+    async def acall(
+        self,
+        fn: Callable[[], Awaitable[Any]],
+        fallback: Optional[Callable[[], Any]] = None,
+        key: Optional[Hashable] = None
+    ) -> Any:
+        """Igual que call() para corrutinas"""
+        if not self.allow():
+            return self._fallback(key, fallback)
+
+        try:
+            value = await fn()
+        except Exception as e:
+            self.record_failure(e)
+            if fallback is None and (key is None or self.last_good(key) is None):
+                raise
+            return self._fallback(key, fallback)
+        except BaseException:
+            # CancelledError (cliente desconectado, wait_for externo): sin
+            # liberar la prueba, half_open quedaría bloqueado para siempre
+            self.release_trial()
+            raise
+
+        self.record_success()
+        if key is not None:
+            self.remember(key, value)
+        return value
+
+    def get_stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "state_age_s": round(time.monotonic() - self.state_since, 1),
+            "consecutive_failures": self.consecutive_failures,
+            "failure_rate": round(self.failure_rate(), 3),
+            "window_calls": len(self._window),
+            "calls": self.calls,
+            "successes": self.successes,
+            "failures": self.failures,
+            "short_circuited": self.short_circuited,
+            "fallbacks": self.fallbacks,
+            "last_good_served": self.last_good_served,
+            "last_good_keys": len(self._last_good),
+            "times_opened": self.times_opened,
+            "last_error": self.last_error
+        }
+
+
+# ===== REGISTRO COMPARTIDO =====
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Breaker compartido del proveedor `name` (se crea con la config global)"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _registry_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = _breakers[name] = CircuitBreaker(
+                    name,
+                    failure_threshold=settings.circuit_failure_threshold,
+                    reset_timeout_s=settings.circuit_reset_timeout_s,
+                    window_size=settings.circuit_window_size,
+                    failure_rate_threshold=settings.circuit_failure_rate,
+                    min_calls=settings.circuit_min_calls,
+                    last_good_max_age_s=settings.circuit_last_good_max_age_s
+                )
+    return breaker
+
+
+def get_all_stats() -> Dict[str, Dict]:
+    """Métricas de todos los breakers"""
+    return {name: breaker.get_stats() for name, breaker in sorted(_breakers.items())}
@@ -0,0 +1,186 @@
+"""
+Caché persistente de climatología NASA POWER
+
+Las series históricas de NASA POWER para un punto no cambian: se guardan en
+SQLite (respuesta JSON comprimida con zlib) con clave
+(celda de grilla, endpoint, parámetros, período).
+
+- Celda: la grilla de meteorología de NASA POWER (MERRA-2) es 0.5° lat × 0.625° lon;
+  dos coordenadas dentro de la misma celda reciben los mismos datos.
+- Modo offline: no se consulta la red; un miss levanta ClimateCacheMiss.
+"""
+
+import json
+import sqlite3
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+# Resolución de la grilla NASA POWER (meteorología)
+GRID_LAT_DEG = 0.5
+GRID_LON_DEG = 0.625
+
+
+class ClimateCacheMiss(LookupError):
+    """No hay datos en caché y el modo offline impide ir a la red"""
+
+
+def grid_cell(latitude: float, longitude: float) -> Tuple[float, float]:
+    """Centro de la celda de grilla que contiene la coordenada"""
+    lat = round(round(latitude / GRID_LAT_DEG) * GRID_LAT_DEG, 4)
+    lon = round(round(longitude / GRID_LON_DEG) * GRID_LON_DEG, 4)
+    return lat, lon
+
+
+class ClimateCache:
+    """
+    Almacén SQLite de respuestas NASA POWER
+    """
+
+    def __init__(self, path: str, offline: bool = False):
+        self.path = Path(path)
+        self.offline = offline
+
+        self.hits = 0
+        self.misses = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS climate_cache (
+                    key TEXT PRIMARY KEY,
+                    lat_cell REAL NOT NULL,
+                    lon_cell REAL NOT NULL,
+                    endpoint TEXT NOT NULL,
+                    parameters TEXT NOT NULL,
+                    period TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    payload BLOB NOT NULL
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_climate_cell ON climate_cache (lat_cell, lon_cell)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # Conexión por operación: segura desde el event loop y desde hilos.
+        # `with conn` sólo hace commit / rollback: el cierre es explícito
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(
+        latitude: float,
+        longitude: float,
+        endpoint: str,
+        parameters: List[str],
+        start: str,
+        end: str
+    ) -> Tuple[str, float, float, str, str]:
+        """Clave canónica: (key, lat_cell, lon_cell, parámetros, período)"""
+        lat_cell, lon_cell = grid_cell(latitude, longitude)
+        params = ",".join(sorted(parameters))
+        period = f"{start}-{end}"
+        key = f"{endpoint}|{lat_cell:.4f}|{lon_cell:.4f}|{params}|{period}"
+        return key, lat_cell, lon_cell, params, period
+
+    def get(
+        self,
+        latitude: float,
+        longitude: float,
+        endpoint: str,
+        parameters: List[str],
+        start: str,
+        end: str
+    ) -> Optional[Dict]:
+        """Respuesta cacheada o None"""
+        key = self.make_key(latitude, longitude, endpoint, parameters, start, end)[0]
+        with self._connect() as conn:
+            row = conn.execute("SELECT payload FROM climate_cache WHERE key = ?", (key,)).fetchone()
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(
+        self,
+        latitude: float,
+        longitude: float,
+        endpoint: str,
+        parameters: List[str],
+        start: str,
+        end: str,
+        data: Dict
+    ) -> None:
+        """Guardar respuesta (comprimida)"""
+        key, lat_cell, lon_cell, params, period = self.make_key(
+            latitude, longitude, endpoint, parameters, start, end
+        )
+        payload = zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"), 6)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO climate_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, lat_cell, lon_cell, endpoint, params, period, time.time(), payload)
+            )
+
+    def require(
+        self,
+        latitude: float,
+        longitude: float,
+        endpoint: str,
+        parameters: List[str],
+        start: str,
+        end: str
+    ) -> Optional[Dict]:
+        """
+        Como get(), pero en modo offline un miss levanta ClimateCacheMiss
+        (el caller sólo va a la red si esto retorna None)
+        """
+        data = self.get(latitude, longitude, endpoint, parameters, start, end)
+        if data is None and self.offline:
+            cell = grid_cell(latitude, longitude)
+            raise ClimateCacheMiss(
+                f"Sin datos climáticos en caché para celda {cell} ({endpoint} {start}-{end}) y modo offline activo"
+            )
+        return data
+
+    def get_stats(self) -> Dict:
+        """Estado de la caché"""
+        with self._connect() as conn:
+            entries, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM climate_cache"
+            ).fetchone()
+            cells = conn.execute(
+                "SELECT COUNT(DISTINCT lat_cell || ',' || lon_cell) FROM climate_cache"
+            ).fetchone()[0]
+
+        return {
+            "path": str(self.path),
+            "offline": self.offline,
+            "entries": entries,
+            "grid_cells": cells,
+            "compressed_bytes": size,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+def _default_cache() -> ClimateCache:
+    from config import get_settings
+    settings = get_settings()
+    return ClimateCache(settings.climate_cache_path, offline=settings.climate_offline)
+
+
+# Singleton instance
+climate_cache = _default_cache()
@@ -0,0 +1,292 @@
+"""
+Planificador de lazos de control a tasa fija
+
+Antes todo el control corría en periodic_update con asyncio.sleep(30):
+el período real era 30 s + lo que tardara el ciclo (deriva acumulada),
+una re-planificación lenta retrasaba todo lo demás y nada medía cuánto
+tarde corría cada ciclo. Acá cada lazo tiene su propio período:
+
+- Protección (1-10 Hz): corre dentro del planificador, antes que
+  cualquier otro lazo vencido en el mismo instante; debe ser liviana
+- Despacho (1 min) y pronóstico (15 min): se lanzan como tareas; lo
+  pesado en CPU (offload=True o run_heavy) va a un pool de hilos propio,
+  así el lazo rápido nunca espera trabajo lento
+
+Los ticks se calculan sobre instantes absolutos (inicio + k × período),
+no sumando sleeps: no hay deriva. Si un lazo se atrasa más de un período
+se saltean los ticks perdidos (no se corren en ráfaga) y se cuentan. Un
+tick que termina después de su deadline (por defecto, el período) es un
+deadline incumplido; si el anterior sigue corriendo, el nuevo se saltea
+(solapado). Atraso de inicio y duración quedan en histogramas por lazo.
+
+El GIL sigue siendo compartido: un paso pesado en un hilo puede demorar
+al loop de eventos hasta sys.getswitchinterval() (5 ms) por cambio, muy
+por debajo del período de protección.
+"""
+
+import asyncio
+import heapq
+import inspect
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from config import get_settings
+
+
+settings = get_settings()
+
+# Prioridades (menor = antes)
+PROTECTION = 0
+CONTROL = 1
+BACKGROUND = 2
+PRIORITY_NAMES = {PROTECTION: "proteccion", CONTROL: "control", BACKGROUND: "segundo_plano"}
+
+# Límites superiores de las cubetas de los histogramas (ms)
+HISTOGRAM_BOUNDS_MS = (0.1, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+
+
+class Histogram:
+    """Histograma de tiempos (ms) con cubetas fijas: memoria constante"""
+
+    def __init__(self, bounds_ms: Sequence[float] = HISTOGRAM_BOUNDS_MS):
+        self.bounds_ms = tuple(bounds_ms)
+        self.counts = [0] * (len(self.bounds_ms) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, value_ms: float) -> None:
+        index = 0
+        while index < len(self.bounds_ms) and value_ms > self.bounds_ms[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total_ms += value_ms
+        self.max_ms = max(self.max_ms, value_ms)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Cota superior de la cubeta que contiene el cuantil q"""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and count:
+                return self.bounds_ms[index] if index < len(self.bounds_ms) else self.max_ms
+        return self.max_ms
+
+    def snapshot(self) -> Dict:
+        labels = [f"<={bound:g}" for bound in self.bounds_ms] + [f">{self.bounds_ms[-1]:g}"]
+        return {
+            "n": self.count,
+            "promedio_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": self.quantile(0.50),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "cubetas_ms": {label: count for label, count in zip(labels, self.counts) if count},
+        }
+
+
+Step = Callable[[], Any]
+
+
+class ControlLoop:
+    """Un lazo periódico y sus métricas"""
+
+    def __init__(self, name: str, period_s: float, step: Step, priority: int = CONTROL,
+                 offload: bool = False, deadline_s: Optional[float] = None):
+        if period_s <= 0:
+            raise ValueError(f"Período inválido para '{name}': {period_s}")
+        self.name = name
+        self.period_s = period_s
+        self.step = step
+        self.priority = priority
+        self.offload = offload
+        self.deadline_s = deadline_s if deadline_s is not None else period_s
+
+        self.ticks = 0
+        self.deadline_misses = 0
+        self.skipped = 0  # Ticks perdidos por atraso del planificador
+        self.overlapped = 0  # Ticks salteados porque el anterior seguía corriendo
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self.last_result: Any = None
+        self.last_finished: Optional[float] = None  # time.time()
+        self.lateness = Histogram()
+        self.duration = Histogram()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def busy(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def result(self, max_age_s: Optional[float] = None) -> Any:
+        """Último resultado del paso (None si nunca corrió o es más viejo que max_age_s)"""
+        if self.last_finished is None:
+            return None
+        if max_age_s is not None and time.time() - self.last_finished > max_age_s:
+            return None
+        return self.last_result
+
+    def snapshot(self) -> Dict:
+        return {
+            "periodo_s": self.period_s,
+            "frecuencia_hz": round(1 / self.period_s, 3),
+            "prioridad": PRIORITY_NAMES.get(self.priority, self.priority),
+            "en_hilo": self.offload,
+            "deadline_s": self.deadline_s,
+            "ticks": self.ticks,
+            "deadlines_incumplidos": self.deadline_misses,
+            "ticks_perdidos": self.skipped,
+            "ticks_solapados": self.overlapped,
+            "errores": self.errors,
+            "ultimo_error": self.last_error,
+            "en_curso": self.busy,
+            "ultimo_fin": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.last_finished))
+            if self.last_finished else None,
+            "atraso_inicio": self.lateness.snapshot(),
+            "duracion": self.duration.snapshot(),
+        }
+
+
+class ControlScheduler:
+    """
+    Corre los lazos registrados sobre un único reloj monotónico
+    """
+
+    def __init__(self, max_workers: int = 2, clock: Callable[[], float] = time.monotonic):
+        self.max_workers = max_workers
+        self.clock = clock
+        self.loops: Dict[str, ControlLoop] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._task: Optional[asyncio.Task] = None
+        self._started_at: Optional[float] = None
+
+    def add_loop(self, name: str, period_s: float, step: Step, priority: int = CONTROL,
+                 offload: bool = False, deadline_s: Optional[float] = None) -> ControlLoop:
+        """
+        Registrar un lazo
+
+        Args:
+            step: Función o corrutina sin argumentos; su retorno queda en
+                loop.last_result
+            offload: Correr step (sincrónica) en el pool de hilos
+            deadline_s: Tiempo desde el tick programado hasta el fin
+                (default: el período)
+        """
+        if offload and inspect.iscoroutinefunction(step):
+            raise ValueError(f"'{name}': offload sólo aplica a funciones sincrónicas")
+        loop = ControlLoop(name, period_s, step, priority, offload, deadline_s)
+        self.loops[name] = loop
+        return loop
+
+    def result(self, name: str, max_age_s: Optional[float] = None) -> Any:
+        loop = self.loops.get(name)
+        return loop.result(max_age_s) if loop is not None else None
+
+    async def run_heavy(self, fn: Callable, *args):
+        """Correr trabajo pesado en CPU fuera del loop de eventos (pool propio)"""
+        return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="control")
+        return self._executor
+
+    async def _execute(self, loop: ControlLoop, scheduled: float) -> None:
+        started = self.clock()
+        loop.lateness.observe((started - scheduled) * 1000)
+        try:
+            if loop.offload:
+                result = await self.run_heavy(loop.step)
+            else:
+                result = loop.step()
+                if inspect.isawaitable(result):
+                    result = await result
+            loop.last_result = result
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            loop.errors += 1
+            loop.last_error = f"{type(e).__name__}: {e}"
+            print(f"⚠️ Lazo de control '{loop.name}': {loop.last_error}")
+        finished = self.clock()
+        loop.ticks += 1
+        loop.last_finished = time.time()
+        loop.duration.observe((finished - started) * 1000)
+        if finished - scheduled > loop.deadline_s:
+            loop.deadline_misses += 1
+
+    async def _launch(self, loop: ControlLoop, scheduled: float) -> None:
+        if loop.busy:
+            loop.overlapped += 1
+            return
+        if loop.priority == PROTECTION and not loop.offload:
+            # Protección: antes de lanzar cualquier otro lazo vencido
+            await self._execute(loop, scheduled)
+        else:
+            loop._task = asyncio.create_task(self._execute(loop, scheduled))
+
+    async def _run(self) -> None:
+        start = self.clock()
+        # (próximo tick, prioridad, orden de registro, nombre)
+        heap: List[Tuple[float, int, int, str]] = [
+            (start, loop.priority, order, name) for order, (name, loop) in enumerate(self.loops.items())
+        ]
+        heapq.heapify(heap)
+        while heap:
+            now = self.clock()
+            due = []
+            while heap and heap[0][0] <= now:
+                due.append(heapq.heappop(heap))
+            due.sort(key=lambda entry: (entry[1], entry[0]))
+
+            for scheduled, priority, order, name in due:
+                loop = self.loops[name]
+                await self._launch(loop, scheduled)
+
+                # Próximo tick sobre la grilla absoluta; los perdidos se saltean
+                next_tick = scheduled + loop.period_s
+                now = self.clock()
+                if next_tick <= now:
+                    missed = int((now - next_tick) // loop.period_s) + 1
+                    loop.skipped += missed
+                    next_tick += missed * loop.period_s
+                heapq.heappush(heap, (next_tick, priority, order, name))
+
+            await asyncio.sleep(max(0.0, heap[0][0] - self.clock()))
+
+    def start(self) -> None:
+        """Iniciar todos los lazos registrados"""
+        if self._task is None or self._task.done():
+            self._started_at = time.time()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Detener el planificador, cancelar pasos en curso y cerrar el pool"""
+        tasks = [loop._task for loop in self.loops.values() if loop.busy]
+        if self._task is not None:
+            tasks.append(self._task)
+            self._task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict:
+        return {
+            "activo": self._task is not None and not self._task.done(),
+            "iniciado": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self._started_at))
+            if self._started_at else None,
+            "hilos": self.max_workers,
+            "lazos": {name: loop.snapshot() for name, loop in self.loops.items()},
+        }
+
+
+# Instancia global (los lazos se registran en main.py)
+control_scheduler = ControlScheduler(max_workers=settings.control_workers)
@@ -0,0 +1,380 @@
+"""
+Optimizador del espacio de diseño: paneles × turbinas × baterías
+
+Enumera combinaciones de DimensionamientoService.PANELES_DISPONIBLES,
+TURBINAS_DISPONIBLES y BATERIAS_DISPONIBLES (modelo y cantidad), simula
+cada una un año hora por hora (services/energy_simulator.py) y devuelve
+el frente de Pareto costo ↔ energía no servida.
+
+- Las combinaciones se ordenan por costo y se evalúan en lotes en un
+  pool de procesos (simulate_batch por lote: un paso NumPy por hora para
+  todo el lote). El pool arranca con "spawn" (el servidor tiene hilos) y
+  recibe el recurso y el perfil de carga una sola vez, en el initializer:
+  cada lote viaja sólo con sus configuraciones. Se reutiliza mientras el
+  sitio sea el mismo
+- Terminación temprana: en cuanto una combinación alcanza la confiabilidad
+  "suficiente" (lolp_suficiente), lo más caro no se envía y los lotes que
+  todavía no arrancaron se cancelan. Con lolp_suficiente = 0 es dominancia
+  estricta; con un valor mayor es una poda por "suficiente": algo más caro
+  podría servir todavía más energía, así que el frente de Pareto llega
+  hasta el corte de costo. También hay tope de tiempo.
+- Frente de Pareto: ninguna combinación del frente es a la vez más cara y
+  menos confiable que otra (entre las evaluadas)
+"""
+
+import asyncio
+import hashlib
+import math
+import multiprocessing
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import get_settings
+from services.dimensionamiento_service import (
+    ComponenteBateria, ComponenteEolico, ComponenteSolar, dimensionamiento_service
+)
+from services.energy_simulator import HourlyResource, SystemConfig, simulate_batch
+
+
+settings = get_settings()
+
+# Tolerancia para comparar confiabilidades (fracción de energía no servida)
+LOLP_EPSILON = 1e-9
+
+# Cantidades de paneles a probar por modelo (como máximo)
+MAX_PANEL_STEPS = 40
+
+
+@dataclass
+class Candidate:
+    """Combinación de componentes con su costo"""
+    panel: Optional[ComponenteSolar]
+    num_paneles: int
+    turbina: Optional[ComponenteEolico]
+    num_turbinas: int
+    bateria: Optional[ComponenteBateria]
+    baterias_paralelo: int
+    voltaje_sistema: int
+    costo_usd: float
+
+    @property
+    def capacidad_bateria_wh(self) -> float:
+        if self.bateria is None:
+            return 0.0
+        return self.baterias_paralelo * self.bateria.capacidad_ah * self.voltaje_sistema
+
+    def to_config(self) -> SystemConfig:
+        service = dimensionamiento_service
+        return SystemConfig(
+            pv_w=self.num_paneles * self.panel.potencia_w if self.panel else 0.0,
+            turbine_count=self.num_turbinas,
+            turbine_diameter_m=self.turbina.diametro_m if self.turbina else 0.0,
+            turbine_rated_w=self.turbina.potencia_w if self.turbina else 0.0,
+            turbine_cut_in_ms=self.turbina.velocidad_arranque_ms if self.turbina else 3.0,
+            hub_height_m=service.ALTURA_VIENTO_M,
+            battery_wh=self.capacidad_bateria_wh,
+            battery_dod=service.PROFUNDIDAD_DESCARGA_BATERIA,
+            pv_system_efficiency=service.EFICIENCIA_SISTEMA_SOLAR,
+            turbine_efficiency=service.EFICIENCIA_TURBINA_REAL
+        )
+
+    def describe(self) -> Dict:
+        return {
+            "paneles": {
+                "modelo": self.panel.nombre if self.panel else None,
+                "cantidad": self.num_paneles,
+                "potencia_total_w": self.num_paneles * self.panel.potencia_w if self.panel else 0
+            },
+            "turbinas": {
+                "modelo": self.turbina.nombre if self.turbina else None,
+                "cantidad": self.num_turbinas,
+                "potencia_total_w": self.num_turbinas * self.turbina.potencia_w if self.turbina else 0
+            },
+            "baterias": {
+                "modelo": self.bateria.nombre if self.bateria else None,
+                "configuracion": f"{self.voltaje_sistema // self.bateria.voltaje}S × {self.baterias_paralelo}P"
+                    if self.bateria else None,
+                "capacidad_kwh": round(self.capacidad_bateria_wh / 1000, 2)
+            },
+            "costo_usd": round(self.costo_usd, 0)
+        }
+
+
+def enumerate_candidates(
+    consumo_diario_kwh: float,
+    hsp_peor_mes: float,
+    max_paneles: Optional[int] = None,
+    max_turbinas: int = 3,
+    max_baterias_paralelo: int = 6,
+    voltaje_sistema: int = 48
+) -> List[Candidate]:
+    """
+    Todas las combinaciones (modelo × cantidad) de cada componente,
+    ordenadas por costo
+
+    Sin max_paneles: hasta la potencia FV que cubre 2× el consumo con el
+    HSP del peor mes. Con muchos paneles posibles se recorren ~MAX_PANEL_STEPS
+    cantidades por modelo.
+    """
+    service = dimensionamiento_service
+
+    solares = [(None, 0)]
+    for panel in service.PANELES_DISPONIBLES:
+        limite = max_paneles
+        if limite is None:
+            pico_w = 2 * consumo_diario_kwh * 1000 / (max(hsp_peor_mes, 0.5) * service.EFICIENCIA_SISTEMA_SOLAR)
+            limite = max(1, math.ceil(pico_w / panel.potencia_w))
+        paso = max(1, math.ceil(limite / MAX_PANEL_STEPS))
+        solares += [(panel, n) for n in range(paso, limite + 1, paso)]
+
+    eolicos = [(None, 0)] + [
+        (turbina, n) for turbina in service.TURBINAS_DISPONIBLES for n in range(1, max_turbinas + 1)
+    ]
+    baterias = [(None, 0)] + [
+        (bateria, n) for bateria in service.BATERIAS_DISPONIBLES for n in range(1, max_baterias_paralelo + 1)
+    ]
+
+    costo_solar = [service.costo_solar_usd(p, n) if p else 0.0 for p, n in solares]
+    costo_eolico = [service.costo_eolico_usd(t, n) if t else 0.0 for t, n in eolicos]
+    costo_bateria = [
+        service.costo_bateria_usd(b, (voltaje_sistema // b.voltaje) * n) if b else 0.0 for b, n in baterias
+    ]
+
+    candidates = [
+        Candidate(p, np_, t, nt, b, nb, voltaje_sistema, cs + ce + cb)
+        for (p, np_), cs in zip(solares, costo_solar)
+        for (t, nt), ce in zip(eolicos, costo_eolico)
+        for (b, nb), cb in zip(baterias, costo_bateria)
+        if np_ > 0 or nt > 0  # Sin generación no hay nada que evaluar
+    ]
+    candidates.sort(key=lambda c: c.costo_usd)
+    return candidates
+
+
+def pareto_front(costs: np.ndarray, lolps: np.ndarray) -> np.ndarray:
+    """
+    Índices del frente de Pareto (minimizar costo y energía no servida),
+    ordenados por costo
+    """
+    order = np.lexsort((lolps, costs))
+    front = []
+    best = math.inf
+    for i in order.tolist():
+        if lolps[i] < best - LOLP_EPSILON:
+            front.append(i)
+            best = lolps[i]
+    return np.array(front, dtype=np.int64)
+
+
+def _evaluate_chunk(resource: HourlyResource, load_profile_w: np.ndarray, configs: List[SystemConfig]) -> List[Dict]:
+    """Métricas reducidas de un lote"""
+    metrics = simulate_batch(resource, configs, load_profile_w)
+    keep = ("lolp", "lolh", "unmet_wh", "curtailment_fraction", "equivalent_cycles", "longest_outage_h")
+    return [{k: m[k] for k in keep} for m in metrics]
+
+
+# Recurso y perfil del sitio en cada proceso del pool (fijados por _init_worker)
+_worker_site: Optional[Tuple[HourlyResource, np.ndarray]] = None
+
+
+def _init_worker(resource: HourlyResource, load_profile_w: np.ndarray) -> None:
+    global _worker_site
+    _worker_site = (resource, load_profile_w)
+
+
+def _evaluate_chunk_in_worker(configs: List[SystemConfig]) -> List[Dict]:
+    """Trabajo de un proceso del pool: el lote contra el sitio del initializer"""
+    return _evaluate_chunk(*_worker_site, configs)
+
+
+_workers = settings.optimizer_workers or os.cpu_count() or 1
+_mp = multiprocessing.get_context("spawn")
+
+# Pools por sitio (huella de recurso + perfil); se conservan los que están en
+# uso y el último usado, el resto se cierra
+_executors: "OrderedDict[str, ProcessPoolExecutor]" = OrderedDict()
+_executor_users: Dict[str, int] = {}
+
+
+def _site_key(resource: HourlyResource, load_profile_w: np.ndarray) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.array([resource.latitude, resource.longitude, resource.shear_alpha]).tobytes())
+    for values in (resource.times, resource.ghi_w_m2, resource.wind10_ms, resource.temperature_c, load_profile_w):
+        digest.update(np.ascontiguousarray(values).tobytes())
+    return digest.hexdigest()
+
+
+def acquire_executor(resource: HourlyResource, load_profile_w: np.ndarray) -> Tuple[str, ProcessPoolExecutor]:
+    """Pool con el sitio ya cargado en cada proceso (se crea al primer uso del sitio)"""
+    key = _site_key(resource, load_profile_w)
+    executor = _executors.get(key)
+    if executor is None:
+        executor = _executors[key] = ProcessPoolExecutor(
+            max_workers=_workers, mp_context=_mp,
+            initializer=_init_worker, initargs=(resource, load_profile_w)
+        )
+        print(f"🧮 Pool del optimizador: {_workers} procesos")
+    _executors.move_to_end(key)
+    _executor_users[key] = _executor_users.get(key, 0) + 1
+    return key, executor
+
+
+def release_executor(key: str) -> None:
+    """Liberar el pool; se cierran los que quedan ociosos salvo el último usado"""
+    _executor_users[key] -= 1
+    last = next(reversed(_executors))
+    for other in list(_executors):
+        if other != last and not _executor_users.get(other):
+            _executor_users.pop(other, None)
+            _executors.pop(other).shutdown(wait=False)
+
+
+def shutdown_executor() -> None:
+    for executor in _executors.values():
+        executor.shutdown(wait=False, cancel_futures=True)
+    _executors.clear()
+    _executor_users.clear()
+
+
+async def optimize(
+    resource: HourlyResource,
+    load_profile_w: np.ndarray,
+    candidates: Sequence[Candidate],
+    lolp_suficiente: float = 0.0,
+    max_seconds: Optional[float] = None,
+    chunk_size: Optional[int] = None
+) -> Dict:
+    """
+    Evaluar candidatos (ordenados por costo) con terminación temprana
+
+    Returns:
+        {"evaluados": [(candidato, métricas)], "estadisticas": {...}}
+    """
+    chunk_size = chunk_size or settings.optimizer_chunk_size
+    max_seconds = settings.optimizer_max_seconds if max_seconds is None else max_seconds
+    started = time.perf_counter()
+    deadline = started + max_seconds
+
+    chunks = [list(candidates[i:i + chunk_size]) for i in range(0, len(candidates), chunk_size)]
+    load = np.asarray(load_profile_w, dtype=np.float64)
+    loop = asyncio.get_running_loop()
+
+    # Búsquedas chicas: un solo lote en un hilo, sin costo de pool
+    in_process = len(chunks) <= 1
+    executor_key, executor = (None, None) if in_process else acquire_executor(resource, load)
+    workers = 1 if in_process else _workers
+    window = 2 * workers
+
+    evaluated = []
+    cost_cutoff = math.inf
+    pending: Dict[asyncio.Future, List[Candidate]] = {}
+    # Future del pool por lote (None en hilo): sólo ese sabe si el lote ya arrancó
+    handles: Dict[asyncio.Future, Optional[Future]] = {}
+    next_chunk = 0
+    pruned = 0
+    timed_out = False
+
+    try:
+        while next_chunk < len(chunks) or pending:
+            # Enviar lotes mientras haya lugar y no estén por encima del corte
+            while next_chunk < len(chunks) and len(pending) < window:
+                chunk = chunks[next_chunk]
+                if chunk[0].costo_usd > cost_cutoff:
+                    pruned += sum(len(c) for c in chunks[next_chunk:])
+                    next_chunk = len(chunks)
+                    break
+                configs = [c.to_config() for c in chunk]
+                if in_process:
+                    handle = None
+                    future = asyncio.ensure_future(asyncio.to_thread(_evaluate_chunk, resource, load, configs))
+                else:
+                    handle = executor.submit(_evaluate_chunk_in_worker, configs)
+                    future = asyncio.wrap_future(handle)
+                pending[future] = chunk
+                handles[future] = handle
+                next_chunk += 1
+
+            if not pending:
+                break
+
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                timed_out = True
+                break
+            done, _ = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                chunk = pending.pop(future)
+                del handles[future]
+                for candidate, metrics in zip(chunk, future.result()):
+                    evaluated.append((candidate, metrics))
+                    if metrics["lolp"] <= lolp_suficiente + LOLP_EPSILON:
+                        cost_cutoff = min(cost_cutoff, candidate.costo_usd)
+
+            # Lotes en vuelo por encima del corte: cancelar los que no arrancaron
+            # (Future.cancel() del pool es False si ya corre: se espera y se usa)
+            for future, chunk in list(pending.items()):
+                handle = handles[future]
+                if chunk[0].costo_usd > cost_cutoff and handle is not None and handle.cancel():
+                    pruned += len(chunk)
+                    del pending[future], handles[future]
+
+        # Tiempo agotado: lo pendiente y lo no enviado queda sin evaluar
+        not_evaluated = sum(len(chunk) for chunk in pending.values())
+        for future in pending:
+            future.cancel()
+        if timed_out:
+            not_evaluated += sum(len(c) for c in chunks[next_chunk:])
+    finally:
+        if executor_key is not None:
+            release_executor(executor_key)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "evaluados": evaluated,
+        "estadisticas": {
+            "candidatos": len(candidates),
+            "evaluados": len(evaluated),
+            "descartados_por_suficiencia": pruned,
+            "sin_evaluar_por_tiempo": not_evaluated,
+            "corte_costo_usd": None if math.isinf(cost_cutoff) else round(cost_cutoff, 0),
+            "tiempo_agotado": timed_out,
+            "procesos": workers,
+            "tiempo_s": round(elapsed, 2),
+            "ms_por_configuracion": round(elapsed * 1000 / len(evaluated), 2) if evaluated else None
+        }
+    }
+
+
+def summarize(evaluated: List, lolp_objetivo: float) -> Dict:
+    """Frente de Pareto + recomendación (la más barata que cumple el objetivo)"""
+    if not evaluated:
+        return {"frente_pareto": [], "recomendado": None}
+
+    costs = np.array([c.costo_usd for c, _ in evaluated])
+    lolps = np.array([m["lolp"] for _, m in evaluated])
+
+    def entry(i: int) -> Dict:
+        candidate, metrics = evaluated[i]
+        return {
+            **candidate.describe(),
+            "fraccion_energia_no_servida": round(metrics["lolp"], 5),
+            "cobertura_horaria_porcentaje": round((1 - metrics["lolp"]) * 100, 2),
+            "horas_sin_suministro": metrics["lolh"],
+            "corte_mas_largo_h": metrics["longest_outage_h"],
+            "vertido_porcentaje": round(metrics["curtailment_fraction"] * 100, 1),
+            "ciclos_equivalentes": round(metrics["equivalent_cycles"], 1)
+        }
+
+    front = pareto_front(costs, lolps)
+    feasible = np.flatnonzero(lolps <= lolp_objetivo + LOLP_EPSILON)
+    recommended = int(feasible[np.argmin(costs[feasible])]) if len(feasible) else None
+    return {
+        "frente_pareto": [entry(i) for i in front.tolist()],
+        "recomendado": entry(recommended) if recommended is not None else None
+    }
@@ -0,0 +1,432 @@
+"""
+Runtime por dispositivo para sitios con varios ESP32 / inversores
+
+inverter_controller, wind_protection, battery_protection,
+efficiency_monitor y pattern_learner son instancias globales con un solo
+estado: con varios pares ESP32 / inversor todo se mezclaba en el mismo
+current_state e historial. Acá cada device_id tiene su propio contexto
+(controlador, protecciones, monitor de eficiencia y aprendizaje de
+patrones), creado recién con su primera telemetría:
+
+- Memoria acotada por contexto: historial de consumo del controlador
+  (100), eficiencia (100) y registros del PatternLearner con tope
+  (learner_max_records, muestreados cada learner_interval_s)
+- Desalojo: contextos sin telemetría por más de idle_s se descartan en
+  el barrido periódico y, si se llega a max_devices, el menos usado.
+  Nunca se desaloja un dispositivo con una protección activa (keep)
+- map(): evalúa todos los contextos en paralelo en un pool de hilos,
+  con concurrencia acotada y un lock por contexto
+- LocalRuntime: registro + ProtectionEngine enlazados, con la misma
+  interfaz asíncrona que ShardSupervisor (services/shard_supervisor.py),
+  que reparte los dispositivos entre procesos worker
+
+Las instancias globales siguen siendo el "sitio" para los endpoints que
+no reciben device_id. Las protecciones de cada contexto arrancan con los
+umbrales configurados en las globales.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from battery_protection import BatteryProtectionSystem, battery_protection
+from efficiency_monitor import EfficiencyMonitor
+from inverter_controller import InverterController
+from pattern_learner import PatternLearner
+from services.protection_engine import Command, ProtectionEngine
+from wind_protection import WindProtectionSystem, wind_protection
+
+
+class DeviceContext:
+    """Estado de control y protección de un dispositivo"""
+
+    def __init__(self, device_id: str, learner_max_records: Optional[int] = None):
+        self.device_id = device_id
+        self.controller = InverterController()
+        self.wind = WindProtectionSystem(
+            max_wind_speed_ms=wind_protection.max_wind_speed_ms,
+            max_rpm=wind_protection.max_rpm,
+            max_voltage=wind_protection.max_voltage,
+            brake_resistor_ohms=wind_protection.brake_resistor_ohms,
+            brake_resistor_watts=wind_protection.brake_resistor_watts
+        )
+        self.battery = BatteryProtectionSystem(
+            min_soc_optimal=battery_protection.min_soc_optimal,
+            max_soc_optimal=battery_protection.max_soc_optimal,
+            critical_min_soc=battery_protection.critical_min_soc,
+            critical_max_soc=battery_protection.critical_max_soc
+        )
+        self.efficiency = EfficiencyMonitor()
+        self.learner = PatternLearner(max_records=learner_max_records)
+
+        self.created_at = time.time()
+        self.last_seen = time.monotonic()
+        self.samples = 0
+        self.last_decision: Optional[Dict] = None
+        self._learned_at = 0.0  # time.monotonic() del último registro de consumo
+        self.lock = threading.Lock()
+
+    def apply_sample(self, sample, learner_interval_s: float) -> None:
+        """Actualizar el estado del controlador con la última muestra del ESP32"""
+        state = self.controller.current_state
+        self.controller.update_state({
+            'solar_power_w': sample.potencia_solar,
+            'wind_power_w': sample.potencia_eolica,
+            'battery_soc_percent': sample.soc if sample.soc > 0 else state['battery_soc_percent'],
+            'battery_power_w': state['battery_power_w'],
+            'load_power_w': sample.potencia_consumo,
+            'grid_available': state['grid_available'],
+        })
+        self.samples += 1
+        now = time.monotonic()
+        self.last_seen = now
+        if now - self._learned_at >= learner_interval_s:
+            self._learned_at = now
+            self.learner.add_consumption_record(datetime.now(), sample.potencia_consumo)
+
+    def decide(self) -> Dict:
+        """Decisión del controlador de este dispositivo (queda en last_decision)"""
+        self.last_decision = self.controller.make_decision()
+        return self.last_decision
+
+    def export_state(self) -> Dict:
+        """Estado serializable del contexto (migración a otro proceso)"""
+        return {
+            'creado': self.created_at,
+            'ultimo_contacto': self.last_seen,
+            'muestras': self.samples,
+            'decision': self.last_decision,
+            'modo_auto': self.controller.auto_mode,
+            'fuente': self.controller.current_source,
+            'estado': dict(self.controller.current_state),
+            'consumo_controlador': list(self.controller.consumption_history),
+            'patrones': list(self.learner.consumption_history),
+            'eficiencia_solar': list(self.efficiency.historial_eficiencia_solar),
+            'eficiencia_eolica': list(self.efficiency.historial_eficiencia_eolica),
+        }
+
+    def import_state(self, state: Dict) -> None:
+        """Restaurar lo exportado por export_state (en otro proceso)"""
+        self.created_at = state['creado']
+        self.last_seen = state['ultimo_contacto']  # time.monotonic() es del sistema, no del proceso
+        self.samples = state['muestras']
+        self.last_decision = state['decision']
+        self.controller.auto_mode = state['modo_auto']
+        self.controller.current_source = state['fuente']
+        self.controller.current_state.update(state['estado'])
+        self.controller.consumption_history = state['consumo_controlador']
+        self.learner.consumption_history = state['patrones']
+        self.efficiency.historial_eficiencia_solar = state['eficiencia_solar']
+        self.efficiency.historial_eficiencia_eolica = state['eficiencia_eolica']
+
+    def idle_s(self, now: Optional[float] = None) -> float:
+        return (time.monotonic() if now is None else now) - self.last_seen
+
+    def snapshot(self) -> Dict:
+        return {
+            'device_id': self.device_id,
+            'creado': datetime.fromtimestamp(self.created_at).isoformat(),
+            'inactivo_s': round(self.idle_s(), 1),
+            'muestras': self.samples,
+            'estado': self.controller.current_state,
+            'decision': self.last_decision,
+            'registros': {
+                'consumo_controlador': len(self.controller.consumption_history),
+                'patrones': len(self.learner.consumption_history),
+                'eficiencia_solar': len(self.efficiency.historial_eficiencia_solar),
+                'eficiencia_eolica': len(self.efficiency.historial_eficiencia_eolica),
+            },
+        }
+
+
+Runner = Callable[..., Awaitable[Any]]
+
+
+class DeviceRegistry:
+    """
+    Contextos por device_id (creación perezosa, LRU y desalojo por inactividad)
+    """
+
+    def __init__(
+        self,
+        max_devices: int = 500,
+        idle_s: float = 3600.0,
+        learner_interval_s: float = 300.0,
+        learner_max_records: Optional[int] = 2016,
+        concurrency: int = 8,
+        keep: Optional[Callable[[str], bool]] = None,
+        on_evict: Optional[Callable[[str], None]] = None
+    ):
+        self.max_devices = max_devices
+        self.idle_s = idle_s
+        self.learner_interval_s = learner_interval_s
+        self.learner_max_records = learner_max_records
+        self.concurrency = concurrency
+        self.keep = keep  # device_id → True si no se puede desalojar
+        self.on_evict = on_evict
+
+        self._contexts: "OrderedDict[str, DeviceContext]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            "creados": 0,
+            "desalojados_inactivos": 0,
+            "desalojados_lru": 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._contexts)
+
+    def __contains__(self, device_id: str) -> bool:
+        return device_id in self._contexts
+
+    def device_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._contexts)
+
+    def peek(self, device_id: str) -> Optional[DeviceContext]:
+        """Contexto existente (sin crearlo ni marcarlo como usado)"""
+        return self._contexts.get(device_id)
+
+    def get(self, device_id: str, touch: bool = True) -> DeviceContext:
+        """Contexto del dispositivo; se crea si no existe"""
+        with self._lock:
+            context = self._contexts.get(device_id)
+            if context is None:
+                context = self._contexts[device_id] = DeviceContext(device_id, self.learner_max_records)
+                self.stats["creados"] += 1
+                evicted = self._evict_over_capacity()
+            else:
+                evicted = []
+                if touch:
+                    self._contexts.move_to_end(device_id)
+        self._notify(evicted)
+        return context
+
+    def pop(self, device_id: str) -> Optional[DeviceContext]:
+        """Quitar un contexto sin desalojarlo (no llama a on_evict)"""
+        with self._lock:
+            return self._contexts.pop(device_id, None)
+
+    def apply_sample(self, device_id: str, sample) -> DeviceContext:
+        """Telemetría recibida: actualizar (o crear) el contexto"""
+        context = self.get(device_id)
+        with context.lock:
+            context.apply_sample(sample, self.learner_interval_s)
+        return context
+
+    def _evictable(self, device_id: str) -> bool:
+        return self.keep is None or not self.keep(device_id)
+
+    def _evict_over_capacity(self) -> List[str]:
+        """Desalojar los menos usados por encima de max_devices (con _lock tomado)"""
+        evicted = []
+        for device_id in list(self._contexts):
+            if len(self._contexts) <= self.max_devices:
+                break
+            if self._evictable(device_id):
+                del self._contexts[device_id]
+                self.stats["desalojados_lru"] += 1
+                evicted.append(device_id)
+        return evicted
+
+    def evict_idle(self) -> List[str]:
+        """Barrido periódico: descartar contextos sin telemetría por más de idle_s"""
+        now = time.monotonic()
+        with self._lock:
+            evicted = [
+                device_id for device_id, context in self._contexts.items()
+                if context.idle_s(now) > self.idle_s and self._evictable(device_id)
+            ]
+            for device_id in evicted:
+                del self._contexts[device_id]
+            self.stats["desalojados_inactivos"] += len(evicted)
+        self._notify(evicted)
+        return evicted
+
+    def _notify(self, evicted: List[str]) -> None:
+        if evicted:
+            print(f"🗑️ Runtime: {len(evicted)} contexto(s) desalojado(s): {', '.join(evicted[:5])}"
+                  f"{'…' if len(evicted) > 5 else ''}")
+        for device_id in evicted:
+            if self.on_evict is not None:
+                self.on_evict(device_id)
+
+    async def map(
+        self,
+        fn: Callable[[DeviceContext], Any],
+        device_ids: Optional[Iterable[str]] = None,
+        run: Optional[Runner] = None
+    ) -> Dict[str, Any]:
+        """
+        Evaluar fn(contexto) para todos (o algunos) dispositivos en paralelo
+
+        Args:
+            run: Cómo correr fn fuera del loop de eventos (default
+                asyncio.to_thread; p. ej. control_scheduler.run_heavy)
+
+        Returns:
+            {device_id: resultado} ({"error": ...} si fn falló)
+        """
+        run = run or asyncio.to_thread
+        with self._lock:
+            contexts = [
+                self._contexts[device_id] for device_id in (device_ids or list(self._contexts))
+                if device_id in self._contexts
+            ]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        def call(context: DeviceContext):
+            with context.lock:
+                return fn(context)
+
+        async def evaluate(context: DeviceContext):
+            async with semaphore:
+                try:
+                    return context.device_id, await run(call, context)
+                except Exception as e:
+                    return context.device_id, {"error": f"{type(e).__name__}: {e}"}
+
+        return dict(await asyncio.gather(*(evaluate(context) for context in contexts)))
+
+    def get_stats(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            contexts = list(self._contexts.values())
+        return {
+            **self.stats,
+            "activos": len(contexts),
+            "max_dispositivos": self.max_devices,
+            "inactividad_max_s": self.idle_s,
+            "registros_patrones_max": self.learner_max_records,
+            "dispositivos": {
+                context.device_id: {
+                    "inactivo_s": round(context.idle_s(now), 1),
+                    "muestras": context.samples,
+                    "soc": context.controller.current_state['battery_soc_percent'],
+                }
+                for context in contexts
+            },
+        }
+
+
+class LocalRuntime:
+    """
+    Contextos y protección de los dispositivos en este proceso
+
+    Misma interfaz asíncrona que ShardSupervisor: main.py usa uno u otro
+    según supervisor_workers y cada worker del supervisor corre uno propio.
+    """
+
+    def __init__(self, registry: DeviceRegistry, engine: ProtectionEngine, run: Optional[Runner] = None):
+        self.registry = registry
+        self.engine = engine
+        self.run = run  # Para map() (default asyncio.to_thread)
+
+    @classmethod
+    def from_settings(cls, settings, dispatcher=None, run: Optional[Runner] = None) -> "LocalRuntime":
+        """Registro y motor de protección enlazados con los parámetros de config.py"""
+        registry = DeviceRegistry(
+            max_devices=settings.device_runtime_max_devices,
+            idle_s=settings.device_runtime_idle_s,
+            learner_interval_s=settings.device_learner_interval_s,
+            learner_max_records=settings.device_learner_max_records,
+            concurrency=settings.device_runtime_concurrency
+        )
+
+        def device_systems(device_id: str):
+            """Protecciones eólica y de batería del contexto del dispositivo"""
+            context = registry.get(device_id, touch=False)
+            return context.wind, context.battery
+
+        engine = ProtectionEngine(
+            dispatcher,
+            wind_protection,
+            battery_protection,
+            trip_debounce_s=settings.protection_trip_debounce_s,
+            release_debounce_s=settings.protection_release_debounce_s,
+            hysteresis=settings.protection_hysteresis,
+            latency_budget_ms=settings.protection_latency_budget_ms,
+            stale_s=settings.protection_stale_s,
+            resend_s=settings.protection_resend_s,
+            max_resends=settings.protection_max_resends,
+            resolve=device_systems
+        )
+        # Nunca desalojar un dispositivo con protección activa; al desalojar, olvidar su estado
+        registry.keep = engine.is_tripped
+        registry.on_evict = engine.forget
+        return cls(registry, engine, run)
+
+    async def evaluate_telemetry(self, device_id: str, samples) -> List[Command]:
+        """Protección sobre las muestras y última muestra al contexto; devuelve comandos a emitir"""
+        commands = self.engine.evaluate(device_id, samples)
+        self.registry.apply_sample(device_id, samples[-1])
+        return commands
+
+    async def sweep(self, wind_speed_ms: Optional[float]) -> Dict:
+        """Viento de corte para los dispositivos con telemetría reciente"""
+        commands = self.engine.sweep(wind_speed_ms)
+        return {
+            'comandos': commands,
+            'limites_activos': {
+                device_id: device.active_limits()
+                for device_id, device in list(self.engine.devices.items())
+                if device.active_limits()
+            },
+        }
+
+    async def decide_all(self, device_ids: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        return await self.registry.map(DeviceContext.decide, device_ids, run=self.run)
+
+    async def evict_idle(self) -> List[str]:
+        return self.registry.evict_idle()
+
+    async def device_view(self, device_id: str, decide: bool = False) -> Optional[Dict]:
+        """Estado de control y protección de un dispositivo (None si no tiene contexto)"""
+        context = self.registry.peek(device_id)
+        if context is None:
+            return None
+        if decide:
+            await self.decide_all([device_id])
+        protection = self.engine.device_status(device_id)
+        return {
+            **context.snapshot(),
+            # El freno lo maneja ProtectionEngine (context.wind sólo aporta umbrales)
+            'freno_activo': protection is not None and protection['actuadores']['freno'] == 'on',
+            'proteccion': protection,
+        }
+
+    async def runtime_stats(self) -> Dict:
+        return self.registry.get_stats()
+
+    async def protection_stats(self) -> Dict:
+        return self.engine.get_stats()
+
+    # ===== MIGRACIÓN =====
+
+    def export_devices(self, owned: Callable[[str], bool]) -> Dict[str, Dict]:
+        """Quitar y exportar los dispositivos que ya no pertenecen a este proceso"""
+        known = dict.fromkeys(self.registry.device_ids() + list(self.engine.devices))
+        moving = [device_id for device_id in known if not owned(device_id)]
+        states = {}
+        for device_id in moving:
+            context = self.registry.pop(device_id)
+            states[device_id] = {
+                'contexto': context.export_state() if context is not None else None,
+                'proteccion': self.engine.export_device(device_id),
+            }
+            self.engine.forget(device_id)
+        return states
+
+    def import_devices(self, states: Dict[str, Dict]) -> int:
+        """Adoptar dispositivos exportados por otro proceso"""
+        for device_id, state in states.items():
+            if state['contexto'] is not None:
+                context = self.registry.get(device_id)
+                with context.lock:
+                    context.import_state(state['contexto'])
+            if state['proteccion'] is not None:
+                self.engine.import_device(device_id, state['proteccion'])
+        return len(states)
@@ -11,9 +11,12 @@ Muestra ecuaciones y pasos de cálculo
 """
 
 import math
-from typing import Dict, Tuple, List
+from typing import Dict, Tuple, List, Optional
 from dataclasses import dataclass
 
+from services.energy_simulator import SystemConfig, hourly_resource, simulate
+from services.monte_carlo import simulate_sizing
+
 
 @dataclass
 class ComponenteSolar:
@@ -38,6 +41,16 @@ class ComponenteEolico:
     fabricante: str
 
 
+@dataclass
+class ComponenteBateria:
+    """Batería disponible (se arma en serie hasta el voltaje del sistema)"""
+    nombre: str
+    voltaje: int
+    capacidad_ah: float
+    precio_usd: float
+    fabricante: str
+
+
 class DimensionamientoService:
     """
     Servicio de dimensionamiento de sistemas renovables
@@ -50,6 +63,7 @@ class DimensionamientoService:
     DENSIDAD_AIRE = 1.225  # kg/m³ al nivel del mar
     LIMITE_BETZ = 0.593  # 59.3% eficiencia máxima teórica
     EFICIENCIA_TURBINA_REAL = 0.35  # 35% eficiencia real típica
+    ALTURA_VIENTO_M = 50  # Altura del viento NASA usado (WS50M)
     
     # Base de datos de componentes (simplificada)
     PANELES_DISPONIBLES = [
@@ -65,6 +79,26 @@ class DimensionamientoService:
         ComponenteEolico("Turbina 5000W", 5000, 4.0, 4.0, 13.0, 2800, "Generic"),
     ]
     
+    BATERIAS_DISPONIBLES = [
+        ComponenteBateria("LiFePO4 12V 100Ah", 12, 100, 250, "Generic"),
+        ComponenteBateria("LiFePO4 12V 200Ah", 12, 200, 450, "Generic"),
+    ]
+    COSTO_BMS_CABLES_USD = 450  # BMS $300 + cables $150
+    
+    # ===== COSTOS (total estimado instalado) =====
+    
+    def costo_solar_usd(self, panel: ComponenteSolar, cantidad: int) -> float:
+        """Paneles + estructura (15%) + instalación (20%) + inversor"""
+        return cantidad * panel.precio_usd * 1.65
+    
+    def costo_eolico_usd(self, turbina: ComponenteEolico, cantidad: int) -> float:
+        """Turbinas + torre, controlador e instalación"""
+        return cantidad * turbina.precio_usd * 1.60
+    
+    def costo_bateria_usd(self, bateria: ComponenteBateria, cantidad: int) -> float:
+        """Baterías + BMS y cables"""
+        return cantidad * bateria.precio_usd + self.COSTO_BMS_CABLES_USD
+    
     def calcular_hsp_real(
         self,
         irradiancia_promedio_kwh_m2_dia: float
@@ -87,7 +121,8 @@ class DimensionamientoService:
         self,
         consumo_diario_kwh: float,
         irradiancia_kwh_m2_dia: float,
-        dias_autonomia: int = 2
+        dias_autonomia: int = 2,
+        recurso=None
     ) -> Dict:
         """
         OPCIÓN 1: Tengo X consumo, ¿qué sistema necesito?
@@ -110,10 +145,14 @@ class DimensionamientoService:
             consumo_diario_kwh: Consumo diario (kWh/día)
             irradiancia_kwh_m2_dia: Irradiancia solar (kWh/m²/día)
             dias_autonomia: Días de autonomía batería
+            recurso: SiteResourceTable del sitio (opcional): HSP desde la
+                serie diaria y generación del peor mes
         
         Returns:
             Dict con dimensionamiento y ecuaciones
         """
+        if recurso is not None:
+            irradiancia_kwh_m2_dia = round(recurso.peak_sun_hours(), 2)
         hsp = self.calcular_hsp_real(irradiancia_kwh_m2_dia)
         
         # Asumimos 60% cobertura solar, 40% eólica
@@ -140,6 +179,16 @@ class DimensionamientoService:
         # Costo
         costo_total_usd = num_paneles * panel_elegido.precio_usd
         
+        generacion = {
+            "diaria_kwh": generacion_diaria_kwh,
+            "mensual_kwh": generacion_diaria_kwh * 30,
+            "anual_kwh": generacion_diaria_kwh * 365
+        }
+        if recurso is not None:
+            peor_mes, hsp_peor_mes = recurso.worst_month_solar()
+            generacion["peor_mes"] = peor_mes
+            generacion["diaria_peor_mes_kwh"] = (potencia_total_w / 1000) * hsp_peor_mes * self.EFICIENCIA_SISTEMA_SOLAR
+        
         return {
             "sistema": "solar",
             "tipo": "opcion1_desde_consumo",
@@ -183,11 +232,7 @@ class DimensionamientoService:
                     "area_total_m2": area_total_m2,
                     "eficiencia": panel_elegido.eficiencia
                 },
-                "generacion": {
-                    "diaria_kwh": generacion_diaria_kwh,
-                    "mensual_kwh": generacion_diaria_kwh * 30,
-                    "anual_kwh": generacion_diaria_kwh * 365
-                },
+                "generacion": generacion,
                 "cobertura": {
                     "porcentaje": (generacion_diaria_kwh / consumo_diario_kwh) * 100,
                     "excedente_kwh": generacion_diaria_kwh - energia_solar_necesaria
@@ -197,15 +242,41 @@ class DimensionamientoService:
                     "estructura_usd": costo_total_usd * 0.15,
                     "inversor_usd": potencia_total_w * 0.3,
                     "instalacion_usd": costo_total_usd * 0.20,
-                    "total_estimado_usd": costo_total_usd * 1.65
+                    "total_estimado_usd": self.costo_solar_usd(panel_elegido, num_paneles)
                 }
             }
         }
     
+    def potencia_media_turbina(
+        self,
+        turbina: ComponenteEolico,
+        velocidad_viento_promedio_ms: float,
+        recurso=None
+    ) -> float:
+        """
+        Potencia media (W) de una turbina en el sitio
+        
+        Sin recurso: P = 0.5 × ρ × A × v³ × η con v promedio
+        Con recurso: curva de potencia integrada sobre Weibull
+        """
+        if recurso is not None:
+            return recurso.expected_turbine_power_w(
+                diameter_m=turbina.diametro_m,
+                efficiency=self.EFICIENCIA_TURBINA_REAL,
+                rated_w=turbina.potencia_w,
+                cut_in_ms=turbina.velocidad_arranque_ms,
+                height_m=self.ALTURA_VIENTO_M
+            )
+        
+        area_barrido = math.pi * (turbina.diametro_m / 2) ** 2
+        potencia_viento = 0.5 * self.DENSIDAD_AIRE * area_barrido * (velocidad_viento_promedio_ms ** 3)
+        return potencia_viento * self.EFICIENCIA_TURBINA_REAL
+    
     def dimensionar_eolico_opcion1(
         self,
         consumo_diario_kwh: float,
-        velocidad_viento_promedio_ms: float
+        velocidad_viento_promedio_ms: float,
+        recurso=None
     ) -> Dict:
         """
         Dimensionamiento eólico desde consumo
@@ -231,6 +302,9 @@ class DimensionamientoService:
         Args:
             consumo_diario_kwh: Consumo diario
             velocidad_viento_promedio_ms: Velocidad promedio viento
+            recurso: SiteResourceTable del sitio (opcional): la potencia
+                real se integra sobre la distribución de Weibull con la
+                curva de la turbina (arranque, nominal) en lugar de v_prom³
         
         Returns:
             Dict con dimensionamiento y ecuaciones
@@ -247,10 +321,7 @@ class DimensionamientoService:
         # Elegir turbina
         turbina_elegida = None
         for turbina in sorted(self.TURBINAS_DISPONIBLES, key=lambda x: x.potencia_w):
-            # Calcular potencia real a velocidad promedio
-            area_barrido = math.pi * (turbina.diametro_m / 2) ** 2
-            potencia_viento = 0.5 * self.DENSIDAD_AIRE * area_barrido * (velocidad_viento_promedio_ms ** 3)
-            potencia_real = potencia_viento * self.EFICIENCIA_TURBINA_REAL
+            potencia_real = self.potencia_media_turbina(turbina, velocidad_viento_promedio_ms, recurso)
             
             if potencia_real >= potencia_promedio_w:
                 turbina_elegida = turbina
@@ -263,7 +334,23 @@ class DimensionamientoService:
         area_barrido = math.pi * (turbina_elegida.diametro_m / 2) ** 2
         potencia_viento_disponible = 0.5 * self.DENSIDAD_AIRE * area_barrido * (velocidad_viento_promedio_ms ** 3)
         potencia_max_teorica = potencia_viento_disponible * self.LIMITE_BETZ
-        potencia_real = potencia_viento_disponible * self.EFICIENCIA_TURBINA_REAL
+        potencia_real = self.potencia_media_turbina(turbina_elegida, velocidad_viento_promedio_ms, recurso)
+        
+        if recurso is not None:
+            k, c = recurso.weibull_params(self.ALTURA_VIENTO_M)
+            paso4 = {
+                "nombre": "Potencia real aprovechable (Weibull)",
+                "ecuacion": "P_real = ∫ min(P_viento(v) × η_turbina, P_nominal) × f_Weibull(v) dv",
+                "valores": f"k = {k:.2f}, c = {c:.2f} m/s, arranque = {turbina_elegida.velocidad_arranque_ms} m/s",
+                "resultado": f"{potencia_real:.0f} W"
+            }
+        else:
+            paso4 = {
+                "nombre": "Potencia real aprovechable",
+                "ecuacion": "P_real = P_viento × η_turbina",
+                "valores": f"P_real = {potencia_viento_disponible:.0f} × {self.EFICIENCIA_TURBINA_REAL}",
+                "resultado": f"{potencia_real:.0f} W"
+            }
         
         # Generación diaria
         generacion_diaria_kwh = (potencia_real * 24) / 1000
@@ -300,12 +387,7 @@ class DimensionamientoService:
                     "valores": f"P_max = {potencia_viento_disponible:.0f} × 0.593",
                     "resultado": f"{potencia_max_teorica:.0f} W"
                 },
-                "paso4": {
-                    "nombre": "Potencia real aprovechable",
-                    "ecuacion": "P_real = P_viento × η_turbina",
-                    "valores": f"P_real = {potencia_viento_disponible:.0f} × {self.EFICIENCIA_TURBINA_REAL}",
-                    "resultado": f"{potencia_real:.0f} W"
-                },
+                "paso4": paso4,
                 "paso5": {
                     "nombre": "Generación diaria",
                     "ecuacion": "E_diaria = P_real × 24h",
@@ -335,7 +417,7 @@ class DimensionamientoService:
                     "torre_usd": num_turbinas * 400,
                     "controlador_usd": num_turbinas * 200,
                     "instalacion_usd": num_turbinas * turbina_elegida.precio_usd * 0.25,
-                    "total_estimado_usd": num_turbinas * turbina_elegida.precio_usd * 1.60
+                    "total_estimado_usd": self.costo_eolico_usd(turbina_elegida, num_turbinas)
                 }
             }
         }
@@ -439,11 +521,112 @@ class DimensionamientoService:
                     "baterias_usd": total_baterias * 450,  # $450/batería LiFePO4
                     "bms_usd": 300,
                     "cables_usd": 150,
-                    "total_estimado_usd": total_baterias * 450 + 450
+                    "total_estimado_usd": self.costo_bateria_usd(self.BATERIAS_DISPONIBLES[1], total_baterias)
                 }
             }
         }
 
+    
+    def configuracion_sistema(
+        self,
+        solar_result: Dict,
+        eolico_result: Dict,
+        bateria_result: Optional[Dict] = None
+    ) -> SystemConfig:
+        """
+        Configuración simulable a partir de los resultados de
+        dimensionar_solar_opcion1 / dimensionar_eolico_opcion1 / dimensionar_bateria
+        (sin bateria_result: sólo generación, batería de 0 kWh)
+        """
+        paneles = solar_result["resultado"]["paneles"]
+        turbinas = eolico_result["resultado"]["turbinas"]
+        capacidad_kwh = bateria_result["resultado"]["baterias"]["capacidad_total_kwh"] if bateria_result else 0
+        return SystemConfig(
+            pv_w=paneles["potencia_total_w"],
+            turbine_count=turbinas["cantidad"],
+            turbine_diameter_m=turbinas["diametro_m"],
+            turbine_rated_w=turbinas["potencia_unitaria_w"],
+            turbine_cut_in_ms=turbinas["velocidad_arranque_ms"],
+            hub_height_m=self.ALTURA_VIENTO_M,
+            battery_wh=capacidad_kwh * 1000,
+            battery_dod=self.PROFUNDIDAD_DESCARGA_BATERIA,
+            pv_system_efficiency=self.EFICIENCIA_SISTEMA_SOLAR,
+            turbine_efficiency=self.EFICIENCIA_TURBINA_REAL
+        )
+    
+    def simular_anio(
+        self,
+        recurso,
+        config: SystemConfig,
+        perfil_carga_w,
+        anio: Optional[int] = None,
+        incluir_series: bool = False
+    ) -> Optional[Dict]:
+        """
+        Simulación cronológica de un año (8760 h) del sistema propuesto
+        
+        Responde lo que los promedios diarios no: horas sin suministro,
+        energía vertida, ciclos de batería y la peor semana del año.
+        
+        Args:
+            recurso: SiteResourceTable del sitio (sin tabla → None)
+            config: Componentes (ver configuracion_sistema)
+            perfil_carga_w: 24 valores en W (hora solar local)
+            anio: Año de la serie a simular (default: últimos 365 días)
+        """
+        if recurso is None:
+            return None
+        try:
+            resource = hourly_resource(recurso, anio)
+        except ValueError as e:
+            print(f"⚠️ Simulación horaria no disponible: {e}")
+            return None
+        return simulate(resource, config, perfil_carga_w).summary(include_series=incluir_series)
+    
+    def autonomia_montecarlo(
+        self,
+        recurso,
+        config: SystemConfig,
+        perfil_carga_w,
+        escenarios: int = 500,
+        percentil: int = 90,
+        semilla: Optional[int] = None,
+        lolp_objetivo: float = 0.01
+    ) -> Optional[Dict]:
+        """
+        Días de autonomía a partir del clima del sitio en lugar de un valor fijo
+        
+        Simula `escenarios` años sintéticos (bootstrap por bloques de la serie
+        NASA) con la generación propuesta y toma, en el percentil pedido, el
+        almacenamiento mínimo que cumple el LOLP objetivo.
+        
+        Returns:
+            {"dias_autonomia": int o None, "generacion_insuficiente": bool,
+            "montecarlo": resultado completo}, o None si el sitio no tiene
+            serie suficiente. Con generación insuficiente dias_autonomia es
+            None: la solución es más generación, no más batería
+        """
+        if recurso is None:
+            return None
+        try:
+            resultado = simulate_sizing(
+                recurso, config, perfil_carga_w,
+                n_scenarios=escenarios, seed=semilla, autonomy_percentile=percentil,
+                objective_lolp=lolp_objetivo
+            )
+        except ValueError as e:
+            print(f"⚠️ Monte Carlo no disponible: {e}")
+            return None
+        
+        dias = resultado["autonomia"]["dias_autonomia_requeridos"]
+        if dias is None:
+            return None
+        if resultado["autonomia"]["generacion_insuficiente"]:
+            return {"dias_autonomia": None, "generacion_insuficiente": True, "montecarlo": resultado}
+        # Al menos 1 día; redondeo hacia arriba (se compran baterías enteras)
+        dias_autonomia = max(1, math.ceil(dias[f"p{percentil}"] - 1e-9))
+        return {"dias_autonomia": dias_autonomia, "generacion_insuficiente": False, "montecarlo": resultado}
+
 
 # Singleton instance
 dimensionamiento_service = DimensionamientoService()
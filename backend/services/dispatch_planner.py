@@ -0,0 +1,528 @@
+"""
+Despacho predictivo (horizonte deslizante) de batería, red y recorte de carga
+
+make_decision, la estrategia de carga por pronóstico y la protección de
+batería decidían cada una con sus propias reglas instantáneas. Este módulo
+planifica una sola vez para las próximas 24-72 h y los tres leen el mismo
+plan.
+
+Programación dinámica sobre el SoC discretizado (niveles entre SoC mínimo
+y máximo):
+- Estado: nivel de energía de la batería al inicio de cada paso
+- Decisión: nivel al final del paso (carga / descarga con eficiencias y
+  límite de C-rate, services/battery_engine.py)
+- Costo del paso: energía de red × precio + carga no abastecida × costo de
+  recorte + degradación (por kWh de throughput) + penalización por estar
+  fuera de la zona óptima de SoC (battery_protection) + un costo chico
+  por la reserva que falta hasta el tope de la zona (sin él, con
+  excedente hoy y mañana, el plan posterga la carga indefinidamente)
+- Valor terminal: la energía que queda al final del horizonte vale algo
+  (si no, el plan vaciaría la batería); un descuento horario hace que,
+  a igual costo, se prefiera recortar carga lo más tarde posible (el
+  pronóstico lejano es el menos confiable)
+
+El resultado es una política completa (paso × nivel → nivel objetivo):
+cada ciclo de control sólo busca la acción para el SoC medido en el paso
+actual, sin volver a resolver. Se vuelve a resolver cuando cambia el
+pronóstico o el plan envejece, dentro de un presupuesto de tiempo estricto:
+primero una grilla gruesa de SoC (siempre rápida) y la fina sólo si entra
+en lo que queda del presupuesto.
+
+Con niveles equiespaciados el costo de un paso sólo depende del salto de
+nivel (d = j − i) y del nivel de llegada, y es convexo en ambos (red más
+barata que el recorte, degradación y zona lineales por tramos). El valor
+de cada paso también queda convexo, así que la minimización de Bellman
+es una convolución min-plus de dos secuencias convexas: se obtiene
+ordenando y acumulando sus pendientes, O((N + K) log) por paso en vez de
+O(N²). Las tablas de costo por salto (T × K) se precalculan de una vez
+para todo el pronóstico (transition_tables). Así 0.1 % de resolución
+(1001 niveles) en 7 días se resuelve en decenas de ms. Si los precios
+rompen la convexidad (red más cara que el recorte) se usa la recursión
+densa N × N.
+"""
+
+import hashlib
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.battery_engine import BatterySpec
+
+
+# Costo de una transición imposible (C-rate): finito para no propagar NaN
+INFEASIBLE_COST = 1e9
+
+# Grilla gruesa: fracción de los niveles de la fina
+COARSE_FRACTION = 4
+MIN_LEVELS = 11
+MAX_LEVELS = 1001
+
+
+@dataclass(frozen=True)
+class DispatchCosts:
+    """Precios y penalizaciones del despacho (USD)"""
+    grid_usd_kwh: float = 0.15
+    grid_max_w: float = 3000.0
+    shed_usd_kwh: float = 2.0  # Valor de la energía no abastecida
+    degradation_usd_kwh: float = 0.05  # Por kWh que entra o sale de la batería
+    zone_min_soc: float = 0.25  # Zona óptima (fracción 0-1)
+    zone_max_soc: float = 0.80
+    zone_penalty_usd_kwh: float = 0.02  # Por kWh fuera de la zona y por hora
+    reserve_usd_kwh_h: float = 0.005  # Por kWh y hora por debajo del tope de la zona (reserva)
+    terminal_usd_kwh: float = 0.10  # Valor de la energía que queda al final
+    discount_per_h: float = 0.995  # Lo lejano pesa menos: recortar tarde antes que ahora
+
+
+def _bus_w(delta_wh, battery: BatterySpec, step_h: float):
+    """Potencia en la barra para un cambio de energía: + carga la batería, − la batería entrega"""
+    return np.where(
+        delta_wh > 0, delta_wh / battery.charge_efficiency, delta_wh * battery.discharge_efficiency
+    ) / step_h
+
+
+def _level_cost(levels_wh: np.ndarray, battery: BatterySpec, step_h: float, costs: DispatchCosts) -> np.ndarray:
+    """Penalización por terminar el paso en cada nivel (zona óptima y reserva)"""
+    capacity = battery.capacity_wh
+    below = np.maximum(costs.zone_min_soc * capacity - levels_wh, 0.0)
+    above = np.maximum(levels_wh - costs.zone_max_soc * capacity, 0.0)
+    headroom = np.maximum(costs.zone_max_soc * capacity - levels_wh, 0.0)
+    return (costs.zone_penalty_usd_kwh * (below + above) + costs.reserve_usd_kwh_h * headroom) / 1000 * step_h
+
+
+class _Transitions:
+    """Magnitudes de cada transición nivel i → nivel j (matrices N × N)"""
+
+    def __init__(self, levels_wh: np.ndarray, battery: BatterySpec, step_h: float, costs: DispatchCosts):
+        delta = levels_wh[None, :] - levels_wh[:, None]
+        self.bus_w = _bus_w(delta, battery, step_h)
+        p_max = battery.capacity_wh * battery.max_c_rate
+        self.feasible = np.abs(self.bus_w) <= p_max + 1e-6
+        self.fixed_cost = costs.degradation_usd_kwh * np.abs(delta) / 1000
+        self.fixed_cost = self.fixed_cost + _level_cost(levels_wh, battery, step_h, costs)[None, :]
+        self.fixed_cost = np.where(self.feasible, self.fixed_cost, INFEASIBLE_COST)
+
+
+def _flows(net_w, bus_w, grid_cap_w):
+    """Red, recorte y vertido para un balance neto y una potencia de batería"""
+    balance = net_w - bus_w
+    deficit = np.maximum(-balance, 0.0)
+    grid = np.minimum(deficit, grid_cap_w)
+    return grid, deficit - grid, np.maximum(balance, 0.0)
+
+
+def _levels(battery: BatterySpec, step_h: float, n_levels: int) -> np.ndarray:
+    """Niveles de energía (Wh); al menos un nivel de distancia alcanzable por paso"""
+    low = battery.capacity_wh * battery.soc_min
+    high = battery.capacity_wh * battery.soc_max
+    usable = high - low
+    if usable <= 0:
+        return np.array([low])
+    reachable = battery.capacity_wh * battery.max_c_rate * step_h * min(
+        battery.charge_efficiency, 1 / battery.discharge_efficiency
+    )
+    if reachable > 0:
+        n_levels = max(n_levels, int(np.ceil(usable / reachable)) + 1)
+    return np.linspace(low, high, int(min(max(n_levels, 2), MAX_LEVELS)))
+
+
+def is_convex(price_usd_kwh: np.ndarray, costs: DispatchCosts) -> bool:
+    """El costo por paso es convexo en el salto de nivel (habilita la DP por pendientes)"""
+    price = np.asarray(price_usd_kwh, dtype=np.float64)
+    return bool(
+        (not len(price) or (price.min() >= 0 and price.max() <= costs.shed_usd_kwh))
+        and min(costs.degradation_usd_kwh, costs.zone_penalty_usd_kwh, costs.reserve_usd_kwh_h) >= 0
+        and costs.discount_per_h > 0
+    )
+
+
+def transition_tables(
+    net_w: np.ndarray,
+    grid_cap_w: np.ndarray,
+    price_usd_kwh: np.ndarray,
+    battery: BatterySpec,
+    costs: DispatchCosts,
+    step_h: float,
+    levels_wh: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Costo de red, recorte y degradación de cada salto de nivel, por paso
+
+    Returns:
+        (saltos d = j − i alcanzables por C-rate (K,), costo USD (T, K))
+    """
+    n = len(levels_wh)
+    spacing = float(levels_wh[1] - levels_wh[0]) if n > 1 else 1.0
+    p_max = battery.capacity_wh * battery.max_c_rate + 1e-6
+    up = min(int(p_max * step_h * battery.charge_efficiency / spacing), n - 1)
+    down = min(int(p_max * step_h / battery.discharge_efficiency / spacing), n - 1)
+    offsets = np.arange(-down, up + 1)
+    delta = offsets * spacing
+    bus_w = _bus_w(delta, battery, step_h)
+    grid, shed, _ = _flows(np.asarray(net_w)[:, None], bus_w[None, :], np.asarray(grid_cap_w)[:, None])
+    table = (np.asarray(price_usd_kwh)[:, None] * grid + costs.shed_usd_kwh * shed) * step_h / 1000
+    table += costs.degradation_usd_kwh * np.abs(delta)[None, :] / 1000
+    return offsets, table
+
+
+def solve(
+    net_w: np.ndarray,
+    grid_cap_w: np.ndarray,
+    price_usd_kwh: np.ndarray,
+    battery: BatterySpec,
+    costs: DispatchCosts,
+    step_h: float,
+    n_levels: int,
+    deadline: Optional[float] = None
+) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Recursión hacia atrás de la programación dinámica
+
+    Args:
+        net_w: Generación − consumo previsto por paso (T,)
+        grid_cap_w: Potencia de red disponible por paso (T,; 0 = sin red)
+        price_usd_kwh: Precio de la red por paso (T,)
+        deadline: time.perf_counter() límite (se abandona y devuelve None)
+
+    Returns:
+        (niveles Wh (N,), política (T, N) índice del nivel objetivo,
+        costo esperado desde cada nivel al inicio (N,))
+    """
+    levels = _levels(battery, step_h, n_levels)
+    if is_convex(price_usd_kwh, costs):
+        return _solve_convex(net_w, grid_cap_w, price_usd_kwh, battery, costs, step_h, levels, deadline)
+    return _solve_dense(net_w, grid_cap_w, price_usd_kwh, battery, costs, step_h, levels, deadline)
+
+
+def _solve_convex(net_w, grid_cap_w, price_usd_kwh, battery, costs, step_h, levels, deadline):
+    """
+    V(i) = min_d g(d) + w(i + d) con g (tabla del paso) y w (nivel de
+    llegada + valor siguiente) convexas: es la convolución min-plus de
+    g(−e) y w, cuyo valor arranca en g(−d_max) + w(0) y sube por las
+    pendientes de ambas ordenadas de menor a mayor. El nivel óptimo de
+    llegada es la cantidad de pendientes de w tomadas hasta cada i.
+    """
+    n = len(levels)
+    offsets, table = transition_tables(net_w, grid_cap_w, price_usd_kwh, battery, costs, step_h, levels)
+    level_cost = _level_cost(levels, battery, step_h, costs)
+    up = int(offsets[-1])
+    from_w = np.concatenate((np.zeros(len(offsets) - 1, dtype=np.int32), np.ones(n - 1, dtype=np.int32)))
+    window = slice(up, up + n)
+
+    value = -costs.terminal_usd_kwh * (levels - levels[0]) / 1000
+    discount = costs.discount_per_h ** step_h
+    policy = np.empty((len(net_w), n), dtype=np.int32)
+    for t in range(len(net_w) - 1, -1, -1):
+        if deadline is not None and time.perf_counter() > deadline:
+            return None
+        arrival = level_cost + discount * value
+        jump = table[t, ::-1]  # g(−e) para e = −d_max … d_min
+        slopes = np.concatenate((np.diff(jump), np.diff(arrival)))
+        order = np.argsort(slopes, kind="stable")
+        climbed = np.concatenate(([0.0], np.cumsum(slopes[order])))
+        taken = np.concatenate(([0], np.cumsum(from_w[order])))
+        value = jump[0] + arrival[0] + climbed[window]
+        policy[t] = taken[window]
+    return levels, policy, value
+
+
+def _solve_dense(net_w, grid_cap_w, price_usd_kwh, battery, costs, step_h, levels, deadline):
+    """Recursión N × N: vale para cualquier precio (también no convexo)"""
+    n = len(levels)
+    transitions = _Transitions(levels, battery, step_h, costs)
+    rows = np.arange(n)
+
+    value = -costs.terminal_usd_kwh * (levels - levels[0]) / 1000
+    discount = costs.discount_per_h ** step_h
+    policy = np.empty((len(net_w), n), dtype=np.int32)
+    for t in range(len(net_w) - 1, -1, -1):
+        if deadline is not None and time.perf_counter() > deadline:
+            return None
+        grid, shed, _ = _flows(net_w[t], transitions.bus_w, grid_cap_w[t])
+        cost = (price_usd_kwh[t] * grid + costs.shed_usd_kwh * shed) * step_h / 1000
+        cost += transitions.fixed_cost
+        cost += discount * value[None, :]
+        best = cost.argmin(axis=1)
+        policy[t] = best
+        value = cost[rows, best]
+    return levels, policy, value
+
+
+class DispatchPlan:
+    """Política de despacho resuelta para un pronóstico"""
+
+    def __init__(
+        self,
+        times: np.ndarray,
+        step_h: float,
+        net_w: np.ndarray,
+        grid_cap_w: np.ndarray,
+        price_usd_kwh: np.ndarray,
+        battery: BatterySpec,
+        costs: DispatchCosts,
+        levels_wh: np.ndarray,
+        policy: np.ndarray,
+        fingerprint: str,
+        solve_ms: float,
+        refined: bool
+    ):
+        self.times = times
+        self.step_h = step_h
+        self.net_w = net_w
+        self.grid_cap_w = grid_cap_w
+        self.price_usd_kwh = price_usd_kwh
+        self.battery = battery
+        self.costs = costs
+        self.levels_wh = levels_wh
+        self.policy = policy
+        self.fingerprint = fingerprint
+        self.solve_ms = solve_ms
+        self.refined = refined
+        self.created_at = time.time()
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @property
+    def granularity_w(self) -> float:
+        """Potencia equivalente a un nivel de SoC: flujos menores son redondeo"""
+        if len(self.levels_wh) < 2:
+            return 0.0
+        return float(self.levels_wh[1] - self.levels_wh[0]) / self.step_h
+
+    def step_index(self, now: Optional[float] = None) -> int:
+        """Paso del plan que contiene `now` (epoch s); len(plan) si ya terminó"""
+        now = time.time() if now is None else now
+        index = int((now - self.times[0]) // (self.step_h * 3600))
+        return min(max(index, 0), len(self))
+
+    def remaining_steps(self, now: Optional[float] = None) -> int:
+        return len(self) - self.step_index(now)
+
+    def level_index(self, soc_percent: float) -> int:
+        energy = self.battery.capacity_wh * soc_percent / 100
+        if len(self.levels_wh) < 2:
+            return 0
+        spacing = self.levels_wh[1] - self.levels_wh[0]
+        return int(np.clip(round((energy - self.levels_wh[0]) / spacing), 0, len(self.levels_wh) - 1))
+
+    def lookup(self, soc_percent: float, now: Optional[float] = None) -> Optional[float]:
+        """SoC objetivo (%) al final del paso actual: una lectura de la tabla de política"""
+        step = self.step_index(now)
+        if step >= len(self):
+            return None
+        return float(self.levels_wh[self.policy[step, self.level_index(soc_percent)]] / self.battery.capacity_wh * 100)
+
+    def rollout(self, soc_percent: float, now: Optional[float] = None) -> Dict[str, np.ndarray]:
+        """Trayectoria planificada desde el SoC medido y el paso actual"""
+        start = self.step_index(now)
+        steps = np.arange(start, len(self))
+        targets = np.empty(len(steps), dtype=np.int64)
+        level = self.level_index(soc_percent)
+        for k, t in enumerate(steps.tolist()):
+            level = self.policy[t, level]
+            targets[k] = level
+        origins = np.concatenate(([self.level_index(soc_percent)], targets[:-1])).astype(np.int64)
+
+        bus_w = _bus_w(self.levels_wh[targets] - self.levels_wh[origins], self.battery, self.step_h)
+        grid, shed, curtailed = _flows(self.net_w[steps], bus_w, self.grid_cap_w[steps])
+        renewable_surplus = np.maximum(self.net_w[steps], 0.0)
+        return {
+            "steps": steps,
+            "times": self.times[steps],
+            "soc": self.levels_wh[targets] / self.battery.capacity_wh,
+            "battery_w": bus_w,
+            "grid_w": grid,
+            "grid_charge_w": np.minimum(grid, np.maximum(bus_w - renewable_surplus, 0.0)),
+            "shed_w": shed,
+            "curtailed_w": curtailed,
+            "cost_usd": (self.price_usd_kwh[steps] * grid + self.costs.shed_usd_kwh * shed) * self.step_h / 1000,
+        }
+
+    def action(self, soc_percent: float, now: Optional[float] = None, lookahead_h: float = 24) -> Optional[Dict]:
+        """
+        Acción del paso actual para el SoC medido (None si el plan terminó)
+
+        target_soc_percent es el máximo SoC planificado en `lookahead_h`:
+        el objetivo de carga que comparten estrategia y protección.
+        """
+        trajectory = self.rollout(soc_percent, now)
+        if not len(trajectory["steps"]):
+            return None
+        ahead = max(1, int(round(lookahead_h / self.step_h)))
+        return {
+            "step": int(trajectory["steps"][0]),
+            "battery_w": float(trajectory["battery_w"][0]),
+            "grid_w": float(trajectory["grid_w"][0]),
+            "grid_charge_w": float(trajectory["grid_charge_w"][0]),
+            "shed_w": float(trajectory["shed_w"][0]),
+            "curtailed_w": float(trajectory["curtailed_w"][0]),
+            "next_soc_percent": float(trajectory["soc"][0] * 100),
+            "target_soc_percent": float(trajectory["soc"][:ahead].max() * 100),
+            "min_soc_percent": float(trajectory["soc"][:ahead].min() * 100),
+            "shed_ahead_wh": float(trajectory["shed_w"][:ahead].sum() * self.step_h),
+            "grid_ahead_wh": float(trajectory["grid_w"][:ahead].sum() * self.step_h),
+            "lookahead_h": min(lookahead_h, len(trajectory["steps"]) * self.step_h),
+            "granularity_w": self.granularity_w,
+            "step_h": self.step_h,
+        }
+
+    def summary(self, soc_percent: float, now: Optional[float] = None, include_schedule: bool = True) -> Dict:
+        """Plan desde el estado actual (claves en castellano, como el resto de la API)"""
+        trajectory = self.rollout(soc_percent, now)
+        step_h = self.step_h
+        result = {
+            "generado": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.created_at)),
+            "inicio_paso": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(
+                float(trajectory["times"][0]) if len(trajectory["times"]) else self.times[-1]
+            )),
+            "horizonte_restante_h": round(len(trajectory["steps"]) * step_h, 2),
+            "paso_min": round(step_h * 60, 1),
+            "niveles_soc": len(self.levels_wh),
+            "resolucion_fina": self.refined,
+            "tiempo_resolucion_ms": round(self.solve_ms, 2),
+            "costo_total_usd": round(float(trajectory["cost_usd"].sum()), 3),
+            "energia_red_kwh": round(float(trajectory["grid_w"].sum()) * step_h / 1000, 2),
+            "carga_desde_red_kwh": round(float(trajectory["grid_charge_w"].sum()) * step_h / 1000, 2),
+            "recorte_carga_kwh": round(float(trajectory["shed_w"].sum()) * step_h / 1000, 2),
+            "vertido_kwh": round(float(trajectory["curtailed_w"].sum()) * step_h / 1000, 2),
+            "soc_minimo_porcentaje": round(float(trajectory["soc"].min()) * 100, 1) if len(trajectory["soc"]) else None,
+            "soc_maximo_porcentaje": round(float(trajectory["soc"].max()) * 100, 1) if len(trajectory["soc"]) else None,
+        }
+        if include_schedule:
+            result["programa"] = [
+                {
+                    "inicio": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(t)),
+                    "soc_objetivo_porcentaje": round(soc * 100, 1),
+                    "bateria_w": round(battery, 0),
+                    "red_w": round(grid, 0),
+                    "carga_desde_red_w": round(grid_charge, 0),
+                    "recorte_w": round(shed, 0),
+                    "vertido_w": round(curtailed, 0),
+                }
+                for t, soc, battery, grid, grid_charge, shed, curtailed in zip(
+                    trajectory["times"].tolist(), trajectory["soc"].tolist(), trajectory["battery_w"].tolist(),
+                    trajectory["grid_w"].tolist(), trajectory["grid_charge_w"].tolist(),
+                    trajectory["shed_w"].tolist(), trajectory["curtailed_w"].tolist()
+                )
+            ]
+        return result
+
+
+def fingerprint(times: np.ndarray, step_h: float, net_w: np.ndarray, grid_cap_w: np.ndarray,
+                price_usd_kwh: np.ndarray, battery: BatterySpec, costs: DispatchCosts) -> str:
+    """Identidad de un problema (pronóstico redondeado a 10 W)"""
+    digest = hashlib.sha1()
+    digest.update(np.float64(times[0] if len(times) else 0).tobytes())
+    digest.update(np.round(np.asarray(net_w), -1).tobytes())
+    digest.update(np.asarray(grid_cap_w, dtype=np.float64).tobytes())
+    digest.update(np.asarray(price_usd_kwh, dtype=np.float64).tobytes())
+    digest.update(repr((step_h, battery, costs)).encode())
+    return digest.hexdigest()
+
+
+class DispatchPlanner:
+    """Plan vigente, re-planificación incremental y estadísticas"""
+
+    def __init__(self):
+        self.plan: Optional[DispatchPlan] = None
+        self.stats = {
+            "resueltos": 0,
+            "reutilizados": 0,
+            "solo_grilla_gruesa": 0,
+            "fuera_de_presupuesto": 0,
+            "ultimo_ms": None,
+            "max_ms": 0.0,
+        }
+
+    def replan(
+        self,
+        times: np.ndarray,
+        net_w: Sequence[float],
+        step_h: float,
+        battery: BatterySpec,
+        costs: DispatchCosts,
+        grid_available: bool = False,
+        price_usd_kwh: Optional[Sequence[float]] = None,
+        n_levels: int = 101,
+        time_budget_s: float = 0.2,
+        max_age_s: float = 900.0,
+        force: bool = False
+    ) -> Optional[DispatchPlan]:
+        """
+        Plan para el pronóstico dado; reutiliza el vigente si el problema
+        no cambió, no envejeció y le queda al menos la mitad del horizonte
+
+        Returns:
+            Plan vigente (None si ni la grilla gruesa entró en el presupuesto)
+        """
+        started = time.perf_counter()
+        deadline = started + time_budget_s
+        times = np.asarray(times, dtype=np.float64)
+        net_w = np.asarray(net_w, dtype=np.float64)
+        grid_cap_w = np.full(len(net_w), costs.grid_max_w if grid_available else 0.0)
+        price = np.full(len(net_w), costs.grid_usd_kwh) if price_usd_kwh is None \
+            else np.asarray(price_usd_kwh, dtype=np.float64)
+        key = fingerprint(times, step_h, net_w, grid_cap_w, price, battery, costs)
+
+        plan = self.plan
+        if (not force and plan is not None and plan.fingerprint == key
+                and time.time() - plan.created_at < max_age_s
+                and plan.remaining_steps() * 2 >= len(plan)):
+            self.stats["reutilizados"] += 1
+            return plan
+
+        # Grilla gruesa primero: siempre hay un plan aunque la fina no entre
+        coarse_levels = max(MIN_LEVELS, n_levels // COARSE_FRACTION + 1)
+        coarse_started = time.perf_counter()
+        solved = solve(net_w, grid_cap_w, price, battery, costs, step_h, coarse_levels, deadline)
+        if solved is None:
+            self.stats["fuera_de_presupuesto"] += 1
+            return self.plan
+        coarse_s = time.perf_counter() - coarse_started
+
+        refined = False
+        if n_levels > coarse_levels:
+            # El costo crece con N (convexo) o N² (denso): estimar antes de intentar
+            growth = 1 if is_convex(price, costs) else 2
+            estimate = coarse_s * (n_levels / len(solved[0])) ** growth
+            fine = None
+            if time.perf_counter() + estimate <= deadline:
+                fine = solve(net_w, grid_cap_w, price, battery, costs, step_h, n_levels, deadline)
+            if fine is not None:
+                solved, refined = fine, True
+            else:
+                self.stats["solo_grilla_gruesa"] += 1
+
+        levels, policy, _ = solved
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.plan = DispatchPlan(
+            times, step_h, net_w, grid_cap_w, price, battery, costs,
+            levels, policy, key, elapsed_ms, refined
+        )
+        self.stats["resueltos"] += 1
+        self.stats["ultimo_ms"] = round(elapsed_ms, 2)
+        self.stats["max_ms"] = round(max(self.stats["max_ms"], elapsed_ms), 2)
+        return self.plan
+
+    def current(self, max_age_s: Optional[float] = None) -> Optional[DispatchPlan]:
+        """Plan vigente si todavía cubre el paso actual (y no es más viejo que max_age_s)"""
+        plan = self.plan
+        if plan is None or plan.remaining_steps() == 0:
+            return None
+        if max_age_s is not None and time.time() - plan.created_at > max_age_s:
+            return None
+        return plan
+
+    def get_stats(self) -> Dict:
+        plan = self.plan
+        return {
+            **self.stats,
+            "plan_vigente": plan is not None and plan.remaining_steps() > 0,
+            "edad_plan_s": round(time.time() - plan.created_at, 1) if plan is not None else None,
+        }
+
+
+# Instancia global
+dispatch_planner = DispatchPlanner()
@@ -0,0 +1,543 @@
+"""
+Simulador cronológico de balance energético (año de 8760 horas)
+
+El dimensionamiento por promedios diarios (HSP × potencia, v³ promedio,
+60/40 solar/eólico) no dice si la batería sobrevive una semana de invierno
+sin viento. Este módulo simula hora por hora un año completo:
+
+1. Recurso horario (HourlyResource): la serie diaria de la tabla del sitio
+   (services/resource_table.py) se baja a resolución horaria
+   - Solar: claridad del día × cielo despejado horario (solar_geometry)
+   - Viento: media diaria × perfil diurno × fluctuación horaria
+     (semilla fija por sitio: el mismo sitio da siempre el mismo año)
+   - Temperatura: media diaria ± oscilación diurna (derating de paneles)
+2. Perfil de carga de 24 h (hora solar local): residencial típico,
+   patrones aprendidos (pattern_learner) o cargas de CargasService
+3. Batería: services/battery_engine.py (eficiencias, límite de C-rate y
+   SoC mínimo / máximo, trayectoria vectorizada)
+
+Resultado: horas sin suministro (LOLH), energía no servida, vertido
+(curtailment), ciclos equivalentes, peor semana y desglose mensual.
+
+Una configuración se simula en pocos ms (benchmarks/bench_energy_simulator.py);
+simulate_batch() evalúa muchas configuraciones del mismo sitio juntas.
+"""
+
+import math
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from services import battery_engine, solar_geometry
+
+
+HOURS_PER_DAY = 24
+DAYS_PER_YEAR = 365
+HOURS_PER_YEAR = HOURS_PER_DAY * DAYS_PER_YEAR
+DENSIDAD_AIRE = 1.225  # kg/m³
+
+# Paneles: coeficiente de temperatura de potencia y calentamiento de celda
+PV_TEMP_COEFF = -0.004        # 1/°C
+PV_CELL_HEATING = 0.03        # °C por W/m² (NOCT ≈ 45 °C)
+
+# Viento horario a partir de la media diaria
+WIND_DIURNAL_AMPLITUDE = 0.25  # ±25% a 10 m, pico a media tarde
+WIND_DIURNAL_PEAK_HOUR = 15
+WIND_HOURLY_WEIBULL_K = 3.0    # Fluctuación dentro del día (media 1)
+TEMP_DIURNAL_AMPLITUDE = 5.0   # °C
+
+# Umbral para contar una hora como "sin suministro"
+UNMET_THRESHOLD_W = 1.0
+
+# Perfil residencial típico (fracción de la energía diaria por hora local)
+RESIDENTIAL_SHAPE = np.array([
+    0.025, 0.022, 0.020, 0.020, 0.021, 0.026,   # 00-05 noche
+    0.038, 0.050, 0.045, 0.040, 0.038, 0.040,   # 06-11 mañana
+    0.045, 0.042, 0.038, 0.036, 0.040, 0.050,   # 12-17 tarde
+    0.062, 0.072, 0.075, 0.068, 0.050, 0.037,   # 18-23 pico nocturno
+])
+RESIDENTIAL_SHAPE = RESIDENTIAL_SHAPE / RESIDENTIAL_SHAPE.sum()
+
+
+@dataclass
+class SystemConfig:
+    """Configuración de componentes a simular"""
+    pv_w: float = 0.0
+    turbine_count: int = 0
+    turbine_diameter_m: float = 0.0
+    turbine_rated_w: float = 0.0
+    turbine_cut_in_ms: float = 3.0
+    turbine_cut_out_ms: float = 25.0
+    hub_height_m: float = 10.0
+    battery_wh: float = 0.0
+    battery_dod: float = 0.80
+    battery_soc_max: float = 1.0
+    charge_efficiency: float = 0.95
+    discharge_efficiency: float = 0.95
+    max_c_rate: float = 0.5             # Potencia máx. de carga/descarga = C-rate × capacidad
+    pv_system_efficiency: float = 0.85  # Cables, inversor, suciedad
+    turbine_efficiency: float = 0.35
+
+    def battery_spec(self) -> battery_engine.BatterySpec:
+        return battery_engine.BatterySpec(
+            capacity_wh=self.battery_wh,
+            soc_min=1 - self.battery_dod,
+            soc_max=self.battery_soc_max,
+            charge_efficiency=self.charge_efficiency,
+            discharge_efficiency=self.discharge_efficiency,
+            max_c_rate=self.max_c_rate
+        )
+
+
+class HourlyResource:
+    """
+    Año de recurso horario de un sitio (arrays de 8760 valores, hora UTC)
+
+    ghi / viento / temperatura pueden traer una dimensión de escenarios
+    adelante ((S, 8760), services/monte_carlo.py); times es siempre (8760,)
+    """
+
+    def __init__(
+        self,
+        latitude: float,
+        longitude: float,
+        times: np.ndarray,
+        ghi_w_m2: np.ndarray,
+        wind10_ms: np.ndarray,
+        temperature_c: np.ndarray,
+        shear_alpha: float = 1 / 7
+    ):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.times = times
+        self.ghi_w_m2 = ghi_w_m2
+        self.wind10_ms = wind10_ms
+        self.temperature_c = temperature_c
+        self.shear_alpha = shear_alpha
+
+        # Hora solar local y mes de cada paso (para perfiles y desgloses)
+        utc_hour = ((times % 86400) // 3600).astype(np.int64)
+        self.local_hour = (utc_hour + int(round(longitude / 15.0))) % HOURS_PER_DAY
+        self.month = (times.astype("datetime64[s]").astype("datetime64[M]").astype(np.int64) % 12) + 1
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @property
+    def shape(self):
+        return np.shape(self.ghi_w_m2)
+
+    def wind_at(self, height_m: float) -> np.ndarray:
+        """Velocidad horaria a la altura de buje (ley potencial)"""
+        if height_m == 10:
+            return self.wind10_ms
+        return self.wind10_ms * (height_m / 10.0) ** self.shear_alpha
+
+    @property
+    def start(self) -> datetime:
+        return datetime.fromtimestamp(float(self.times[0]), tz=timezone.utc)
+
+
+def day_epochs(table, n_days: int) -> np.ndarray:
+    """00:00 UTC de cada día de la serie (alineada al final del período)"""
+    end = datetime.strptime(table.period.split("-")[1], "%Y%m%d").replace(tzinfo=timezone.utc)
+    last = end.timestamp()
+    return last - np.arange(n_days - 1, -1, -1, dtype=np.float64) * 86400.0
+
+
+def fill_missing(values: np.ndarray, by_month: np.ndarray, months: np.ndarray) -> np.ndarray:
+    """Días faltantes → promedio del mes"""
+    values = values.astype(np.float64)
+    missing = np.isnan(values)
+    if missing.any():
+        values[missing] = np.nan_to_num(by_month)[months[missing] - 1]
+    return values
+
+
+def build_hourly_resource(table, year: Optional[int] = None) -> HourlyResource:
+    """
+    Bajar la serie diaria de la tabla de recurso a un año horario
+
+    Args:
+        table: SiteResourceTable del sitio
+        year: Año calendario a usar (default: los últimos 365 días de la serie)
+    """
+    n_total = len(table.month)
+    if n_total < DAYS_PER_YEAR:
+        raise ValueError(f"Serie diaria demasiado corta ({n_total} días) para simular un año")
+
+    days = day_epochs(table, n_total)
+    if year is not None:
+        index = np.flatnonzero(table.year == year)[:DAYS_PER_YEAR]
+        if len(index) < DAYS_PER_YEAR:
+            raise ValueError(f"El año {year} no está completo en la serie del sitio")
+    else:
+        index = np.arange(n_total - DAYS_PER_YEAR, n_total)
+
+    months = table.month[index].astype(np.int64)
+    seed = int(abs(table.latitude) * 1000) * 100003 + int(abs(table.longitude) * 1000)
+    hourly = downscale_daily(
+        table.latitude,
+        table.longitude,
+        days[index],
+        fill_missing(table.solar_daily[index], table.solar_monthly, months),
+        fill_missing(table.wind10_daily[index], table.wind10_monthly, months),
+        fill_missing(table.temperature_daily[index], table.temperature_monthly, months),
+        np.random.default_rng(seed)  # Semilla por sitio: mismo sitio, mismo año
+    )
+    return HourlyResource(
+        table.latitude, table.longitude, hourly["times"], hourly["ghi_w_m2"],
+        hourly["wind10_ms"], hourly["temperature_c"], shear_alpha=table.shear_alpha
+    )
+
+
+def downscale_daily(
+    latitude: float,
+    longitude: float,
+    day_start: np.ndarray,
+    solar_daily: np.ndarray,
+    wind10_daily: np.ndarray,
+    temperature_daily: np.ndarray,
+    rng: np.random.Generator
+) -> Dict[str, np.ndarray]:
+    """
+    Series diarias → horarias
+
+    Las series diarias pueden tener una dimensión de escenarios adelante
+    ((S, D) en lugar de (D,)): la geometría solar se calcula una sola vez
+    y se reusa para todos.
+
+    Args:
+        day_start: 00:00 UTC de cada día (D,)
+        solar_daily: kWh/m²/día; wind10_daily: m/s; temperature_daily: °C
+        rng: Generador para la fluctuación horaria del viento
+
+    Returns:
+        {"times" (D*24,), "ghi_w_m2", "wind10_ms", "temperature_c" (..., D*24)}
+    """
+    n_days = len(day_start)
+    lead = np.shape(solar_daily)[:-1]
+    times = (day_start[:, None] + np.arange(HOURS_PER_DAY) * 3600.0).ravel()
+
+    # Solar: cielo despejado en el centro de cada hora × claridad del día
+    position = solar_geometry.solar_position(latitude, longitude, times + 1800.0)
+    clear = solar_geometry.haurwitz_ghi(position["cos_zenith"]).reshape(n_days, HOURS_PER_DAY)
+    clear_daily_kwh = clear.sum(axis=1) / 1000.0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        clearness = np.where(clear_daily_kwh > 0, solar_daily / clear_daily_kwh, 0.0)
+    ghi = clear * np.clip(clearness, 0.0, 1.0)[..., None]
+
+    # Viento: media diaria × perfil diurno × fluctuación (media diaria conservada)
+    solar_hour = (np.arange(HOURS_PER_DAY) + longitude / 15.0) % HOURS_PER_DAY
+    diurnal = 1 + WIND_DIURNAL_AMPLITUDE * np.cos(2 * np.pi * (solar_hour - WIND_DIURNAL_PEAK_HOUR) / 24)
+    k = WIND_HOURLY_WEIBULL_K
+    fluctuation = rng.weibull(k, size=lead + (n_days, HOURS_PER_DAY)) / math.gamma(1 + 1 / k)
+    hourly = diurnal * fluctuation
+    hourly /= hourly.mean(axis=-1, keepdims=True)
+    wind10 = wind10_daily[..., None] * hourly
+
+    # Temperatura: media diaria ± oscilación (máxima a las 15 h solares)
+    temp_shape = TEMP_DIURNAL_AMPLITUDE * np.cos(2 * np.pi * (solar_hour - 15) / 24)
+    temperature = temperature_daily[..., None] + temp_shape
+
+    shape = lead + (n_days * HOURS_PER_DAY,)
+    return {
+        "times": times,
+        "ghi_w_m2": ghi.reshape(shape),
+        "wind10_ms": wind10.reshape(shape),
+        "temperature_c": temperature.reshape(shape),
+    }
+
+
+_resource_cache: "OrderedDict[tuple, HourlyResource]" = OrderedDict()
+_RESOURCE_CACHE_SIZE = 32
+
+
+def hourly_resource(table, year: Optional[int] = None) -> HourlyResource:
+    """build_hourly_resource() cacheado por (sitio, período, año)"""
+    key = (table.latitude, table.longitude, table.period, year)
+    resource = _resource_cache.get(key)
+    if resource is None:
+        resource = _resource_cache[key] = build_hourly_resource(table, year)
+        while len(_resource_cache) > _RESOURCE_CACHE_SIZE:
+            _resource_cache.popitem(last=False)
+    else:
+        _resource_cache.move_to_end(key)
+    return resource
+
+
+# ===== PERFILES DE CARGA (24 valores en W, hora solar local) =====
+
+def residential_load_profile(daily_kwh: float) -> np.ndarray:
+    """Perfil residencial típico para un consumo diario dado"""
+    return RESIDENTIAL_SHAPE * daily_kwh * 1000.0
+
+
+def load_profile_from_patterns(patterns: Dict) -> Optional[np.ndarray]:
+    """
+    Perfil desde los patrones aprendidos (pattern_learner.patterns:
+    {hora: ConsumptionPattern}); horas sin datos → promedio del resto
+    """
+    if not patterns:
+        return None
+    profile = np.full(HOURS_PER_DAY, np.nan)
+    for hour, pattern in patterns.items():
+        profile[int(hour) % HOURS_PER_DAY] = pattern.avg_power_w
+    profile[np.isnan(profile)] = np.nanmean(profile)
+    return profile
+
+
+def load_profile_from_cargas(cargas: List[Dict], default_hours: float = 4.0) -> np.ndarray:
+    """
+    Perfil desde cargas de CargasService ([{"tipo", "cantidad", "horas_dia"}]):
+    energía diaria = Σ potencia nominal × cantidad × horas de uso, repartida
+    con la forma residencial
+    """
+    from services.cargas_service import CARGAS_TIPICAS
+
+    daily_wh = 0.0
+    for carga in cargas:
+        tipo = CARGAS_TIPICAS.get(carga.get("tipo"))
+        if tipo is None:
+            continue
+        daily_wh += tipo.potencia_nominal_w * carga.get("cantidad", 1) * carga.get("horas_dia", default_hours)
+    return residential_load_profile(daily_wh / 1000.0)
+
+
+# ===== GENERACIÓN =====
+
+def pv_power_w(resource: HourlyResource, pv_w: float, system_efficiency: float = 0.85) -> np.ndarray:
+    """Potencia FV horaria (W) con derating por temperatura de celda"""
+    if pv_w <= 0:
+        return np.zeros(resource.shape)
+    cell_temp = resource.temperature_c + PV_CELL_HEATING * resource.ghi_w_m2
+    derate = np.clip(1 + PV_TEMP_COEFF * (cell_temp - 25.0), 0.0, None)
+    return pv_w * resource.ghi_w_m2 / 1000.0 * system_efficiency * derate
+
+
+def wind_power_w(resource: HourlyResource, config: SystemConfig) -> np.ndarray:
+    """Potencia eólica horaria (W) con la curva de la turbina × cantidad"""
+    if config.turbine_count <= 0 or config.turbine_diameter_m <= 0:
+        return np.zeros(resource.shape)
+    v = resource.wind_at(config.hub_height_m)
+    area = math.pi * (config.turbine_diameter_m / 2) ** 2
+    power = 0.5 * DENSIDAD_AIRE * area * v ** 3 * config.turbine_efficiency
+    if config.turbine_rated_w > 0:
+        power = np.minimum(power, config.turbine_rated_w)
+    power[(v < config.turbine_cut_in_ms) | (v >= config.turbine_cut_out_ms)] = 0.0
+    return power * config.turbine_count
+
+
+# ===== BATERÍA =====
+
+class SimulationResult:
+    """Series horarias y métricas de una simulación"""
+
+    def __init__(self, resource: HourlyResource, config: SystemConfig, series: Dict[str, np.ndarray]):
+        self.resource = resource
+        self.config = config
+        self.series = series
+        self.metrics = _metrics(resource, config, series)
+
+    def summary(self, include_series: bool = False) -> Dict:
+        """Resumen JSON-serializable (claves en castellano, como el resto de la API)"""
+        m = self.metrics
+        result = {
+            "periodo": {
+                "inicio": self.resource.start.date().isoformat(),
+                "horas": len(self.resource)
+            },
+            "energia": {
+                "carga_kwh": round(m["load_wh"] / 1000, 1),
+                "generacion_solar_kwh": round(m["pv_wh"] / 1000, 1),
+                "generacion_eolica_kwh": round(m["wind_wh"] / 1000, 1),
+                "no_servida_kwh": round(m["unmet_wh"] / 1000, 2),
+                "vertida_kwh": round(m["curtailed_wh"] / 1000, 1)
+            },
+            "confiabilidad": {
+                "horas_sin_suministro": m["lolh"],
+                "fraccion_energia_no_servida": round(m["lolp"], 4),
+                "cobertura_horaria_porcentaje": round((1 - m["lolp"]) * 100, 2),
+                "corte_mas_largo_h": m["longest_outage_h"],
+                "peor_semana": m["worst_week"]
+            },
+            "vertido_porcentaje": round(m["curtailment_fraction"] * 100, 1),
+            "bateria": {
+                "ciclos_equivalentes": round(m["equivalent_cycles"], 1),
+                "energia_descargada_kwh": round(m["discharged_wh"] / 1000, 1),
+                "soc_minimo_porcentaje": round(m["soc_min"] * 100, 1),
+                "soc_medio_porcentaje": round(m["soc_mean"] * 100, 1),
+                "horas_en_soc_minimo": m["hours_at_min_soc"]
+            },
+            "mensual": {
+                "horas_sin_suministro": m["lolh_monthly"],
+                "no_servida_kwh": [round(v / 1000, 2) for v in m["unmet_wh_monthly"]],
+                "soc_minimo_porcentaje": [round(v * 100, 1) for v in m["soc_min_monthly"]]
+            }
+        }
+        if include_series:
+            result["series"] = {
+                "soc_porcentaje": np.round(self.series["soc"] * 100, 1).tolist(),
+                "carga_w": np.round(self.series["load_w"], 0).tolist(),
+                "solar_w": np.round(self.series["pv_w"], 0).tolist(),
+                "eolica_w": np.round(self.series["wind_w"], 0).tolist()
+            }
+        return result
+
+
+def load_series(resource: HourlyResource, load_profile_w: np.ndarray) -> np.ndarray:
+    profile = np.asarray(load_profile_w, dtype=np.float64)
+    if profile.shape == (HOURS_PER_DAY,):
+        return profile[resource.local_hour]
+    if profile.shape == (len(resource),):
+        return profile
+    raise ValueError("El perfil de carga debe tener 24 valores (W por hora) o uno por hora simulada")
+
+
+def dispatch_battery(
+    net_w: np.ndarray,
+    configs: Sequence[SystemConfig],
+    initial_soc: Optional[float] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Despacho de batería para B columnas (net_w: (T, B), W): B configuraciones
+    o B escenarios de una misma configuración (ver battery_engine.simulate)
+
+    Args:
+        initial_soc: SoC inicial (0-1, default: batería llena)
+    """
+    return battery_engine.simulate(net_w, [c.battery_spec() for c in configs], initial_soc=initial_soc)
+
+
+def longest_run(mask: np.ndarray) -> int:
+    """Racha más larga de True (vectorizado)"""
+    if not mask.any():
+        return 0
+    padded = np.concatenate(([0], mask.astype(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(padded))
+    return int((edges[1::2] - edges[::2]).max())
+
+
+def _metrics(resource: HourlyResource, config: SystemConfig, series: Dict[str, np.ndarray]) -> Dict:
+    load = series["load_w"]
+    unmet = series["unmet_w"]
+    soc = series["soc"]
+    months = resource.month - 1
+
+    load_wh = float(load.sum())
+    unmet_wh = float(unmet.sum())
+    pv_wh = float(series["pv_w"].sum())
+    wind_wh = float(series["wind_w"].sum())
+    curtailed_wh = float(series["curtailed_w"].sum())
+    discharged_wh = float(series["discharged_w"].sum())
+    outage = unmet > UNMET_THRESHOLD_W
+
+    usable_wh = config.battery_wh * config.battery_dod
+    lolh_monthly = np.bincount(months[outage], minlength=12)[:12]
+    unmet_monthly = np.bincount(months, weights=unmet, minlength=12)[:12]
+    soc_min_monthly = np.full(12, np.nan)
+    np.fmin.at(soc_min_monthly, months, soc)
+
+    # Peor semana: ventana de 168 h con menor balance generación - carga
+    window = 7 * HOURS_PER_DAY
+    balance = np.concatenate(([0.0], np.cumsum(series["pv_w"] + series["wind_w"] - load)))
+    weekly = balance[window:] - balance[:-window]
+    worst = int(np.argmin(weekly))
+    worst_unmet = float(unmet[worst:worst + window].sum())
+
+    return {
+        "load_wh": load_wh,
+        "pv_wh": pv_wh,
+        "wind_wh": wind_wh,
+        "unmet_wh": unmet_wh,
+        "curtailed_wh": curtailed_wh,
+        "discharged_wh": discharged_wh,
+        "lolh": int(outage.sum()),
+        "lolp": unmet_wh / load_wh if load_wh > 0 else 0.0,
+        "longest_outage_h": longest_run(outage),
+        "curtailment_fraction": curtailed_wh / (pv_wh + wind_wh) if pv_wh + wind_wh > 0 else 0.0,
+        "equivalent_cycles": discharged_wh / usable_wh if usable_wh > 0 else 0.0,
+        "soc_min": float(soc.min()),
+        "soc_mean": float(soc.mean()),
+        "hours_at_min_soc": int((soc <= 1 - config.battery_dod + 1e-6).sum()) if config.battery_wh > 0 else 0,
+        "lolh_monthly": lolh_monthly.astype(int).tolist(),
+        "unmet_wh_monthly": unmet_monthly.tolist(),
+        "soc_min_monthly": np.nan_to_num(soc_min_monthly, nan=1.0).tolist(),
+        "worst_week": {
+            "inicio": datetime.fromtimestamp(float(resource.times[worst]), tz=timezone.utc).date().isoformat(),
+            "deficit_kwh": round(-float(weekly[worst]) / 1000, 2),
+            "no_servida_kwh": round(worst_unmet / 1000, 2),
+            "horas_sin_suministro": int(outage[worst:worst + window].sum())
+        }
+    }
+
+
+def simulate(resource: HourlyResource, config: SystemConfig, load_profile_w: np.ndarray) -> SimulationResult:
+    """
+    Simular un año hora por hora
+
+    Args:
+        resource: Recurso horario del sitio (hourly_resource(tabla))
+        config: Componentes
+        load_profile_w: 24 valores (W por hora solar local) o uno por hora
+    """
+    load = load_series(resource, load_profile_w)
+    pv = pv_power_w(resource, config.pv_w, config.pv_system_efficiency)
+    wind = wind_power_w(resource, config)
+    net = (pv + wind - load)[:, None]
+
+    flows = dispatch_battery(net, [config])
+    series = {
+        "load_w": load,
+        "pv_w": pv,
+        "wind_w": wind,
+        **{name: values[:, 0] for name, values in flows.items() if name != "energy_wh"}
+    }
+    return SimulationResult(resource, config, series)
+
+
+def simulate_batch(
+    resource: HourlyResource,
+    configs: Sequence[SystemConfig],
+    load_profile_w: np.ndarray
+) -> List[Dict]:
+    """
+    Métricas de muchas configuraciones del mismo sitio y carga
+
+    La generación se calcula por columnas y las B baterías se simulan
+    juntas (battery_engine, un lote).
+    """
+    load = load_series(resource, load_profile_w)
+
+    pv_unit = pv_power_w(resource, 1.0, 1.0)  # Escala lineal con potencia y eficiencia
+    pv = np.column_stack([pv_unit * c.pv_w * c.pv_system_efficiency for c in configs])
+    wind_cache: Dict[tuple, np.ndarray] = {}
+    wind_columns = []
+    for c in configs:
+        key = (c.turbine_diameter_m, c.turbine_rated_w, c.turbine_cut_in_ms, c.turbine_cut_out_ms,
+               c.hub_height_m, c.turbine_efficiency)
+        unit = wind_cache.get(key)
+        if unit is None:
+            unit = wind_cache[key] = wind_power_w(resource, SystemConfig(
+                turbine_count=1, turbine_diameter_m=c.turbine_diameter_m, turbine_rated_w=c.turbine_rated_w,
+                turbine_cut_in_ms=c.turbine_cut_in_ms, turbine_cut_out_ms=c.turbine_cut_out_ms,
+                hub_height_m=c.hub_height_m, turbine_efficiency=c.turbine_efficiency
+            ))
+        wind_columns.append(unit * c.turbine_count)
+    wind = np.column_stack(wind_columns)
+
+    flows = dispatch_battery(pv + wind - load[:, None], configs)
+
+    # (B, T) contiguo: cada configuración lee filas, no columnas con stride
+    columns = {"pv_w": pv, "wind_w": wind}
+    columns.update((name, values) for name, values in flows.items() if name != "energy_wh")
+    rows = {name: np.ascontiguousarray(values.T) for name, values in columns.items()}
+
+    results = []
+    for b, config in enumerate(configs):
+        series = {"load_w": load, **{name: values[b] for name, values in rows.items()}}
+        results.append(_metrics(resource, config, series))
+    return results
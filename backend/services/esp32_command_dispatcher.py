@@ -0,0 +1,325 @@
+"""
+Despachador único de comandos para dispositivos ESP32
+
+Una sola cola por dispositivo, con estado ACK consistente
+(pending → sent → acked) sin importar el transporte:
+
+- WebSocket: push inmediato si el ESP32 tiene socket abierto
+- HTTP long-poll: el ESP32 tiene un GET estacionado esperando comandos
+- HTTP polling: el comando queda en cola hasta el próximo GET
+
+Los entregados por HTTP quedan "sent" (el firmware por polling no suele
+confirmar): se descartan pasado sent_ttl_s o cuando la cola supera
+max_commands_per_device, igual que los confirmados.
+"""
+
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+
+TRANSPORT_WEBSOCKET = "websocket"
+TRANSPORT_LONG_POLL = "http_long_poll"
+TRANSPORT_POLLING = "http_polling"
+
+
+class ESP32CommandDispatcher:
+    """
+    Dueño de la cola de comandos por device_id y de la elección de transporte
+    """
+
+    def __init__(
+        self,
+        max_commands_per_device: int = 100,
+        max_parked: int = 256,
+        max_long_poll_s: float = 30.0,
+        sent_ttl_s: float = 300.0
+    ):
+        self.max_commands_per_device = max_commands_per_device
+        self.sent_ttl_s = sent_ttl_s  # Antigüedad máxima de los entregados / confirmados
+        self.max_parked = max_parked  # Tope global de GETs estacionados
+        self.max_long_poll_s = max_long_poll_s
+
+        # {device_id: [{"id", "command", "parameter", "status", "transport", "timestamp", "sent_at", "acked_at"}]}
+        self.command_queue: Dict[str, List[Dict]] = {}
+
+        # {device_id: websocket}
+        self.websockets: Dict[str, object] = {}
+
+        # {device_id: {"command_id": uuid, "timestamp": str}}
+        self.last_ack: Dict[str, Dict] = {}
+
+        # Un Event por dispositivo para despertar GETs estacionados
+        self._events: Dict[str, asyncio.Event] = {}
+
+        # {device_id: cantidad de GETs estacionados}
+        self.parked: Dict[str, int] = {}
+        self.parked_total = 0
+
+        # Contadores de long-poll
+        self.long_poll_stats = {
+            "requests": 0,
+            "delivered": 0,
+            "timeouts": 0,
+            "rejected": 0,
+            "abandoned": 0
+        }
+
+    # ===== TRANSPORTES =====
+
+    def attach_websocket(self, device_id: str, websocket) -> None:
+        """Registrar socket abierto del ESP32"""
+        self.websockets[device_id] = websocket
+
+    def detach_websocket(self, device_id: str) -> None:
+        """Quitar socket del ESP32 (los comandos pendientes siguen en cola)"""
+        self.websockets.pop(device_id, None)
+
+    def transport_for(self, device_id: str) -> str:
+        """Elegir transporte según cómo está conectado el dispositivo ahora"""
+        if device_id in self.websockets:
+            return TRANSPORT_WEBSOCKET
+        if self.parked.get(device_id, 0) > 0:
+            return TRANSPORT_LONG_POLL
+        return TRANSPORT_POLLING
+
+    # ===== COLA =====
+
+    def enqueue(self, device_id: str, command: str, parameter: Optional[str] = None,
+                replace: bool = False) -> Dict:
+        """
+        Encolar comando con ID único y avisar a quien esté esperando
+
+        Args:
+            replace: Descartar los pendientes del mismo comando (órdenes de
+                estado como freno on/off: sólo vale la última)
+        """
+        queue = self.command_queue.setdefault(device_id, [])
+        if replace:
+            queue[:] = [c for c in queue if c["status"] != "pending" or c["command"] != command]
+
+        cmd_entry = {
+            "id": str(uuid.uuid4()),
+            "command": command,
+            "parameter": parameter,
+            "status": "pending",
+            "transport": None,
+            "timestamp": datetime.now().isoformat(),
+            "sent_at": None,
+            "acked_at": None
+        }
+        queue.append(cmd_entry)
+
+        # Acotar memoria: descartar primero los confirmados más viejos y
+        # después los entregados (los pendientes nunca se descartan)
+        excess = len(queue) - self.max_commands_per_device
+        if excess > 0:
+            delivered = [c for c in queue if c["status"] == "acked"] + [c for c in queue if c["status"] == "sent"]
+            for old in delivered[:excess]:
+                queue.remove(old)
+
+        self._event(device_id).set()
+        print(f"📤 Comando encolado [{cmd_entry['id'][:8]}]: {command}({parameter})")
+
+        return cmd_entry
+
+    async def dispatch(self, device_id: str, command: str, parameter: Optional[str] = None,
+                       replace: bool = False) -> Dict:
+        """
+        Encolar y entregar por el mejor transporte disponible
+
+        Returns:
+            La entrada del comando con el transporte elegido
+        """
+        transport = self.transport_for(device_id)
+        cmd_entry = self.enqueue(device_id, command, parameter, replace)
+
+        if transport == TRANSPORT_WEBSOCKET:
+            await self.send_pending_websocket(device_id)
+            # Si el socket falló, el comando sigue pendiente para HTTP
+            if cmd_entry["status"] == "pending":
+                transport = self.transport_for(device_id)
+
+        cmd_entry["transport"] = cmd_entry["transport"] or transport
+        return cmd_entry
+
+    def pending(self, device_id: str) -> List[Dict]:
+        """Comandos aún no entregados"""
+        return [cmd for cmd in self.command_queue.get(device_id, []) if cmd["status"] == "pending"]
+
+    def take_pending(self, device_id: str, transport: str = TRANSPORT_POLLING) -> List[Dict]:
+        """Entregar pendientes por HTTP: quedan marcados como 'sent' hasta vencer sent_ttl_s"""
+        pending = self.pending(device_id)
+        now = datetime.now().isoformat()
+
+        for cmd in pending:
+            cmd["status"] = "sent"
+            cmd["transport"] = transport
+            cmd["sent_at"] = now
+
+        self._event(device_id).clear()
+        self.cleanup_old_commands(device_id, self.sent_ttl_s / 60)
+        return pending
+
+    async def send_pending_websocket(self, device_id: str) -> int:
+        """Enviar pendientes por WebSocket; retorna cantidad enviada"""
+        websocket = self.websockets.get(device_id)
+        if websocket is None:
+            return 0
+
+        sent = 0
+        for cmd in self.pending(device_id):
+            try:
+                await websocket.send_json({
+                    "type": "command",
+                    "id": cmd["id"],
+                    "command": cmd["command"],
+                    "parameter": cmd["parameter"],
+                    "timestamp": cmd["timestamp"]
+                })
+            except Exception as e:
+                print(f"❌ Error enviando comando [{cmd['id'][:8]}]: {e}")
+                self.detach_websocket(device_id)
+                break
+
+            cmd["status"] = "sent"
+            cmd["transport"] = TRANSPORT_WEBSOCKET
+            cmd["sent_at"] = datetime.now().isoformat()
+            sent += 1
+            print(f"✅ Comando enviado [{cmd['id'][:8]}]: {cmd['command']}({cmd['parameter']})")
+
+        if not self.pending(device_id):
+            self._event(device_id).clear()
+        return sent
+
+    def can_park(self) -> bool:
+        """¿Queda lugar para otro GET estacionado?"""
+        return self.parked_total < self.max_parked
+
+    async def wait_for_commands(
+        self,
+        device_id: str,
+        timeout: float,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None
+    ) -> Optional[List[Dict]]:
+        """
+        Long-poll: esperar hasta que haya comandos o venza el timeout
+
+        Args:
+            is_disconnected: Chequeo del cliente antes de llevarse los
+                comandos (request.is_disconnected); si se fue, quedan
+                pendientes para el próximo GET
+
+        Returns:
+            Comandos entregados (marcados 'sent'), [] si venció el timeout
+            o el cliente se desconectó, o None si se alcanzó el tope de
+            conexiones estacionadas
+        """
+        self.long_poll_stats["requests"] += 1
+        if self.pending(device_id):
+            self.long_poll_stats["delivered"] += 1
+            return self.take_pending(device_id, TRANSPORT_POLLING)
+
+        if not self.can_park():
+            self.long_poll_stats["rejected"] += 1
+            return None
+
+        timeout = max(0.0, min(timeout, self.max_long_poll_s))
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        event = self._event(device_id)
+
+        self.parked[device_id] = self.parked.get(device_id, 0) + 1
+        self.parked_total += 1
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    self.long_poll_stats["timeouts"] += 1
+                    return []
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    self.long_poll_stats["timeouts"] += 1
+                    return []
+
+                if is_disconnected is not None and await is_disconnected():
+                    self.long_poll_stats["abandoned"] += 1
+                    return []
+
+                # Otro GET estacionado pudo haberse llevado los comandos.
+                # Sin await entre tomarlos y responder: una cancelación no los pierde
+                commands = self.take_pending(device_id, TRANSPORT_LONG_POLL)
+                if commands:
+                    self.long_poll_stats["delivered"] += 1
+                    return commands
+        finally:
+            self.parked_total -= 1
+            self.parked[device_id] -= 1
+            if self.parked[device_id] <= 0:
+                del self.parked[device_id]
+
+    def get_stats(self) -> Dict:
+        """Estado del despachador para diagnóstico"""
+        return {
+            "devices": len(self.command_queue),
+            "websocket_devices": len(self.websockets),
+            "pending_commands": sum(len(self.pending(d)) for d in self.command_queue),
+            "parked_connections": self.parked_total,
+            "max_parked": self.max_parked,
+            "long_poll": dict(self.long_poll_stats)
+        }
+
+    def _event(self, device_id: str) -> asyncio.Event:
+        event = self._events.get(device_id)
+        if event is None:
+            event = self._events[device_id] = asyncio.Event()
+        return event
+
+    # ===== ACK / ESTADO =====
+
+    def mark_ack(self, device_id: str, command_id: str) -> bool:
+        """Marcar comando como confirmado (ACK)"""
+        for cmd in self.command_queue.get(device_id, []):
+            if cmd["id"] == command_id:
+                now = datetime.now().isoformat()
+                cmd["status"] = "acked"
+                cmd["acked_at"] = now
+                if cmd["sent_at"] is None:
+                    cmd["sent_at"] = now
+
+                self.last_ack[device_id] = {
+                    "command_id": command_id,
+                    "timestamp": now
+                }
+
+                print(f"✅ ACK recibido [{command_id[:8]}]: {cmd['command']}({cmd['parameter']})")
+                return True
+
+        return False
+
+    def get_command_status(self, device_id: str, command_id: str) -> Optional[Dict]:
+        """Obtener estado de un comando"""
+        for cmd in self.command_queue.get(device_id, []):
+            if cmd["id"] == command_id:
+                return cmd
+        return None
+
+    def cleanup_old_commands(self, device_id: str, max_age_minutes: float = 5):
+        """Limpiar comandos viejos ya confirmados o entregados"""
+        if device_id not in self.command_queue:
+            return
+
+        cutoff = datetime.now() - timedelta(minutes=max_age_minutes)
+
+        # Mantener solo comandos pendientes o recientes
+        self.command_queue[device_id] = [
+            cmd for cmd in self.command_queue[device_id]
+            if cmd["status"] == "pending"
+            or datetime.fromisoformat(cmd["acked_at"] if cmd["status"] == "acked" else cmd["sent_at"]) > cutoff
+        ]
+
+
+# Singleton instance
+command_dispatcher = ESP32CommandDispatcher()
@@ -0,0 +1,187 @@
+"""
+Motor de remuestreo de pronósticos meteorológicos
+
+Convierte el pronóstico de un proveedor (cada 3 h de OpenWeather, horario,
+cada 15 min...) en una grilla temporal regular en formato columnar
+(arrays NumPy), para cualquier horizonte y resolución:
+
+- Variables continuas: interpolación lineal vectorizada (np.interp)
+- Dirección del viento: interpolación circular (componentes sin/cos →
+  arctan2), 350° → 10° pasa por 0°, no por 180°
+- Descripción: valor del punto de pronóstico anterior (escalón)
+- Fuera del rango del pronóstico se mantiene el valor del extremo y la
+  máscara `covered` queda en False
+
+El predictor (EnergyPredictor.predict_grid) y el controlador consumen la
+grilla directamente, sin armar un dict por punto.
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+# Variables interpoladas linealmente (clave en los dicts de WeatherService)
+LINEAR_FIELDS = [
+    "temperature_c",
+    "humidity_percent",
+    "pressure_hpa",
+    "wind_speed_ms",
+    "cloud_cover_percent",
+    "rain_1h_mm",
+    "solar_radiation_wm2",
+]
+
+CIRCULAR_FIELDS = ["wind_direction_deg"]
+
+# Valores por defecto si el proveedor no trae la variable
+DEFAULTS = {
+    "temperature_c": 25.0,
+    "humidity_percent": 50.0,
+    "pressure_hpa": 1013.0,
+    "wind_speed_ms": 0.0,
+    "cloud_cover_percent": 0.0,
+    "rain_1h_mm": 0.0,
+    "wind_direction_deg": 0.0,
+}
+
+
+class ForecastGrid:
+    """
+    Pronóstico en grilla regular, formato columnar
+
+    Attributes:
+        times: epoch (segundos, float64) de cada punto de la grilla
+        columns: {variable: array float64}
+        descriptions: array de strings (descripción del proveedor)
+        covered: bool, True si el punto cae dentro del rango del pronóstico
+        step_minutes: resolución de la grilla
+    """
+
+    def __init__(
+        self,
+        times: np.ndarray,
+        columns: Dict[str, np.ndarray],
+        descriptions: np.ndarray,
+        covered: np.ndarray,
+        step_minutes: float
+    ):
+        self.times = times
+        self.columns = columns
+        self.descriptions = descriptions
+        self.covered = covered
+        self.step_minutes = step_minutes
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.columns
+
+    def column(self, name: str) -> np.ndarray:
+        """Columna de la variable (valor por defecto si no existe)"""
+        values = self.columns.get(name)
+        if values is None:
+            return np.full(len(self), DEFAULTS.get(name, np.nan))
+        return values
+
+    @property
+    def step_hours(self) -> float:
+        return self.step_minutes / 60.0
+
+    def timestamps(self) -> List[datetime]:
+        """Timestamps como datetime local (formato de WeatherService)"""
+        return [datetime.fromtimestamp(t) for t in self.times.tolist()]
+
+    def hours(self) -> np.ndarray:
+        """Hora local del día de cada punto (0-23)"""
+        return np.array([ts.hour for ts in self.timestamps()], dtype=np.int64)
+
+    def to_records(self) -> List[Dict]:
+        """Lista de dicts con las claves de WeatherService (para la API)"""
+        names = list(self.columns)
+        values = [self.columns[name].tolist() for name in names]
+        return [
+            {
+                "timestamp": ts,
+                **{name: column[i] for name, column in zip(names, values)},
+                "description": self.descriptions[i],
+            }
+            for i, ts in enumerate(self.timestamps())
+        ]
+
+    @classmethod
+    def from_records(cls, records: List[Dict], step_minutes: Optional[float] = None) -> "ForecastGrid":
+        """
+        Grilla a partir de puntos ya regulares (sin interpolar)
+        Útil para callers que todavía arman listas de dicts
+        """
+        times = np.array([r["timestamp"].timestamp() for r in records], dtype=np.float64)
+        if step_minutes is None:
+            step_minutes = float(np.median(np.diff(times)) / 60.0) if len(times) > 1 else 60.0
+
+        fields = [f for f in LINEAR_FIELDS + CIRCULAR_FIELDS if any(f in r for r in records)]
+        columns = {
+            f: np.array([r.get(f, DEFAULTS.get(f, np.nan)) for r in records], dtype=np.float64)
+            for f in fields
+        }
+        descriptions = np.array([r.get("description", "") for r in records], dtype=object)
+        return cls(times, columns, descriptions, np.ones(len(times), dtype=bool), step_minutes)
+
+
+def _circular_interp(x: np.ndarray, xp: np.ndarray, degrees: np.ndarray) -> np.ndarray:
+    """Interpolar ángulos (grados) por componentes: 350° → 10° pasa por 0°"""
+    radians = np.deg2rad(degrees)
+    sin = np.interp(x, xp, np.sin(radians))
+    cos = np.interp(x, xp, np.cos(radians))
+    return np.rad2deg(np.arctan2(sin, cos)) % 360.0
+
+
+def resample(
+    points: List[Dict],
+    horizon_hours: float = 24,
+    step_minutes: float = 60,
+    start: Optional[datetime] = None
+) -> ForecastGrid:
+    """
+    Remuestrear un pronóstico a una grilla regular
+
+    Args:
+        points: Pronóstico del proveedor (dicts con 'timestamp' datetime y
+            las variables de WeatherService), a cualquier resolución
+        horizon_hours: Largo de la grilla
+        step_minutes: Resolución de la grilla
+        start: Primer punto (default: primer punto del pronóstico)
+
+    Returns:
+        ForecastGrid con int(horizon_hours * 60 / step_minutes) puntos
+    """
+    if not points:
+        raise ValueError("Pronóstico vacío: no hay puntos para remuestrear")
+
+    points = sorted(points, key=lambda p: p["timestamp"])
+    xp = np.array([p["timestamp"].timestamp() for p in points], dtype=np.float64)
+
+    t0 = xp[0] if start is None else start.timestamp()
+    n = max(1, int(round(horizon_hours * 60 / step_minutes)))
+    times = t0 + np.arange(n, dtype=np.float64) * step_minutes * 60.0
+
+    columns = {}
+    for field in LINEAR_FIELDS:
+        if any(field in p for p in points):
+            fp = np.array([p.get(field, DEFAULTS.get(field, 0.0)) for p in points], dtype=np.float64)
+            columns[field] = np.interp(times, xp, fp)
+
+    for field in CIRCULAR_FIELDS:
+        if any(field in p for p in points):
+            fp = np.array([p.get(field, 0.0) for p in points], dtype=np.float64)
+            columns[field] = _circular_interp(times, xp, fp)
+
+    # Descripción del punto de pronóstico vigente (anterior o igual)
+    source_descriptions = np.array([p.get("description", "") for p in points], dtype=object)
+    index = np.clip(np.searchsorted(xp, times, side="right") - 1, 0, len(xp) - 1)
+
+    covered = (times >= xp[0]) & (times <= xp[-1])
+
+    return ForecastGrid(times, columns, source_descriptions[index], covered, step_minutes)
@@ -0,0 +1,195 @@
+"""
+Monitor de salud de servicios externos
+
+Los chequeos contra APIs externas (OpenWeather, NASA POWER) corren en
+segundo plano cada `interval_s`, concurrentemente y sobre los clientes HTTP
+compartidos. /api/status/health responde al instante con el último
+resultado y su antigüedad; /api/status/health/deep fuerza un chequeo en vivo.
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+
+from config import get_settings
+from services.http_clients import get_client
+
+
+settings = get_settings()
+
+Probe = Callable[[], Awaitable[Dict]]
+
+
+class HealthMonitor:
+    """
+    Ejecuta probes registrados y guarda el último resultado de cada uno
+    """
+
+    def __init__(self, interval_s: float = 60.0, probe_timeout_s: float = 5.0):
+        self.interval_s = interval_s
+        self.probe_timeout_s = probe_timeout_s
+
+        self.probes: Dict[str, Probe] = {}
+        self.labels: Dict[str, str] = {}
+        self._results: Dict[str, Dict] = {}
+        self._checked_at: Dict[str, float] = {}  # time.monotonic() del último chequeo
+        self._task: Optional[asyncio.Task] = None
+        self._running: Optional[asyncio.Future] = None
+
+    def register(self, name: str, probe: Probe, label: Optional[str] = None) -> None:
+        """Registrar un probe: corrutina que retorna {"status", "name", ...}"""
+        self.probes[name] = probe
+        self.labels[name] = label or name
+
+    async def _run_probe(self, name: str, probe: Probe) -> None:
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(probe(), timeout=self.probe_timeout_s)
+        except asyncio.TimeoutError:
+            result = {"status": "offline", "error": f"Timeout ({self.probe_timeout_s:.0f}s)"}
+        except Exception as e:
+            result = {"status": "offline", "error": str(e)}
+
+        result.setdefault("name", self.labels[name])
+        result.setdefault("response_time_ms", int((time.monotonic() - started) * 1000))
+        result["checked_at"] = datetime.now().isoformat()
+        self._results[name] = result
+        self._checked_at[name] = time.monotonic()
+
+    async def run_probes(self) -> Dict[str, Dict]:
+        """
+        Chequear todos los servicios ahora (en paralelo)
+
+        Si ya hay una ronda en curso (background o deep-check), se espera
+        esa misma en lugar de lanzar otra.
+        """
+        if self._running is None or self._running.done():
+            self._running = asyncio.gather(*(
+                self._run_probe(name, probe) for name, probe in self.probes.items()
+            ))
+        await asyncio.shield(self._running)
+        return self.snapshot()
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Últimos resultados con su antigüedad (sin I/O)"""
+        now = time.monotonic()
+        snapshot = {}
+        for name in self.probes:
+            if name not in self._results:
+                snapshot[name] = {"status": "unknown", "name": self.labels[name], "message": "Chequeo pendiente"}
+                continue
+            age_s = now - self._checked_at[name]
+            snapshot[name] = {
+                **self._results[name],
+                "age_s": round(age_s, 1),
+                "stale": age_s > 2 * self.interval_s
+            }
+        return snapshot
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.run_probes()
+            except Exception as e:
+                print(f"⚠️ Error en chequeo de salud: {e}")
+            await asyncio.sleep(self.interval_s)
+
+    def start(self) -> None:
+        """Iniciar chequeos periódicos en segundo plano"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Detener chequeos periódicos"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# ===== PROBES =====
+
+async def probe_openweather() -> Dict:
+    """OpenWeather: clima actual en la ubicación configurada (valida API key)"""
+    client = get_client("openweather")
+    started = time.monotonic()
+    response = await client.get(
+        "https://api.openweathermap.org/data/2.5/weather",
+        params={
+            "lat": settings.latitude,
+            "lon": settings.longitude,
+            "appid": settings.openweather_api_key
+        }
+    )
+    elapsed_ms = int((time.monotonic() - started) * 1000)
+
+    if response.status_code == 200:
+        data = response.json()
+        return {
+            "status": "online",
+            "name": "OpenWeather API",
+            "response_time_ms": elapsed_ms,
+            "api_key_valid": True,
+            "location": data.get("name", "Unknown"),
+            "last_update": datetime.fromtimestamp(data.get("dt", 0)).isoformat()
+        }
+    if response.status_code == 401:
+        return {
+            "status": "error",
+            "name": "OpenWeather API",
+            "error": "API key inválida",
+            "api_key_valid": False
+        }
+    return {
+        "status": "error",
+        "name": "OpenWeather API",
+        "error": f"HTTP {response.status_code}"
+    }
+
+
+async def probe_nasa_power() -> Dict:
+    """NASA POWER: una semana de un parámetro (fuera de la caché climática)"""
+    from services.nasa_power_service import nasa_service
+
+    started = time.monotonic()
+    response = await nasa_service.client.get(
+        f"{nasa_service.BASE_URL}/daily/point",
+        params={
+            "parameters": "ALLSKY_SFC_SW_DWN",
+            "community": "RE",
+            "longitude": settings.longitude,
+            "latitude": settings.latitude,
+            "start": "20240101",
+            "end": "20240107",
+            "format": "JSON"
+        }
+    )
+    elapsed_ms = int((time.monotonic() - started) * 1000)
+
+    if response.status_code == 200:
+        data = response.json()
+        return {
+            "status": "online",
+            "name": "NASA POWER API",
+            "response_time_ms": elapsed_ms,
+            "data_available": True,
+            "source": data.get("header", {}).get("title", "NASA POWER")
+        }
+    return {
+        "status": "error",
+        "name": "NASA POWER API",
+        "error": f"HTTP {response.status_code}"
+    }
+
+
+# Singleton instance
+health_monitor = HealthMonitor(
+    interval_s=settings.health_check_interval_s,
+    probe_timeout_s=settings.health_probe_timeout_s
+)
+health_monitor.register("openweather", probe_openweather, "OpenWeather API")
+health_monitor.register("nasa_power", probe_nasa_power, "NASA POWER API")
@@ -0,0 +1,35 @@
+"""
+Clientes HTTP compartidos para APIs externas
+
+Un httpx.AsyncClient con pool de conexiones por proveedor, creado una vez y
+reutilizado (keep-alive, TLS ya negociado). Cerrar con close_all() en el
+shutdown de la aplicación.
+"""
+
+from typing import Dict
+
+import httpx
+
+
+_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60.0)
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def get_client(name: str, timeout: float = 10.0) -> httpx.AsyncClient:
+    """
+    Cliente compartido para un proveedor ("openweather", "open_meteo", ...)
+
+    El timeout es el default del cliente; cada request puede pasar el suyo.
+    """
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        client = _clients[name] = httpx.AsyncClient(timeout=timeout, limits=_LIMITS)
+    return client
+
+
+async def close_all() -> None:
+    """Cerrar todos los clientes compartidos"""
+    for client in list(_clients.values()):
+        await client.aclose()
+    _clients.clear()
@@ -15,6 +15,7 @@ from typing import Dict, List, Tuple
 from datetime import datetime, timedelta
 import asyncio
 
+from services import nasa_response
 from services.nasa_power_service import nasa_service
 
 
@@ -124,55 +125,51 @@ class MLPredictorService:
     ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[str]]:
         """Procesar datos de NASA en formato para ML"""
         
-        params = nasa_data["properties"]["parameter"]
-        
-        X_solar = []
-        y_solar = []
-        X_wind = []
-        y_wind = []
-        
-        # Extraer datos mensuales
-        for year in range(start_year, end_year + 1):
-            for month in range(1, 13):
-                key = f"{year}{month:02d}"
-                
-                # Features (X)
-                solar_rad = params.get("ALLSKY_SFC_SW_DWN", {}).get(key, 0)
-                wind_speed = params.get("WS50M", {}).get(key, 0)
-                temp = params.get("T2M", {}).get(key, 0)
-                humidity = params.get("RH2M", {}).get(key, 0)
-                pressure = params.get("PS", {}).get(key, 0)
-                clear_sky = params.get("CLRSKY_SFC_SW_DWN", {}).get(key, 0)
-                
-                if solar_rad > 0 and wind_speed > 0:
-                    # Calcular día del año (medio del mes)
-                    day_of_year = (month - 1) * 30 + 15
-                    
-                    features = [
-                        month,              # Mes (1-12)
-                        day_of_year,        # Día del año
-                        temp,               # Temperatura
-                        humidity,           # Humedad
-                        pressure,           # Presión
-                        clear_sky,          # Potencial solar
-                        wind_speed          # Viento para solar
-                    ]
-                    
-                    X_solar.append(features)
-                    y_solar.append(solar_rad)
-                    
-                    features_wind = [
-                        month,
-                        day_of_year,
-                        temp,
-                        humidity,
-                        pressure,
-                        solar_rad,          # Irradiancia para eólico
-                        wind_speed * 0.8    # Viento histórico (feature para predecir futuro)
-                    ]
-                    
-                    X_wind.append(features_wind)
-                    y_wind.append(wind_speed)
+        frame = nasa_response.decode(nasa_data)
+        
+        # Sólo los meses del período pedido (sin filas anuales ni datos faltantes)
+        in_period = (frame.year >= start_year) & (frame.year <= end_year)
+        
+        def column(name: str) -> np.ndarray:
+            # Faltantes (-999 / ausentes) → 0, como antes
+            return np.nan_to_num(frame.column(name)[in_period], nan=0.0)
+        
+        month = frame.month[in_period]
+        solar_rad = column("ALLSKY_SFC_SW_DWN")
+        wind_speed = column("WS50M")
+        temp = column("T2M")
+        humidity = column("RH2M")
+        pressure = column("PS")
+        clear_sky = column("CLRSKY_SFC_SW_DWN")
+        
+        valid = (solar_rad > 0) & (wind_speed > 0)
+        month, solar_rad, wind_speed = month[valid], solar_rad[valid], wind_speed[valid]
+        temp, humidity, pressure, clear_sky = temp[valid], humidity[valid], pressure[valid], clear_sky[valid]
+        
+        # Día del año (medio del mes)
+        day_of_year = (month - 1) * 30 + 15
+        
+        X_solar = np.column_stack([
+            month,              # Mes (1-12)
+            day_of_year,        # Día del año
+            temp,               # Temperatura
+            humidity,           # Humedad
+            pressure,           # Presión
+            clear_sky,          # Potencial solar
+            wind_speed          # Viento para solar
+        ]).astype(np.float64)
+        y_solar = solar_rad
+        
+        X_wind = np.column_stack([
+            month,
+            day_of_year,
+            temp,
+            humidity,
+            pressure,
+            solar_rad,          # Irradiancia para eólico
+            wind_speed * 0.8    # Viento histórico (feature para predecir futuro)
+        ]).astype(np.float64)
+        y_wind = wind_speed
         
         feature_names = [
             "mes",
@@ -184,13 +181,7 @@ class MLPredictorService:
             "viento_historico"
         ]
         
-        return (
-            np.array(X_solar),
-            np.array(y_solar),
-            np.array(X_wind),
-            np.array(y_wind),
-            feature_names
-        )
+        return X_solar, y_solar, X_wind, y_wind, feature_names
     
     def _train_solar_model(
         self,
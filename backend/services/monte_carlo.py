@@ -0,0 +1,362 @@
+"""
+Análisis Monte Carlo de incertidumbre meteorológica
+
+Dos usos, la misma idea: en lugar de UNA trayectoria determinística de la
+batería, miles de escenarios simulados juntos (escenarios × horizonte como
+arrays NumPy) y bandas de percentiles como resultado.
+
+1. Dimensionamiento (simulate_sizing): años sintéticos armados por
+   bootstrap por bloques de la serie diaria NASA del sitio (bloques de
+   una semana tomados de años distintos en la misma época del año:
+   conserva estacionalidad y rachas sin viento / nubladas). Cada año se
+   baja a horas (energy_simulator.downscale_daily) y se simula.
+   → LOLP, horas sin suministro, SoC mínimo y almacenamiento / días de
+     autonomía requeridos por percentil (reemplaza el dias_autonomia fijo):
+     el almacenamiento mínimo con el que cada año cumple el LOLP objetivo
+     (bisección), no la máxima caída del año, que con un déficit estacional
+     suma meses. Con balance anual negativo, o si el objetivo pide más de
+     MAX_AUTONOMY_DAYS de almacenamiento (déficit estacional), se informa
+     generación insuficiente en lugar de una batería
+
+2. Operación (simulate_forecast): la predicción de 24 h (o más) con
+   errores de pronóstico multiplicativos (log-normales, correlacionados
+   en el tiempo con AR(1), crecen con el horizonte).
+   → Bandas de SoC hora a hora, probabilidad de déficit y autonomía
+
+Reproducible: misma semilla → mismos escenarios (la semilla usada se
+devuelve siempre). Throughput en benchmarks/bench_monte_carlo.py.
+"""
+
+import math
+import time
+from dataclasses import replace
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from services import battery_engine
+from services.battery_engine import BatterySpec
+from services.energy_simulator import (
+    DAYS_PER_YEAR, UNMET_THRESHOLD_W, HourlyResource, SystemConfig, day_epochs, fill_missing,
+    dispatch_battery, downscale_daily, load_series, longest_run, pv_power_w, wind_power_w
+)
+
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+# Error de pronóstico: σ (log) = inicial + crecimiento por hora de horizonte
+FORECAST_ERROR = {
+    "solar": (0.20, 0.010),
+    "wind": (0.30, 0.010),
+    "load": (0.12, 0.003),
+}
+FORECAST_ERROR_MAX_SIGMA = 0.8
+FORECAST_ERROR_CORRELATION = 0.85  # AR(1) hora a hora
+
+# Escenarios simulados juntos en el año horario (acota memoria: 128 × 8760)
+SIZING_BATCH = 128
+
+# "Batería ideal" para medir el almacenamiento requerido (sin límites prácticos)
+IDEAL_BATTERY_WH = 1e9
+
+# Pasos de bisección del almacenamiento requerido (resolución: caída máxima / 2^N)
+STORAGE_BISECTION_STEPS = 10
+
+# Más días de almacenamiento que esto en el año de diseño = déficit estacional:
+# corresponde más generación, no más batería
+MAX_AUTONOMY_DAYS = 7.0
+
+
+def _seed(seed: Optional[int]) -> int:
+    """Semilla a usar (una nueva si no se indicó, para poder repetir la corrida)"""
+    if seed is not None:
+        return int(seed)
+    return int(np.random.SeedSequence().entropy % (2 ** 32))
+
+
+def bands(values: np.ndarray, axis: int = 0, decimals: int = 4, percentiles: Sequence[int] = PERCENTILES) -> Dict:
+    """Percentiles como {"p5": ..., "p50": ...} (listas si queda más de una dimensión)"""
+    result = np.percentile(values, percentiles, axis=axis)
+    return {
+        f"p{p}": np.round(row, decimals).tolist() if np.ndim(row) else round(float(row), decimals)
+        for p, row in zip(percentiles, result)
+    }
+
+
+# ===== 1. DIMENSIONAMIENTO: AÑOS SINTÉTICOS =====
+
+def storage_for_lolp(
+    net_w: np.ndarray,
+    ideal: SystemConfig,
+    upper_wh: np.ndarray,
+    max_unmet_wh: float
+) -> np.ndarray:
+    """
+    Almacenamiento útil mínimo (Wh) con el que cada columna de net_w (T, B)
+    deja a lo sumo max_unmet_wh sin servir en el año
+
+    Bisección por columna (todas en el mismo despacho) entre 0 y upper_wh,
+    la caída máxima con batería ideal (que no deja nada sin servir).
+    """
+    lo = np.zeros_like(upper_wh)
+    hi = upper_wh.copy()
+    for _ in range(STORAGE_BISECTION_STEPS):
+        mid = (lo + hi) / 2
+        unmet = dispatch_battery(net_w, [replace(ideal, battery_wh=max(w, 1.0)) for w in mid])["unmet_w"]
+        ok = unmet.sum(axis=0) <= max_unmet_wh
+        hi = np.where(ok, mid, hi)
+        lo = np.where(ok, lo, mid)
+    return hi
+
+
+def bootstrap_daily(table, n_scenarios: int, rng: np.random.Generator, block_days: int = 7) -> Dict[str, np.ndarray]:
+    """
+    Años sintéticos (S, 365) por bootstrap por bloques de la serie diaria
+
+    Cada bloque de `block_days` días se toma de un año histórico al azar,
+    en la misma posición del calendario; solar, viento y temperatura salen
+    del mismo bloque (se conserva su correlación).
+    """
+    n_total = len(table.month)
+    n_years = n_total // DAYS_PER_YEAR
+    if n_years < 2:
+        raise ValueError(f"Se necesitan al menos 2 años de serie diaria ({n_total} días disponibles)")
+
+    first = n_total - n_years * DAYS_PER_YEAR
+    months = table.month[first:].astype(np.int64)
+
+    def by_year(values: np.ndarray, monthly: np.ndarray) -> np.ndarray:
+        return fill_missing(values[first:], monthly, months).reshape(n_years, DAYS_PER_YEAR)
+
+    solar = by_year(table.solar_daily, table.solar_monthly)
+    wind = by_year(table.wind10_daily, table.wind10_monthly)
+    temperature = by_year(table.temperature_daily, table.temperature_monthly)
+
+    n_blocks = math.ceil(DAYS_PER_YEAR / block_days)
+    picks = rng.integers(n_years, size=(n_scenarios, n_blocks))
+    year_of_day = np.repeat(picks, block_days, axis=1)[:, :DAYS_PER_YEAR]
+    day = np.arange(DAYS_PER_YEAR)
+
+    return {
+        "day_start": day_epochs(table, n_total)[-DAYS_PER_YEAR:],
+        "solar": solar[year_of_day, day],
+        "wind10": wind[year_of_day, day],
+        "temperature": temperature[year_of_day, day],
+        "years": n_years,
+    }
+
+
+def simulate_sizing(
+    table,
+    config: SystemConfig,
+    load_profile_w: np.ndarray,
+    n_scenarios: int = 500,
+    seed: Optional[int] = None,
+    block_days: int = 7,
+    objective_lolp: float = 0.01,
+    autonomy_percentile: int = 90,
+    max_autonomy_days: float = MAX_AUTONOMY_DAYS
+) -> Dict:
+    """
+    Distribución de confiabilidad y autonomía requerida de un sistema
+
+    Args:
+        table: SiteResourceTable del sitio
+        config: Componentes (la batería se usa para LOLP / SoC; el
+            almacenamiento requerido se mide con una batería ideal)
+        load_profile_w: 24 valores (W por hora solar local)
+        objective_lolp: Objetivo de fracción de energía no servida: el
+            almacenamiento requerido es el mínimo que lo cumple en cada año
+        autonomy_percentile: Percentil de diseño del almacenamiento
+            (se agrega a las bandas de autonomía)
+        max_autonomy_days: Por encima de esto en el percentil de diseño la
+            generación se considera insuficiente
+    """
+    started = time.perf_counter()
+    seed = _seed(seed)
+    rng = np.random.default_rng(seed)
+    daily = bootstrap_daily(table, n_scenarios, rng, block_days)
+
+    ideal = replace(config, battery_wh=IDEAL_BATTERY_WH, battery_dod=1.0, battery_soc_max=1.0, max_c_rate=1e3)
+    lolp = np.empty(n_scenarios)
+    lolh = np.empty(n_scenarios)
+    longest = np.empty(n_scenarios)
+    soc_min = np.empty(n_scenarios)
+    required_wh = np.empty(n_scenarios)
+    balance_wh = np.empty(n_scenarios)
+    daily_load_wh = 0.0
+
+    for b0 in range(0, n_scenarios, SIZING_BATCH):
+        b1 = min(n_scenarios, b0 + SIZING_BATCH)
+        hourly = downscale_daily(
+            table.latitude, table.longitude, daily["day_start"],
+            daily["solar"][b0:b1], daily["wind10"][b0:b1], daily["temperature"][b0:b1], rng
+        )
+        resource = HourlyResource(
+            table.latitude, table.longitude, hourly["times"], hourly["ghi_w_m2"],
+            hourly["wind10_ms"], hourly["temperature_c"], shear_alpha=table.shear_alpha
+        )
+        load = load_series(resource, load_profile_w)
+        daily_load_wh = load.sum() / DAYS_PER_YEAR
+        pv = pv_power_w(resource, config.pv_w, config.pv_system_efficiency)
+        net = np.ascontiguousarray((pv + wind_power_w(resource, config) - load).T)  # (T, B)
+        batch = b1 - b0
+
+        flows = dispatch_battery(net, [config] * batch)
+        unmet = flows["unmet_w"]
+        outage = unmet > UNMET_THRESHOLD_W
+        lolp[b0:b1] = unmet.sum(axis=0) / load.sum() if load.sum() > 0 else 0.0
+        lolh[b0:b1] = outage.sum(axis=0)
+        longest[b0:b1] = [longest_run(outage[:, i]) for i in range(batch)]
+        soc_min[b0:b1] = flows["energy_wh"].min(axis=0) / config.battery_wh if config.battery_wh > 0 else 0.0
+
+        # Almacenamiento mínimo que cumple el objetivo, acotado por la máxima
+        # caída desde lleno (la que evita todo corte)
+        ideal_energy = dispatch_battery(net, [ideal] * batch)["energy_wh"]
+        drawdown = IDEAL_BATTERY_WH - ideal_energy.min(axis=0)
+        required_wh[b0:b1] = storage_for_lolp(net, ideal, drawdown, objective_lolp * load.sum())
+        balance_wh[b0:b1] = net.sum(axis=0)
+
+    elapsed = time.perf_counter() - started
+    usable_required = required_wh / config.battery_dod if config.battery_dod > 0 else required_wh
+    autonomy_bands = tuple(sorted(set(PERCENTILES) | {int(autonomy_percentile)}))
+    # En el año de diseño la generación no alcanza el consumo (la batería sólo
+    # traslada energía, no la crea) o lo alcanza sólo guardando semanas
+    required_days = required_wh / daily_load_wh if daily_load_wh > 0 else None
+    undersized = bool(
+        np.percentile(balance_wh, 100 - autonomy_percentile) < 0
+        or (required_days is not None and np.percentile(required_days, autonomy_percentile) > max_autonomy_days)
+    )
+    return {
+        "escenarios": n_scenarios,
+        "semilla": seed,
+        "bootstrap": {"bloque_dias": block_days, "anios_historicos": daily["years"]},
+        "confiabilidad": {
+            "fraccion_energia_no_servida": bands(lolp, decimals=5),
+            "horas_sin_suministro": bands(lolh, decimals=0),
+            "corte_mas_largo_h": bands(longest, decimals=0),
+            "probabilidad_deficit": round(float((lolh > 0).mean()), 4),
+            "probabilidad_cumplir_objetivo": round(float((lolp <= objective_lolp).mean()), 4),
+            "lolp_objetivo": objective_lolp
+        },
+        "bateria": {
+            "capacidad_kwh": round(config.battery_wh / 1000, 2),
+            "soc_minimo_porcentaje": bands(soc_min * 100, decimals=1)
+        },
+        "autonomia": {
+            "percentil_diseno": int(autonomy_percentile),
+            "lolp_objetivo": objective_lolp,
+            "balance_anual_kwh": bands(balance_wh / 1000, decimals=0),
+            "probabilidad_balance_negativo": round(float((balance_wh < 0).mean()), 4),
+            "generacion_insuficiente": undersized,
+            "almacenamiento_util_requerido_kwh": bands(required_wh / 1000, decimals=2, percentiles=autonomy_bands),
+            "capacidad_nominal_requerida_kwh": bands(usable_required / 1000, decimals=2, percentiles=autonomy_bands),
+            "dias_autonomia_requeridos": bands(required_days, decimals=2, percentiles=autonomy_bands)
+                if required_days is not None else None,
+            "dias_autonomia_maximos": max_autonomy_days
+        },
+        "rendimiento": {
+            "tiempo_ms": round(elapsed * 1000, 1),
+            "escenarios_por_s": round(n_scenarios / elapsed, 1) if elapsed > 0 else None
+        }
+    }
+
+
+# ===== 2. OPERACIÓN: ERRORES DE PRONÓSTICO =====
+
+def forecast_error_factors(
+    n_scenarios: int,
+    horizon: int,
+    rng: np.random.Generator,
+    sigma0: float,
+    growth_per_step: float,
+    correlation: float = FORECAST_ERROR_CORRELATION
+) -> np.ndarray:
+    """
+    Factores multiplicativos (S, T) log-normales de media 1, AR(1) en el
+    tiempo y σ creciente con el horizonte (por paso)
+    """
+    z = rng.standard_normal((n_scenarios, horizon))
+    innovation = math.sqrt(1 - correlation ** 2)
+    for t in range(1, horizon):
+        z[:, t] = correlation * z[:, t - 1] + innovation * z[:, t]
+    sigma = np.minimum(sigma0 + growth_per_step * np.arange(horizon), FORECAST_ERROR_MAX_SIGMA)
+    return np.exp(sigma * z - sigma ** 2 / 2)
+
+
+def simulate_forecast(
+    solar_w: np.ndarray,
+    wind_w: np.ndarray,
+    load_w: np.ndarray,
+    soc_percent: float,
+    battery: BatterySpec,
+    step_h: float = 1.0,
+    n_scenarios: int = 1000,
+    seed: Optional[int] = None
+) -> Dict:
+    """
+    Bandas de SoC y probabilidad de déficit para un pronóstico
+
+    Args:
+        solar_w, wind_w, load_w: Predicción por paso (T,)
+        soc_percent: SoC actual
+        battery: Batería del sistema (battery_engine.BatterySpec)
+        step_h: Duración del paso de la predicción en horas
+    """
+    started = time.perf_counter()
+    seed = _seed(seed)
+    rng = np.random.default_rng(seed)
+    solar_w = np.asarray(solar_w, dtype=np.float64)
+    wind_w = np.asarray(wind_w, dtype=np.float64)
+    load_w = np.asarray(load_w, dtype=np.float64)
+    horizon = len(load_w)
+
+    scenarios = {}
+    for name, base in (("solar", solar_w), ("wind", wind_w), ("load", load_w)):
+        sigma0, growth_per_hour = FORECAST_ERROR[name]
+        scenarios[name] = base * forecast_error_factors(
+            n_scenarios, horizon, rng, sigma0, growth_per_hour * step_h,
+            correlation=FORECAST_ERROR_CORRELATION ** step_h
+        )
+    net = np.ascontiguousarray((scenarios["solar"] + scenarios["wind"] - scenarios["load"]).T)  # (T, S)
+
+    flows = battery_engine.simulate(net, battery, step_h=step_h, initial_soc=soc_percent / 100)
+    soc = flows["soc"] * 100  # (T, S)
+    unmet = flows["unmet_w"]
+    outage = unmet > UNMET_THRESHOLD_W
+
+    # Autonomía: horas hasta tocar el SoC mínimo (censurada en el horizonte)
+    min_soc_percent = battery.soc_min * 100
+    at_min = soc <= min_soc_percent + 1e-6
+    reached = at_min.any(axis=0)
+    autonomy_h = np.where(reached, at_min.argmax(axis=0) + 1, horizon) * step_h
+
+    # Trayectoria sin errores, como referencia
+    deterministic = battery_engine.simulate(
+        solar_w + wind_w - load_w, battery, step_h=step_h, initial_soc=soc_percent / 100
+    )["soc"] * 100
+
+    elapsed = time.perf_counter() - started
+    return {
+        "escenarios": n_scenarios,
+        "semilla": seed,
+        "horizonte_h": horizon * step_h,
+        "paso_h": step_h,
+        "soc_porcentaje": {
+            "inicial": round(soc_percent, 1),
+            "bandas": bands(soc, axis=1, decimals=1),
+            "determinista": np.round(deterministic, 1).tolist()
+        },
+        "probabilidad_deficit": round(float(outage.any(axis=0).mean()), 4),
+        "probabilidad_soc_minimo": round(float(reached.mean()), 4),
+        "energia_no_servida_wh": bands(unmet.sum(axis=0) * step_h, decimals=0),
+        "autonomia_h": {
+            **bands(autonomy_h, decimals=1),
+            "probabilidad_mayor_horizonte": round(float((~reached).mean()), 4)
+        },
+        "soc_final_porcentaje": bands(soc[-1], decimals=1),
+        "rendimiento": {
+            "tiempo_ms": round(elapsed * 1000, 2),
+            "escenarios_por_s": round(n_scenarios / elapsed, 0) if elapsed > 0 else None
+        }
+    }
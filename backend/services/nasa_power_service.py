@@ -9,13 +9,67 @@ Datos disponibles:
 - Humedad
 - Presión
 
-GRATIS y sin límite de requests
+GRATIS, pero con límite de uso: las requests a la red pasan por un
+semáforo (concurrencia máxima) y un espaciado mínimo entre inicios, y
+respetan Retry-After ante un 429.
+
+Las respuestas se guardan en la caché local (services/climate_cache.py):
+una consulta repetida para la misma celda/período no sale a la red, y
+consultas idénticas en vuelo comparten una sola request. La caché es
+SQLite sincrónico: se consulta siempre desde un hilo (asyncio.to_thread).
+
+El cliente HTTP es el compartido de services/http_clients.py ("nasa_power").
+
+Las salidas a la red pasan por el circuit breaker "nasa_power"
+(services/circuit_breaker.py): con NASA caída se falla al instante
+(CircuitOpenError) y get_historical_data responde con el último dato
+bueno de la celda antes que con los valores por defecto.
+
+Es el ÚNICO cliente NASA POWER del backend. El código sincrónico
+(recommendation_service, nasa_power_service.py legacy) usa
+NASAPowerSyncFacade, que ejecuta las corrutinas en el event loop
+principal desde un hilo de trabajo.
 """
 
 import httpx
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 import asyncio
+import concurrent.futures
+import math
+import statistics
+import threading
+import time
+import weakref
+
+from pydantic import BaseModel
+
+from services import http_clients, nasa_response
+from services.circuit_breaker import CircuitOpenError, get_breaker
+from services.climate_cache import climate_cache, grid_cell
+
+
+class ClimateSummary(BaseModel):
+    """
+    Resumen climático uniforme (mensual o diario) de un punto
+    """
+    latitude: float
+    longitude: float
+    temporal: str                  # "monthly" | "daily"
+    start: str
+    end: str
+    years: int
+    
+    solar_kwh_m2_day: float        # Promedio ALLSKY_SFC_SW_DWN
+    wind_speed_ms: float           # Promedio del parámetro de viento
+    wind_parameter: str            # WS50M / WS10M
+    temperature_c: Optional[float] = None
+    
+    solar_monthly: List[float]     # 12 valores (0 en meses sin datos)
+    wind_monthly: List[float]
+    
+    source: str = "NASA POWER"
+
 
 class NASAPowerService:
     """
@@ -39,12 +93,125 @@ class NASAPowerService:
         "WD50M",               # Dirección viento 50m (°)
     ]
     
-    def __init__(self):
-        self.client = httpx.AsyncClient(timeout=30.0)
+    MAX_RETRIES = 3
+    TIMEOUT_S = 30.0
+    
+    def __init__(self, max_concurrency: int = 4, min_request_interval_s: float = 0.25):
+        # Límites hacia NASA POWER (compartidos por todas las consultas).
+        # Semáforo y lock por event loop (el de la app y el de NASAPowerSyncFacade),
+        # creados al primer uso en ese loop, no al importar
+        self.max_concurrency = max_concurrency
+        self.min_request_interval_s = min_request_interval_s
+        self._loop_limits = weakref.WeakKeyDictionary()  # loop → (semáforo, lock)
+        self._last_request_at = 0.0
+        
+        # Consultas en vuelo por clave de caché (coalescing)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.coalesced = 0
+        
+        self.breaker = get_breaker("nasa_power")
     
-    async def close(self):
-        """Cerrar cliente HTTP"""
-        await self.client.aclose()
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Cliente HTTP compartido (pool de services/http_clients.py)"""
+        return http_clients.get_client("nasa_power", timeout=self.TIMEOUT_S)
+    
+    def _limits(self) -> Tuple[asyncio.Semaphore, asyncio.Lock]:
+        """Semáforo de concurrencia y lock de espaciado del event loop actual"""
+        loop = asyncio.get_running_loop()
+        limits = self._loop_limits.get(loop)
+        if limits is None:
+            limits = self._loop_limits[loop] = (asyncio.Semaphore(self.max_concurrency), asyncio.Lock())
+        return limits
+    
+    async def _get_json(self, url: str, params: Dict) -> Dict:
+        """
+        GET a NASA POWER con concurrencia acotada, espaciado mínimo
+        entre requests y reintento ante 429 / 503 (Retry-After)
+        """
+        semaphore, pace_lock = self._limits()
+        async with semaphore:
+            for attempt in range(self.MAX_RETRIES + 1):
+                async with pace_lock:
+                    wait = self._last_request_at + self.min_request_interval_s - time.monotonic()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                    self._last_request_at = time.monotonic()
+                
+                response = await self.client.get(url, params=params)
+                
+                if response.status_code in (429, 503) and attempt < self.MAX_RETRIES:
+                    retry_after = response.headers.get("Retry-After", "")
+                    delay = float(retry_after) if retry_after.isdigit() else 2.0 ** attempt
+                    print(f"⏳ NASA POWER {response.status_code}, reintentando en {delay:.0f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                
+                response.raise_for_status()
+                return response.json()
+    
+    async def _fetch(
+        self,
+        endpoint: str,
+        latitude: float,
+        longitude: float,
+        parameters: List[str],
+        start: str,
+        end: str
+    ) -> Dict:
+        """
+        Caché local → consulta en vuelo idéntica → red (y guardar en caché)
+        """
+        cached = await asyncio.to_thread(
+            climate_cache.require, latitude, longitude, endpoint, parameters, start, end
+        )
+        if cached is not None:
+            return cached
+        
+        key = climate_cache.make_key(latitude, longitude, endpoint, parameters, start, end)[0]
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+        
+        if not self.breaker.allow():
+            raise CircuitOpenError("NASA POWER no disponible (circuito abierto)")
+        
+        async def fetch() -> Dict:
+            try:
+                try:
+                    data = await self._get_json(f"{self.BASE_URL}/{endpoint}/point", {
+                        "parameters": ",".join(parameters),
+                        "community": "RE",  # Renewable Energy
+                        "longitude": longitude,
+                        "latitude": latitude,
+                        "start": start,
+                        "end": end,
+                        "format": "JSON"
+                    })
+                except httpx.HTTPStatusError as e:
+                    # 4xx (parámetros inválidos): NASA responde, no es una caída
+                    if e.response.status_code < 500 and e.response.status_code != 429:
+                        self.breaker.record_success()
+                    else:
+                        self.breaker.record_failure(e)
+                    raise
+                except Exception as e:
+                    self.breaker.record_failure(e)
+                    raise
+                except BaseException:
+                    self.breaker.release_trial()  # Cancelada: no bloquear half_open
+                    raise
+                self.breaker.record_success()
+                await asyncio.to_thread(
+                    climate_cache.put, latitude, longitude, endpoint, parameters, start, end, data
+                )
+                return data
+            finally:
+                self._inflight.pop(key, None)
+        
+        task = self._inflight[key] = asyncio.create_task(fetch())
+        return await asyncio.shield(task)
     
     async def get_monthly_data(
         self,
@@ -70,24 +237,9 @@ class NASAPowerService:
         if parameters is None:
             parameters = self.SOLAR_PARAMS + self.WIND_PARAMS
         
-        params_str = ",".join(parameters)
-        
-        url = f"{self.BASE_URL}/monthly/point"
-        
-        params = {
-            "parameters": params_str,
-            "community": "RE",  # Renewable Energy
-            "longitude": longitude,
-            "latitude": latitude,
-            "start": start_year,
-            "end": end_year,
-            "format": "JSON"
-        }
-        
-        response = await self.client.get(url, params=params)
-        response.raise_for_status()
-        
-        return response.json()
+        return await self._fetch(
+            "monthly", latitude, longitude, parameters, str(start_year), str(end_year)
+        )
     
     async def get_daily_data(
         self,
@@ -113,24 +265,53 @@ class NASAPowerService:
         if parameters is None:
             parameters = self.SOLAR_PARAMS + self.WIND_PARAMS
         
-        params_str = ",".join(parameters)
-        
-        url = f"{self.BASE_URL}/daily/point"
+        return await self._fetch("daily", latitude, longitude, parameters, start_date, end_date)
+    
+    async def get_climate_summary(
+        self,
+        latitude: float,
+        longitude: float,
+        years: int = 10,
+        temporal: str = "monthly",
+        wind_parameter: str = "WS50M"
+    ) -> ClimateSummary:
+        """
+        Resumen climático uniforme a partir de datos mensuales o diarios
         
-        params = {
-            "parameters": params_str,
-            "community": "RE",
-            "longitude": longitude,
-            "latitude": latitude,
-            "start": start_date,
-            "end": end_date,
-            "format": "JSON"
-        }
+        Períodos estables (años completos / hasta fin del mes anterior)
+        para que la caché local sirva entre llamadas.
+        """
+        if temporal == "monthly":
+            end_year = datetime.now().year - 1  # Último año completo
+            start_year = end_year - years + 1
+            start, end = str(start_year), str(end_year)
+            parameters = self.SOLAR_PARAMS + self.WIND_PARAMS
+            data = await self.get_monthly_data(latitude, longitude, start_year, end_year, parameters)
+        else:
+            end_date = datetime.now().replace(day=1) - timedelta(days=1)
+            start_date = end_date - timedelta(days=years * 365)
+            start, end = start_date.strftime('%Y%m%d'), end_date.strftime('%Y%m%d')
+            parameters = ["ALLSKY_SFC_SW_DWN", wind_parameter]
+            data = await self.get_daily_data(latitude, longitude, start, end, parameters)
         
-        response = await self.client.get(url, params=params)
-        response.raise_for_status()
+        # Decodificar a columnas (NaN en datos faltantes, mes 13 = anual aparte)
+        frame = nasa_response.decode(data, ["ALLSKY_SFC_SW_DWN", wind_parameter, "T2M"])
+        temperature = frame.mean("T2M")
         
-        return response.json()
+        return ClimateSummary(
+            latitude=latitude,
+            longitude=longitude,
+            temporal=temporal,
+            start=start,
+            end=end,
+            years=years,
+            solar_kwh_m2_day=frame.mean("ALLSKY_SFC_SW_DWN"),
+            wind_speed_ms=frame.mean(wind_parameter),
+            wind_parameter=wind_parameter,
+            temperature_c=None if math.isnan(temperature) else temperature,
+            solar_monthly=nasa_response.nan_to_zero(frame.monthly_mean("ALLSKY_SFC_SW_DWN")),
+            wind_monthly=nasa_response.nan_to_zero(frame.monthly_mean(wind_parameter))
+        )
     
     async def get_historical_average(
         self,
@@ -156,80 +337,282 @@ class NASAPowerService:
                 "wind_speed_monthly": [...]      # Por mes
             }
         """
-        end_year = datetime.now().year - 1  # Último año completo
-        start_year = end_year - years_back + 1
+        summary = await self.get_climate_summary(latitude, longitude, years=years_back)
         
-        data = await self.get_monthly_data(
-            latitude, longitude,
-            start_year, end_year
-        )
+        return {
+            "solar_irradiance_avg": _or_zero(summary.solar_kwh_m2_day),
+            "wind_speed_avg": _or_zero(summary.wind_speed_ms),
+            "temperature_avg": summary.temperature_c or 0,
+            "solar_irradiance_monthly": summary.solar_monthly,
+            "wind_speed_monthly": summary.wind_monthly,
+            "years_analyzed": years_back,
+            "period": f"{summary.start}-{summary.end}"
+        }
+    
+    async def get_historical_data(
+        self,
+        latitude: float,
+        longitude: float,
+        years: int = 5
+    ) -> Dict:
+        """
+        Promedios de radiación solar y viento a 10m desde datos diarios
+        (formato del antiguo nasa_power_service.py)
+        
+        Returns:
+            Dict con promedios y promedios mensuales; si NASA no responde,
+            el último dato bueno de la celda o status 'default' con valores
+            por defecto
+        """
+        last_good_key = ("historical", *grid_cell(latitude, longitude), years)
+        try:
+            summary = await self.get_climate_summary(
+                latitude, longitude, years=years, temporal="daily", wind_parameter="WS10M"
+            )
+        except Exception as e:
+            last_good = self.breaker.last_good(last_good_key)
+            if last_good is not None:
+                self.breaker.last_good_served += 1
+                return last_good
+            if not isinstance(e, CircuitOpenError):
+                print(f"❌ Error obteniendo datos NASA POWER: {e}")
+            self.breaker.fallbacks += 1
+            return self._get_default_data()
         
-        # Extraer parámetros
-        params = data["properties"]["parameter"]
-        
-        # Calcular promedios
-        solar_values = []
-        wind_values = []
-        temp_values = []
-        
-        # Promedios por mes (12 meses)
-        solar_monthly = [[] for _ in range(12)]
-        wind_monthly = [[] for _ in range(12)]
-        
-        for key, value in params.get("ALLSKY_SFC_SW_DWN", {}).items():
-            if isinstance(value, (int, float)):
-                solar_values.append(value)
-                month = int(key[-2:]) - 1  # Extraer mes
-                solar_monthly[month].append(value)
-        
-        for key, value in params.get("WS50M", {}).items():
-            if isinstance(value, (int, float)):
-                wind_values.append(value)
-                month = int(key[-2:]) - 1
-                wind_monthly[month].append(value)
-        
-        for key, value in params.get("T2M", {}).items():
-            if isinstance(value, (int, float)):
-                temp_values.append(value)
-        
-        # Calcular promedios mensuales
-        solar_monthly_avg = [
-            sum(month) / len(month) if month else 0
-            for month in solar_monthly
-        ]
-        
-        wind_monthly_avg = [
-            sum(month) / len(month) if month else 0
-            for month in wind_monthly
-        ]
+        avg_solar = summary.solar_kwh_m2_day
+        avg_wind = summary.wind_speed_ms
+        if math.isnan(avg_solar) or math.isnan(avg_wind):
+            print("⚠️ NASA POWER sin datos válidos")
+            return self._get_default_data()
+        
+        print(f"✅ Datos obtenidos: Solar={avg_solar:.1f} kWh/m²/día, Viento={avg_wind:.1f} m/s")
+        
+        start = datetime.strptime(summary.start, '%Y%m%d')
+        end = datetime.strptime(summary.end, '%Y%m%d')
+        
+        result = {
+            'status': 'success',
+            'source': 'NASA POWER',
+            'location': {
+                'latitude': latitude,
+                'longitude': longitude
+            },
+            'period': {
+                'start': start.strftime('%Y-%m-%d'),
+                'end': end.strftime('%Y-%m-%d'),
+                'years': years
+            },
+            'averages': {
+                'solar_irradiance_kwh_m2_day': round(avg_solar, 2),
+                'solar_irradiance_w_m2': round(avg_solar * 1000 / 24, 2),  # Promedio por hora
+                'wind_speed_ms': round(avg_wind, 2),
+                'sun_hours_day': round(avg_solar / 0.85, 1)  # Estimado (asumiendo 850W/m² pico)
+            },
+            'monthly': {
+                'solar_kwh_m2_day': {m: round(v, 2) for m, v in enumerate(summary.solar_monthly, start=1)},
+                'wind_ms': {m: round(v, 2) for m, v in enumerate(summary.wind_monthly, start=1)}
+            }
+        }
+        self.breaker.remember(last_good_key, result)
+        return result
+    
+    async def get_prediction_model_data(
+        self,
+        latitude: float,
+        longitude: float,
+        years: int = 5
+    ) -> Dict:
+        """
+        Obtener datos para el modelo de predicción
+        Incluye patrones estacionales y promedios
+        """
+        historical = await self.get_historical_data(latitude, longitude, years=years)
+        
+        if historical['status'] == 'default':
+            return historical
+        
+        # Calcular patrones estacionales (hemisferio sur)
+        monthly_solar = historical['monthly']['solar_kwh_m2_day']
+        monthly_wind = historical['monthly']['wind_ms']
+        
+        # Verano (Dic-Feb), Otoño (Mar-May), Invierno (Jun-Ago), Primavera (Sep-Nov)
+        seasons = {
+            'summer': [12, 1, 2],
+            'autumn': [3, 4, 5],
+            'winter': [6, 7, 8],
+            'spring': [9, 10, 11]
+        }
+        
+        seasonal_data = {}
+        for season, months in seasons.items():
+            solar_avg = statistics.mean([monthly_solar.get(m, 0) for m in months])
+            wind_avg = statistics.mean([monthly_wind.get(m, 0) for m in months])
+            seasonal_data[season] = {
+                'solar_kwh_m2_day': round(solar_avg, 2),
+                'wind_ms': round(wind_avg, 2)
+            }
         
         return {
-            "solar_irradiance_avg": sum(solar_values) / len(solar_values) if solar_values else 0,
-            "wind_speed_avg": sum(wind_values) / len(wind_values) if wind_values else 0,
-            "temperature_avg": sum(temp_values) / len(temp_values) if temp_values else 0,
-            "solar_irradiance_monthly": solar_monthly_avg,
-            "wind_speed_monthly": wind_monthly_avg,
-            "years_analyzed": years_back,
-            "period": f"{start_year}-{end_year}"
+            'status': 'success',
+            'source': 'NASA POWER',
+            'location': historical['location'],
+            'period': historical['period'],
+            'averages': historical['averages'],
+            'monthly': historical['monthly'],
+            'seasonal': seasonal_data,
+            'best_month_solar': max(monthly_solar, key=monthly_solar.get),
+            'best_month_wind': max(monthly_wind, key=monthly_wind.get),
+            'worst_month_solar': min(monthly_solar, key=monthly_solar.get),
+            'worst_month_wind': min(monthly_wind, key=monthly_wind.get)
+        }
+    
+    def _get_default_data(self) -> Dict:
+        """Datos por defecto si falla la API"""
+        return {
+            'status': 'default',
+            'source': 'Default values',
+            'averages': {
+                'solar_irradiance_kwh_m2_day': 5.5,
+                'solar_irradiance_w_m2': 850,
+                'wind_speed_ms': 6.5,
+                'sun_hours_day': 5.5
+            }
         }
+    
+    async def prefetch_sites(self, sites: List[Dict], years_back: int = 10) -> List[Dict]:
+        """
+        Precargar la caché para una lista de sitios [{"latitude", "longitude"}]
+        
+        Returns:
+            Estado por sitio (cached / fetched / error)
+        """
+        end_year = datetime.now().year - 1
+        start_year = end_year - years_back + 1
+        parameters = self.SOLAR_PARAMS + self.WIND_PARAMS
+        
+        # Estado previo de la caché, antes de que el lote la complete
+        was_cached = await asyncio.to_thread(lambda: [
+            climate_cache.get(
+                site["latitude"], site["longitude"], "monthly", parameters, str(start_year), str(end_year)
+            ) is not None
+            for site in sites
+        ])
+        
+        results = [None] * len(sites)
+        async for item in iter_sites_climate(sites, years_back=years_back):
+            i = item["index"]
+            if item["status"] == "error":
+                status = f"error: {item['error']}"
+            else:
+                status = "cached" if was_cached[i] else "fetched"
+            results[i] = {"latitude": item["latitude"], "longitude": item["longitude"], "status": status}
+        
+        return results
 
 
 # Singleton instance
-nasa_service = NASAPowerService()
+def _default_service() -> NASAPowerService:
+    from config import get_settings
+    settings = get_settings()
+    return NASAPowerService(
+        max_concurrency=settings.nasa_max_concurrency,
+        min_request_interval_s=settings.nasa_min_request_interval_s
+    )
+
 
+nasa_service = _default_service()
 
-async def get_location_climate_data(latitude: float, longitude: float) -> Dict:
+
+def _or_zero(value: float) -> float:
+    return 0 if math.isnan(value) else value
+
+
+class NASAPowerSyncFacade:
+    """
+    Fachada sincrónica sobre nasa_service para código legacy
+    
+    Las corrutinas se ejecutan en el event loop principal (bind_loop en el
+    startup), compartiendo cliente HTTP, caché y coalescing. Debe llamarse
+    desde un hilo de trabajo (p.ej. asyncio.to_thread), nunca desde el loop.
+    Sin loop enlazado (scripts) usa un loop propio en un hilo daemon.
+    """
+    
+    def __init__(self, service: NASAPowerService, timeout_s: float = 120.0):
+        self.service = service
+        self.timeout_s = timeout_s
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._own_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+    
+    def bind_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Enlazar al event loop de la aplicación"""
+        self._loop = loop
+    
+    def _target_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is not None and not self._loop.is_closed():
+            return self._loop
+        
+        with self._lock:
+            if self._own_loop is None:
+                self._own_loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._own_loop.run_forever,
+                    name="nasa-power-sync",
+                    daemon=True
+                ).start()
+        return self._own_loop
+    
+    def _run(self, coro):
+        loop = self._target_loop()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            coro.close()
+            raise RuntimeError(
+                "NASAPowerSyncFacade llamada desde el event loop: usar 'await nasa_service...' "
+                "o asyncio.to_thread(...)"
+            )
+        
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        try:
+            return future.result(timeout=self.timeout_s)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+    
+    def get_historical_data(self, latitude: float, longitude: float, years: int = 5) -> Dict:
+        return self._run(self.service.get_historical_data(latitude, longitude, years=years))
+    
+    def get_prediction_model_data(self, latitude: float, longitude: float, years: int = 5) -> Dict:
+        return self._run(self.service.get_prediction_model_data(latitude, longitude, years=years))
+    
+    def get_resource_table(self, latitude: float, longitude: float):
+        """Tabla de recurso del sitio (services/resource_table.py), None si no hay datos"""
+        from services.resource_table import get_resource_or_none
+        return self._run(get_resource_or_none(latitude, longitude))
+    
+    def get_climate_summary(self, latitude: float, longitude: float, **kwargs) -> ClimateSummary:
+        return self._run(self.service.get_climate_summary(latitude, longitude, **kwargs))
+
+
+nasa_sync = NASAPowerSyncFacade(nasa_service)
+
+
+async def get_location_climate_data(latitude: float, longitude: float, years_back: int = 10) -> Dict:
     """
     Obtener datos climáticos históricos para una ubicación
     
     Args:
         latitude: Latitud
         longitude: Longitud
+        years_back: Años de histórico
     
     Returns:
         Dict con datos de clima históricos y promedios
     """
-    avg_data = await nasa_service.get_historical_average(latitude, longitude, years_back=10)
+    avg_data = await nasa_service.get_historical_average(latitude, longitude, years_back=years_back)
     
     return {
         "location": {
@@ -255,3 +638,58 @@ async def get_location_climate_data(latitude: float, longitude: float) -> Dict:
         "data_source": "NASA POWER API",
         "period": avg_data["period"]
     }
+
+
+async def iter_sites_climate(
+    sites: List[Dict],
+    years_back: int = 10
+) -> AsyncIterator[Dict]:
+    """
+    Climatología para muchos sitios, entregada a medida que se completa
+    
+    - Deduplica por celda de grilla NASA: una sola request por celda; el
+      resto de los sitios de la celda sale de la caché local
+    - Las celdas se consultan en paralelo, acotadas por el semáforo de
+      nasa_service (concurrencia + espaciado + Retry-After)
+    
+    Args:
+        sites: [{"latitude", "longitude"}, ...]
+    
+    Yields:
+        {"index", "latitude", "longitude", "grid_cell", "status": "success"|"error",
+         "data" | "error"}
+    """
+    cells: Dict[tuple, List[int]] = {}
+    for i, site in enumerate(sites):
+        cells.setdefault(grid_cell(site["latitude"], site["longitude"]), []).append(i)
+    
+    async def fetch_cell(cell: tuple, indices: List[int]) -> List[Dict]:
+        items = []
+        for i in indices:
+            lat, lon = sites[i]["latitude"], sites[i]["longitude"]
+            item = {"index": i, "latitude": lat, "longitude": lon, "grid_cell": list(cell)}
+            try:
+                item["data"] = await get_location_climate_data(lat, lon, years_back=years_back)
+                item["status"] = "success"
+            except Exception as e:
+                item["status"] = "error"
+                item["error"] = str(e)
+            items.append(item)
+        return items
+    
+    tasks = [asyncio.create_task(fetch_cell(cell, indices)) for cell, indices in cells.items()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            for item in await next_done:
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def get_sites_climate(sites: List[Dict], years_back: int = 10) -> List[Dict]:
+    """Como iter_sites_climate, pero devuelve la lista completa en el orden de entrada"""
+    results = [None] * len(sites)
+    async for item in iter_sites_climate(sites, years_back=years_back):
+        results[item["index"]] = item
+    return results
@@ -0,0 +1,166 @@
+"""
+Decodificador vectorizado de respuestas NASA POWER
+
+Convierte properties.parameter ({"PARAM": {"YYYYMMDD": valor, ...}}) en
+columnas NumPy en una sola pasada:
+
+- Claves de fecha → arrays year / month / day (sin strptime por clave)
+- Valor de relleno (-999) → NaN
+- Promedios mensuales / anuales con np.bincount (group-by vectorizado)
+
+Soporta respuestas diarias (YYYYMMDD) y mensuales (YYYYMM, donde el
+mes 13 es el promedio anual que agrega NASA y se separa aparte).
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+FILL_VALUE = -999.0
+
+
+class NASAResponseFrame:
+    """
+    Datos NASA POWER en formato columnar
+
+    Attributes:
+        temporal: "daily" o "monthly"
+        year, month, day: arrays int (day = 0 en respuestas mensuales)
+        columns: {parámetro: array float64 con NaN donde faltaba el dato}
+        annual: {parámetro: (años, valores)} filas "mes 13" de respuestas mensuales
+    """
+
+    def __init__(
+        self,
+        temporal: str,
+        year: np.ndarray,
+        month: np.ndarray,
+        day: np.ndarray,
+        columns: Dict[str, np.ndarray],
+        annual: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]] = None
+    ):
+        self.temporal = temporal
+        self.year = year
+        self.month = month
+        self.day = day
+        self.columns = columns
+        self.annual = annual or {}
+
+    def __len__(self) -> int:
+        return len(self.year)
+
+    def __contains__(self, parameter: str) -> bool:
+        return parameter in self.columns
+
+    def column(self, parameter: str) -> np.ndarray:
+        """Columna del parámetro (todo NaN si la respuesta no lo trae)"""
+        values = self.columns.get(parameter)
+        if values is None:
+            return np.full(len(self), np.nan)
+        return values
+
+    def mean(self, parameter: str, default: float = float("nan")) -> float:
+        """Promedio ignorando datos faltantes (default si no hay ninguno)"""
+        values = self.column(parameter)
+        valid = values[~np.isnan(values)]
+        return float(valid.mean()) if valid.size else default
+
+    def monthly_mean(self, parameter: str) -> np.ndarray:
+        """Promedio por mes calendario: array de 12 (NaN en meses sin datos)"""
+        return _group_mean(self.month, self.column(parameter), 13)[1:]
+
+    def annual_mean(self, parameter: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Promedio por año: (años, valores)"""
+        values = self.column(parameter)
+        if not len(self):
+            return np.array([], dtype=np.int64), np.array([])
+        first = int(self.year.min())
+        means = _group_mean(self.year - first, values, int(self.year.max()) - first + 1)
+        years = np.arange(first, first + len(means))
+        has_data = ~np.isnan(means)
+        return years[has_data], means[has_data]
+
+    def to_dataframe(self):
+        """DataFrame de pandas (year, month, day + una columna por parámetro)"""
+        import pandas as pd
+
+        return pd.DataFrame({
+            "year": self.year,
+            "month": self.month,
+            "day": self.day,
+            **self.columns
+        })
+
+
+def decode(nasa_data: Dict, parameters: Optional[List[str]] = None) -> NASAResponseFrame:
+    """
+    Decodificar una respuesta NASA POWER (JSON ya parseado)
+
+    Args:
+        nasa_data: Respuesta completa ({"properties": {"parameter": {...}}, "header": {...}})
+        parameters: Parámetros a extraer (default: todos los de la respuesta)
+    """
+    params = nasa_data["properties"]["parameter"]
+    fill = float(nasa_data.get("header", {}).get("fill_value", FILL_VALUE))
+
+    names = list(params) if parameters is None else [p for p in parameters if p in params]
+    if not names:
+        empty = np.array([], dtype=np.int64)
+        return NASAResponseFrame("daily", empty, empty, empty, {})
+
+    ref_keys = list(params[names[0]])
+    n = len(ref_keys)
+    if n == 0:
+        empty = np.array([], dtype=np.int64)
+        return NASAResponseFrame("daily", empty, empty, empty, {name: np.array([]) for name in names})
+
+    keys = np.array(ref_keys).astype(np.int64)
+    daily = len(ref_keys[0]) == 8
+
+    if daily:
+        year = keys // 10000
+        month = (keys // 100) % 100
+        day = keys % 100
+    else:
+        year = keys // 100
+        month = keys % 100
+        day = np.zeros(n, dtype=np.int64)
+
+    columns = {}
+    for name in names:
+        series = params[name]
+        if list(series) == ref_keys:
+            values = np.fromiter(series.values(), dtype=np.float64, count=n)
+        else:
+            # Claves en otro orden / incompletas: alinear a la referencia
+            values = np.fromiter((series.get(k, fill) for k in ref_keys), dtype=np.float64, count=n)
+        values[values == fill] = np.nan
+        columns[name] = values
+
+    annual = {}
+    if not daily:
+        is_annual = month == 13
+        if is_annual.any():
+            keep = ~is_annual
+            annual = {name: (year[is_annual], values[is_annual]) for name, values in columns.items()}
+            year, month, day = year[keep], month[keep], day[keep]
+            columns = {name: values[keep] for name, values in columns.items()}
+
+    return NASAResponseFrame("daily" if daily else "monthly", year, month, day, columns, annual)
+
+
+def nan_to_zero(values: np.ndarray, decimals: Optional[int] = None) -> List[float]:
+    """Lista de floats con NaN → 0 (formato que esperan los callers existentes)"""
+    values = np.nan_to_num(values, nan=0.0)
+    if decimals is not None:
+        values = np.round(values, decimals)
+    return values.tolist()
+
+
+def _group_mean(groups: np.ndarray, values: np.ndarray, size: int) -> np.ndarray:
+    valid = ~np.isnan(values)
+    sums = np.bincount(groups[valid], weights=values[valid], minlength=size)
+    counts = np.bincount(groups[valid], minlength=size)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
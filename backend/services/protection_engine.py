@@ -0,0 +1,380 @@
+"""
+Motor de protección en tiempo real sobre el flujo de telemetría
+
+WindProtectionSystem y BatteryProtectionSystem sólo evaluaban cuando
+alguien llamaba a sus endpoints con parámetros: nunca veían el
+turbine_rpm, v_wind_v_dc ni v_bat_v que llegan del ESP32. Acá cada
+muestra (suelta o de un lote) se evalúa al llegar, antes de persistir,
+con trabajo O(1) por muestra:
+
+- Límites con histéresis: dispara en `trip` y se libera recién al
+  volver más allá de `release` (sin oscilar en el umbral)
+- Debounce: la condición tiene que sostenerse trip_debounce_s para
+  disparar y release_debounce_s para liberar (una muestra con ruido no
+  mueve relés), medido con el reloj del propio ESP32 (ts)
+- Estado por dispositivo; los límites activos definen el estado deseado
+  de cada actuador (freno, carga, solar) y sólo un cambio genera comando,
+  directo a la cola de command_dispatcher (reemplaza un pendiente del
+  mismo actuador). Si el ESP32 informa relés distintos de lo ordenado, se
+  reenvía con espera creciente (resend_s, 2×, 4×...) hasta max_resends
+- Latencia de evaluación y de emisión de comandos en histogramas
+
+Umbrales de turbina desde WindProtectionSystem, de SoC desde
+BatteryProtectionSystem (los del contexto de cada dispositivo si se pasa
+`resolve`, services/device_runtime.py), de tensión de batería y escalas
+de ADC desde config.py. v_wind_v_dc y v_bat_v son tensiones de ADC: sin
+escala configurada (PROTECTION_V_WIND_SCALE=0) el límite de tensión
+eólica no se evalúa, y la batería usa voltaje_promedio.
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import get_settings
+from services.control_scheduler import Histogram
+
+
+settings = get_settings()
+
+# Cubetas (ms) para tiempos de evaluación: microsegundos a milisegundos
+LATENCY_BOUNDS_MS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Estado normal de los actuadores (sin ningún límite activo)
+NORMAL_ACTUATORS = {"freno": False, "carga": True, "solar": True}
+
+# Límite → actuador y valor que impone mientras está activo
+LIMIT_ACTIONS = {
+    "rpm_turbina": (("freno", True),),
+    "tension_eolica": (("freno", True),),
+    "viento": (("freno", True),),
+    "soc_bajo": (("carga", False),),
+    "tension_bateria_baja": (("carga", False),),
+    "soc_alto": (("solar", False), ("freno", True)),  # Cortar solar y disipar el eólico
+    "tension_bateria_alta": (("solar", False), ("freno", True)),
+}
+
+
+@dataclass(frozen=True)
+class Limit:
+    """Umbral con histéresis (above: dispara por encima; si no, por debajo)"""
+    name: str
+    trip: float
+    release: float
+    above: bool = True
+
+    def tripped(self, value: float) -> bool:
+        return value >= self.trip if self.above else value <= self.trip
+
+    def released(self, value: float) -> bool:
+        return value < self.release if self.above else value > self.release
+
+
+class _Debounce:
+    """Estado de un límite en un dispositivo"""
+    __slots__ = ("active", "since", "value")
+
+    def __init__(self):
+        self.active = False
+        self.since: Optional[float] = None  # Inicio de la condición que cambiaría el estado
+        self.value = 0.0
+
+    def update(self, limit: Limit, value: float, now: float, trip_s: float, release_s: float) -> bool:
+        """Aplicar una muestra; True si el límite cambió de estado"""
+        self.value = value
+        changing = limit.released(value) if self.active else limit.tripped(value)
+        if not changing:
+            self.since = None
+            return False
+        if self.since is None or now < self.since:  # now < since: el ESP32 reinició su reloj
+            self.since = now
+        if now - self.since >= (release_s if self.active else trip_s):
+            self.active = not self.active
+            self.since = None
+            return True
+        return False
+
+
+class DeviceProtection:
+    """Límites, actuadores y último contacto de un dispositivo"""
+
+    def __init__(self):
+        self.limits: Dict[str, _Debounce] = {}
+        self.actuators = dict(NORMAL_ACTUATORS)
+        self.commanded_at: Dict[str, float] = {}  # time.monotonic() del último comando por actuador
+        self.resends: Dict[str, int] = {}  # Reenvíos desde la última orden por actuador
+        self.last_sample = 0.0  # time.monotonic()
+        self.trips = 0
+
+    def active_limits(self) -> List[str]:
+        return [name for name, state in self.limits.items() if state.active]
+
+    def desired_actuators(self) -> Dict[str, bool]:
+        desired = dict(NORMAL_ACTUATORS)
+        for name in self.active_limits():
+            for actuator, value in LIMIT_ACTIONS[name]:
+                desired[actuator] = value
+        return desired
+
+
+Command = Tuple[str, str, str, str]  # (device_id, comando, parámetro, motivo)
+
+
+class ProtectionEngine:
+    """
+    Evalúa cada muestra de telemetría y emite comandos de protección
+    """
+
+    def __init__(self, dispatcher, wind, battery, trip_debounce_s: float = 0.2,
+                 release_debounce_s: float = 5.0, hysteresis: float = 0.1,
+                 latency_budget_ms: float = 2.0, stale_s: float = 10.0, resend_s: float = 5.0,
+                 max_resends: int = 5, resolve: Optional[Callable[[str], Tuple[object, object]]] = None):
+        self.dispatcher = dispatcher
+        self.wind = wind
+        self.battery = battery
+        self.resolve = resolve  # device_id → (wind, battery) propios del dispositivo
+        self.trip_debounce_s = trip_debounce_s
+        self.release_debounce_s = release_debounce_s
+        self.hysteresis = hysteresis
+        self.latency_budget_ms = latency_budget_ms
+        self.stale_s = stale_s
+        self.resend_s = resend_s
+        self.max_resends = max_resends
+
+        self.devices: Dict[str, DeviceProtection] = {}
+        self.evaluation = Histogram(LATENCY_BOUNDS_MS)
+        self.emission = Histogram(LATENCY_BOUNDS_MS)
+        self.stats = {
+            "muestras": 0,
+            "disparos": 0,
+            "liberaciones": 0,
+            "comandos": 0,
+            "reenvios": 0,
+            "reenvios_agotados": 0,
+            "errores_envio": 0,
+            "errores_evaluacion": 0,
+            "fuera_de_presupuesto": 0,
+        }
+
+    # ===== LÍMITES =====
+
+    def systems(self, device_id: str) -> Tuple[object, object]:
+        """Sistemas de protección (eólica, batería) de un dispositivo"""
+        if self.resolve is None:
+            return self.wind, self.battery
+        return self.resolve(device_id)
+
+    def sample_limits(self, wind=None, battery=None) -> Tuple[Limit, ...]:
+        """Límites evaluados por muestra (leídos en cada llamada: siguen a los endpoints de config)"""
+        wind = wind or self.wind
+        battery = battery or self.battery
+        h = self.hysteresis
+        limits = [
+            Limit("rpm_turbina", wind.max_rpm, wind.max_rpm * (1 - h)),
+            Limit("soc_bajo", battery.critical_min_soc, battery.min_soc_optimal, above=False),
+            Limit("soc_alto", battery.critical_max_soc, battery.max_soc_optimal),
+        ]
+        if settings.protection_v_wind_scale > 0:
+            limits.append(Limit("tension_eolica", wind.max_voltage, wind.max_voltage * (1 - h)))
+        if settings.protection_battery_min_v > 0:
+            limits.append(Limit("tension_bateria_baja", settings.protection_battery_min_v,
+                                settings.protection_battery_min_v * (1 + h), above=False))
+        if settings.protection_battery_max_v > 0:
+            limits.append(Limit("tension_bateria_alta", settings.protection_battery_max_v,
+                                settings.protection_battery_max_v * (1 - h)))
+        return tuple(limits)
+
+    @staticmethod
+    def signals(sample) -> Dict[str, Optional[float]]:
+        """Valor de cada límite en una muestra (None: la muestra no trae esa señal)"""
+        bat_scale = settings.protection_v_bat_scale
+        battery_v = sample.v_bat_v * bat_scale if sample.v_bat_v > 0 and bat_scale > 0 else sample.voltaje_promedio
+        battery_v = battery_v if battery_v > 0 else None
+        wind_v = sample.v_wind_v_dc * settings.protection_v_wind_scale
+        wind_v = wind_v if wind_v > 0 else None
+        return {
+            "rpm_turbina": max(sample.turbine_rpm, sample.rpm, 0.0),
+            "tension_eolica": wind_v,
+            "soc_bajo": sample.soc if sample.soc > 0 else None,
+            "soc_alto": sample.soc if sample.soc > 0 else None,
+            "tension_bateria_baja": battery_v,
+            "tension_bateria_alta": battery_v,
+        }
+
+    # ===== EVALUACIÓN =====
+
+    def evaluate(self, device_id: str, samples) -> List[Command]:
+        """
+        Evaluar las muestras de un paquete (en orden) para un dispositivo
+
+        Returns:
+            Comandos a emitir (cambios de actuador y reenvíos)
+        """
+        started = time.perf_counter()
+        now = time.monotonic()
+        device = self.devices.get(device_id)
+        if device is None:
+            device = self.devices[device_id] = DeviceProtection()
+        device.last_sample = now
+        limits = self.sample_limits(*self.systems(device_id))
+
+        changed: List[str] = []
+        latest = samples[-1]
+        for sample in samples:
+            # Reloj del ESP32 (los lotes traen ts por muestra); sin ts, el del servidor
+            at = sample.ts if sample.ts else now
+            values = self.signals(sample)
+            for limit in limits:
+                value = values[limit.name]
+                if value is None:
+                    continue
+                state = device.limits.get(limit.name)
+                if state is None:
+                    state = device.limits[limit.name] = _Debounce()
+                if state.update(limit, value, at, self.trip_debounce_s, self.release_debounce_s):
+                    changed.append(f"{limit.name} {'activo' if state.active else 'liberado'} ({value:g})")
+                    self.stats["disparos" if state.active else "liberaciones"] += 1
+                    device.trips += state.active
+        self.stats["muestras"] += len(samples)
+
+        commands = self._commands(device_id, device, ", ".join(changed), reported=latest.relays, now=now)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.evaluation.observe(elapsed_ms)
+        if elapsed_ms > self.latency_budget_ms:
+            self.stats["fuera_de_presupuesto"] += 1
+        return commands
+
+    def _commands(self, device_id: str, device: DeviceProtection, reason: str, reported=None,
+                  now: Optional[float] = None) -> List[Command]:
+        """Comandos para llevar los actuadores al estado deseado"""
+        now = time.monotonic() if now is None else now
+        commands = []
+        for actuator, desired in device.desired_actuators().items():
+            parameter = "on" if desired else "off"
+            if device.actuators[actuator] != desired:
+                device.actuators[actuator] = desired
+                device.commanded_at[actuator] = now
+                device.resends[actuator] = 0
+                commands.append((device_id, actuator, parameter, reason))
+                continue
+            # Relés informados por el ESP32 distintos de lo ordenado: reenviar
+            # con espera creciente y un máximo (un relé trabado no llena la cola)
+            actual = getattr(reported, actuator, None) if reported is not None else None
+            if actual is None or actuator not in device.commanded_at:
+                continue
+            resends = device.resends.get(actuator, 0)
+            if actual == desired:
+                device.resends[actuator] = 0
+            elif resends < self.max_resends and now - device.commanded_at[actuator] >= self.resend_s * 2 ** resends:
+                device.commanded_at[actuator] = now
+                device.resends[actuator] = resends + 1
+                self.stats["reenvios"] += 1
+                if resends + 1 == self.max_resends:
+                    self.stats["reenvios_agotados"] += 1
+                    print(f"⚠️ Protección [{device_id}]: {actuator} sigue en {actual} tras "
+                          f"{self.max_resends} reenvíos; no se reenvía más hasta un cambio")
+                commands.append((device_id, actuator, parameter, f"reenvío: relé informado {actual}"))
+        return commands
+
+    def sweep(self, wind_speed_ms: Optional[float] = None) -> List[Command]:
+        """
+        Chequeo periódico (lazo de protección del control_scheduler)
+
+        Viento de corte (clima actual) para todos los dispositivos con
+        telemetría reciente; los que dejaron de reportar quedan marcados.
+        """
+        if wind_speed_ms is None:
+            return []
+        now = time.monotonic()
+        commands = []
+        for device_id, device in list(self.devices.items()):
+            if now - device.last_sample > self.stale_s:
+                continue
+            wind, _ = self.systems(device_id)
+            limit = Limit("viento", wind.max_wind_speed_ms, wind.warning_wind_speed)
+            state = device.limits.get("viento")
+            if state is None:
+                state = device.limits["viento"] = _Debounce()
+            if state.update(limit, wind_speed_ms, now, self.trip_debounce_s, self.release_debounce_s):
+                self.stats["disparos" if state.active else "liberaciones"] += 1
+                device.trips += state.active
+                reason = f"viento {'activo' if state.active else 'liberado'} ({wind_speed_ms:g} m/s)"
+                commands.extend(self._commands(device_id, device, reason, now=now))
+        return commands
+
+    async def emit(self, commands: List[Command], received_at: float) -> None:
+        """Enviar por la cola del ESP32; received_at = time.perf_counter() de la llegada"""
+        for device_id, command, parameter, reason in commands:
+            print(f"🛑 Protección [{device_id}]: {command} {parameter} — {reason}")
+            try:
+                await self.dispatcher.dispatch(device_id, command, parameter, replace=True)
+                self.stats["comandos"] += 1
+            except Exception as e:
+                self.stats["errores_envio"] += 1
+                print(f"⚠️ Protección [{device_id}]: no se pudo enviar {command} {parameter}: {e}")
+            self.emission.observe((time.perf_counter() - received_at) * 1000)
+
+    # ===== ESTADO =====
+
+    def is_tripped(self, device_id: str) -> bool:
+        """Algún límite activo (el dispositivo no debe olvidarse)"""
+        device = self.devices.get(device_id)
+        return device is not None and bool(device.active_limits())
+
+    def forget(self, device_id: str) -> None:
+        """Descartar el estado de un dispositivo (desalojado del runtime)"""
+        self.devices.pop(device_id, None)
+
+    def export_device(self, device_id: str) -> Optional[Dict]:
+        """Estado serializable de un dispositivo (migración a otro proceso)"""
+        device = self.devices.get(device_id)
+        if device is None:
+            return None
+        return {
+            "limites": {name: (state.active, state.since, state.value) for name, state in device.limits.items()},
+            "actuadores": dict(device.actuators),
+            "ordenados": dict(device.commanded_at),
+            "reenvios": dict(device.resends),
+            "ultima_muestra": device.last_sample,
+            "disparos": device.trips,
+        }
+
+    def import_device(self, device_id: str, state: Dict) -> None:
+        """Restaurar lo exportado por export_device (time.monotonic() es del sistema)"""
+        device = self.devices[device_id] = DeviceProtection()
+        for name, (active, since, value) in state["limites"].items():
+            limit = device.limits[name] = _Debounce()
+            limit.active, limit.since, limit.value = active, since, value
+        device.actuators.update(state["actuadores"])
+        device.commanded_at = dict(state["ordenados"])
+        device.resends = dict(state["reenvios"])
+        device.last_sample = state["ultima_muestra"]
+        device.trips = state["disparos"]
+
+    def device_status(self, device_id: str) -> Optional[Dict]:
+        device = self.devices.get(device_id)
+        if device is None:
+            return None
+        age_s = time.monotonic() - device.last_sample
+        return {
+            "limites_activos": device.active_limits(),
+            "actuadores": {name: "on" if value else "off" for name, value in device.actuators.items()},
+            "valores": {name: round(state.value, 3) for name, state in device.limits.items()},
+            "disparos": device.trips,
+            "ultima_muestra_s": round(age_s, 1),
+            "sin_telemetria": age_s > self.stale_s,
+        }
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            "presupuesto_ms": self.latency_budget_ms,
+            "latencia_evaluacion": self.evaluation.snapshot(),
+            "latencia_emision": self.emission.snapshot(),
+            "limites": {
+                limit.name: {"disparo": limit.trip, "liberacion": limit.release,
+                             "sentido": "mayor" if limit.above else "menor"}
+                for limit in self.sample_limits()
+            },
+            "dispositivos": {device_id: self.device_status(device_id) for device_id in self.devices},
+        }
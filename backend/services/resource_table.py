@@ -0,0 +1,404 @@
+"""
+Tablas de recurso solar / eólico por sitio (precalculadas)
+
+Se construyen UNA vez por celda de grilla NASA POWER a partir de la serie
+diaria cacheada (services/climate_cache.py) y se guardan compactas en disco
+(.npz, float32) para cargarlas en milisegundos:
+
+- Solar: irradiancia diaria → promedios mensuales (HSP), índice de
+  claridad mensual respecto del cielo despejado del sitio
+  (services/solar_geometry.py) y perfil horario típico por mes (UTC)
+- Viento: parámetros de Weibull (k, c) anuales y por mes a 10 m y 50 m,
+  exponente de cizalladura (ley potencial) para otras alturas de buje
+
+Todo el dimensionamiento (SystemCalculator, DimensionamientoService,
+RecommendationService, /api/dimensionamiento/opcion2) usa la misma tabla:
+la energía eólica se integra sobre la distribución de Weibull con la
+curva de potencia de la turbina en lugar de usar v_promedio³.
+
+Nota: Weibull se ajusta sobre promedios diarios (lo que trae NASA POWER
+diario); subestima algo la variabilidad horaria, por lo que el resultado
+es conservador respecto de la energía real.
+"""
+
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from services import nasa_response, solar_geometry
+from services.circuit_breaker import CircuitOpenError
+from services.climate_cache import ClimateCacheMiss, grid_cell
+
+
+DENSIDAD_AIRE = 1.225  # kg/m³
+PARAMETERS = ["ALLSKY_SFC_SW_DWN", "WS10M", "WS50M", "T2M"]
+
+# Curva de potencia: grilla de velocidades para integrar sobre Weibull
+_V_GRID = np.linspace(0.0, 40.0, 801)
+_DV = _V_GRID[1] - _V_GRID[0]
+
+
+def weibull_fit(speeds: np.ndarray) -> Tuple[float, float]:
+    """
+    Ajuste de Weibull por momentos (Justus): k = (σ/μ)^-1.086,
+    c = μ / Γ(1 + 1/k)
+    """
+    speeds = speeds[~np.isnan(speeds)]
+    if speeds.size < 2:
+        return float("nan"), float("nan")
+    mean = float(speeds.mean())
+    std = float(speeds.std(ddof=1))
+    if mean <= 0 or std <= 0:
+        return float("nan"), float("nan")
+    k = min(10.0, max(1.0, (std / mean) ** -1.086))
+    c = mean / math.gamma(1 + 1 / k)
+    return k, c
+
+
+def weibull_pdf(v: np.ndarray, k: float, c: float) -> np.ndarray:
+    return (k / c) * (v / c) ** (k - 1) * np.exp(-(v / c) ** k)
+
+
+class SiteResourceTable:
+    """
+    Recurso solar y eólico de un sitio (celda de grilla NASA POWER)
+    """
+
+    VERSION = 1
+
+    def __init__(
+        self,
+        latitude: float,
+        longitude: float,
+        period: str,
+        month: np.ndarray,
+        solar_daily: np.ndarray,
+        wind10_daily: np.ndarray,
+        wind50_daily: np.ndarray,
+        temperature_daily: np.ndarray,
+        year: Optional[np.ndarray] = None
+    ):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.period = period
+
+        # Series diarias (float32 en disco; NaN = dato faltante)
+        self.year = year if year is not None else np.zeros(len(month), dtype=np.int16)
+        self.month = month
+        self.solar_daily = solar_daily
+        self.wind10_daily = wind10_daily
+        self.wind50_daily = wind50_daily
+        self.temperature_daily = temperature_daily
+
+        self._derive()
+
+    # ===== DERIVADOS (se calculan al cargar, ~ms) =====
+
+    def _derive(self) -> None:
+        months = self.month.astype(np.int64)
+
+        def monthly(values: np.ndarray) -> np.ndarray:
+            valid = ~np.isnan(values)
+            sums = np.bincount(months[valid], weights=values[valid], minlength=13)[1:]
+            counts = np.bincount(months[valid], minlength=13)[1:]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+        self.solar_monthly = monthly(self.solar_daily.astype(np.float64))
+        self.wind10_monthly = monthly(self.wind10_daily.astype(np.float64))
+        self.wind50_monthly = monthly(self.wind50_daily.astype(np.float64))
+        self.temperature_monthly = monthly(self.temperature_daily.astype(np.float64))
+
+        # Cizalladura: v(h) = v10 × (h / 10)^α
+        v10 = np.nanmean(self.wind10_daily)
+        v50 = np.nanmean(self.wind50_daily)
+        self.shear_alpha = float(np.log(v50 / v10) / np.log(5.0)) if v10 > 0 and v50 > 0 else 1 / 7
+
+        # Weibull anual y mensual (10 m y 50 m)
+        self.weibull = {
+            10: self._fit_by_month(self.wind10_daily),
+            50: self._fit_by_month(self.wind50_daily),
+        }
+
+        # Cielo despejado del sitio: día medio de cada mes, cada 10 min
+        clear_kwh = np.empty(12)
+        hourly_clear = np.empty((12, 24))
+        for m in range(12):
+            day = datetime(2001, m + 1, 15).timestamp()
+            day -= day % 86400  # 00:00 UTC
+            times = day + np.arange(0, 86400, 600, dtype=np.float64)
+            ghi = solar_geometry.clear_sky_ghi(self.latitude, self.longitude, times)
+            clear_kwh[m] = ghi.sum() * 600 / 3600 / 1000
+            hourly_clear[m] = ghi.reshape(24, 6).mean(axis=1)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.clearness_monthly = np.clip(self.solar_monthly / clear_kwh, 0.0, 1.0)
+        self.clear_sky_monthly_kwh_m2 = clear_kwh
+        # Perfil horario típico (W/m², hora UTC) = cielo despejado × claridad del mes
+        self.solar_hourly_w_m2 = hourly_clear * np.nan_to_num(self.clearness_monthly)[:, None]
+
+    def _fit_by_month(self, speeds: np.ndarray) -> Dict:
+        speeds = speeds.astype(np.float64)
+        annual = weibull_fit(speeds)
+        by_month = [weibull_fit(speeds[self.month == m]) for m in range(1, 13)]
+        return {"annual": annual, "monthly": by_month}
+
+    # ===== SOLAR =====
+
+    def peak_sun_hours(self, month: Optional[int] = None) -> float:
+        """HSP = kWh/m²/día (anual o del mes 1-12)"""
+        if month is None:
+            return float(np.nanmean(self.solar_daily))
+        return float(self.solar_monthly[month - 1])
+
+    def worst_month_solar(self) -> Tuple[int, float]:
+        """(mes, HSP) del peor mes; (0, 0.0) si ningún mes tiene datos solares"""
+        if np.isnan(self.solar_monthly).all():
+            return 0, 0.0
+        m = int(np.nanargmin(self.solar_monthly))
+        return m + 1, float(self.solar_monthly[m])
+
+    # ===== VIENTO =====
+
+    def weibull_params(self, height_m: float = 10, month: Optional[int] = None) -> Tuple[float, float]:
+        """(k, c) a la altura de buje pedida (escala c con la ley potencial)"""
+        reference = 50 if height_m >= 30 else 10
+        fits = self.weibull[reference]
+        k, c = fits["annual"] if month is None else fits["monthly"][month - 1]
+        return k, c * (height_m / reference) ** self.shear_alpha
+
+    def mean_wind_speed(self, height_m: float = 10, month: Optional[int] = None) -> float:
+        k, c = self.weibull_params(height_m, month)
+        return c * math.gamma(1 + 1 / k)
+
+    def power_density_w_m2(self, height_m: float = 10, month: Optional[int] = None) -> float:
+        """Densidad de potencia media del viento: 0.5 ρ E[v³] (W/m²)"""
+        k, c = self.weibull_params(height_m, month)
+        return 0.5 * DENSIDAD_AIRE * c ** 3 * math.gamma(1 + 3 / k)
+
+    def expected_turbine_power_w(
+        self,
+        diameter_m: float,
+        efficiency: float,
+        rated_w: Optional[float] = None,
+        cut_in_ms: float = 3.0,
+        cut_out_ms: float = 25.0,
+        height_m: float = 10,
+        month: Optional[int] = None
+    ) -> float:
+        """
+        Potencia media de una turbina: ∫ P(v) f(v) dv
+
+        P(v) = min(0.5 ρ A v³ η, P_nominal) entre arranque y corte, 0 fuera
+        """
+        k, c = self.weibull_params(height_m, month)
+        if not (k > 0 and c > 0) or diameter_m <= 0:
+            return 0.0
+        area = math.pi * (diameter_m / 2) ** 2
+        curve = 0.5 * DENSIDAD_AIRE * area * _V_GRID ** 3 * efficiency
+        if rated_w:
+            curve = np.minimum(curve, rated_w)
+        curve[(_V_GRID < cut_in_ms) | (_V_GRID >= cut_out_ms)] = 0.0
+        pdf = weibull_pdf(np.maximum(_V_GRID, 1e-9), k, c)
+        return float((curve * pdf).sum() * _DV)
+
+    def capacity_factor(self, rated_w: float, **kwargs) -> float:
+        """Factor de capacidad de la turbina (0-1)"""
+        if rated_w <= 0:
+            return 0.0
+        return self.expected_turbine_power_w(rated_w=rated_w, **kwargs) / rated_w
+
+    # ===== SERIALIZACIÓN =====
+
+    def summary(self) -> Dict:
+        """Resumen JSON-serializable"""
+        k10, c10 = self.weibull_params(10)
+        k50, c50 = self.weibull_params(50)
+        worst_month, worst_hsp = self.worst_month_solar()
+        return {
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "period": self.period,
+            "days": int(len(self.month)),
+            "solar": {
+                "hsp_anual": round(self.peak_sun_hours(), 2),
+                "hsp_mensual": nasa_response.nan_to_zero(self.solar_monthly, 2),
+                "claridad_mensual": nasa_response.nan_to_zero(self.clearness_monthly, 2),
+                "peor_mes": worst_month,
+                "hsp_peor_mes": round(worst_hsp, 2)
+            },
+            "viento": {
+                "weibull_10m": {"k": round(k10, 2), "c": round(c10, 2)},
+                "weibull_50m": {"k": round(k50, 2), "c": round(c50, 2)},
+                "media_10m_ms": round(float(np.nanmean(self.wind10_daily)), 2),
+                "media_50m_ms": round(float(np.nanmean(self.wind50_daily)), 2),
+                "densidad_potencia_10m_w_m2": round(self.power_density_w_m2(10), 1),
+                "cizalladura_alpha": round(self.shear_alpha, 3),
+                "mensual_10m": nasa_response.nan_to_zero(self.wind10_monthly, 2)
+            }
+        }
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.stem + ".tmp.npz")
+        np.savez_compressed(
+            tmp,
+            version=self.VERSION,
+            location=np.array([self.latitude, self.longitude]),
+            period=np.array(self.period),
+            year=self.year.astype(np.int16),
+            month=self.month.astype(np.int8),
+            solar=self.solar_daily.astype(np.float32),
+            wind10=self.wind10_daily.astype(np.float32),
+            wind50=self.wind50_daily.astype(np.float32),
+            temperature=self.temperature_daily.astype(np.float32)
+        )
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["SiteResourceTable"]:
+        with np.load(path) as data:
+            if int(data["version"]) != cls.VERSION:
+                return None
+            latitude, longitude = data["location"].tolist()
+            return cls(
+                latitude, longitude, str(data["period"]),
+                data["month"], data["solar"], data["wind10"], data["wind50"],
+                data["temperature"], year=data["year"]
+            )
+
+    @classmethod
+    def from_nasa(cls, latitude: float, longitude: float, period: str, nasa_data: Dict) -> "SiteResourceTable":
+        frame = nasa_response.decode(nasa_data, PARAMETERS)
+        return cls(
+            latitude, longitude, period,
+            frame.month.astype(np.int8),
+            frame.column("ALLSKY_SFC_SW_DWN").astype(np.float32),
+            frame.column("WS10M").astype(np.float32),
+            frame.column("WS50M").astype(np.float32),
+            frame.column("T2M").astype(np.float32),
+            year=frame.year.astype(np.int16)
+        )
+
+
+class ResourceTableStore:
+    """
+    Tablas por celda: memoria (LRU) → disco (.npz) → NASA POWER (caché climática)
+    """
+
+    def __init__(self, directory: str, years: int = 10, max_in_memory: int = 64):
+        self.directory = Path(directory)
+        self.years = years
+        self.max_in_memory = max_in_memory
+
+        self._tables: "OrderedDict[str, SiteResourceTable]" = OrderedDict()
+        self._building: Dict[str, asyncio.Task] = {}
+
+        self.memory_hits = 0
+        self.disk_loads = 0
+        self.builds = 0
+
+    def _period(self) -> Tuple[str, str]:
+        # Hasta fin del mes anterior: la tabla se reconstruye una vez por mes
+        end = datetime.now().replace(day=1) - timedelta(days=1)
+        start = end - timedelta(days=self.years * 365)
+        return start.strftime("%Y%m%d"), end.strftime("%Y%m%d")
+
+    def _key(self, latitude: float, longitude: float) -> Tuple[str, float, float, str, str]:
+        lat_cell, lon_cell = grid_cell(latitude, longitude)
+        start, end = self._period()
+        return f"{lat_cell:.4f}_{lon_cell:.4f}_{start}_{end}", lat_cell, lon_cell, start, end
+
+    def _remember(self, key: str, table: SiteResourceTable) -> SiteResourceTable:
+        self._tables[key] = table
+        self._tables.move_to_end(key)
+        while len(self._tables) > self.max_in_memory:
+            self._tables.popitem(last=False)
+        return table
+
+    async def get(self, latitude: float, longitude: float) -> SiteResourceTable:
+        """Tabla del sitio (cargas / construcciones concurrentes de la misma celda se comparten)"""
+        key, lat_cell, lon_cell, start, end = self._key(latitude, longitude)
+
+        table = self._tables.get(key)
+        if table is not None:
+            self.memory_hits += 1
+            self._tables.move_to_end(key)
+            return table
+
+        task = self._building.get(key)
+        if task is None:
+            task = self._building[key] = asyncio.create_task(
+                self._load_or_build(key, self.directory / f"{key}.npz", lat_cell, lon_cell, start, end)
+            )
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _load(path: Path) -> Optional[SiteResourceTable]:
+        return SiteResourceTable.load(path) if path.exists() else None
+
+    async def _load_or_build(
+        self, key: str, path: Path, lat_cell: float, lon_cell: float, start: str, end: str
+    ) -> SiteResourceTable:
+        """Disco → NASA POWER; np.load y la construcción (series de 10 años) en un hilo"""
+        from services.nasa_power_service import nasa_service
+
+        try:
+            table = await asyncio.to_thread(self._load, path)
+            if table is not None:
+                self.disk_loads += 1
+                return self._remember(key, table)
+
+            started = time.perf_counter()
+            data = await nasa_service.get_daily_data(lat_cell, lon_cell, start, end, PARAMETERS)
+            table = await asyncio.to_thread(
+                SiteResourceTable.from_nasa, lat_cell, lon_cell, f"{start}-{end}", data
+            )
+            await asyncio.to_thread(table.save, path)
+            self.builds += 1
+            print(f"🗺️ Tabla de recurso {key} construida en {(time.perf_counter() - started) * 1000:.0f} ms")
+            return self._remember(key, table)
+        finally:
+            self._building.pop(key, None)
+
+    def get_stats(self) -> Dict:
+        return {
+            "directory": str(self.directory),
+            "in_memory": len(self._tables),
+            "on_disk": len(list(self.directory.glob("*.npz"))) if self.directory.exists() else 0,
+            "memory_hits": self.memory_hits,
+            "disk_loads": self.disk_loads,
+            "builds": self.builds
+        }
+
+
+def _default_store() -> ResourceTableStore:
+    from config import get_settings
+    settings = get_settings()
+    return ResourceTableStore(settings.resource_table_dir, years=settings.resource_table_years)
+
+
+# Singleton instance
+resource_tables = _default_store()
+
+
+async def get_resource_or_none(latitude: float, longitude: float) -> Optional[SiteResourceTable]:
+    """
+    Tabla del sitio, o None si NASA no está disponible (los callers usan promedios por defecto)
+
+    Sólo se absorben las fallas esperables (red, circuito abierto, modo
+    offline sin caché, disco, respuesta NASA inválida); un error de
+    programación se propaga.
+    """
+    try:
+        return await resource_tables.get(latitude, longitude)
+    except (ClimateCacheMiss, CircuitOpenError, httpx.HTTPError, OSError, KeyError, ValueError) as e:
+        print(f"⚠️ Tabla de recurso no disponible para ({latitude}, {longitude}): {type(e).__name__}: {e}")
+        return None
@@ -0,0 +1,675 @@
+"""
+Supervisor multi-proceso: dispositivos repartidos entre workers
+
+Con muchos ESP32 / inversores, la protección, las decisiones y los
+contextos de services/device_runtime.py compiten por un solo proceso (y
+un solo GIL). El supervisor reparte los device_id entre N procesos
+worker, cada uno con su propio LocalRuntime (contextos + ProtectionEngine):
+
+- Anillo de hash consistente (md5 con nodos virtuales): cada device_id
+  tiene un dueño estable y agregar un worker mueve sólo ~1/N de los
+  dispositivos. No depende de hash() (PYTHONHASHSEED cambia por proceso):
+  supervisor y workers calculan el mismo dueño
+- IPC local: una multiprocessing.Queue de entrada por worker y una de
+  respuestas compartida que lee un hilo del supervisor. Cada cola es FIFO:
+  los mensajes de un dispositivo se procesan en orden
+- La telemetría va al dueño sin esperar respuesta: el pedido HTTP sigue
+  con el store y el historial, y los comandos de protección que devuelve
+  el worker se emiten desde este proceso (command_dispatcher vive acá)
+  cuando llega la respuesta. Los paquetes que llegan juntos para un mismo worker viajan en un solo
+  mensaje (uno por vuelta del loop de eventos): el costo de IPC no se
+  paga por muestra
+- Agregar un worker: cuando el nuevo está listo se pausa el enrutamiento,
+  los workers existentes exportan los dispositivos que pasan a ser del
+  nuevo (contexto y estado de protección: un freno activo sigue activo) y
+  el nuevo los adopta
+- Vistas HTTP: estadísticas de todos los workers fusionadas; la vista de
+  un dispositivo se le pide a su dueño
+- Barrido de viento (lazo de protección): va por una cola prioritaria que
+  atiende un hilo propio del worker, no detrás de decisiones y lotes de
+  telemetría; el lazo no lo espera: devuelve los límites activos del
+  último barrido y los comandos se emiten al llegar la respuesta
+
+Limitación: el parseo, el store y el historial siguen en el proceso
+principal (el pedido ya no espera al worker, pero ese trabajo no se
+reparte), así que la telemetría no escala con workers: en un host de 1
+núcleo, benchmarks/bench_shard_supervisor.py da ~10000 muestras/s en
+proceso contra ~7300 con 1 worker y ~3400 con 4 (hasta que los workers
+responden), y 400 decisiones en 34 ms contra 47 ms con 4 workers. Sólo
+compensa cuando el trabajo por dispositivo (p. ej. las decisiones) es
+pesado y hay núcleos libres: por eso viene apagado (supervisor_workers = 0).
+
+Los workers arrancan con "spawn" (único modo en Windows y seguro con
+hilos ya corriendo) e importan los servicios (~3 s). Un worker que muere
+se reinicia en el siguiente pedido; el estado de sus dispositivos se
+reconstruye con la telemetría siguiente. Store, historial y controlador
+del sitio siguen en el proceso principal.
+"""
+
+import asyncio
+import bisect
+import hashlib
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from config import get_settings
+from services.control_scheduler import Histogram
+from services.device_runtime import LocalRuntime
+from services.dispatch_planner import dispatch_planner
+from services.protection_engine import LATENCY_BOUNDS_MS, Command
+
+
+settings = get_settings()
+
+# Claves de configuración en las estadísticas de cada worker (no se suman)
+CONFIG_KEYS = {"max_dispositivos", "inactividad_max_s", "registros_patrones_max", "presupuesto_ms", "limites"}
+
+# Pedidos que un worker atiende directamente con su LocalRuntime
+RUNTIME_CALLS = {"sweep", "evict_idle", "device_view", "runtime_stats", "protection_stats"}
+
+
+class HashRing:
+    """Anillo de hash consistente con nodos virtuales"""
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 64):
+        self.vnodes = vnodes
+        self.nodes: List[str] = []
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+    def add(self, node: str) -> None:
+        if node in self.nodes:
+            return
+        self.nodes.append(node)
+        for replica in range(self.vnodes):
+            point = self._hash(f"{node}#{replica}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def owner(self, key: str) -> str:
+        """Nodo dueño de key: el primer punto del anillo a partir de su hash"""
+        if not self._points:
+            raise LookupError("Anillo sin nodos")
+        index = bisect.bisect(self._points, self._hash(key)) % len(self._points)
+        return self._owners[index]
+
+    def shares(self) -> Dict[str, float]:
+        """Fracción del anillo que cubre cada nodo"""
+        span = 2 ** 64
+        shares = dict.fromkeys(self.nodes, 0.0)
+        for index, point in enumerate(self._points):
+            previous = self._points[index - 1] if index else self._points[-1] - span
+            shares[self._owners[index]] += (point - previous) / span
+        return shares
+
+
+def _serve_priority(runtime: LocalRuntime, lock: threading.Lock, priority, outbox) -> None:
+    """Hilo del worker: barridos de protección sin esperar a la cola normal"""
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            message = priority.get()
+            if message is None:
+                break
+            request_id, kind, args = message
+            try:
+                with lock:
+                    result = loop.run_until_complete(getattr(runtime, kind)(*args))
+                outbox.put((request_id, True, result))
+            except Exception as e:
+                outbox.put((request_id, False, f"{type(e).__name__}: {e}"))
+    finally:
+        loop.close()
+
+
+def _worker_main(worker_id: str, inbox, priority, outbox) -> None:
+    """Proceso worker: atiende (request_id, pedido, args) con su propio LocalRuntime"""
+    runtime = LocalRuntime.from_settings(settings)
+    loop = asyncio.new_event_loop()
+    # Estado de protección compartido con el hilo prioritario (ver decide_all)
+    lock = threading.Lock()
+    sweeper = threading.Thread(
+        target=_serve_priority, args=(runtime, lock, priority, outbox), name="shard-priority", daemon=True
+    )
+    sweeper.start()
+
+    def export_devices(nodes: List[str], vnodes: int) -> Dict[str, Dict]:
+        ring = HashRing(nodes, vnodes)
+        return runtime.export_devices(lambda device_id: ring.owner(device_id) == worker_id)
+
+    async def evaluate_batch(entries: List[Tuple[str, list]]) -> List[Any]:
+        results = []
+        for device_id, samples in entries:
+            try:
+                results.append(await runtime.evaluate_telemetry(device_id, samples))
+            except Exception as e:  # Un paquete inválido no arrastra al resto del lote
+                results.append({"error": f"{type(e).__name__}: {e}"})
+        return results
+
+    def decide_all(device_ids, plan):
+        # Sin `lock`, para que un barrido no espere un ciclo de decisiones. Es
+        # seguro: las decisiones leen y escriben sólo cada DeviceContext (con
+        # context.lock) y la lista de contextos (con el lock del registro); el
+        # barrido sólo toca el estado de ProtectionEngine y lee umbrales con
+        # registry.get (mismo lock del registro). Ningún dato queda sin lock.
+        # Plan de despacho del proceso principal: el worker no re-planifica
+        dispatch_planner.plan = plan
+        return loop.run_until_complete(runtime.decide_all(device_ids))
+
+    handlers: Dict[str, Callable] = {
+        "ping": os.getpid,
+        "evaluate_batch": lambda entries: loop.run_until_complete(evaluate_batch(entries)),
+        "export_devices": export_devices,
+        "import_devices": runtime.import_devices,
+    }
+    try:
+        while True:
+            message = inbox.get()
+            if message is None:
+                break
+            request_id, kind, args = message
+            try:
+                if kind == "decide_all":
+                    result = decide_all(*args)
+                elif kind in RUNTIME_CALLS:
+                    with lock:
+                        result = loop.run_until_complete(getattr(runtime, kind)(*args))
+                else:
+                    with lock:
+                        result = handlers[kind](*args)
+                outbox.put((request_id, True, result))
+            except Exception as e:
+                outbox.put((request_id, False, f"{type(e).__name__}: {e}"))
+    except KeyboardInterrupt:
+        pass  # Ctrl+C llega a todo el grupo de procesos; el supervisor cierra
+    finally:
+        priority.put(None)
+        sweeper.join(5)
+        loop.close()
+
+
+class _Worker:
+    """Proceso worker visto desde el supervisor"""
+
+    def __init__(self, worker_id: str, process, inbox, priority):
+        self.worker_id = worker_id
+        self.process = process
+        self.inbox = inbox
+        self.priority = priority  # Cola del hilo de protección del worker
+        self.sweeping = False  # Barrido en curso (no se encola otro detrás)
+        self.started_at = time.time()
+        self.ready = False
+        self.restarts = 0
+
+
+class ShardSupervisor:
+    """
+    Reparte los dispositivos entre procesos worker (misma interfaz que LocalRuntime)
+    """
+
+    def __init__(self, workers: int = 2, vnodes: int = 64, request_timeout_s: float = 2.0,
+                 startup_timeout_s: float = 120.0, emitter=None):
+        if workers < 1:
+            raise ValueError(f"Cantidad de workers inválida: {workers}")
+        self.n_workers = workers
+        self.vnodes = vnodes
+        self.request_timeout_s = request_timeout_s
+        self.startup_timeout_s = startup_timeout_s
+        self.emitter = emitter  # ProtectionEngine local que emite los comandos de los workers
+
+        self.ring = HashRing((), vnodes)
+        self.workers: Dict[str, _Worker] = {}
+        self._tripped: Dict[str, Dict[str, Any]] = {}  # worker → límites activos del último barrido
+        self._mp = multiprocessing.get_context("spawn")
+        self._replies = None
+        self._reader: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # request_id → (worker, futuro, enviado (perf_counter), callback si llega tarde)
+        self._pending: Dict[int, Tuple[str, asyncio.Future, float, Optional[Callable]]] = {}
+        self._ids = itertools.count()
+        self._routing = asyncio.Event()
+        self._rebalance_lock = asyncio.Lock()
+        self._tasks: set = set()
+        # worker → (paquetes de telemetría a enviar en el próximo mensaje, llegada del primero)
+        self._batches: Dict[str, Tuple[List[Tuple[str, list]], float]] = {}
+        self._inflight: set = set()  # Lotes de telemetría enviados sin respuesta todavía
+
+        self.roundtrip = Histogram(LATENCY_BOUNDS_MS)
+        self.stats = {
+            "pedidos": 0,
+            "errores": 0,
+            "timeouts": 0,
+            "respuestas_tardias": 0,
+            "reinicios": 0,
+            "rebalanceos": 0,
+            "migrados": 0,
+            "lotes": 0,
+            "paquetes": 0,
+        }
+
+    @property
+    def active(self) -> bool:
+        return self._loop is not None
+
+    def owner(self, device_id: str) -> str:
+        return self.ring.owner(device_id)
+
+    # ===== PROCESOS =====
+
+    async def start(self) -> None:
+        """Lanzar los workers (no espera a que terminen de importar)"""
+        if self.active:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._replies = self._mp.Queue()
+        self._reader = threading.Thread(target=self._read_replies, name="shard-replies", daemon=True)
+        self._reader.start()
+        names = [f"w{index}" for index in range(self.n_workers)]
+        self.ring = HashRing(names, self.vnodes)
+        for name in names:
+            self._spawn(name)
+        self._routing.set()
+        print(f"🧩 Supervisor: {len(names)} workers, {self.vnodes} nodos virtuales por worker")
+
+    def _spawn(self, worker_id: str) -> _Worker:
+        self._tripped.pop(worker_id, None)  # Límites del proceso anterior: su estado se perdió
+        inbox = self._mp.Queue()
+        priority = self._mp.Queue()
+        process = self._mp.Process(
+            target=_worker_main, args=(worker_id, inbox, priority, self._replies),
+            name=f"shard-{worker_id}", daemon=True
+        )
+        process.start()
+        previous = self.workers.get(worker_id)
+        worker = self.workers[worker_id] = _Worker(worker_id, process, inbox, priority)
+        if previous is not None:
+            worker.restarts = previous.restarts + 1
+        task = asyncio.ensure_future(self._wait_ready(worker))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return worker
+
+    async def _wait_ready(self, worker: _Worker) -> None:
+        try:
+            await self.request(worker.worker_id, "ping", timeout=self.startup_timeout_s)
+            worker.ready = True
+        except Exception as e:
+            print(f"⚠️ Supervisor: worker {worker.worker_id} no arrancó: {type(e).__name__}: {e}")
+
+    def _alive(self, worker_id: str) -> _Worker:
+        """Worker dueño; si el proceso murió se reinicia (su estado se pierde)"""
+        worker = self.workers[worker_id]
+        if worker.process.is_alive():
+            return worker
+        print(f"⚠️ Supervisor: worker {worker_id} terminó (código {worker.process.exitcode}); reiniciando")
+        self.stats["reinicios"] += 1
+        self._fail_pending(worker_id, f"worker {worker_id} reiniciado")
+        return self._spawn(worker_id)
+
+    def _fail_pending(self, worker_id: Optional[str], reason: str) -> None:
+        for request_id, (owner, future, _, _) in list(self._pending.items()):
+            if worker_id is None or owner == worker_id:
+                del self._pending[request_id]
+                if not future.done():
+                    future.set_exception(RuntimeError(reason))
+
+    async def stop(self) -> None:
+        """Cerrar los workers (terminar los que no salen a tiempo) y el hilo lector"""
+        if not self.active:
+            return
+        for pending in list(self._batches):  # Lotes en armado: antes del aviso de cierre
+            self._flush(pending)
+        for worker in self.workers.values():
+            if worker.process.is_alive():
+                worker.inbox.put(None)
+        await asyncio.to_thread(self._join)
+        self._replies.put(None)
+        await asyncio.to_thread(self._reader.join, 5)
+        self._fail_pending(None, "supervisor detenido")
+        for task in list(self._tasks):
+            task.cancel()
+        self._loop = None
+
+    def _join(self, timeout_s: float = 5.0) -> None:
+        deadline = time.monotonic() + timeout_s
+        for worker in self.workers.values():
+            worker.process.join(max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join(1)
+
+    # ===== IPC =====
+
+    def _read_replies(self) -> None:
+        """Hilo: respuestas de todos los workers → futuros del loop de eventos"""
+        while True:
+            reply = self._replies.get()
+            if reply is None:
+                return
+            self._loop.call_soon_threadsafe(self._resolve, *reply)
+
+    def _resolve(self, request_id: int, ok: bool, result: Any) -> None:
+        entry = self._pending.pop(request_id, None)
+        if entry is None:
+            return
+        worker_id, future, sent_at, on_late = entry
+        self.roundtrip.observe((time.perf_counter() - sent_at) * 1000)
+        if not ok:
+            self.stats["errores"] += 1
+        if future.done():  # Timeout: el pedido ya se había dado por perdido
+            self.stats["respuestas_tardias"] += 1
+            if ok and on_late is not None:
+                on_late(result)
+        elif ok:
+            future.set_result(result)
+        else:
+            future.set_exception(RuntimeError(f"Worker {worker_id}: {result}"))
+
+    def _send(self, worker_id: str, kind: str, args: tuple,
+              on_late: Optional[Callable[[Any], None]] = None, priority: bool = False) -> asyncio.Future:
+        """
+        Encolar un pedido (sincrónico: respeta el orden de llegada a la cola del worker)
+
+        Args:
+            priority: Por la cola del hilo de protección del worker
+        """
+        worker = self._alive(worker_id)
+        request_id = next(self._ids)
+        future = self._loop.create_future()
+        self._pending[request_id] = (worker_id, future, time.perf_counter(), on_late)
+        (worker.priority if priority else worker.inbox).put((request_id, kind, args))
+        self.stats["pedidos"] += 1
+        return future
+
+    async def request(self, worker_id: str, kind: str, *args, timeout: Optional[float] = None,
+                      on_late: Optional[Callable[[Any], None]] = None) -> Any:
+        """
+        Pedido a un worker
+
+        Args:
+            timeout: Default request_timeout_s (asyncio.TimeoutError al vencer)
+            on_late: Se llama con el resultado si llega después del timeout
+        """
+        future = self._send(worker_id, kind, args, on_late)
+        try:
+            return await asyncio.wait_for(future, timeout or self.request_timeout_s)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise
+
+    async def broadcast(self, kind: str, *args, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Mismo pedido a todos los workers listos: {worker: resultado o excepción}
+
+        Los que todavía importan los servicios (arranque o reinicio) se
+        omiten: los lazos periódicos no se encolan detrás del arranque.
+        """
+        worker_ids = [worker_id for worker_id, worker in self.workers.items() if worker.ready]
+        results = await asyncio.gather(
+            *(self.request(worker_id, kind, *args, timeout=timeout) for worker_id in worker_ids),
+            return_exceptions=True
+        )
+        for worker_id, result in zip(worker_ids, results):
+            if isinstance(result, Exception):
+                print(f"⚠️ Supervisor: {kind} en {worker_id}: {type(result).__name__}: {result}")
+        return dict(zip(worker_ids, results))
+
+    def _emit_late(self, results: List[Any], received_at: Optional[float] = None) -> None:
+        """Emitir comandos que llegaron sin nadie esperándolos (telemetría o barrido)"""
+        commands = [command for result in results if isinstance(result, list) for command in result]
+        if commands and self.emitter is not None:
+            task = asyncio.ensure_future(self.emitter.emit(commands, received_at or time.perf_counter()))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    # ===== INTERFAZ DE RUNTIME (igual que LocalRuntime) =====
+
+    async def evaluate_telemetry(self, device_id: str, samples) -> List[Command]:
+        """
+        Enrutar las muestras al dueño sin esperar su respuesta
+
+        Devuelve siempre []: los comandos de protección los emite `emitter`
+        cuando el worker responde, así el store y el historial no esperan la
+        ida y vuelta de IPC. Sólo espera mientras se migran dispositivos.
+        """
+        await self._routing.wait()
+        worker_id = self.ring.owner(device_id)
+        batch = self._batches.get(worker_id)
+        if batch is None:
+            batch = self._batches[worker_id] = ([], time.perf_counter())
+            self._loop.call_soon(self._flush, worker_id)
+        batch[0].append((device_id, list(samples)))
+        return []
+
+    def _flush(self, worker_id: str) -> None:
+        """Enviar el lote de telemetría acumulado para un worker en un solo mensaje"""
+        batch = self._batches.pop(worker_id, None)
+        if batch is None:
+            return
+        entries, received_at = batch
+        self.stats["lotes"] += 1
+        self.stats["paquetes"] += len(entries)
+        try:
+            future = self._send(worker_id, "evaluate_batch", (entries,))
+        except Exception as e:
+            self._evaluation_failed(worker_id, len(entries), e)
+            return
+        self._inflight.add(future)
+        future.add_done_callback(lambda done: self._evaluated(worker_id, entries, received_at, done))
+
+    def _evaluated(self, worker_id: str, entries: List[Tuple[str, list]], received_at: float,
+                   future: asyncio.Future) -> None:
+        """Respuesta de un lote de telemetría: emitir sus comandos y contar los errores"""
+        self._inflight.discard(future)
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            self._evaluation_failed(worker_id, len(entries), future.exception())
+            return
+        results = future.result()
+        for (device_id, _), result in zip(entries, results):
+            if isinstance(result, dict):
+                self._evaluation_failed(worker_id, 1, f"{device_id}: {result['error']}")
+        self._emit_late(results, received_at)
+
+    def _evaluation_failed(self, worker_id: str, packets: int, error) -> None:
+        if self.emitter is not None:
+            self.emitter.stats["errores_evaluacion"] += packets
+        print(f"⚠️ Supervisor: protección no evaluada en {worker_id} ({packets} paquete(s)): {error}")
+
+    async def drain(self, timeout: Optional[float] = None) -> None:
+        """Esperar a que los workers respondan la telemetría ya enrutada"""
+        for pending in list(self._batches):
+            self._flush(pending)
+        if self._inflight:
+            await asyncio.wait(list(self._inflight), timeout=timeout or self.request_timeout_s)
+
+    async def sweep(self, wind_speed_ms: Optional[float]) -> Dict:
+        """
+        Barrido de viento sin esperar a los workers (corre dentro del lazo de protección)
+
+        Se envía por la cola prioritaria de cada worker listo que no tenga
+        uno en curso; los comandos los emite `emitter` al llegar. Un barrido
+        sin respuesta en request_timeout_s se da por perdido (habilita el
+        siguiente); si la respuesta llega después, se aplica igual. Devuelve
+        los límites activos del último barrido respondido.
+        """
+        for worker_id, worker in self.workers.items():
+            if worker.ready and not worker.sweeping and worker.process.is_alive():
+                worker.sweeping = True
+                future = self._send(worker_id, "sweep", (wind_speed_ms,), priority=True,
+                                    on_late=lambda result, worker_id=worker_id: self._swept(worker_id, result))
+                future.add_done_callback(lambda done, worker=worker: self._sweep_done(worker, done))
+                self._loop.call_later(self.request_timeout_s, self._sweep_expired, future)
+        tripped = {}
+        for limits in self._tripped.values():
+            tripped.update(limits)
+        return {'comandos': [], 'limites_activos': tripped}
+
+    def _sweep_done(self, worker: _Worker, future: asyncio.Future) -> None:
+        worker.sweeping = False
+        if future.cancelled() or future.exception() is not None:
+            return
+        self._swept(worker.worker_id, future.result())
+
+    def _sweep_expired(self, future: asyncio.Future) -> None:
+        if not future.done():
+            self.stats["timeouts"] += 1
+            future.set_exception(asyncio.TimeoutError())
+
+    def _swept(self, worker_id: str, result: Dict) -> None:
+        self._tripped[worker_id] = result['limites_activos']
+        self._emit_late([result['comandos']])
+
+    async def decide_all(self, device_ids: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Decisiones en todos los workers en paralelo, con el plan de despacho vigente"""
+        plan = dispatch_planner.current()
+        if device_ids is None:
+            results = await self.broadcast("decide_all", None, plan)
+        else:
+            owned: Dict[str, List[str]] = {}
+            for device_id in device_ids:
+                owned.setdefault(self.ring.owner(device_id), []).append(device_id)
+            worker_ids = list(owned)
+            results = dict(zip(worker_ids, await asyncio.gather(
+                *(self.request(worker_id, "decide_all", owned[worker_id], plan) for worker_id in worker_ids),
+                return_exceptions=True
+            )))
+        decisions = {}
+        for partial in results.values():
+            if not isinstance(partial, Exception):
+                decisions.update(partial)
+        return decisions
+
+    async def evict_idle(self) -> List[str]:
+        evicted = []
+        for partial in (await self.broadcast("evict_idle")).values():
+            if not isinstance(partial, Exception):
+                evicted.extend(partial)
+        return evicted
+
+    async def device_view(self, device_id: str, decide: bool = False) -> Optional[Dict]:
+        worker_id = self.ring.owner(device_id)
+        view = await self.request(worker_id, "device_view", device_id, decide)
+        return {**view, 'worker': worker_id} if view is not None else None
+
+    async def runtime_stats(self) -> Dict:
+        return self._merge(await self.broadcast("runtime_stats"))
+
+    async def protection_stats(self) -> Dict:
+        merged = self._merge(await self.broadcast("protection_stats"))
+        if self.emitter is not None:
+            # Los comandos se emiten desde este proceso; los pedidos fallidos se cuentan acá
+            for key in ("comandos", "errores_envio"):
+                merged[key] = self.emitter.stats[key]
+            merged["errores_evaluacion"] = merged.get("errores_evaluacion", 0) + self.emitter.stats["errores_evaluacion"]
+            merged["latencia_emision"] = self.emitter.emission.snapshot()
+        return merged
+
+    @staticmethod
+    def _merge(results: Dict[str, Any]) -> Dict:
+        """Contadores sumados, dispositivos unidos (con su worker) e histogramas por worker"""
+        merged: Dict[str, Any] = {"dispositivos": {}, "por_worker": {}}
+        for worker_id, result in results.items():
+            own = merged["por_worker"][worker_id] = {}
+            if isinstance(result, Exception):
+                own["error"] = f"{type(result).__name__}: {result}"
+                continue
+            for key, value in result.items():
+                if key == "dispositivos":
+                    merged[key].update({
+                        device_id: {**status, "worker": worker_id} if isinstance(status, dict) else status
+                        for device_id, status in value.items()
+                    })
+                elif key in CONFIG_KEYS:
+                    merged.setdefault(key, value)
+                elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                    merged[key] = merged.get(key, 0) + value
+                    own[key] = value
+                else:
+                    own[key] = value
+        return merged
+
+    # ===== REBALANCEO =====
+
+    async def add_worker(self) -> Dict:
+        """
+        Agregar un worker y migrarle sus dispositivos
+
+        El enrutamiento se pausa sólo durante la migración (con el nuevo
+        worker ya listo); los pedidos en vuelo a los dueños anteriores se
+        procesan antes de exportar porque cada cola es FIFO.
+        """
+        async with self._rebalance_lock:
+            worker_id = f"w{len(self.workers)}"
+            while worker_id in self.workers:
+                worker_id = f"w{int(worker_id[1:]) + 1}"
+            self._spawn(worker_id)
+            try:
+                await self.request(worker_id, "ping", timeout=self.startup_timeout_s)
+            except Exception:
+                self.workers.pop(worker_id).process.terminate()
+                raise
+            self.workers[worker_id].ready = True
+
+            ring = HashRing(self.ring.nodes + [worker_id], self.vnodes)
+            started = time.perf_counter()
+            self._routing.clear()
+            for pending in list(self._batches):  # Lotes en armado: a los dueños actuales, antes de exportar
+                self._flush(pending)
+            try:
+                exports = await asyncio.gather(*(
+                    self.request(previous, "export_devices", ring.nodes, self.vnodes)
+                    for previous in self.ring.nodes
+                ))
+                states = {device_id: state for exported in exports for device_id, state in exported.items()}
+                if states:
+                    await self.request(worker_id, "import_devices", states)
+                self.ring = ring
+            finally:
+                self._routing.set()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            self.stats["rebalanceos"] += 1
+            self.stats["migrados"] += len(states)
+            print(f"🧩 Supervisor: worker {worker_id} agregado, {len(states)} dispositivo(s) migrado(s) "
+                  f"en {elapsed_ms:.1f} ms")
+            return {
+                'worker': worker_id,
+                'migrados': sorted(states),
+                'pausa_ms': round(elapsed_ms, 2),
+                'fraccion_anillo': {node: round(share, 4) for node, share in ring.shares().items()},
+            }
+
+    def get_stats(self) -> Dict:
+        shares = self.ring.shares()
+        return {
+            **self.stats,
+            "activo": self.active,
+            "nodos_virtuales": self.vnodes,
+            "timeout_s": self.request_timeout_s,
+            "pendientes": len(self._pending),
+            "latencia_ipc": self.roundtrip.snapshot(),
+            "workers": {
+                worker_id: {
+                    "pid": worker.process.pid,
+                    "vivo": worker.process.is_alive(),
+                    "listo": worker.ready,
+                    "iniciado": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(worker.started_at)),
+                    "reinicios": worker.restarts,
+                    "fraccion_anillo": round(shares.get(worker_id, 0.0), 4),
+                }
+                for worker_id, worker in self.workers.items()
+            },
+        }
@@ -0,0 +1,171 @@
+"""
+Geometría solar y radiación de cielo despejado (vectorizado con NumPy)
+
+Para una ubicación (lat, lon) y un array de instantes (epoch, segundos):
+
+- Posición del sol: declinación y ecuación del tiempo (series de Spencer),
+  ángulo horario → elevación y azimut (0° = Norte, sentido horario)
+- Irradiancia extraterrestre sobre plano normal (W/m²), corregida por la
+  excentricidad de la órbita
+- GHI de cielo despejado (modelo de Haurwitz, W/m²)
+
+Las tablas de un día (resolución de 1 minuto) se cachean por
+(sitio, día UTC): consultar muchos timestamps del mismo día es un
+indexado de arrays, no trigonometría por punto.
+"""
+
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Iterable, Union
+
+import numpy as np
+
+
+SOLAR_CONSTANT_W_M2 = 1361.0
+MINUTES_PER_DAY = 1440
+SECONDS_PER_DAY = 86400
+
+# Redondeo de coordenadas para la clave de caché (~100 m)
+SITE_DECIMALS = 3
+
+
+def _as_epoch(times: Union[np.ndarray, Iterable, datetime, float]) -> np.ndarray:
+    """datetime / lista de datetime / epoch → array float64 de epoch (segundos)"""
+    if isinstance(times, datetime):
+        return np.array([times.timestamp()])
+    if isinstance(times, np.ndarray) and times.dtype.kind in "fi":
+        return times.astype(np.float64, copy=False)
+    if np.isscalar(times):
+        return np.array([float(times)])
+    return np.array([t.timestamp() if isinstance(t, datetime) else float(t) for t in times])
+
+
+def solar_position(latitude: float, longitude: float, times) -> Dict[str, np.ndarray]:
+    """
+    Posición del sol (cálculo directo, sin caché)
+
+    Args:
+        latitude, longitude: Grados (sur / oeste negativos)
+        times: epoch (s), datetime o iterable de ellos
+
+    Returns:
+        {"elevation_deg", "azimuth_deg", "cos_zenith", "day_of_year"}
+    """
+    epoch = _as_epoch(times)
+
+    days = epoch / SECONDS_PER_DAY
+    # Día del año (1-366) y hora UTC fraccional, desde epoch
+    dt64 = epoch.astype("datetime64[s]")
+    year_start = dt64.astype("datetime64[Y]")
+    day_of_year = (dt64.astype("datetime64[D]") - year_start).astype(np.int64) + 1
+    hour_utc = (days % 1.0) * 24.0
+
+    # Ángulo diario (Spencer, 1971)
+    gamma = 2 * np.pi / 365.0 * (day_of_year - 1 + (hour_utc - 12) / 24.0)
+
+    declination = (
+        0.006918 - 0.399912 * np.cos(gamma) + 0.070257 * np.sin(gamma)
+        - 0.006758 * np.cos(2 * gamma) + 0.000907 * np.sin(2 * gamma)
+        - 0.002697 * np.cos(3 * gamma) + 0.00148 * np.sin(3 * gamma)
+    )
+    equation_of_time_min = 229.18 * (
+        0.000075 + 0.001868 * np.cos(gamma) - 0.032077 * np.sin(gamma)
+        - 0.014615 * np.cos(2 * gamma) - 0.040849 * np.sin(2 * gamma)
+    )
+
+    # Hora solar verdadera → ángulo horario (0 al mediodía solar)
+    true_solar_min = hour_utc * 60.0 + equation_of_time_min + 4.0 * longitude
+    hour_angle = np.deg2rad(true_solar_min / 4.0 - 180.0)
+
+    lat = np.deg2rad(latitude)
+    cos_zenith = (
+        np.sin(lat) * np.sin(declination)
+        + np.cos(lat) * np.cos(declination) * np.cos(hour_angle)
+    )
+    cos_zenith = np.clip(cos_zenith, -1.0, 1.0)
+    zenith = np.arccos(cos_zenith)
+
+    # Azimut desde el Norte, sentido horario
+    azimuth = np.arctan2(
+        np.sin(hour_angle),
+        np.cos(hour_angle) * np.sin(lat) - np.tan(declination) * np.cos(lat)
+    )
+    azimuth_deg = (np.rad2deg(azimuth) + 180.0) % 360.0
+
+    return {
+        "elevation_deg": 90.0 - np.rad2deg(zenith),
+        "azimuth_deg": azimuth_deg,
+        "cos_zenith": cos_zenith,
+        "day_of_year": day_of_year,
+    }
+
+
+def extraterrestrial_irradiance(day_of_year: np.ndarray) -> np.ndarray:
+    """Irradiancia extraterrestre sobre plano normal al sol (W/m²)"""
+    return SOLAR_CONSTANT_W_M2 * (1 + 0.033 * np.cos(2 * np.pi * np.asarray(day_of_year) / 365.0))
+
+
+def haurwitz_ghi(cos_zenith: np.ndarray) -> np.ndarray:
+    """GHI de cielo despejado (Haurwitz): 0 con el sol bajo el horizonte"""
+    cos_zenith = np.asarray(cos_zenith, dtype=np.float64)
+    ghi = np.zeros_like(cos_zenith)
+    up = cos_zenith > 0.01
+    ghi[up] = 1098.0 * cos_zenith[up] * np.exp(-0.057 / cos_zenith[up])
+    return ghi
+
+
+@lru_cache(maxsize=1024)
+def _day_table(latitude: float, longitude: float, day_index: int) -> Dict[str, np.ndarray]:
+    """Tabla minuto a minuto de un día UTC (day_index = días desde epoch)"""
+    minutes = day_index * SECONDS_PER_DAY + np.arange(MINUTES_PER_DAY, dtype=np.float64) * 60.0
+    position = solar_position(latitude, longitude, minutes)
+    table = {
+        "elevation_deg": position["elevation_deg"],
+        "azimuth_deg": position["azimuth_deg"],
+        "extraterrestrial_w_m2": extraterrestrial_irradiance(position["day_of_year"])
+            * np.maximum(position["cos_zenith"], 0.0),
+        "clear_sky_ghi_w_m2": haurwitz_ghi(position["cos_zenith"]),
+    }
+    for values in table.values():
+        values.setflags(write=False)
+    return table
+
+
+def solar_profile(latitude: float, longitude: float, times) -> Dict[str, np.ndarray]:
+    """
+    Geometría + irradiancia de cielo despejado para un array de instantes,
+    desde las tablas diarias cacheadas (resolución 1 minuto)
+
+    Returns:
+        {"elevation_deg", "azimuth_deg", "extraterrestrial_w_m2",
+         "clear_sky_ghi_w_m2"}: arrays alineados con `times`.
+        extraterrestrial_w_m2 es sobre plano horizontal (0 de noche)
+    """
+    epoch = _as_epoch(times)
+    lat = round(float(latitude), SITE_DECIMALS)
+    lon = round(float(longitude), SITE_DECIMALS)
+
+    day_index = np.floor(epoch / SECONDS_PER_DAY).astype(np.int64)
+    minute = np.clip(
+        np.round((epoch - day_index * SECONDS_PER_DAY) / 60.0).astype(np.int64), 0, MINUTES_PER_DAY - 1
+    )
+
+    result = {name: np.empty(len(epoch)) for name in (
+        "elevation_deg", "azimuth_deg", "extraterrestrial_w_m2", "clear_sky_ghi_w_m2"
+    )}
+    for day in np.unique(day_index):
+        mask = day_index == day
+        table = _day_table(lat, lon, int(day))
+        for name, values in result.items():
+            values[mask] = table[name][minute[mask]]
+    return result
+
+
+def clear_sky_ghi(latitude: float, longitude: float, times) -> np.ndarray:
+    """GHI de cielo despejado (W/m²) para un array de instantes"""
+    return solar_profile(latitude, longitude, times)["clear_sky_ghi_w_m2"]
+
+
+def cache_info():
+    """Estado de la caché de tablas diarias"""
+    return _day_table.cache_info()
@@ -0,0 +1,190 @@
+"""
+Formato binario compacto de telemetría ESP32
+
+Registros de layout fijo (little-endian, `struct`) con un schema ID en el
+primer byte. Se decodifican con unpack_from sobre un memoryview (sin copiar
+el buffer) directamente al mismo modelo ESP32Telemetry que usa el camino JSON.
+
+Cabecera común (26 bytes):
+    u8   schema_id
+    u8   flags           (reservado, 0)
+    16s  device_id       ASCII, rellenado con NUL
+    u32  seq
+    u32  ts              ms desde el arranque (el modelo lo guarda en segundos)
+
+Schema 1 - Stage 1 (+24 bytes = 50):
+    4×f32  v_bat_v, v_wind_v_dc, v_solar_v, v_load_v
+    4×u16  adc1_bat1_raw, adc2_eolica_raw, adc5_solar_raw, adc6_load_raw
+
+Schema 2 - Extendido (Stage 1 + 47 bytes = 97):
+    9×f32  voltaje_promedio, soc, potencia_solar, potencia_eolica,
+           potencia_consumo, temperatura, rpm, turbine_rpm, frequency_hz
+    u32    uptime
+    u32    free_heap
+    i16    rssi
+    u8     relays (bit0 solar, bit1 eolica, bit2 red, bit3 carga, bit4 freno)
+
+Un frame puede traer varios registros seguidos (lote): decode_many().
+"""
+
+import struct
+from typing import List, Optional, Union
+
+from services.telemetry_ingest import ESP32Relays, ESP32Telemetry, ESP32TelemetryBatch
+
+
+SCHEMA_STAGE1 = 1
+SCHEMA_EXTENDED = 2
+
+CONTENT_TYPE = "application/octet-stream"
+
+_HEADER = struct.Struct("<BB16sII")
+_STAGE1 = struct.Struct("<4f4H")
+_EXTENDED = struct.Struct("<9fIIhB")
+
+SCHEMA_SIZES = {
+    SCHEMA_STAGE1: _HEADER.size + _STAGE1.size,
+    SCHEMA_EXTENDED: _HEADER.size + _STAGE1.size + _EXTENDED.size,
+}
+
+_RELAY_BITS = ('solar', 'eolica', 'red', 'carga', 'freno')
+
+# Instancias con valores por defecto: decode() las copia (copia superficial)
+# en lugar de construir el modelo campo por campo
+_TELEMETRY_DEFAULTS = ESP32Telemetry()
+
+# 5 bits → 32 combinaciones posibles: una instancia (sólo lectura) por máscara
+_RELAYS_BY_MASK = tuple(
+    ESP32Relays(**{name: bool(mask & (1 << bit)) for bit, name in enumerate(_RELAY_BITS)})
+    for mask in range(1 << len(_RELAY_BITS))
+)
+
+
+class BinaryTelemetryError(ValueError):
+    """Paquete binario con schema desconocido o tamaño incorrecto"""
+
+
+def decode(buf: Union[bytes, bytearray, memoryview], device_id: Optional[str] = None) -> ESP32Telemetry:
+    """
+    Decodificar un registro binario a ESP32Telemetry
+
+    Args:
+        buf: Bytes del paquete
+        device_id: Si se indica (p.ej. desde la URL del WebSocket), se usa
+            cuando el campo device_id del paquete viene vacío
+    """
+    view = memoryview(buf)
+    size = _record_size(view, 0)
+    if len(view) != size:
+        raise BinaryTelemetryError(f"Se esperaban {size} bytes, llegaron {len(view)}")
+    return _decode_at(view, 0, device_id)
+
+
+def decode_many(
+    buf: Union[bytes, bytearray, memoryview],
+    device_id: Optional[str] = None
+) -> Union[ESP32Telemetry, ESP32TelemetryBatch]:
+    """
+    Decodificar un frame con uno o más registros consecutivos
+
+    Returns:
+        ESP32Telemetry si hay un solo registro, ESP32TelemetryBatch si hay varios
+    """
+    view = memoryview(buf)
+    samples: List[ESP32Telemetry] = []
+    offset = 0
+    while offset < len(view):
+        size = _record_size(view, offset)
+        if offset + size > len(view):
+            raise BinaryTelemetryError(f"Registro truncado en el byte {offset}")
+        samples.append(_decode_at(view, offset, device_id))
+        offset += size
+
+    if len(samples) == 1:
+        return samples[0]
+    return ESP32TelemetryBatch.model_construct(
+        device_id=samples[-1].device_id,
+        seq_start=samples[0].seq,
+        seq_end=samples[-1].seq,
+        samples=samples
+    )
+
+
+def _record_size(view: memoryview, offset: int) -> int:
+    if len(view) - offset < _HEADER.size:
+        raise BinaryTelemetryError(f"Paquete demasiado corto: {len(view) - offset} bytes")
+    schema_id = view[offset]
+    size = SCHEMA_SIZES.get(schema_id)
+    if size is None:
+        raise BinaryTelemetryError(f"Schema desconocido: {schema_id}")
+    return size
+
+
+def _decode_at(view: memoryview, offset: int, device_id: Optional[str]) -> ESP32Telemetry:
+    schema_id, _flags, raw_id, seq, ts_ms = _HEADER.unpack_from(view, offset)
+    offset += _HEADER.size
+
+    v_bat, v_wind, v_solar, v_load, r_bat, r_wind, r_solar, r_load = _STAGE1.unpack_from(view, offset)
+    offset += _STAGE1.size
+
+    fields = {
+        'device_id': raw_id.rstrip(b'\0').decode('ascii', 'replace') or device_id or "UNKNOWN",
+        'seq': seq,
+        'ts': ts_ms / 1000.0,
+        'v_bat_v': v_bat,
+        'v_wind_v_dc': v_wind,
+        'v_solar_v': v_solar,
+        'v_load_v': v_load,
+        'raw_adc': {
+            'adc1_bat1': v_bat, 'adc1_bat1_raw': r_bat,
+            'adc2_eolica': v_wind, 'adc2_eolica_raw': r_wind,
+            'adc5_solar': v_solar, 'adc5_solar_raw': r_solar,
+            'adc6_load': v_load, 'adc6_load_raw': r_load,
+        },
+    }
+
+    if schema_id == SCHEMA_EXTENDED:
+        (
+            fields['voltaje_promedio'], fields['soc'], fields['potencia_solar'],
+            fields['potencia_eolica'], fields['potencia_consumo'], fields['temperatura'],
+            fields['rpm'], fields['turbine_rpm'], fields['frequency_hz'],
+            fields['uptime'], fields['free_heap'], fields['rssi'], relay_bits
+        ) = _EXTENDED.unpack_from(view, offset)
+
+        fields['relays'] = _RELAYS_BY_MASK[relay_bits & 0x1F]
+
+    # Los tipos ya vienen garantizados por el layout: copiar sin revalidar
+    return _TELEMETRY_DEFAULTS.model_copy(update=fields)
+
+
+def encode(packet: ESP32Telemetry, schema_id: int = SCHEMA_EXTENDED) -> bytes:
+    """
+    Codificar un paquete (referencia del formato para firmware y benchmarks)
+    """
+    if schema_id not in SCHEMA_SIZES:
+        raise BinaryTelemetryError(f"Schema desconocido: {schema_id}")
+
+    raw_adc = packet.raw_adc or {}
+    buf = _HEADER.pack(
+        schema_id, 0, packet.device_id.encode('ascii')[:16],
+        packet.seq or 0, int(packet.ts * 1000)
+    ) + _STAGE1.pack(
+        packet.v_bat_v, packet.v_wind_v_dc, packet.v_solar_v, packet.v_load_v,
+        int(raw_adc.get('adc1_bat1_raw', 0)), int(raw_adc.get('adc2_eolica_raw', 0)),
+        int(raw_adc.get('adc5_solar_raw', 0)), int(raw_adc.get('adc6_load_raw', 0))
+    )
+
+    if schema_id == SCHEMA_EXTENDED:
+        relay_bits = 0
+        if packet.relays is not None:
+            for bit, name in enumerate(_RELAY_BITS):
+                if getattr(packet.relays, name):
+                    relay_bits |= 1 << bit
+        buf += _EXTENDED.pack(
+            packet.voltaje_promedio, packet.soc, packet.potencia_solar,
+            packet.potencia_eolica, packet.potencia_consumo, packet.temperatura,
+            packet.rpm, packet.turbine_rpm, packet.frequency_hz,
+            packet.uptime, packet.free_heap, packet.rssi, relay_bits
+        )
+
+    return buf
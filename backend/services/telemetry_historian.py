@@ -0,0 +1,112 @@
+"""
+Historial de telemetría ESP32 en base de datos
+
+Las muestras se acumulan en un buffer en memoria y se escriben con un único
+INSERT masivo (bulk_insert_mappings) por flush. El buffer se vacía en el
+event loop (drain) y la escritura corre en un hilo (write), así la request
+nunca espera al disco. Además del flush en cada paquete, un lazo del
+control_scheduler ('historial', main.py) vacía el buffer cada
+flush_interval_s aunque no llegue más telemetría.
+"""
+
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from database import SessionLocal, ESP32TelemetrySample
+
+
+logger = logging.getLogger("esp32.telemetry")
+
+
+class TelemetryHistorian:
+    """
+    Buffer + escritura masiva de muestras de telemetría
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        flush_size: int = 500,
+        flush_interval_s: float = 5.0,
+        max_buffer: int = 50_000
+    ):
+        self.session_factory = session_factory
+        self.flush_size = flush_size
+        self.flush_interval_s = flush_interval_s
+        self.max_buffer = max_buffer  # Si la DB no responde, no crecer sin límite
+
+        self._buffer: List[Dict] = []
+        self._last_flush = time.monotonic()
+
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.flushes = 0
+
+    def record(self, device_id: str, packet, seq: Optional[int], timestamp: datetime) -> None:
+        """Agregar una muestra al buffer"""
+        if len(self._buffer) >= self.max_buffer:
+            self.rows_dropped += 1
+            return
+
+        self._buffer.append({
+            'device_id': device_id,
+            'seq': seq,
+            'ts_device': packet.ts,
+            'timestamp': timestamp,
+            'v_bat_v': packet.v_bat_v,
+            'v_wind_v_dc': packet.v_wind_v_dc,
+            'v_solar_v': packet.v_solar_v,
+            'v_load_v': packet.v_load_v,
+            'battery_soc_percent': packet.soc,
+            'solar_power_w': packet.potencia_solar,
+            'wind_power_w': packet.potencia_eolica,
+            'load_power_w': packet.potencia_consumo,
+            'turbine_rpm': packet.turbine_rpm,
+        })
+
+    def should_flush(self) -> bool:
+        """¿Buffer lleno o pasó el intervalo?"""
+        if not self._buffer:
+            return False
+        return (
+            len(self._buffer) >= self.flush_size
+            or time.monotonic() - self._last_flush >= self.flush_interval_s
+        )
+
+    def drain(self) -> List[Dict]:
+        """Tomar el contenido del buffer (llamar desde el event loop)"""
+        rows, self._buffer = self._buffer, []
+        self._last_flush = time.monotonic()
+        return rows
+
+    def write(self, rows: List[Dict]) -> int:
+        """Escribir filas en un solo INSERT masivo (apto para asyncio.to_thread)"""
+        if not rows:
+            return 0
+
+        db = self.session_factory()
+        try:
+            db.bulk_insert_mappings(ESP32TelemetrySample, rows)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            self.rows_dropped += len(rows)
+            logger.warning("Error escribiendo historial de telemetría (%d filas): %s", len(rows), e)
+            return 0
+        finally:
+            db.close()
+
+        self.rows_written += len(rows)
+        self.flushes += 1
+        return len(rows)
+
+    def get_stats(self) -> Dict:
+        """Estado del historial para diagnóstico"""
+        return {
+            'buffered': len(self._buffer),
+            'rows_written': self.rows_written,
+            'rows_dropped': self.rows_dropped,
+            'flushes': self.flushes
+        }
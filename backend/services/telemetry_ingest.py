@@ -0,0 +1,423 @@
+"""
+Ingesta rápida de telemetría ESP32
+
+- Modelo Pydantic precompilado para los formatos Stage 1 y extendido,
+  tolerante como el handler original (null o no numérico → default)
+- Actualiza el registro existente del dispositivo EN SITIO
+- Lotes (ESP32TelemetryBatch): N muestras por request, procesadas en una
+  pasada (estado actual una vez, historial en un solo INSERT masivo)
+- Logging por niveles y muestreado vía `logging` + QueueHandler,
+  para que stdout (lento en consolas Windows) nunca bloquee la ingesta
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Annotated, Any, Dict, List, Optional, Union
+
+from pydantic import BaseModel, ConfigDict, Discriminator, Tag, TypeAdapter, ValidationError
+
+
+logger = logging.getLogger("esp32.telemetry")
+
+_log_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_telemetry_logging(level: str = "INFO") -> None:
+    """
+    Enviar los logs de telemetría a stdout a través de una cola
+
+    El handler de consola corre en el hilo del QueueListener; la request
+    sólo hace un put() no bloqueante.
+    """
+    global _log_listener
+
+    logger.setLevel(getattr(logging, level.upper(), logging.INFO))
+    if _log_listener is not None:
+        return
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.propagate = False
+
+    _log_listener = logging.handlers.QueueListener(log_queue, console)
+    _log_listener.start()
+
+
+def stop_telemetry_logging() -> None:
+    """Vaciar la cola de logs y detener el listener"""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+
+# ===== MODELOS =====
+
+class ESP32Relays(BaseModel):
+    """Estado de relés reportado por el firmware"""
+    model_config = ConfigDict(extra="ignore")
+
+    solar: Optional[bool] = None
+    eolica: Optional[bool] = None
+    red: Optional[bool] = None
+    carga: Optional[bool] = None
+    freno: Optional[bool] = None
+
+
+class ESP32Telemetry(BaseModel):
+    """
+    Paquete de telemetría ESP32
+
+    Stage 1: device_id, seq, ts, v_bat_v, v_wind_v_dc, v_solar_v, v_load_v (+ raw_adc)
+    Extendido: voltaje_promedio, soc, potencias, temperatura, relays, rpm...
+    """
+    model_config = ConfigDict(extra="ignore")
+
+    device_id: str = "UNKNOWN"
+
+    # Stage 1
+    seq: Optional[int] = None
+    ts: float = 0
+    v_bat_v: float = 0.0
+    v_wind_v_dc: float = 0.0
+    v_solar_v: float = 0.0
+    v_load_v: float = 0.0
+
+    # Extendido
+    voltaje_promedio: float = 0.0
+    soc: float = 0.0
+    potencia_solar: float = 0.0
+    potencia_eolica: float = 0.0
+    potencia_consumo: float = 0.0
+    temperatura: float = 0.0
+    rpm: float = 0.0
+    turbine_rpm: float = 0.0
+    frequency_hz: float = 0.0
+
+    # Heartbeat embebido
+    uptime: int = 0
+    free_heap: int = 0
+    rssi: int = 0
+
+    relays: Optional[ESP32Relays] = None
+    raw_adc: Optional[Dict[str, float]] = None
+
+
+class ESP32TelemetryBatch(BaseModel):
+    """
+    Lote de muestras con cabecera común
+
+    {
+        "device_id": "ESP32_INVERSOR_001", "seq_start": 100, "seq_end": 109,
+        "samples": [{"ts": 12.0, "v_bat_v": 2.51, ...}, {"ts": 12.1, ...}, ...]
+    }
+
+    Las muestras sin seq propio toman seq_start + índice; su device_id
+    se ignora (manda el de la cabecera).
+    """
+    model_config = ConfigDict(extra="ignore")
+
+    device_id: str = "UNKNOWN"
+    seq_start: Optional[int] = None
+    seq_end: Optional[int] = None
+    samples: List[ESP32Telemetry]
+
+    def sample_seqs(self) -> List[Optional[int]]:
+        """seq efectivo de cada muestra"""
+        if self.seq_start is None:
+            return [sample.seq for sample in self.samples]
+        return [
+            sample.seq if sample.seq is not None else self.seq_start + i
+            for i, sample in enumerate(self.samples)
+        ]
+
+
+# 4 ADC reales del hardware (nombres según firmware):
+# GPIO34: Batería (adc1_bat1), GPIO35: Eólica DC (adc2_eolica),
+# GPIO36: Solar (adc5_solar), GPIO39: Carga (adc6_load)
+RAW_ADC_KEYS = (
+    'adc1_bat1', 'adc1_bat1_raw',
+    'adc2_eolica', 'adc2_eolica_raw',
+    'adc5_solar', 'adc5_solar_raw',
+    'adc6_load', 'adc6_load_raw',
+)
+
+# relays del firmware → nombres del store
+RELAY_MAP = (('solar', 'solar'), ('eolica', 'wind'), ('red', 'grid'), ('carga', 'load'))
+
+
+def _packet_shape(data: Any) -> str:
+    return "lote" if isinstance(data, dict) and isinstance(data.get("samples"), list) else "muestra"
+
+
+# Muestra o lote según la forma del JSON ya parseado (validación en un solo paso)
+_PACKET = TypeAdapter(Annotated[
+    Union[Annotated[ESP32TelemetryBatch, Tag("lote")], Annotated[ESP32Telemetry, Tag("muestra")]],
+    Discriminator(_packet_shape),
+])
+
+
+def _drop(data: Any, loc: tuple) -> None:
+    """Quitar el campo inválido en la ruta loc (p. ej. ('samples', 3, 'soc'))"""
+    *path, key = loc
+    for step in path:
+        try:
+            data = data[step]
+        except (KeyError, IndexError, TypeError):
+            return
+    if isinstance(data, dict):
+        data.pop(key, None)
+
+
+def bind_device(
+    packet: Union[ESP32Telemetry, ESP32TelemetryBatch],
+    device_id: str
+) -> Union[ESP32Telemetry, ESP32TelemetryBatch]:
+    """
+    Atribuir el paquete al dispositivo de la conexión (WebSocket /api/ws/esp32/{device_id})
+
+    El device_id embebido debe coincidir con el de la conexión (o con sus
+    primeros 16 caracteres, el ancho del campo binario); si no, ValueError:
+    una conexión no puede escribir telemetría de otro dispositivo.
+    """
+    samples = packet.samples if isinstance(packet, ESP32TelemetryBatch) else [packet]
+    allowed = (device_id, device_id[:16])
+    for sample in [packet, *samples]:
+        if sample.device_id not in allowed:
+            raise ValueError(f"device_id {sample.device_id!r} no corresponde a la conexión {device_id!r}")
+        sample.device_id = device_id
+    return packet
+
+
+class TelemetryIngest:
+    """
+    Procesa paquetes ESP32 sobre un store compartido {device_id: registro}
+    """
+
+    def __init__(self, store: Dict, log_every: int = 50, save_interval_s: float = 2.0, historian=None):
+        self.store = store
+        self.historian = historian  # TelemetryHistorian opcional
+        self.log_every = max(1, log_every)  # 1 de cada N paquetes a INFO
+        self.save_interval_s = save_interval_s
+
+        self.last_seq: Dict[str, int] = {}
+        self.uplink_lost: Dict[str, int] = {}
+        self.packet_count = 0
+        self._last_save = 0.0
+        self._complete = set()
+        self._log_block = 0
+
+    def parse(self, body: bytes) -> Union[ESP32Telemetry, ESP32TelemetryBatch]:
+        """
+        Validar el JSON contra el modelo: lote si trae una lista "samples", si no muestra
+
+        Como el handler original (data.get con default), un null o un valor
+        no numérico no rechaza el paquete: el campo se descarta y toma su
+        default. Sólo se paga ese segundo intento cuando hay errores.
+        """
+        try:
+            return _PACKET.validate_json(body)
+        except ValidationError as e:
+            data = json.loads(body)
+            for error in e.errors():
+                _drop(data, error["loc"][1:])  # loc[0] es la etiqueta (lote / muestra)
+            return _PACKET.validate_python(data)
+
+    def ingest_any(self, packet: Union[ESP32Telemetry, ESP32TelemetryBatch]) -> Dict:
+        """Despachar muestra suelta o lote"""
+        if isinstance(packet, ESP32TelemetryBatch):
+            return self.ingest_batch(packet)
+        return self.ingest(packet)
+
+    def ingest(self, packet: ESP32Telemetry) -> Dict:
+        """Aplicar un paquete validado al registro del dispositivo"""
+        now = datetime.now()
+
+        self.packet_count += 1
+
+        if packet.seq is not None:
+            self._track_seq(packet.device_id, packet.seq)
+
+        if self.historian is not None:
+            self.historian.record(packet.device_id, packet, packet.seq, now)
+
+        return self._update_record(packet.device_id, packet, packet.relays, packet.raw_adc, now)
+
+    def ingest_batch(self, batch: ESP32TelemetryBatch) -> Dict:
+        """
+        Aplicar un lote en una sola pasada
+
+        - Pérdida de paquetes contabilizada muestra por muestra sobre el rango de seq
+        - Historial: todas las muestras al buffer (el caller hace un único flush)
+        - Estado actual: se actualiza una sola vez con la última muestra
+        """
+        device_id = batch.device_id
+        samples = batch.samples
+        now = datetime.now()
+
+        if not samples:
+            return {
+                'status': 'success',
+                'message': 'Lote vacío',
+                'device_id': device_id,
+                'timestamp': now.isoformat(),
+                'samples': 0
+            }
+
+        seqs = batch.sample_seqs()
+        for seq in seqs:
+            if seq is not None:
+                self._track_seq(device_id, seq)
+
+        # Huecos al final del rango declarado (seq_end sin muestra)
+        last_seq = seqs[-1]
+        if batch.seq_end is not None and last_seq is not None and batch.seq_end > last_seq:
+            self.uplink_lost[device_id] = self.uplink_lost.get(device_id, 0) + (batch.seq_end - last_seq)
+            self.last_seq[device_id] = batch.seq_end
+
+        self.packet_count += len(samples)
+
+        latest = samples[-1]
+        if self.historian is not None:
+            # Hora de cada muestra relativa a la última, según el reloj del ESP32
+            for sample, seq in zip(samples, seqs):
+                age_s = latest.ts - sample.ts if latest.ts and sample.ts else 0.0
+                self.historian.record(device_id, sample, seq, now - timedelta(seconds=max(age_s, 0.0)))
+
+        # Relays / raw_adc: los más recientes que haya traído el lote
+        relays = next((s.relays for s in reversed(samples) if s.relays is not None), None)
+        raw_adc = next((s.raw_adc for s in reversed(samples) if s.raw_adc), None)
+
+        result = self._update_record(device_id, latest, relays, raw_adc, now)
+        result['samples'] = len(samples)
+        result['seq_range'] = [seqs[0], last_seq]
+        return result
+
+    def _update_record(
+        self,
+        device_id: str,
+        packet: ESP32Telemetry,
+        relays_in: Optional[ESP32Relays],
+        raw_adc_in: Optional[Dict[str, float]],
+        when: datetime
+    ) -> Dict:
+        """Escribir el estado actual del dispositivo en el store (en sitio)"""
+        now = when.isoformat()
+        contador = self.packet_count
+
+        record = self.store.get(device_id)
+        if record is None:
+            record = self.store[device_id] = self._new_record(device_id, now)
+            self._complete.add(device_id)
+        elif device_id not in self._complete:
+            # Registro cargado de disco: completar secciones faltantes una vez
+            for key, value in self._new_record(device_id, now).items():
+                record.setdefault(key, value)
+            self._complete.add(device_id)
+
+        turbine_rpm = packet.turbine_rpm if packet.turbine_rpm >= 0 else 0.0
+
+        record['last_seen'] = now
+        record['contador'] = contador
+
+        heartbeat = record['heartbeat']
+        heartbeat['uptime'] = packet.uptime
+        heartbeat['free_heap'] = packet.free_heap
+        heartbeat['rssi'] = packet.rssi
+        heartbeat['timestamp'] = now
+
+        telemetry = record['telemetry']
+        telemetry['battery_voltage'] = packet.voltaje_promedio
+        telemetry['battery_soc'] = packet.soc
+        telemetry['solar_power'] = packet.potencia_solar
+        telemetry['wind_power'] = packet.potencia_eolica
+        telemetry['load_power'] = packet.potencia_consumo
+        telemetry['temperature'] = packet.temperatura
+        telemetry['v_bat_v'] = packet.v_bat_v
+        telemetry['v_wind_v_dc'] = packet.v_wind_v_dc
+        telemetry['v_solar_v'] = packet.v_solar_v
+        telemetry['v_load_v'] = packet.v_load_v
+        telemetry['rpm'] = packet.rpm
+        telemetry['frequency_hz'] = packet.frequency_hz
+        telemetry['turbine_rpm'] = turbine_rpm
+
+        # Relays: usar los nuevos si vienen, si no mantener los anteriores
+        if relays_in is not None:
+            relays = record['relays']
+            for src, dst in RELAY_MAP:
+                value = getattr(relays_in, src)
+                if value is not None:
+                    relays[dst] = value
+
+        # raw_adc: si no viene en este paquete, mantener el anterior
+        if raw_adc_in:
+            raw_adc = record['raw_adc']
+            for key in RAW_ADC_KEYS:
+                raw_adc[key] = raw_adc_in.get(key, 0)
+
+        self._log_packet(device_id, packet, contador)
+
+        return {
+            'status': 'success',
+            'message': 'Telemetría recibida',
+            'device_id': device_id,
+            'timestamp': now,
+            'turbine_rpm': turbine_rpm
+        }
+
+    def should_save(self) -> bool:
+        """Persistir a disco como máximo cada save_interval_s"""
+        now = time.monotonic()
+        if now - self._last_save >= self.save_interval_s:
+            self._last_save = now
+            return True
+        return False
+
+    def _track_seq(self, device_id: str, seq: int) -> None:
+        """Contabilizar pérdida de paquetes por hueco en seq"""
+        if device_id in self.last_seq:
+            expected_seq = self.last_seq[device_id] + 1
+            if seq > expected_seq:
+                self.uplink_lost[device_id] = self.uplink_lost.get(device_id, 0) + (seq - expected_seq)
+            # seq < expected: duplicado / fuera de orden, no cuenta como pérdida
+        else:
+            self.uplink_lost[device_id] = 0
+
+        self.last_seq[device_id] = seq
+
+    def _new_record(self, device_id: str, now: str) -> Dict:
+        return {
+            'last_seen': now,
+            'registered_at': now,
+            'contador': 0,
+            'heartbeat': {'device_id': device_id, 'uptime': 0, 'free_heap': 0, 'rssi': 0, 'timestamp': now},
+            'telemetry': {},
+            'relays': {'solar': False, 'wind': False, 'grid': False, 'load': False},
+            'raw_adc': {key: 0 for key in RAW_ADC_KEYS},
+        }
+
+    def _log_packet(self, device_id: str, packet: ESP32Telemetry, contador: int) -> None:
+        """Log muestreado: 1 de cada log_every a INFO, detalle ADC sólo en DEBUG"""
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "device=%s seq=%s raw_adc=%s",
+                device_id, packet.seq, packet.raw_adc
+            )
+        # En lotes el contador avanza de a N: loguear si se cruzó un múltiplo
+        block = contador // self.log_every
+        if block != self._log_block and logger.isEnabledFor(logging.INFO):
+            self._log_block = block
+            logger.info(
+                "device=%s seq=%s ts=%s Vbat=%.3f Vwind_DC=%.3f Vsolar=%.3f Vload=%.3f RPM=%.1f lost=%d total=%d",
+                device_id, packet.seq, packet.ts,
+                packet.v_bat_v, packet.v_wind_v_dc, packet.v_solar_v, packet.v_load_v,
+                packet.turbine_rpm, self.uplink_lost.get(device_id, 0), contador
+            )
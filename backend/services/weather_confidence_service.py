@@ -1,33 +1,188 @@
 """
 Servicio de confianza meteorológica
 Combina múltiples fuentes y detecta discrepancias
+
+Las fuentes son proveedores enchufables (WeatherProvider): se consultan en
+paralelo sobre clientes HTTP compartidos, cada una con su timeout, su
+circuit breaker y una caché por ubicación con TTL acorde a la frecuencia
+de actualización del proveedor. Agregar una fuente no suma latencia.
 """
 
-import httpx
-from typing import Dict, List
+import asyncio
+import math
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
+
+import httpx
+
 from config import get_settings
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError, get_breaker
+from services.http_clients import get_client
 
 settings = get_settings()
 
 
+# ===== PROVEEDORES =====
+
+class WeatherProvider(ABC):
+    """
+    Fuente meteorológica enchufable
+    
+    Subclases definen name, ttl_s (vida de la caché por ubicación),
+    timeout_s y fetch().
+    """
+    name = "base"
+    ttl_s = 600.0
+    timeout_s = 5.0
+    uses_network = True
+    
+    @abstractmethod
+    async def fetch(self, client: Optional[httpx.AsyncClient], lat: float, lon: float) -> Dict:
+        """Datos actuales normalizados (source, temperature, humidity, clouds, wind_speed...)"""
+
+
+class OpenWeatherProvider(WeatherProvider):
+    """OpenWeather: clima actual (se actualiza cada ~10 min)"""
+    name = "openweather"
+    ttl_s = 600.0
+    
+    async def fetch(self, client: httpx.AsyncClient, lat: float, lon: float) -> Dict:
+        url = "https://api.openweathermap.org/data/2.5/weather"
+        params = {
+            "lat": lat,
+            "lon": lon,
+            "appid": settings.openweather_api_key,
+            "units": "metric"
+        }
+        response = await client.get(url, params=params)
+        response.raise_for_status()
+        data = response.json()
+        
+        return {
+            "source": "OpenWeather",
+            "condition": data["weather"][0]["main"],
+            "description": data["weather"][0]["description"],
+            "temperature": data["main"]["temp"],
+            "humidity": data["main"]["humidity"],
+            "clouds": data["clouds"]["all"],
+            "wind_speed": data["wind"]["speed"],
+            "rain_1h": data.get("rain", {}).get("1h", 0),
+            "timestamp": data["dt"],
+            "update_frequency": "1-3 horas"
+        }
+
+
+class OpenMeteoProvider(WeatherProvider):
+    """
+    Open-Meteo (GRATIS, sin API key)
+    Fuente europea, muy precisa; datos "current" cada 15 minutos
+    """
+    name = "open_meteo"
+    ttl_s = 900.0
+    
+    async def fetch(self, client: httpx.AsyncClient, lat: float, lon: float) -> Dict:
+        url = "https://api.open-meteo.com/v1/forecast"
+        params = {
+            "latitude": lat,
+            "longitude": lon,
+            "current": "temperature_2m,relative_humidity_2m,precipitation,cloud_cover,wind_speed_10m",
+            "hourly": "precipitation_probability",
+            "forecast_days": 1
+        }
+        response = await client.get(url, params=params)
+        response.raise_for_status()
+        data = response.json()
+        
+        current = data["current"]
+        hourly = data["hourly"]
+        
+        # Calcular probabilidad próximas horas
+        next_3h_precip_prob = sum(hourly["precipitation_probability"][:3]) / 3
+        
+        # Determinar condición
+        if current["precipitation"] > 0:
+            condition = "Rain"
+        elif current["cloud_cover"] > 70:
+            condition = "Clouds"
+        else:
+            condition = "Clear"
+        
+        return {
+            "source": "Open-Meteo",
+            "condition": condition,
+            "temperature": current["temperature_2m"],
+            "humidity": current["relative_humidity_2m"],
+            "clouds": current["cloud_cover"],
+            "wind_speed": current["wind_speed_10m"],
+            "precipitation_current": current["precipitation"],
+            "precipitation_probability_3h": next_3h_precip_prob,
+            "timestamp": current["time"],
+            "update_frequency": "15 minutos"
+        }
+
+
+class MockWeatherProvider(WeatherProvider):
+    """
+    Fuente local simulada (modo simulación / desarrollo sin red)
+    Determinística por ubicación y hora
+    """
+    name = "mock"
+    ttl_s = 0.0
+    timeout_s = 1.0
+    uses_network = False
+    
+    async def fetch(self, client: Optional[httpx.AsyncClient], lat: float, lon: float) -> Dict:
+        hour = datetime.now().hour
+        daylight = max(0.0, math.sin(math.pi * (hour - 6) / 12))
+        clouds = 40 + 30 * math.sin(lat + lon + hour / 4)
+        
+        return {
+            "source": "Mock",
+            "condition": "Clouds" if clouds > 70 else "Clear",
+            "temperature": round(15 + 8 * daylight - abs(lat) / 10, 1),
+            "humidity": round(60 - 15 * daylight, 1),
+            "clouds": round(clouds, 1),
+            "wind_speed": round(5 + 2 * math.cos(lon + hour / 3), 1),
+            "rain_1h": 0,
+            "timestamp": int(time.time()),
+            "update_frequency": "simulado"
+        }
+
+
 class WeatherConfidenceService:
     """
     Evalúa confianza de predicciones combinando múltiples fuentes
     """
     
+    def __init__(self, providers: Optional[List[WeatherProvider]] = None):
+        self.providers: Dict[str, WeatherProvider] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        
+        # {(proveedor, lat, lon): (expira_monotonic, guardado_monotonic, datos)}
+        self._cache: Dict[Tuple[str, float, float], Tuple[float, float, Dict]] = {}
+        
+        for provider in providers or []:
+            self.register(provider)
+    
+    def register(self, provider: WeatherProvider) -> None:
+        """Agregar una fuente"""
+        self.providers[provider.name] = provider
+        self.breakers[provider.name] = get_breaker(provider.name)
+    
     async def get_multi_source_weather(
         self,
         latitude: float,
         longitude: float
     ) -> Dict:
         """
-        Obtener clima de múltiples fuentes y comparar
+        Obtener clima de múltiples fuentes (en paralelo) y comparar
         
-        Fuentes:
+        Fuentes por defecto:
         1. OpenWeather (principal)
-        2. WeatherAPI.com (alternativa)
-        3. Open-Meteo (gratis, sin API key)
+        2. Open-Meteo (gratis, sin API key)
+        3. Mock local (sólo en modo simulación)
         """
         
         results = {
@@ -38,97 +193,66 @@ class WeatherConfidenceService:
             "alerts": []
         }
         
-        # 1. OpenWeather (ya tenemos)
-        try:
-            openweather_data = await self._get_openweather(latitude, longitude)
-            results["sources"]["openweather"] = openweather_data
-        except Exception as e:
-            results["sources"]["openweather"] = {"error": str(e)}
-        
-        # 2. Open-Meteo (GRATIS, sin API key)
-        try:
-            open_meteo_data = await self._get_open_meteo(latitude, longitude)
-            results["sources"]["open_meteo"] = open_meteo_data
-        except Exception as e:
-            results["sources"]["open_meteo"] = {"error": str(e)}
+        # 1. Todas las fuentes a la vez: la latencia es la de la más lenta
+        names = list(self.providers)
+        fetched = await asyncio.gather(*(
+            self._get_source(self.providers[name], latitude, longitude) for name in names
+        ))
+        results["sources"] = dict(zip(names, fetched))
         
-        # 3. Calcular consenso
+        # 2. Calcular consenso
         results["consensus"] = self._calculate_consensus(results["sources"])
         
-        # 4. Detectar discrepancias
+        # 3. Detectar discrepancias
         results["alerts"] = self._detect_discrepancies(results["sources"])
         
         return results
     
-    async def _get_openweather(self, lat: float, lon: float) -> Dict:
-        """Obtener datos de OpenWeather"""
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            url = f"https://api.openweathermap.org/data/2.5/weather"
-            params = {
-                "lat": lat,
-                "lon": lon,
-                "appid": settings.openweather_api_key,
-                "units": "metric"
-            }
-            response = await client.get(url, params=params)
-            data = response.json()
-            
-            return {
-                "source": "OpenWeather",
-                "condition": data["weather"][0]["main"],
-                "description": data["weather"][0]["description"],
-                "temperature": data["main"]["temp"],
-                "humidity": data["main"]["humidity"],
-                "clouds": data["clouds"]["all"],
-                "wind_speed": data["wind"]["speed"],
-                "rain_1h": data.get("rain", {}).get("1h", 0),
-                "timestamp": data["dt"],
-                "update_frequency": "1-3 horas"
-            }
+    async def _get_source(self, provider: WeatherProvider, lat: float, lon: float) -> Dict:
+        """Caché por ubicación → circuit breaker (con último dato bueno) → fetch con timeout"""
+        key = (provider.name, round(lat, 2), round(lon, 2))
+        now = time.monotonic()
+        
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] > now:
+            return {**cached[2], "cached": True, "age_s": round(now - cached[1], 1)}
+        
+        client = get_client(provider.name) if provider.uses_network else None
+        
+        async def fetch() -> Tuple[Dict, float]:
+            data = await asyncio.wait_for(provider.fetch(client, lat, lon), timeout=provider.timeout_s)
+            return data, time.monotonic()
+        
+        try:
+            data, fetched_at = await self.breakers[provider.name].acall(fetch, key=key)
+        except CircuitOpenError:
+            return {"error": "Fuente temporalmente deshabilitada (circuito abierto)"}
+        except asyncio.TimeoutError:
+            return {"error": f"Timeout ({provider.timeout_s:.0f}s)"}
+        except Exception as e:
+            return {"error": str(e)}
+        
+        if fetched_at < now:
+            # Circuito abierto o fetch fallido: último dato bueno del breaker
+            return {**data, "cached": True, "stale": True, "age_s": round(now - fetched_at, 1)}
+        if provider.ttl_s > 0:
+            self._cache[key] = (now + provider.ttl_s, now, data)
+        return data
     
-    async def _get_open_meteo(self, lat: float, lon: float) -> Dict:
-        """
-        Obtener datos de Open-Meteo (GRATIS, sin API key)
-        Fuente europea, muy precisa
-        """
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            url = "https://api.open-meteo.com/v1/forecast"
-            params = {
-                "latitude": lat,
-                "longitude": lon,
-                "current": "temperature_2m,relative_humidity_2m,precipitation,cloud_cover,wind_speed_10m",
-                "hourly": "precipitation_probability",
-                "forecast_days": 1
-            }
-            response = await client.get(url, params=params)
-            data = response.json()
-            
-            current = data["current"]
-            hourly = data["hourly"]
-            
-            # Calcular probabilidad próximas horas
-            next_3h_precip_prob = sum(hourly["precipitation_probability"][:3]) / 3
-            
-            # Determinar condición
-            if current["precipitation"] > 0:
-                condition = "Rain"
-            elif current["cloud_cover"] > 70:
-                condition = "Clouds"
-            else:
-                condition = "Clear"
-            
-            return {
-                "source": "Open-Meteo",
-                "condition": condition,
-                "temperature": current["temperature_2m"],
-                "humidity": current["relative_humidity_2m"],
-                "clouds": current["cloud_cover"],
-                "wind_speed": current["wind_speed_10m"],
-                "precipitation_current": current["precipitation"],
-                "precipitation_probability_3h": next_3h_precip_prob,
-                "timestamp": current["time"],
-                "update_frequency": "15 minutos"
-            }
+    def get_stats(self) -> Dict:
+        """Estado de fuentes, circuitos y caché"""
+        now = time.monotonic()
+        return {
+            "providers": {
+                name: {
+                    "ttl_s": provider.ttl_s,
+                    "timeout_s": provider.timeout_s,
+                    "circuit": self.breakers[name].get_stats()
+                }
+                for name, provider in self.providers.items()
+            },
+            "cached_locations": sum(1 for expires, _, _ in self._cache.values() if expires > now)
+        }
     
     def _calculate_consensus(self, sources: Dict) -> Dict:
         """
@@ -246,4 +370,6 @@ class WeatherConfidenceService:
 
 
 # Singleton
-weather_confidence = WeatherConfidenceService()
+weather_confidence = WeatherConfidenceService([OpenWeatherProvider(), OpenMeteoProvider()])
+if settings.simulation_mode:
+    weather_confidence.register(MockWeatherProvider())
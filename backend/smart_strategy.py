@@ -1,10 +1,25 @@
 """
 Estrategia Inteligente de Carga Basada en Pronóstico del Clima
 Toma decisiones anticipadas según predicción meteorológica
+
+El objetivo de carga sale, cuando hay balance horario previsto, de una
+política de programación dinámica sobre el SoC en buckets (tablas de
+costo por hora precalculadas, services/dispatch_planner.py): sin solver
+LP, y cada decisión posterior es una lectura O(1) de la tabla.
 """
-from typing import Dict, List
+import dataclasses
+import time
+from typing import Dict, List, Optional, Sequence
 from datetime import datetime, timedelta
 
+import numpy as np
+
+from config import get_settings
+from services.battery_engine import BatterySpec
+from services.dispatch_planner import DispatchCosts, DispatchPlan, fingerprint, solve
+
+settings = get_settings()
+
 class SmartChargingStrategy:
     """
     Sistema inteligente que analiza el pronóstico del clima
@@ -15,13 +30,17 @@ class SmartChargingStrategy:
         self.umbral_lluvia_mm = 5.0  # >5mm = día lluvioso
         self.umbral_nubosidad = 80  # >80% = muy nublado
         self.umbral_viento_bueno = 8.0  # >8 m/s = buen viento
+        self.politica: Optional[DispatchPlan] = None  # Última política de carga optimizada
         
-    def analizar_pronostico(self, forecast_data: List[Dict]) -> Dict:
+    def analizar_pronostico(self, forecast_data: List[Dict], plan_action: Optional[Dict] = None) -> Dict:
         """
         Analiza pronóstico y genera estrategia de carga
         
         Args:
             forecast_data: Lista de pronósticos por día
+            plan_action: Acción del plan de despacho vigente
+                (DispatchPlan.action); su objetivo de carga pasa a ser
+                la acción inmediata
             
         Returns:
             Estrategia con decisiones y recomendaciones
@@ -74,7 +93,8 @@ class SmartChargingStrategy:
         estrategia = self._generar_estrategia(
             dias_sin_sol, 
             dias_con_viento,
-            forecast_data[0] if forecast_data else None  # Hoy
+            forecast_data[0] if forecast_data else None,  # Hoy
+            plan_action
         )
         
         return {
@@ -94,7 +114,8 @@ class SmartChargingStrategy:
         self, 
         dias_sin_sol: List[Dict], 
         dias_con_viento: List[Dict],
-        condiciones_hoy: Dict
+        condiciones_hoy: Dict,
+        plan_action: Optional[Dict] = None
     ) -> Dict:
         """Genera estrategia inteligente de carga"""
         
@@ -202,6 +223,13 @@ class SmartChargingStrategy:
             # Si hay viento, no necesitas tanta autonomía
             dias_autonomia_necesaria = max(1, len(dias_sin_sol) - viento_en_dias_malos)
         
+        # Plan de despacho: la acción inmediata es la misma que ejecuta el controlador
+        if plan_action is not None:
+            decision_plan = self._decision_desde_plan(plan_action)
+            decisiones.insert(0, decision_plan)
+            if decision_plan['prioridad'] == 'CRÍTICA' and nivel_urgencia == 'NORMAL':
+                nivel_urgencia = 'ALTA'
+        
         return {
             'decisiones': decisiones,
             'recomendaciones': recomendaciones,
@@ -210,17 +238,107 @@ class SmartChargingStrategy:
             'accion_inmediata': decisiones[0] if decisiones else None
         }
     
+    def _decision_desde_plan(self, plan_action: Dict) -> Dict:
+        """Decisión de la estrategia a partir de la acción del plan de despacho"""
+        
+        umbral_w = max(plan_action['granularity_w'], 10.0)
+        objetivo = plan_action['target_soc_percent']
+        horas = plan_action['lookahead_h']
+        
+        if plan_action['shed_ahead_wh'] > umbral_w * plan_action['step_h']:
+            return {
+                'accion': 'REDUCIR_CONSUMO',
+                'razon': (
+                    f"Plan de despacho: {plan_action['shed_ahead_wh'] / 1000:.1f} kWh sin cubrir "
+                    f"en las próximas {horas:.0f} h"
+                ),
+                'prioridad': 'CRÍTICA',
+                'soc_objetivo': round(objetivo, 1)
+            }
+        if plan_action['grid_charge_w'] > umbral_w:
+            return {
+                'accion': 'CARGAR_DESDE_RED',
+                'razon': f"Plan de despacho: cargar desde la red hasta {objetivo:.0f}%",
+                'prioridad': 'ALTA',
+                'soc_objetivo': round(objetivo, 1)
+            }
+        return {
+            'accion': 'SEGUIR_PLAN',
+            'razon': f"Plan de despacho: SoC objetivo {objetivo:.0f}% en las próximas {horas:.0f} h",
+            'prioridad': 'MEDIA',
+            'soc_objetivo': round(objetivo, 1)
+        }
+    
+    def optimizar_politica(
+        self,
+        tiempos: Sequence[float],
+        balance_w: Sequence[float],
+        capacidad_bateria_kwh: float,
+        paso_h: float = 1.0,
+        resolucion_soc_percent: float = 1.0,
+        costos: Optional[DispatchCosts] = None,
+        con_red: bool = False
+    ) -> DispatchPlan:
+        """
+        Política óptima de carga para el balance previsto
+        
+        El SoC entre el mínimo y el máximo de config.py se discretiza en
+        buckets de resolucion_soc_percent; la DP hacia atrás deja la tabla
+        (paso × bucket → bucket objetivo) en self.politica.
+        """
+        
+        bateria = dataclasses.replace(
+            BatterySpec.from_settings(settings), capacity_wh=capacidad_bateria_kwh * 1000
+        )
+        costos = costos or DispatchCosts()
+        tiempos = np.asarray(tiempos, dtype=np.float64)
+        balance_w = np.asarray(balance_w, dtype=np.float64)
+        red_w = np.full(len(balance_w), costos.grid_max_w if con_red else 0.0)
+        precio = np.full(len(balance_w), costos.grid_usd_kwh)
+        niveles = int(round((bateria.soc_max - bateria.soc_min) * 100 / resolucion_soc_percent)) + 1
+        
+        inicio = time.perf_counter()
+        niveles_wh, tabla, _ = solve(balance_w, red_w, precio, bateria, costos, paso_h, niveles)
+        self.politica = DispatchPlan(
+            tiempos, paso_h, balance_w, red_w, precio, bateria, costos, niveles_wh, tabla,
+            fingerprint(tiempos, paso_h, balance_w, red_w, precio, bateria, costos),
+            (time.perf_counter() - inicio) * 1000, refined=True
+        )
+        return self.politica
+    
+    def soc_objetivo_inmediato(self, bateria_actual_percent: float) -> Optional[float]:
+        """SoC (%) al que llevar la batería en la hora actual según la última política (O(1))"""
+        
+        if self.politica is None:
+            return None
+        return self.politica.lookup(bateria_actual_percent)
+    
     def calcular_carga_objetivo(
         self, 
         bateria_actual_percent: float,
         dias_sin_sol: int,
         consumo_diario_kwh: float,
-        capacidad_bateria_kwh: float
+        capacidad_bateria_kwh: float,
+        tiempos: Optional[Sequence[float]] = None,
+        balance_w: Optional[Sequence[float]] = None,
+        paso_h: float = 1.0,
+        resolucion_soc_percent: float = 1.0,
+        costos: Optional[DispatchCosts] = None
     ) -> Dict:
         """
         Calcula nivel de carga objetivo según pronóstico
+        
+        Con tiempos / balance_w (generación − consumo previsto por paso)
+        el objetivo es el máximo SoC de la política óptima en las próximas
+        24 h; sin ellos, la regla por días sin sol.
         """
         
+        if balance_w is not None and len(balance_w):
+            return self._carga_objetivo_optima(
+                bateria_actual_percent, capacidad_bateria_kwh, tiempos, balance_w,
+                paso_h, resolucion_soc_percent, costos
+            )
+        
         # Carga mínima para días sin sol
         energia_necesaria_kwh = consumo_diario_kwh * dias_sin_sol
         
@@ -249,7 +367,57 @@ class SmartChargingStrategy:
                 bateria_actual_percent, 
                 carga_objetivo_percent, 
                 urgente
-            )
+            ),
+            'metodo': 'heuristica'
+        }
+    
+    def _carga_objetivo_optima(
+        self,
+        bateria_actual_percent: float,
+        capacidad_bateria_kwh: float,
+        tiempos: Sequence[float],
+        balance_w: Sequence[float],
+        paso_h: float,
+        resolucion_soc_percent: float,
+        costos: Optional[DispatchCosts]
+    ) -> Dict:
+        """Objetivo de carga desde la política de programación dinámica"""
+        
+        politica = self.optimizar_politica(
+            tiempos, balance_w, capacidad_bateria_kwh, paso_h, resolucion_soc_percent, costos
+        )
+        accion = politica.action(bateria_actual_percent, now=politica.times[0])
+        carga_objetivo_percent = accion['target_soc_percent']
+        deficit_percent = max(0, carga_objetivo_percent - bateria_actual_percent)
+        deficit_kwh = (deficit_percent / 100) * capacidad_bateria_kwh
+        
+        # Urgente: aun siguiendo la política queda consumo sin cubrir
+        umbral_w = max(accion['granularity_w'], 10.0)
+        urgente = deficit_percent > 30 or accion['shed_ahead_wh'] > umbral_w * paso_h
+        
+        return {
+            'carga_actual_percent': bateria_actual_percent,
+            'carga_objetivo_percent': round(carga_objetivo_percent, 1),
+            'deficit_percent': round(deficit_percent, 1),
+            'deficit_kwh': round(deficit_kwh, 2),
+            'urgente': urgente,
+            'mensaje': self._generar_mensaje_carga(
+                bateria_actual_percent,
+                carga_objetivo_percent,
+                urgente
+            ),
+            'metodo': 'programacion_dinamica',
+            'soc_proxima_hora_percent': round(accion['next_soc_percent'], 1),
+            'energia_no_cubierta_24h_kwh': round(accion['shed_ahead_wh'] / 1000, 2),
+            'politica': {
+                'niveles_soc': len(politica.levels_wh),
+                'resolucion_soc_percent': round(
+                    float(politica.levels_wh[1] - politica.levels_wh[0]) / politica.battery.capacity_wh * 100, 3
+                ) if len(politica.levels_wh) > 1 else None,
+                'pasos': len(politica),
+                'horizonte_h': round(len(politica) * paso_h, 2),
+                'tiempo_resolucion_ms': round(politica.solve_ms, 2),
+            }
         }
     
     def _generar_mensaje_carga(
@@ -4,10 +4,12 @@ Calcula cuántos paneles solares y turbinas eólicas se necesitan
 basándose en consumo, ubicación geográfica y datos meteorológicos
 """
 import math
-from typing import Dict
+from typing import Dict, Optional
 from datetime import datetime
 
 class SystemCalculator:
+    TURBINE_HUB_HEIGHT_M = 10  # Turbinas residenciales
+    
     def __init__(self, latitude: float, longitude: float):
         self.latitude = latitude
         self.longitude = longitude
@@ -18,7 +20,8 @@ class SystemCalculator:
         battery_capacity_wh: float,
         avg_solar_radiation_kwh_m2: float = 5.0,
         avg_wind_speed_ms: float = 6.0,
-        autonomy_days: float = 2.0
+        autonomy_days: float = 2.0,
+        resource=None
     ) -> Dict:
         """
         Calcula los requerimientos del sistema híbrido
@@ -29,6 +32,8 @@ class SystemCalculator:
             avg_solar_radiation_kwh_m2: Radiación solar promedio diaria (kWh/m²/día)
             avg_wind_speed_ms: Velocidad de viento promedio (m/s)
             autonomy_days: Días de autonomía deseados
+            resource: SiteResourceTable del sitio (services/resource_table.py);
+                si se pasa, reemplaza los promedios escalares
             
         Returns:
             Dict con especificaciones del sistema
@@ -37,6 +42,10 @@ class SystemCalculator:
         # Consumo diario (Wh/día)
         daily_consumption_wh = average_consumption_w * 24
         
+        if resource is not None:
+            avg_solar_radiation_kwh_m2 = resource.peak_sun_hours()
+            avg_wind_speed_ms = round(resource.mean_wind_speed(self.TURBINE_HUB_HEIGHT_M), 2)
+        
         # ===== CÁLCULO SOLAR =====
         # Horas de sol pico efectivas basadas en latitud
         peak_sun_hours = self._calculate_peak_sun_hours(avg_solar_radiation_kwh_m2)
@@ -55,7 +64,7 @@ class SystemCalculator:
         
         # ===== CÁLCULO EÓLICO =====
         # Factor de capacidad basado en velocidad del viento
-        wind_capacity_factor = self._calculate_wind_capacity_factor(avg_wind_speed_ms)
+        wind_capacity_factor = self._calculate_wind_capacity_factor(avg_wind_speed_ms, resource)
         
         # Potencia eólica necesaria para cubrir el 40% del consumo
         required_wind_w = (daily_consumption_wh * 0.4) / (24 * wind_capacity_factor)
@@ -162,7 +171,7 @@ class SystemCalculator:
         # ya que 1 kWh/m² = 1 hora de sol a 1000 W/m²
         return avg_radiation_kwh_m2
     
-    def _calculate_wind_capacity_factor(self, avg_wind_speed_ms: float) -> float:
+    def _calculate_wind_capacity_factor(self, avg_wind_speed_ms: float, resource=None) -> float:
         """
         Calcula el factor de capacidad de la turbina eólica
         basándose en la velocidad promedio del viento
@@ -171,7 +180,23 @@ class SystemCalculator:
         - Cut-in: 3.5 m/s
         - Rated: 12 m/s
         - Cut-out: 25 m/s
+        
+        Con tabla de recurso: curva de potencia integrada sobre la
+        distribución de Weibull del sitio
         """
+        if resource is not None:
+            # Turbina de referencia: 1 kW nominal a 12 m/s (η ≈ 0.35 → Ø ≈ 2.4 m)
+            rated_w = 1000.0
+            diameter_m = math.sqrt(4 * rated_w / (0.5 * 1.225 * 12 ** 3 * 0.35) / math.pi)
+            return resource.capacity_factor(
+                rated_w,
+                diameter_m=diameter_m,
+                efficiency=0.35,
+                cut_in_ms=3.5,
+                cut_out_ms=25.0,
+                height_m=self.TURBINE_HUB_HEIGHT_M
+            )
+        
         if avg_wind_speed_ms < 3.5:
             return 0.0
         elif avg_wind_speed_ms < 12:
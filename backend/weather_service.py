@@ -1,124 +1,147 @@
 import requests
+import time
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from config import get_settings
+from services import forecast_grid, solar_geometry
+from services.circuit_breaker import get_breaker
+from services.forecast_grid import ForecastGrid
 
 settings = get_settings()
 
 
 class WeatherService:
-    """Servicio para obtener datos meteorológicos de OpenWeatherMap"""
+    """
+    Servicio para obtener datos meteorológicos de OpenWeatherMap
+    
+    Las llamadas pasan por el circuit breaker compartido "openweather":
+    con la API caída se responde al instante con el último dato bueno
+    (o datos simulados) en lugar de esperar el timeout en cada request.
+    
+    El lazo de pronóstico (control_scheduler) descarga el pronóstico con
+    refresh_forecast(); mientras esa copia sea reciente, get_forecast_grid
+    la reutiliza y el despacho de cada minuto no hace I/O. Sólo se guarda
+    un pronóstico real: si la descarga falla se conserva el último bueno
+    (con su hora original), nunca el simulado.
+    """
     
     def __init__(self):
         self.api_key = settings.openweather_api_key
         self.lat = settings.latitude
         self.lon = settings.longitude
         self.base_url = "https://api.openweathermap.org/data/2.5"
+        self.breaker = get_breaker("openweather")
+        self.forecast_max_age_s = 2 * settings.control_forecast_s
+        self._forecast_raw: Optional[List[Dict]] = None
+        self._forecast_raw_at = 0.0  # time.monotonic() de la última descarga
+    
+    def _get_json(self, endpoint: str, **extra_params) -> Dict:
+        """GET a OpenWeatherMap (levanta excepción ante error HTTP / red)"""
+        params = {
+            'lat': self.lat,
+            'lon': self.lon,
+            'appid': self.api_key,
+            'units': 'metric',
+            **extra_params
+        }
+        response = requests.get(f"{self.base_url}/{endpoint}", params=params, timeout=10)
+        response.raise_for_status()
+        return response.json()
     
     def get_forecast_5days(self) -> dict:
         """
         Obtener pronóstico de 5 días con datos cada 3 horas
         """
-        try:
-            url = f"{self.base_url}/forecast"
-            params = {
-                'lat': self.lat,
-                'lon': self.lon,
-                'appid': self.api_key,
-                'units': 'metric',
-                'lang': 'es'
-            }
+        return self.breaker.call(
+            lambda: self._summarize_forecast_5days(self._get_json("forecast", lang='es')),
+            fallback=lambda: {
+                'success': False,
+                'error': self.breaker.last_error or 'OpenWeatherMap no disponible',
+                'forecast': []
+            },
+            key="forecast_5days"
+        )
+    
+    def _summarize_forecast_5days(self, data: Dict) -> dict:
+        """Resumen diario del pronóstico cada 3 horas"""
+        # Procesar datos por día
+        daily_forecast = {}
+        for item in data.get('list', []):
+            date = datetime.fromtimestamp(item['dt']).date()
+            date_str = date.strftime('%Y-%m-%d')
             
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            if date_str not in daily_forecast:
+                daily_forecast[date_str] = {
+                    'date': date_str,
+                    'temps': [],
+                    'conditions': [],
+                    'clouds': [],
+                    'wind_speeds': [],
+                    'humidity': [],
+                    'rain': 0
+                }
             
-            # Procesar datos por día
-            daily_forecast = {}
-            for item in data.get('list', []):
-                date = datetime.fromtimestamp(item['dt']).date()
-                date_str = date.strftime('%Y-%m-%d')
-                
-                if date_str not in daily_forecast:
-                    daily_forecast[date_str] = {
-                        'date': date_str,
-                        'temps': [],
-                        'conditions': [],
-                        'clouds': [],
-                        'wind_speeds': [],
-                        'humidity': [],
-                        'rain': 0
-                    }
-                
-                daily_forecast[date_str]['temps'].append(item['main']['temp'])
-                daily_forecast[date_str]['conditions'].append(item['weather'][0]['description'])
-                daily_forecast[date_str]['clouds'].append(item['clouds']['all'])
-                daily_forecast[date_str]['wind_speeds'].append(item['wind']['speed'])
-                daily_forecast[date_str]['humidity'].append(item['main']['humidity'])
-                
-                if 'rain' in item and '3h' in item['rain']:
-                    daily_forecast[date_str]['rain'] += item['rain']['3h']
+            daily_forecast[date_str]['temps'].append(item['main']['temp'])
+            daily_forecast[date_str]['conditions'].append(item['weather'][0]['description'])
+            daily_forecast[date_str]['clouds'].append(item['clouds']['all'])
+            daily_forecast[date_str]['wind_speeds'].append(item['wind']['speed'])
+            daily_forecast[date_str]['humidity'].append(item['main']['humidity'])
             
-            # Calcular promedios y radiación solar estimada
-            forecast_summary = []
-            for date_str, day_data in sorted(daily_forecast.items())[:5]:
-                avg_temp = sum(day_data['temps']) / len(day_data['temps'])
-                max_temp = max(day_data['temps'])
-                min_temp = min(day_data['temps'])
-                avg_clouds = sum(day_data['clouds']) / len(day_data['clouds'])
-                avg_wind = sum(day_data['wind_speeds']) / len(day_data['wind_speeds'])
-                avg_humidity = sum(day_data['humidity']) / len(day_data['humidity'])
-                
-                # Estimación de radiación solar (kWh/m²/día)
-                # Basado en: cielo despejado = 5-6 kWh/m²/día en Argentina
-                clear_sky_radiation = 5.5
-                cloud_factor = 1 - (avg_clouds / 100) * 0.7  # Las nubes reducen hasta 70%
-                estimated_radiation = clear_sky_radiation * cloud_factor
-                
-                # Estimación de producción solar (para panel de 1kW)
-                # Eficiencia promedio ~15-20%
-                estimated_solar_production = estimated_radiation * 0.17 * 1000  # Wh por 1kW instalado
-                
-                # Estimación de producción eólica (para turbina de 1kW)
-                # Fórmula cúbica: P = 0.5 * ρ * A * v³ * η
-                # Simplificado: aprovechamos que la potencia es proporcional al cubo de la velocidad
-                # Asumimos turbina pequeña con cut-in de 3.5 m/s
-                if avg_wind >= 3.5:
-                    # Factor cúbico normalizado
-                    wind_power_factor = pow(avg_wind / 3.5, 3)
-                    # Asumimos 24h de operación con factor de capacidad variable
-                    estimated_wind_production = min(wind_power_factor * 50, 1000) * 24  # Wh por 1kW instalado
-                else:
-                    estimated_wind_production = 0
-                
-                forecast_summary.append({
-                    'date': date_str,
-                    'temp_avg': round(avg_temp, 1),
-                    'temp_max': round(max_temp, 1),
-                    'temp_min': round(min_temp, 1),
-                    'condition': day_data['conditions'][len(day_data['conditions'])//2],
-                    'clouds_percent': round(avg_clouds, 1),
-                    'wind_speed': round(avg_wind, 1),
-                    'humidity': round(avg_humidity, 1),
-                    'rain_mm': round(day_data['rain'], 1),
-                    'solar_radiation_kwh_m2': round(estimated_radiation, 2),
-                    'estimated_solar_wh_per_kw': round(estimated_solar_production, 0),
-                    'estimated_wind_wh_per_kw': round(estimated_wind_production, 0)
-                })
+            if 'rain' in item and '3h' in item['rain']:
+                daily_forecast[date_str]['rain'] += item['rain']['3h']
+        
+        # Calcular promedios y radiación solar estimada
+        forecast_summary = []
+        for date_str, day_data in sorted(daily_forecast.items())[:5]:
+            avg_temp = sum(day_data['temps']) / len(day_data['temps'])
+            max_temp = max(day_data['temps'])
+            min_temp = min(day_data['temps'])
+            avg_clouds = sum(day_data['clouds']) / len(day_data['clouds'])
+            avg_wind = sum(day_data['wind_speeds']) / len(day_data['wind_speeds'])
+            avg_humidity = sum(day_data['humidity']) / len(day_data['humidity'])
             
-            return {
-                'success': True,
-                'location': f"{data.get('city', {}).get('name', 'Desconocido')}",
-                'forecast': forecast_summary
-            }
+            # Estimación de radiación solar (kWh/m²/día)
+            # Basado en: cielo despejado = 5-6 kWh/m²/día en Argentina
+            clear_sky_radiation = 5.5
+            cloud_factor = 1 - (avg_clouds / 100) * 0.7  # Las nubes reducen hasta 70%
+            estimated_radiation = clear_sky_radiation * cloud_factor
             
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Error obteniendo pronóstico: {e}")
-            return {
-                'success': False,
-                'error': str(e),
-                'forecast': []
-            }
+            # Estimación de producción solar (para panel de 1kW)
+            # Eficiencia promedio ~15-20%
+            estimated_solar_production = estimated_radiation * 0.17 * 1000  # Wh por 1kW instalado
+            
+            # Estimación de producción eólica (para turbina de 1kW)
+            # Fórmula cúbica: P = 0.5 * ρ * A * v³ * η
+            # Simplificado: aprovechamos que la potencia es proporcional al cubo de la velocidad
+            # Asumimos turbina pequeña con cut-in de 3.5 m/s
+            if avg_wind >= 3.5:
+                # Factor cúbico normalizado
+                wind_power_factor = pow(avg_wind / 3.5, 3)
+                # Asumimos 24h de operación con factor de capacidad variable
+                estimated_wind_production = min(wind_power_factor * 50, 1000) * 24  # Wh por 1kW instalado
+            else:
+                estimated_wind_production = 0
+            
+            forecast_summary.append({
+                'date': date_str,
+                'temp_avg': round(avg_temp, 1),
+                'temp_max': round(max_temp, 1),
+                'temp_min': round(min_temp, 1),
+                'condition': day_data['conditions'][len(day_data['conditions'])//2],
+                'clouds_percent': round(avg_clouds, 1),
+                'wind_speed': round(avg_wind, 1),
+                'humidity': round(avg_humidity, 1),
+                'rain_mm': round(day_data['rain'], 1),
+                'solar_radiation_kwh_m2': round(estimated_radiation, 2),
+                'estimated_solar_wh_per_kw': round(estimated_solar_production, 0),
+                'estimated_wind_wh_per_kw': round(estimated_wind_production, 0)
+            })
+        
+        return {
+            'success': True,
+            'location': f"{data.get('city', {}).get('name', 'Desconocido')}",
+            'forecast': forecast_summary
+        }
     
     def get_current_weather(self) -> dict:
         """Obtener clima actual"""
@@ -127,24 +150,11 @@ class WeatherService:
             print("⚠️ API Key de OpenWeatherMap no configurada, usando datos simulados")
             return self._generate_mock_weather()
         
-        try:
-            url = f"{self.base_url}/weather"
-            params = {
-                'lat': self.lat,
-                'lon': self.lon,
-                'appid': self.api_key,
-                'units': 'metric'
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            return self._parse_current_weather(data)
-        
-        except Exception as e:
-            print(f"❌ Error obteniendo clima: {e}")
-            return self._generate_mock_weather()
+        return self.breaker.call(
+            lambda: self._parse_current_weather(self._get_json("weather")),
+            fallback=self._generate_mock_weather,
+            key="current"
+        )
     
     def get_forecast_raw(self) -> List[Dict]:
         """Obtener pronóstico de 5 días (cada 3 horas) - formato raw"""
@@ -153,68 +163,46 @@ class WeatherService:
             print("⚠️ API Key no configurada, usando pronóstico simulado")
             return self._generate_mock_forecast()
         
-        try:
-            url = f"{self.base_url}/forecast"
-            params = {
-                'lat': self.lat,
-                'lon': self.lon,
-                'appid': self.api_key,
-                'units': 'metric'
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            return self._parse_forecast(data)
-        
-        except Exception as e:
-            print(f"❌ Error obteniendo pronóstico: {e}")
-            return self._generate_mock_forecast()
+        return self.breaker.call(
+            lambda: self._parse_forecast(self._get_json("forecast")),
+            fallback=self._generate_mock_forecast,
+            key="forecast_raw"
+        )
     
-    def get_hourly_forecast_24h(self) -> List[Dict]:
-        """Obtener pronóstico horario para las próximas 24 horas"""
-        
-        # OpenWeatherMap API 3.0 tiene OneCall con pronóstico horario
-        # Para API gratuita 2.5, interpolamos el pronóstico de 3 horas
-        
-        forecast_3h = self.get_forecast_raw()
-        
-        # Tomar solo las primeras 24 horas (8 intervalos de 3h)
-        forecast_24h = forecast_3h[:8]
-        
-        # Interpolar para tener datos cada hora
-        hourly_forecast = []
-        
-        for i, current in enumerate(forecast_24h):
-            hourly_forecast.append(current)
-            
-            # Interpolar 2 puntos intermedios hasta el siguiente
-            if i < len(forecast_24h) - 1:
-                next_point = forecast_24h[i + 1]
-                
-                for j in range(1, 3):
-                    ratio = j / 3.0
-                    interpolated = self._interpolate_weather(current, next_point, ratio)
-                    hourly_forecast.append(interpolated)
-        
-        # Retornar solo 24 puntos
-        return hourly_forecast[:24]
+    def refresh_forecast(self) -> Optional[List[Dict]]:
+        """
+        Descargar el pronóstico ahora y guardarlo para get_forecast_grid
+
+        Returns:
+            El pronóstico guardado: el recién descargado o, si la descarga
+            falla (o no hay API key), el último bueno (None si nunca hubo)
+        """
+        if not self.api_key:
+            return self._forecast_raw
+        try:
+            forecast = self.breaker.call(lambda: self._parse_forecast(self._get_json("forecast")))
+        except Exception:
+            print("⚠️ Pronóstico no actualizado, se mantiene el último bueno")
+            return self._forecast_raw
+        self.breaker.remember("forecast_raw", forecast)
+        self._forecast_raw, self._forecast_raw_at = forecast, time.monotonic()
+        return forecast
     
-    def _interpolate_weather(self, w1: Dict, w2: Dict, ratio: float) -> Dict:
-        """Interpolar entre dos puntos meteorológicos"""
+    def get_forecast_grid(self, hours: float = 24, step_minutes: float = 60) -> ForecastGrid:
+        """
+        Pronóstico remuestreado a grilla regular (columnar)
         
-        return {
-            'timestamp': w1['timestamp'] + timedelta(hours=ratio * 3),
-            'temperature_c': w1['temperature_c'] + ratio * (w2['temperature_c'] - w1['temperature_c']),
-            'humidity_percent': w1['humidity_percent'] + ratio * (w2['humidity_percent'] - w1['humidity_percent']),
-            'pressure_hpa': w1['pressure_hpa'] + ratio * (w2['pressure_hpa'] - w1['pressure_hpa']),
-            'wind_speed_ms': w1['wind_speed_ms'] + ratio * (w2['wind_speed_ms'] - w1['wind_speed_ms']),
-            'wind_direction_deg': w1['wind_direction_deg'],
-            'cloud_cover_percent': w1['cloud_cover_percent'] + ratio * (w2['cloud_cover_percent'] - w1['cloud_cover_percent']),
-            'rain_1h_mm': w1.get('rain_1h_mm', 0),
-            'description': w1['description'],
-        }
+        OpenWeatherMap 2.5 (gratuita) da puntos cada 3 horas: se
+        interpolan vectorialmente a la resolución pedida, hasta 5 días.
+        """
+        raw = self._forecast_raw
+        if raw is None or time.monotonic() - self._forecast_raw_at > self.forecast_max_age_s:
+            raw = self.get_forecast_raw()
+        return forecast_grid.resample(
+            raw,
+            horizon_hours=hours,
+            step_minutes=step_minutes
+        )
     
     def _parse_current_weather(self, data: Dict) -> Dict:
         """Parsear respuesta de clima actual"""
@@ -241,8 +229,9 @@ class WeatherService:
         forecast = []
         
         for item in data['list']:
+            timestamp = datetime.fromtimestamp(item['dt'])
             forecast.append({
-                'timestamp': datetime.fromtimestamp(item['dt']),
+                'timestamp': timestamp,
                 'temperature_c': item['main']['temp'],
                 'humidity_percent': item['main']['humidity'],
                 'pressure_hpa': item['main']['pressure'],
@@ -253,26 +242,25 @@ class WeatherService:
                 'description': item['weather'][0]['description'],
                 'solar_radiation_wm2': self._estimate_solar_radiation(
                     item['clouds']['all'],
-                    item['main']['humidity']
+                    item['main']['humidity'],
+                    timestamp
                 )
             })
         
         return forecast
     
-    def _estimate_solar_radiation(self, cloud_cover: float, humidity: float) -> float:
-        """Estimar radiación solar (W/m²) basada en nubosidad"""
-        
-        hour = datetime.now().hour
-        
-        if hour < 6 or hour > 20:
-            return 0.0
+    def _estimate_solar_radiation(self, cloud_cover: float, humidity: float,
+                                  timestamp: Optional[datetime] = None) -> float:
+        """
+        Estimar radiación solar (W/m²) basada en nubosidad
         
-        # Radiación máxima teórica
-        max_radiation = 1000.0
+        Parte del GHI de cielo despejado para la posición del sol en el
+        sitio al momento `timestamp` (default: ahora)
+        """
         
-        # Factor por hora del día (curva sinusoidal)
-        import numpy as np
-        hour_factor = np.sin(np.pi * (hour - 6) / 14)
+        clear_sky = float(solar_geometry.clear_sky_ghi(
+            self.lat, self.lon, timestamp or datetime.now()
+        )[0])
         
         # Factor de nubosidad
         cloud_factor = 1.0 - (cloud_cover / 100.0) * 0.75
@@ -280,9 +268,7 @@ class WeatherService:
         # Factor de humedad
         humidity_factor = 1.0 - (humidity / 100.0) * 0.1
         
-        radiation = max_radiation * hour_factor * cloud_factor * humidity_factor
-        
-        return max(0.0, radiation)
+        return max(0.0, clear_sky * cloud_factor * humidity_factor)
     
     def _generate_mock_weather(self) -> Dict:
         """Generar datos meteorológicos simulados"""
@@ -336,7 +322,7 @@ class WeatherService:
                 'rain_1h_mm': 0,
                 'description': 'Simulado',
                 'solar_radiation_wm2': self._estimate_solar_radiation(
-                    random.uniform(0, 50), 50
+                    random.uniform(0, 50), 50, timestamp
                 )
             })
         